@@ -0,0 +1,247 @@
+import functools
+import os
+import sys
+import threading
+import time
+
+import sublime
+import sublime_plugin
+
+if sys.version_info[0] >= 3:
+    from .util import Util
+    from .wrap_fixer import WrapFixer
+else:
+    from util import Util
+    from wrap_fixer import WrapFixer
+
+
+class WrapAsYouTypeAuditCommand(sublime_plugin.TextCommand):
+    """A command that lists the paragraphs that are not wrapped correctly.
+
+    The command checks each paragraph in the document to see whether its
+    wrapping differs from what the "wrap_as_you_type_reflow" command
+    would produce, e.g. because a line extends past the wrap width, or
+    because some of the lines could be joined.  It lists the paragraphs
+    in an output panel, in the same format as build results, so that the
+    user can jump to each one.  Where possible, we scan the document on
+    a worker thread, using a copy of its contents made on the UI thread
+    when the scan starts.  If the document changes during the scan, we
+    mark the results as stale, since their line numbers may be out of
+    date.  Running the command with the "cancel" argument set to true
+    cancels the scan, as does running the command again.  When the scan
+    finishes, we report how many lines per second it checked.
+    """
+
+    # Private class attributes:
+    #
+    # dict<int, dict<str, object>> _audits - A map from the ID of each view we
+    #     are scanning to the state of the scan.  Each state has the following
+    #     entries: "canceled", whether the scan was canceled; "change_count",
+    #     the value of view.change_count() when the scan started; and
+    #     "is_stale", whether we have observed that the view changed since
+    #     then.
+
+    _audits = {}
+
+    # The name of the output panel that lists the results
+    _PANEL_NAME = 'wrap_as_you_type_audit'
+
+    # The key for the status bar text indicating the progress of the scan
+    _STATUS_KEY = 'wrap_as_you_type_audit'
+
+    # The minimum number of seconds between adding results to the output
+    # panel and updating the progress in the status bar
+    _FLUSH_INTERVAL = 0.1
+
+    # A map from each problem in the results of WrapFixer.gen_audit() to a
+    # description of the problem
+    _PROBLEM_DESCRIPTIONS = {
+        'over_width': 'a line extends past the wrap width',
+        'rewrapped': 'the wrapping differs from a reflow',
+        'under_filled': 'some of the lines could be joined',
+    }
+
+    def run(self, edit, cancel=False):
+        view = self.view
+        audit = WrapAsYouTypeAuditCommand._audits.pop(view.id(), None)
+        if audit is not None:
+            audit['canceled'] = True
+            view.erase_status(WrapAsYouTypeAuditCommand._STATUS_KEY)
+            if cancel:
+                Util.status_message(
+                    view.window(), 'WrapAsYouType: audit canceled')
+        if cancel:
+            return
+
+        window = view.window()
+        if hasattr(window, 'create_output_panel'):
+            panel = window.create_output_panel(
+                WrapAsYouTypeAuditCommand._PANEL_NAME)
+        else:
+            panel = window.get_output_panel(
+                WrapAsYouTypeAuditCommand._PANEL_NAME)
+        file_name = view.file_name()
+        panel_settings = panel.settings()
+        panel_settings.set('result_file_regex', r'^(.+?):(\d+):(\d+): ')
+        if file_name is not None:
+            panel_settings.set(
+                'result_base_dir', os.path.dirname(file_name))
+            name = os.path.basename(file_name)
+        else:
+            name = view.name() or 'untitled'
+        panel_settings.set('word_wrap', False)
+        window.run_command(
+            'show_panel',
+            {'panel': 'output.{0:s}'.format(
+                WrapAsYouTypeAuditCommand._PANEL_NAME)})
+
+        audit = {
+            'canceled': False,
+            'change_count': view.change_count(),
+            'is_stale': False,
+        }
+        WrapAsYouTypeAuditCommand._audits[view.id()] = audit
+        row_count = view.rowcol(view.size())[0] + 1
+
+        # Calling gen_audit() copies the view's text, so we call it here
+        # rather than on the worker thread
+        scan = functools.partial(
+            self._scan, WrapFixer.instance(view).gen_audit(), audit, panel,
+            name, row_count)
+        if hasattr(sublime, 'set_timeout_async'):
+            thread = threading.Thread(target=scan)
+            thread.daemon = True
+            thread.start()
+        else:
+            # Sublime Text 2's API is not thread-safe
+            scan()
+
+    def _append(self, audit, panel, text):
+        """Add the specified text to the end of the output panel.
+
+        This must be called on the UI thread.  It has no effect if the
+        scan was canceled.
+
+        dict<str, object> audit - The state of the scan, as in _audits.
+        View panel - The output panel.
+        str text - The text to add.
+        """
+        if not audit['canceled'] and text:
+            panel.run_command(
+                'append',
+                {'characters': text, 'force': True, 'scroll_to_end': False})
+
+    def _check_stale(self, audit):
+        """Update the "is_stale" entry of the specified scan's state.
+
+        This must be called on the UI thread.
+
+        dict<str, object> audit - The state of the scan, as in _audits.
+        return bool - The resulting value of the "is_stale" entry.
+        """
+        if self.view.change_count() != audit['change_count']:
+            audit['is_stale'] = True
+        return audit['is_stale']
+
+    def _finish(self, audit, message):
+        """Notify the user that the scan finished.
+
+        This must be called on the UI thread.
+
+        dict<str, object> audit - The state of the scan, as in _audits.
+        str message - The summary of the results.
+        """
+        view = self.view
+        if audit['canceled']:
+            return
+        if WrapAsYouTypeAuditCommand._audits.get(view.id()) is audit:
+            del WrapAsYouTypeAuditCommand._audits[view.id()]
+        view.erase_status(WrapAsYouTypeAuditCommand._STATUS_KEY)
+        Util.status_message(view.window(), message)
+
+    def _flush(self, audit, panel, lines, fraction):
+        """Add results to the output panel and show the scan's progress.
+
+        This may be called off of the UI thread.
+
+        dict<str, object> audit - The state of the scan, as in _audits.
+        View panel - The output panel.
+        list<str> lines - The lines to add to the panel.
+        float fraction - The fraction of the document we have scanned.
+        """
+        text = ''.join(lines)
+
+        def flush():
+            self._append(audit, panel, text)
+            if not audit['canceled']:
+                if self._check_stale(audit):
+                    status = 'WrapAsYouType: auditing ({0:d}%, stale)'
+                else:
+                    status = 'WrapAsYouType: auditing ({0:d}%)'
+                self.view.set_status(
+                    WrapAsYouTypeAuditCommand._STATUS_KEY,
+                    status.format(int(100 * fraction)))
+
+        sublime.set_timeout(flush, 0)
+
+    def _scan(self, results, audit, panel, name, row_count):
+        """Check the paragraphs in the document, and list the results.
+
+        Generator<dict<str, object>> results - The results, as returned
+            by WrapFixer.gen_audit().
+        dict<str, object> audit - The state of the scan, as in _audits.
+        View panel - The output panel.
+        str name - The name of the file to use in the results.
+        int row_count - The number of lines in the document.
+        """
+        start_time = time.time()
+        flush_time = start_time
+        lines = []
+        paragraph_count = 0
+        scanned_row_count = 0
+        for result in results:
+            if audit['canceled']:
+                return
+            scanned_row_count = result['end_row'] + 1
+            if result['problem'] is not None:
+                paragraph_count += 1
+                if result['row'] == result['end_row']:
+                    rows = u'line {0:d}'.format(result['row'] + 1)
+                else:
+                    rows = u'lines {0:d}-{1:d}'.format(
+                        result['row'] + 1, result['end_row'] + 1)
+                lines.append(
+                    u'{0:s}:{1:d}:1: {2:s}: {3:s}\n'.format(
+                        name, result['row'] + 1, rows,
+                        WrapAsYouTypeAuditCommand._PROBLEM_DESCRIPTIONS[
+                            result['problem']]))
+
+            now = time.time()
+            if now - flush_time >= WrapAsYouTypeAuditCommand._FLUSH_INTERVAL:
+                flush_time = now
+                self._flush(
+                    audit, panel, lines,
+                    scanned_row_count / float(row_count))
+                lines = []
+
+        if audit['canceled']:
+            return
+        elapsed = time.time() - start_time
+        summary = (
+            u'Scanned {0:d} lines in {1:.2f} seconds ({2:d} lines/sec); '
+            'found {3:d} paragraphs that are not wrapped correctly'.format(
+                row_count, elapsed,
+                int(row_count / max(elapsed, 0.001)), paragraph_count))
+
+        def finish():
+            if self._check_stale(audit):
+                message = (
+                    u'{0:s}.  The document changed during the audit, so '
+                    'the results may be out of date.'.format(summary))
+            else:
+                message = summary
+            lines.append(u'{0:s}\n'.format(message))
+            self._append(audit, panel, ''.join(lines))
+            self._finish(audit, u'WrapAsYouType: {0:s}'.format(message))
+
+        sublime.set_timeout(finish, 0)
@@ -0,0 +1,1264 @@
+import argparse
+import codecs
+import difflib
+import hashlib
+import io
+import json
+import mmap
+import multiprocessing
+import os
+import re
+import sys
+import time
+
+if sys.version_info[0] >= 3:
+    from .error import UserFacingError
+    from .scope_provider import RegexScopeProvider
+    from .syntax_definition import SyntaxDefinition
+    from .syntax_definition import SyntaxScopeProvider
+    from .text_buffer import Region
+    from .text_buffer import Settings
+    from .text_buffer import TextBuffer
+    from .wrap_engine import WrapEngine
+else:
+    from error import UserFacingError
+    from scope_provider import RegexScopeProvider
+    from syntax_definition import SyntaxDefinition
+    from syntax_definition import SyntaxScopeProvider
+    from text_buffer import Region
+    from text_buffer import Settings
+    from text_buffer import TextBuffer
+    from wrap_engine import WrapEngine
+
+
+class BatchReflower(object):
+    """Reflows the wrappable sections of files outside of Sublime Text.
+
+    BatchReflower applies the same reflow as the "wrap_as_you_type_reflow"
+    command to files on disk, using WrapEngine.  The configuration is a
+    dictionary of settings, as in a .sublime-settings file, e.g.
+    {"wrap_as_you_type_sections": [...], "wrap_width": 80}.  We parse it
+    once, when constructing the BatchReflower, and reuse the result for
+    every file.
+
+    Since there is no syntax definition to supply the scopes of the
+    characters, we use a ScopeProvider to compute them, based on the
+    file's extension: by default, a RegexScopeProvider, which gives
+    comments the scopes Sublime would give them, e.g.
+    "source.c comment.line.double-slash.c".  We skip files whose
+    extensions have no ScopeProvider.
+    """
+
+    # Private attributes:
+    #
+    # WrapEngine _engine - A WrapEngine whose settings are the configuration.
+    #     We use WrapEngine.for_buffer to create an engine for each file.
+    # re.Pattern _paragraphs_regex - A bytes regular expression matching the
+    #     maximal runs of consecutive lines in UTF-8 encoded text that might
+    #     be part of a paragraph, as in WrapEngine.may_be_in_paragraph.  It
+    #     matches a superset of such lines.  This is None if some line start
+    #     consists only of whitespace, so that almost any line might be part
+    #     of a paragraph.
+    # dict<str, ScopeProvider> _scope_providers - A map from file extensions
+    #     to the ScopeProviders to use for them instead of the
+    #     RegexScopeProviders.
+    # Settings _settings - The configuration.
+
+    # The number of characters reflow_stream buffers before it writes the
+    # buffered text, if possible
+    _STREAM_BUFFER_SIZE = 65536
+
+    # The minimum size in bytes of a file for check_file to scan it using
+    # _mapped_changed_rows rather than reading it into memory
+    _MMAP_THRESHOLD = 1 << 20
+
+    # The number of bytes or characters that _count_newlines and _advance_rows
+    # examine at a time
+    _COUNT_CHUNK_SIZE = 1 << 16
+
+    # The number of bytes that _check_mapped_encoding decodes at a time
+    _DECODE_CHUNK_SIZE = 1 << 20
+
+    def __init__(self, config, scope_providers=None):
+        """Initialize the reflower.
+
+        dict<str, object> config - The settings.  We use a tab size of
+            4 if there is no "tab_size" setting.
+        dict<str, ScopeProvider> scope_providers - A map from file
+            extensions, e.g. 'py', to the ScopeProviders to use for
+            files with those extensions, in place of the
+            RegexScopeProviders.
+        """
+        values = {'tab_size': 4}
+        values.update(config)
+        self._settings = Settings(values)
+        self._scope_providers = dict(
+            (extension.lower(), provider)
+            for extension, provider in (scope_providers or {}).items())
+        self._engine = WrapEngine(TextBuffer('', self._settings))
+        self._paragraphs_regex = self._compute_paragraphs_regex()
+
+    def _compute_paragraphs_regex(self):
+        """Return the value of _paragraphs_regex."""
+        markers = set()
+        for section in self._engine.settings_parser().sections:
+            for line_start in section['allowed_line_starts']:
+                marker = line_start.lstrip()
+                if not marker:
+                    return None
+                markers.add(marker)
+        if not markers:
+            return None
+
+        # A line might be part of a paragraph only if it starts with
+        # whitespace followed by a marker.  The whitespace may include any
+        # non-ASCII character, since we don't decode it.
+        marker_pattern = b'|'.join(
+            re.escape(marker.encode('utf-8'))
+            for marker in sorted(markers, key=len, reverse=True))
+        line_pattern = (
+            br'[\t\x0b\x0c\r\x1c-\x1f \x80-\xff]*(?:' + marker_pattern +
+            br')[^\n]*')
+        return re.compile(
+            br'^(?:' + line_pattern + br'(?:\n|\Z))+', re.MULTILINE)
+
+    def has_sections(self):
+        """Return whether the configuration has any wrappable sections."""
+        return bool(self._engine.settings_parser().sections)
+
+    @staticmethod
+    def _extension(path):
+        """Return the extension of the specified file, e.g. 'py'."""
+        return os.path.splitext(path)[1][1:].lower()
+
+    def _scope_provider(self, path):
+        """Return the ScopeProvider for the specified file.
+
+        str path - The file's path.
+        return ScopeProvider - The provider, or None if we do not
+            support the file's extension.
+        """
+        extension = BatchReflower._extension(path)
+        provider = self._scope_providers.get(extension)
+        if provider is None:
+            provider = RegexScopeProvider.for_extension(extension)
+        return provider
+
+    def is_supported(self, path):
+        """Return whether we can determine the scopes of the specified file.
+
+        str path - The file's path.
+        return bool - Whether there is a ScopeProvider for the file's
+            extension.
+        """
+        return self._scope_provider(path) is not None
+
+    def _engine_for_text(self, text, path, state=None):
+        """Return a WrapEngine for the specified text.
+
+        str text - The text.  Its line breaks must be '\\n' characters.
+        str path - The path of the file containing the text.  We use its
+            extension to determine the scopes of the characters.
+        object state - The state of the file's ScopeProvider at the
+            beginning of the text, as returned by
+            ScopeProvider.end_state.
+        return WrapEngine - The engine.
+        """
+        text_buffer = TextBuffer(
+            text, self._settings,
+            self._scope_provider(path).scope_runs(text, state))
+        return self._engine.for_buffer(text_buffer)
+
+    @staticmethod
+    def _advance_rows(text, point, count):
+        """Return the beginning of the line "count" lines after "point".
+
+        We skip over text _COUNT_CHUNK_SIZE characters at a time, so
+        that the amount of Python-level work is small even if "count"
+        is large.
+
+        str text - The text.  Its line breaks must be '\\n' characters.
+        int point - The beginning of a line.
+        int count - The number of lines to advance.
+        return int - The beginning of the resulting line, or None if the
+            text has fewer than "count" lines after "point".
+        """
+        chunk_size = BatchReflower._COUNT_CHUNK_SIZE
+        while count > 0:
+            chunk_end = point + chunk_size
+            if chunk_end < len(text):
+                chunk_count = text.count('\n', point, chunk_end)
+                if chunk_count < count:
+                    count -= chunk_count
+                    point = chunk_end
+                    continue
+            index = text.find('\n', point)
+            if index < 0:
+                return None
+            point = index + 1
+            count -= 1
+        return point
+
+    def _gen_row_edits(self, text, path, rows, state):
+        """Generator for the edits for reflowing the paragraphs with "rows".
+
+        Rather than computing the scopes of all of the text, we divide
+        it into windows that extend from each row to the nearest lines
+        before and after it that are not part of any paragraph, as in
+        WrapEngine.may_be_in_paragraph, and we reflow each window
+        separately.  Reflowing never joins a window with the text
+        around it, so the Python-level work is proportional to the size
+        of the windows rather than the size of the text.  We obtain the
+        state of the ScopeProvider at the beginning of each window using
+        ScopeProvider.end_state, which skips over the text between the
+        windows without computing its scopes.
+
+        str text - The text.  Its line breaks must be '\\n' characters.
+        str path - The path of the file containing the text, as in
+            reflow_text.
+        list<int> rows - The rows whose paragraphs we reflow, as in
+            reflow_text.
+        object state - The state of the file's ScopeProvider at the
+            beginning of the text, as in reflow_text.
+        return Generator<tuple<Region, str>> - The edits, as in
+            WrapEngine.reflow_edits.
+        """
+        engine = self._engine
+        scope_provider = self._scope_provider(path)
+
+        def line_end(begin):
+            end = text.find('\n', begin)
+            if end >= 0:
+                return end
+            else:
+                return len(text)
+
+        rows = sorted(set(row for row in rows if row >= 0))
+        row = 0
+        line_begin = 0
+        min_begin = 0
+        state_point = 0
+        index = 0
+        while index < len(rows):
+            line_begin = BatchReflower._advance_rows(
+                text, line_begin, rows[index] - row)
+            if line_begin is None:
+                break
+            row = rows[index]
+
+            # Compute the window, and the rows in the window.  The window may
+            # not overlap the previous one.
+            begin = line_begin
+            while begin > min_begin:
+                prev_begin = text.rfind('\n', 0, begin - 1) + 1
+                if not engine.may_be_in_paragraph(text[prev_begin:begin - 1]):
+                    break
+                begin = prev_begin
+            regions = []
+            while True:
+                end = line_end(line_begin)
+                if index < len(rows) and rows[index] == row:
+                    regions.append(Region(line_begin - begin, end - begin))
+                    index += 1
+                if (end == len(text) or
+                        not engine.may_be_in_paragraph(
+                            text[end + 1:line_end(end + 1)])):
+                    break
+                line_begin = end + 1
+                row += 1
+
+            # Reflow the window
+            min_begin = end + 1
+            window_text = text[begin:end]
+            if not engine.may_need_reflow(window_text):
+                continue
+            state = scope_provider.end_state(text, state, state_point, begin)
+            state_point = begin
+            window_engine = self._engine_for_text(window_text, path, state)
+            paragraphs = window_engine.paragraph_regions(regions)
+            for replace_region, replacement_str in (
+                    window_engine.gen_reflow_edits(paragraphs)):
+                yield (
+                    Region(
+                        replace_region.begin() + begin,
+                        replace_region.end() + begin),
+                    replacement_str)
+
+    def _gen_edits(self, text, path, rows=None, state=None):
+        """Generator for the edits for reflowing the specified text.
+
+        We skip computing the scopes and reflowing if
+        WrapEngine.may_need_reflow indicates that the text is already
+        wrapped correctly.
+
+        str text - The text.  Its line breaks must be '\\n' characters.
+        str path - The path of the file containing the text, as in
+            reflow_text.
+        list<int> rows - The rows whose paragraphs we reflow, as in
+            reflow_text.
+        object state - The state of the file's ScopeProvider at the
+            beginning of the text, as in reflow_text.
+        return Generator<tuple<Region, str>> - The edits, as in
+            WrapEngine.reflow_edits.
+        """
+        if rows is not None:
+            for edit in self._gen_row_edits(text, path, rows, state):
+                yield edit
+        elif self._engine.may_need_reflow(text):
+            engine = self._engine_for_text(text, path, state)
+            for edit in engine.gen_reflow_edits([Region(0, len(text))]):
+                yield edit
+
+    def reflow_text(self, text, path, rows=None, state=None):
+        """Return the result of reflowing the specified text.
+
+        str text - The text.  Its line breaks must be '\\n' characters.
+        str path - The path of the file containing the text.  We use its
+            extension to determine the scopes of the characters.
+        list<int> rows - The 0-based rows to reflow.  We only reflow the
+            paragraphs that contain these rows, as in
+            WrapEngine.paragraph_regions.  If this is None, we reflow
+            all of the text.
+        object state - The state of the file's ScopeProvider at the
+            beginning of the text, as returned by
+            ScopeProvider.end_state, if the text is part of a file.  The
+            text must begin at the beginning of a line.
+        return str - The reflowed text.
+        """
+        components = []
+        end = 0
+        for replace_region, replacement_str in self._gen_edits(
+                text, path, rows, state):
+            components.append(text[end:replace_region.begin()])
+            components.append(replacement_str)
+            end = replace_region.end()
+        components.append(text[end:])
+        return ''.join(components)
+
+    def reflow_stream(self, input_file, output_file, path):
+        """Reflow the text in the specified stream, writing it incrementally.
+
+        We read the input one line at a time.  Whenever we have buffered
+        _STREAM_BUFFER_SIZE more characters, we write the reflowed text
+        of the buffered lines that precede the paragraph containing the
+        last buffered line, as in _stream_flush_point.  So the amount of
+        memory we use is bounded by the length of the longest paragraph
+        plus _STREAM_BUFFER_SIZE, rather than the length of the input.  We
+        convert all of the line breaks to match the first line break in
+        the input, either '\\r\\n' or '\\n'.  We carry the state of the
+        ScopeProvider from each run of lines to the next.
+
+        file input_file - The input, as a text file object that does not
+            translate line breaks, e.g. the result of
+            io.open(..., newline='').
+        file output_file - The output, as a text file object that does
+            not translate line breaks.
+        str path - The path to use to determine the scopes of the
+            characters, as in reflow_text.
+        """
+        scope_provider = self._scope_provider(path)
+        state = None
+        newline = None
+        lines = []
+        buffer_size = 0
+        flush_size = BatchReflower._STREAM_BUFFER_SIZE
+        for line in input_file:
+            if line.endswith('\r\n'):
+                line = line[:-2] + '\n'
+                if newline is None:
+                    newline = '\r\n'
+            elif newline is None and line.endswith('\n'):
+                newline = '\n'
+            lines.append(line)
+            buffer_size += len(line)
+            if buffer_size >= flush_size and line.endswith('\n'):
+                text = ''.join(lines)
+                end = self._stream_flush_point(text, path, state)
+                if end > 0:
+                    # Reflowing never joins text[:end] with any later text
+                    reflowed_text = self.reflow_text(
+                        text[:end], path, None, state)
+                    output_file.write(
+                        reflowed_text.replace('\n', newline or '\n'))
+                    output_file.flush()
+                    state = scope_provider.end_state(text, state, 0, end)
+                    text = text[end:]
+                lines = [text]
+                buffer_size = len(text)
+
+                # Wait for another _STREAM_BUFFER_SIZE characters before
+                # checking again, so that the total work is linear in the
+                # length of the input, even if a paragraph is long
+                flush_size = buffer_size + BatchReflower._STREAM_BUFFER_SIZE
+        output_file.write(
+            self.reflow_text(''.join(lines), path, None, state).replace(
+                '\n', newline or '\n'))
+        output_file.flush()
+
+    def _stream_flush_point(self, text, path, state):
+        """Return the end of the text reflow_stream may write so far.
+
+        This is the beginning of the paragraph containing the last line
+        of "text", as in WrapEngine.paragraph_regions, since later lines
+        might extend that paragraph, or the end of the text if the last
+        line is not part of any paragraph.  Whether a line continues the
+        paragraph of the line before it does not depend on any later
+        lines, so the paragraphs before this point are complete.
+
+        str text - The buffered text.  Its line breaks must be '\\n'
+            characters, and it must end with a line break.
+        str path - The path to use to determine the scopes of the
+            characters, as in reflow_text.
+        object state - The state of the file's ScopeProvider at the
+            beginning of the text, as in reflow_text.
+        return int - The end of the text to write.
+        """
+        last_line_begin = text.rfind('\n', 0, len(text) - 1) + 1
+        if not self._engine.may_be_in_paragraph(text[last_line_begin:-1]):
+            return len(text)
+        engine = self._engine_for_text(text, path, state)
+        return engine.paragraph_regions([Region(last_line_begin)])[0].begin()
+
+    @staticmethod
+    def _read(path):
+        """Return the contents of the specified file.
+
+        str path - The file's path.  The file must be encoded in UTF-8.
+        return tuple<str, str> - A pair consisting of the text, with each
+            line break converted to '\\n', and the line break the file
+            uses: '\\r\\n' or '\\n'.
+        """
+        with io.open(path, 'r', encoding='utf-8', newline='') as file_:
+            text = file_.read()
+        if '\r\n' in text:
+            return (text.replace('\r\n', '\n'), '\r\n')
+        else:
+            return (text, '\n')
+
+    def process_file(self, path, rows=None):
+        """Reflow the specified file, and save the result.
+
+        str path - The file's path.  The file must be encoded in UTF-8.
+        list<int> rows - The rows to reflow, as in reflow_text, or None
+            to reflow the entire file.
+        return dict<str, object> - The result.  This has the following
+            entries: "path", the file's path; "status", which is
+            "reflowed" if we altered the file, "clean" if it was already
+            wrapped correctly, and "error" if we could not process it;
+            and "message", a description of the error, if any.
+        """
+        try:
+            text, newline = BatchReflower._read(path)
+            reflowed_text = self.reflow_text(text, path, rows)
+            if reflowed_text == text:
+                return {'message': None, 'path': path, 'status': 'clean'}
+            with io.open(path, 'w', encoding='utf-8', newline='') as file_:
+                file_.write(reflowed_text.replace('\n', newline))
+            return {'message': None, 'path': path, 'status': 'reflowed'}
+        except (IOError, OSError, UnicodeDecodeError) as exception:
+            return {
+                'message': str(exception), 'path': path, 'status': 'error'}
+
+    def _gen_changed_rows(self, text, path, rows=None, state=None):
+        """Generator for the lines that reflowing the specified text changes.
+
+        str text - The text.  Its line breaks must be '\\n' characters.
+        str path - The path of the file containing the text, as in
+            reflow_text.
+        list<int> rows - The rows to reflow, as in reflow_text.
+        object state - The state of the file's ScopeProvider at the
+            beginning of the text, as in reflow_text.
+        return Generator<tuple<int, int>> - The first and last rows of
+            each paragraph that is not wrapped correctly, in order.  The
+            rows are 0-based.
+        """
+        for replace_region, replacement_str in self._gen_edits(
+                text, path, rows, state):
+            begin = text.rfind('\n', 0, replace_region.begin()) + 1
+            row = text.count('\n', 0, begin)
+            yield (row, row + text.count('\n', begin, replace_region.end()))
+
+    @staticmethod
+    def _check_mapped_encoding(mapped_file):
+        """Raise a UnicodeDecodeError if a memory-mapped file is not UTF-8.
+
+        We decode _DECODE_CHUNK_SIZE bytes at a time using an incremental
+        decoder, so that we do not store all of the file's text in memory
+        at once.  This lets check_file report encoding errors outside of
+        the runs that _gen_mapped_changed_rows decodes, as when we read
+        the file into memory.
+
+        mmap.mmap mapped_file - The file.
+        """
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        chunk_size = BatchReflower._DECODE_CHUNK_SIZE
+        for index in range(0, len(mapped_file), chunk_size):
+            decoder.decode(mapped_file[index:index + chunk_size])
+        decoder.decode(b'', True)
+
+    @staticmethod
+    def _count_newlines(mapped_file, begin, end):
+        """Return the number of newlines in mapped_file[begin:end].
+
+        We examine _COUNT_CHUNK_SIZE bytes at a time, so that we do not
+        copy the whole range into memory at once.
+
+        mmap.mmap mapped_file - The file.
+        int begin - The index of the beginning of the range.
+        int end - The index of the end of the range.
+        return int - The number of b'\\n' characters.
+        """
+        count = 0
+        chunk_size = BatchReflower._COUNT_CHUNK_SIZE
+        for index in range(begin, end, chunk_size):
+            count += mapped_file[index:min(end, index + chunk_size)].count(
+                b'\n')
+        return count
+
+    def _gen_mapped_changed_rows(self, mapped_file, path):
+        """Generator for the lines that reflowing a memory-mapped file changes.
+
+        This is equivalent to _gen_changed_rows, but rather than decoding
+        the entire file, we use _paragraphs_regex to locate the runs of
+        lines that might be part of a paragraph, and decode and reflow
+        each of them separately.  Reflowing never joins a run with the
+        text around it, so this produces the same results as reflowing
+        the whole file.  We obtain the state of the ScopeProvider at the
+        beginning of each run by passing the undecoded text before it to
+        ScopeProvider.end_state.  We do not detect encoding errors
+        outside of the runs; see _check_mapped_encoding.  This assumes
+        that _paragraphs_regex is not None.
+
+        mmap.mmap mapped_file - The contents of the file, encoded in
+            UTF-8.
+        str path - The file's path, as in reflow_text.
+        return Generator<tuple<int, int>> - The changed rows, as in
+            _gen_changed_rows.
+        """
+        scope_provider = self._scope_provider(path)
+        state = None
+        row = 0
+        end = 0
+        for match in self._paragraphs_regex.finditer(mapped_file):
+            text = match.group().decode('utf-8').replace('\r\n', '\n')
+            if not self._engine.may_need_reflow(text):
+                continue
+            row += BatchReflower._count_newlines(
+                mapped_file, end, match.start())
+            state = scope_provider.end_state(
+                mapped_file, state, end, match.start())
+            end = match.start()
+            for first_row, last_row in self._gen_changed_rows(
+                    text, path, None, state):
+                yield (row + first_row, row + last_row)
+
+    def _line_report(self, rows, path):
+        """Return a description of the lines that reflowing would change.
+
+        Iterable<tuple<int, int>> rows - The first and last rows of each
+            paragraph that is not wrapped correctly, as in
+            _gen_changed_rows.
+        str path - The file's path.
+        return str - The report, consisting of one line for each
+            paragraph, formatted like "foo.py:12:1: lines 12-14 would be
+            reflowed".  This is '' if there are no such paragraphs.
+        """
+        return ''.join(
+            u'{0:s}:{1:d}:1: lines {1:d}-{2:d} would be reflowed\n'.format(
+                path, first_row + 1, last_row + 1)
+            for first_row, last_row in rows)
+
+    def _diff_report(self, text, newline, path, rows=None):
+        """Return a unified diff of the result of reflowing a file.
+
+        str text - The text of the file.  Its line breaks must be '\\n'
+            characters.
+        str newline - The line break the file uses, as returned by _read.
+            As in the "diff" program, the lines of the diff that come
+            from the file end with this line break, so that the diff
+            applies to the file.
+        str path - The file's path.
+        list<int> rows - The rows to reflow, as in reflow_text.
+        return str - The diff, or '' if reflowing would not alter the
+            file.
+        """
+        reflowed_text = self.reflow_text(text, path, rows)
+        if reflowed_text == text:
+            return ''
+        lines = difflib.unified_diff(
+            text.replace('\n', newline).splitlines(True),
+            reflowed_text.replace('\n', newline).splitlines(True),
+            path, path)
+        components = []
+        for line in lines:
+            components.append(line)
+            if not line.endswith('\n'):
+                components.append('\n\\ No newline at end of file\n')
+        return ''.join(components)
+
+    def check_file(self, path, report, rows=None):
+        """Determine whether the specified file is wrapped correctly.
+
+        This does not alter the file.
+
+        str path - The file's path.  The file must be encoded in UTF-8.
+        str report - The kind of report to produce: "files" to only
+            determine whether the file is wrapped correctly, "lines" for
+            a list of the lines that reflowing would change, as in
+            _line_report, or "diff" for a unified diff.  With "files",
+            we stop at the first paragraph that is not wrapped
+            correctly.  With "files" or "lines", if the file is large
+            and "rows" is None, we scan it using _gen_mapped_changed_rows
+            rather than reading it into memory.  Either way, we report an
+            error if any part of the file is not valid UTF-8.
+        list<int> rows - The rows to check, as in reflow_text, or None
+            to check the entire file.
+        return dict<str, object> - The result.  This has the following
+            entries: "path", the file's path; "status", which is
+            "unwrapped" if reflowing would alter the file, "clean" if it
+            is wrapped correctly, and "error" if we could not process
+            it; "message", a description of the error, if any; and
+            "report", the report, if the status is "unwrapped" and the
+            report is "lines" or "diff".
+        """
+        try:
+            if (report != 'diff' and rows is None and
+                    self._paragraphs_regex is not None and
+                    os.path.getsize(path) >= BatchReflower._MMAP_THRESHOLD):
+                with open(path, 'rb') as file_:
+                    mapped_file = mmap.mmap(
+                        file_.fileno(), 0, access=mmap.ACCESS_READ)
+                    changed_rows = self._gen_mapped_changed_rows(
+                        mapped_file, path)
+                    try:
+                        BatchReflower._check_mapped_encoding(mapped_file)
+                        if report == 'files':
+                            output = None
+                            is_clean = next(changed_rows, None) is None
+                        else:
+                            output = self._line_report(changed_rows, path)
+                            is_clean = not output
+                    finally:
+                        # Release the generator's reference to the buffer
+                        # before closing the mapping
+                        changed_rows.close()
+                        mapped_file.close()
+            else:
+                text, newline = BatchReflower._read(path)
+                if report == 'files':
+                    output = None
+                    is_clean = (
+                        next(self._gen_edits(text, path, rows), None) is None)
+                elif report == 'lines':
+                    output = self._line_report(
+                        self._gen_changed_rows(text, path, rows), path)
+                    is_clean = not output
+                else:
+                    output = self._diff_report(text, newline, path, rows)
+                    is_clean = not output
+        except (IOError, OSError, UnicodeDecodeError) as exception:
+            return {
+                'message': str(exception), 'path': path, 'report': None,
+                'status': 'error'}
+        if is_clean:
+            return {
+                'message': None, 'path': path, 'report': None,
+                'status': 'clean'}
+        else:
+            return {
+                'message': None, 'path': path, 'report': output,
+                'status': 'unwrapped'}
+
+    def run_file(self, path, report, rows=None):
+        """Reflow or check the specified file.
+
+        str path - The file's path.
+        str report - The "report" argument to check_file, or None to
+            reflow the file, as in process_file.
+        list<int> rows - The rows to reflow or check, as in reflow_text,
+            or None to reflow or check the entire file.
+        return dict<str, object> - The result of process_file or
+            check_file.
+        """
+        if report is None:
+            return self.process_file(path, rows)
+        else:
+            return self.check_file(path, report, rows)
+
+
+class ResultCache(object):
+    """A persistent record of the files that are wrapped correctly.
+
+    ResultCache lets repeated runs of the batch tool skip the files that
+    have not changed since a run found them to be wrapped correctly,
+    without decoding or reflowing them.  It stores a single file
+    consisting of a sequence of SHA-1 digests, one for each file known
+    to be wrapped correctly.  Each digest covers the source code of the
+    modules that affect reflowing, the configuration, the file's
+    extension, and the file's contents, so a change to any of them
+    results in a cache miss.
+    """
+
+    # Private attributes:
+    #
+    # set<bytes> _added_digests - The digests passed to add() since we loaded
+    #     the cache.
+    # set<bytes> _digests - The digests in the cache.
+    # str _path - The path of the cache file.
+    # object _prefix_hash - A hashlib SHA-1 object that has consumed the
+    #     hash of the source code and the configuration.  We copy it to
+    #     compute each file's digest.
+    # set<bytes> _used_digests - The digests that contains() found since we
+    #     loaded the cache.
+
+    # The size of each digest in bytes
+    _DIGEST_SIZE = 20
+
+    # The number of bytes digest() reads at a time
+    _READ_CHUNK_SIZE = 1 << 20
+
+    # The maximum number of digests to store.  When saving, we keep the
+    # digests we added or used during the current run, followed by as many of
+    # the others as fit.
+    _MAX_DIGESTS = 250000
+
+    # The names of the modules whose source code affects the results of
+    # reflowing
+    _MODULES = (
+        'batch', 'scope_provider', 'scope_selector', 'settings_parser',
+        'syntax_definition', 'text_buffer', 'util', 'view_snapshot',
+        'wrap_engine')
+
+    def __init__(self, cache_dir, config, syntax_paths=()):
+        """Initialize the cache, and load its contents.
+
+        str cache_dir - The directory containing the cache file.
+        dict<str, object> config - The configuration, as in
+            BatchReflower.
+        list<str> syntax_paths - The paths of the .sublime-syntax files
+            we are using, as in _load_scope_providers.  Their contents
+            are part of each digest.
+        """
+        self._path = os.path.join(cache_dir, 'batch-clean-files.bin')
+        prefix_hash = hashlib.sha1()
+        package_dir = os.path.dirname(os.path.abspath(__file__))
+        for module in ResultCache._MODULES:
+            try:
+                with open(
+                        os.path.join(package_dir, module + '.py'),
+                        'rb') as file_:
+                    prefix_hash.update(hashlib.sha1(file_.read()).digest())
+            except (IOError, OSError):
+                prefix_hash.update(b'\0' * ResultCache._DIGEST_SIZE)
+        prefix_hash.update(
+            json.dumps(config, sort_keys=True).encode('utf-8'))
+        for path in syntax_paths:
+            with open(path, 'rb') as file_:
+                prefix_hash.update(hashlib.sha1(file_.read()).digest())
+        self._prefix_hash = prefix_hash
+        self._digests = set()
+        self._added_digests = set()
+        self._used_digests = set()
+        self._load()
+
+    def _load(self):
+        """Read the digests in the cache file into _digests.
+
+        If we are unable to read the file, we treat the cache as empty.
+        """
+        try:
+            with open(self._path, 'rb') as file_:
+                data = file_.read()
+        except (IOError, OSError):
+            return
+        size = ResultCache._DIGEST_SIZE
+        self._digests = set(
+            data[index:index + size]
+            for index in range(0, len(data) - size + 1, size))
+
+    def digest(self, path, file_):
+        """Return the digest of the specified file.
+
+        str path - The file's path.
+        file file_ - The file, opened for reading in binary mode.  We
+            read it in chunks, so that we do not need to store all of
+            its contents in memory at once.
+        return bytes - The digest.
+        """
+        hash_ = self._prefix_hash.copy()
+        hash_.update(
+            u'\0{0:s}\0'.format(
+                BatchReflower._extension(path)).encode('utf-8'))
+        while True:
+            chunk = file_.read(ResultCache._READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            hash_.update(chunk)
+        return hash_.digest()
+
+    def contains(self, digest):
+        """Return whether a file with the specified digest is clean.
+
+        bytes digest - The file's digest, as returned by digest().
+        return bool - Whether the file is wrapped correctly.
+        """
+        if digest in self._digests:
+            self._used_digests.add(digest)
+            return True
+        else:
+            return False
+
+    def add(self, digest):
+        """Record that a file with the specified digest is clean.
+
+        This should only be called for a file that we decoded in its
+        entirety without error, so that contains() never skips a file
+        that is not valid UTF-8.
+
+        bytes digest - The file's digest, as returned by digest().
+        """
+        self._digests.add(digest)
+        self._added_digests.add(digest)
+
+    def save(self):
+        """Write the cache file, if we added any digests.
+
+        We write to a temporary file and then rename it, so that
+        concurrent runs never see a partially written cache file.
+
+        return str - A description of the error, if we were unable to
+            write the file, or None otherwise.
+        """
+        if not self._added_digests:
+            return None
+        digests = list(self._added_digests | self._used_digests)
+        for digest in self._digests:
+            if len(digests) >= ResultCache._MAX_DIGESTS:
+                break
+            if (digest not in self._added_digests and
+                    digest not in self._used_digests):
+                digests.append(digest)
+
+        temp_path = u'{0:s}.{1:d}.tmp'.format(self._path, os.getpid())
+        try:
+            cache_dir = os.path.dirname(self._path)
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            with open(temp_path, 'wb') as file_:
+                file_.write(b''.join(digests[:ResultCache._MAX_DIGESTS]))
+            if hasattr(os, 'replace'):
+                os.replace(temp_path, self._path)
+            else:
+                # Python 2
+                if os.path.exists(self._path):
+                    os.remove(self._path)
+                os.rename(temp_path, self._path)
+        except (IOError, OSError) as exception:
+            return str(exception)
+        return None
+
+
+def _default_cache_dir():
+    """Return the default directory for the ResultCache file."""
+    cache_home = os.environ.get('XDG_CACHE_HOME')
+    if not cache_home:
+        cache_home = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'WrapAsYouType')
+
+
+# BatchReflower - The BatchReflower of the current worker process, as created
+# by _init_worker
+_worker_reflower = None
+
+# str - The "report" argument to pass to BatchReflower.run_file in the current
+# worker process, as set by _init_worker
+_worker_report = None
+
+
+# A regular expression matching the header of a hunk in a unified diff, e.g.
+# "@@ -12,3 +12,4 @@".  The groups are the line number and the line count of
+# the old and new versions of the hunk.  The line counts are optional.
+_HUNK_HEADER_REGEX = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+
+def _load_scope_providers(syntax_paths):
+    """Return ScopeProviders for the specified .sublime-syntax files.
+
+    list<str> syntax_paths - The paths of the files.  If multiple files
+        have the same extension in their "file_extensions", the last one
+        takes precedence.
+    return dict<str, ScopeProvider> - A map from each file extension to
+        the SyntaxScopeProvider to use for it, as in the
+        "scope_providers" argument to BatchReflower.
+    """
+    scope_providers = {}
+    for path in syntax_paths:
+        syntax = SyntaxDefinition.load(path)
+        provider = SyntaxScopeProvider(syntax)
+        for extension in syntax.file_extensions():
+            scope_providers[extension] = provider
+    return scope_providers
+
+
+def _init_worker(config, report, syntax_paths):
+    """Initialize a worker process of the process pool.
+
+    dict<str, object> config - The configuration, as in BatchReflower.
+    str report - The "report" argument to pass to BatchReflower.run_file.
+    list<str> syntax_paths - The paths of the .sublime-syntax files to
+        use, as in _load_scope_providers.
+    """
+    global _worker_reflower, _worker_report
+    _worker_reflower = BatchReflower(
+        config, _load_scope_providers(syntax_paths))
+    _worker_report = report
+
+
+def _run_file(task):
+    """Call run_file on the worker process's BatchReflower.
+
+    tuple<str, list<int>> task - A pair consisting of the "path" and
+        "rows" arguments to run_file.
+    """
+    return _worker_reflower.run_file(task[0], _worker_report, task[1])
+
+
+def _gen_paths(paths, reflower):
+    """Generator for the supported files in the specified paths.
+
+    We search directories recursively, skipping hidden directories, and
+    we return the files in each directory in sorted order, so that the
+    order is deterministic.
+
+    list<str> paths - The paths of the files and directories.
+    BatchReflower reflower - The reflower.
+    return Generator<str> - The paths of the files the reflower
+        supports, as in BatchReflower.is_supported.
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            if reflower.is_supported(path):
+                yield path
+            continue
+        for dir_path, dir_names, file_names in os.walk(path):
+            dir_names[:] = sorted(
+                name for name in dir_names if not name.startswith('.'))
+            for file_name in sorted(file_names):
+                if reflower.is_supported(file_name):
+                    yield os.path.join(dir_path, file_name)
+
+
+def _parse_diff(file_, strip):
+    """Return the lines that the specified unified diff adds or modifies.
+
+    These are the lines that start with "+" in the diff's hunks.  We
+    ignore lines that the diff only deletes, as well as files that it
+    deletes.
+
+    file file_ - The diff, as a text file object, e.g. the output of
+        "git diff".
+    int strip - The number of leading components to strip from each
+        path in the diff, as in the -p option of "patch", e.g. 1 to
+        strip the "b/" in "+++ b/foo.py".
+    return list<tuple<str, list<int>>> - Pairs consisting of the path of
+        each file, as given in the diff, and the 0-based rows in the new
+        version of the file that the diff adds or modifies, in order.
+    """
+    rows_by_path = {}
+    paths = []
+    path = None
+    new_row = 0
+    old_remaining = 0
+    new_remaining = 0
+    for line in file_:
+        line = line.rstrip('\r\n')
+        if old_remaining > 0 or new_remaining > 0:
+            # We are in a hunk
+            if line.startswith('+'):
+                if path is not None:
+                    rows_by_path[path].append(new_row)
+                new_row += 1
+                new_remaining -= 1
+            elif line.startswith('-'):
+                old_remaining -= 1
+            elif not line.startswith('\\'):
+                new_row += 1
+                old_remaining -= 1
+                new_remaining -= 1
+        elif line.startswith('+++ '):
+            path = line[4:].split('\t')[0]
+            if path.startswith('"') and path.endswith('"'):
+                path = path[1:-1]
+            if path == '/dev/null':
+                path = None
+            else:
+                path = '/'.join(path.split('/')[strip:])
+                if path not in rows_by_path:
+                    rows_by_path[path] = []
+                    paths.append(path)
+        else:
+            match = _HUNK_HEADER_REGEX.match(line)
+            if match is not None:
+                old_remaining = int(match.group(2) or 1)
+                new_row = int(match.group(3)) - 1
+                new_remaining = int(match.group(4) or 1)
+    return [(path, rows_by_path[path]) for path in paths]
+
+
+def main(argv=None):
+    """Run the command-line batch reflow tool.
+
+    list<str> argv - The command-line arguments, excluding the program
+        name.  If this is None, we use sys.argv[1:].
+    return int - The exit status.
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m WrapAsYouType.batch',
+        description=(
+            'Reflow the wrappable sections of source files, as in the '
+            '"wrap_as_you_type_reflow" command.'))
+    parser.add_argument(
+        'paths', nargs='*', metavar='PATH',
+        help=(
+            'a file, or a directory to search recursively, or "-" to reflow '
+            'the standard input and write the result to the standard '
+            'output.  With --from-diff, we limit the files in the diff to '
+            'these paths.'))
+    parser.add_argument(
+        '--config', required=True,
+        help=(
+            'a JSON file containing the settings, e.g. '
+            '"wrap_as_you_type_sections" and "wrap_width"'))
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=multiprocessing.cpu_count(),
+        help='the number of processes to use (default: the number of CPUs)')
+    parser.add_argument(
+        '--chunk-size', type=int, default=None,
+        help='the number of files to send to a process at a time')
+    parser.add_argument(
+        '--check', action='store_true',
+        help=(
+            "don't write the files; list the files that are not wrapped "
+            'correctly, and exit with status 1 if there are any'))
+    report_group = parser.add_mutually_exclusive_group()
+    report_group.add_argument(
+        '--diff', action='store_true',
+        help='like --check, but print a unified diff for each file')
+    report_group.add_argument(
+        '--lines', action='store_true',
+        help=(
+            'like --check, but list the lines of each paragraph that is not '
+            'wrapped correctly'))
+    parser.add_argument(
+        '--syntax', action='append', default=[], metavar='SYNTAX',
+        help=(
+            'a .sublime-syntax file to use to determine the scopes of the '
+            'files with its "file_extensions", instead of the built-in '
+            'regular expressions (requires PyYAML); may be repeated'))
+    parser.add_argument(
+        '--stdin-filename', default=None,
+        help=(
+            'with "-", a file name whose extension indicates the language of '
+            'the standard input, e.g. "foo.py"'))
+    parser.add_argument(
+        '--from-diff', default=None, metavar='DIFF',
+        help=(
+            'a unified diff, e.g. the output of "git diff", or "-" for the '
+            'standard input; only reflow the paragraphs that contain lines '
+            'the diff adds or modifies'))
+    parser.add_argument(
+        '-p', '--strip', type=int, default=1, metavar='NUM',
+        help=(
+            'with --from-diff, the number of leading components to strip '
+            'from the paths in the diff, as in "patch -p" (default: 1)'))
+    parser.add_argument(
+        '--cache-dir', default=None,
+        help=(
+            'the directory in which to cache which files are wrapped '
+            'correctly (default: {0:s})'.format(_default_cache_dir())))
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help="don't read or write the cache")
+    args = parser.parse_args(argv)
+    if args.diff:
+        report = 'diff'
+    elif args.lines:
+        report = 'lines'
+    elif args.check:
+        report = 'files'
+    else:
+        report = None
+    if not args.paths and args.from_diff is None:
+        parser.error('at least one PATH is required')
+    if '-' in args.paths:
+        if len(args.paths) > 1 or report is not None:
+            parser.error('"-" may not be combined with other paths or --check')
+        if args.from_diff is not None:
+            parser.error('"-" may not be combined with --from-diff')
+
+    try:
+        with io.open(args.config, 'r', encoding='utf-8') as file_:
+            config = json.load(file_)
+    except (IOError, OSError, ValueError) as exception:
+        sys.stderr.write(
+            u'Error reading {0:s}: {1:s}\n'.format(
+                args.config, str(exception)))
+        return 2
+    if not isinstance(config, dict):
+        sys.stderr.write(
+            u'Error: {0:s} must contain a JSON object\n'.format(args.config))
+        return 2
+    try:
+        scope_providers = _load_scope_providers(args.syntax)
+    except (IOError, OSError, UnicodeDecodeError,
+            UserFacingError) as exception:
+        sys.stderr.write(
+            u'Error reading syntax definitions: {0:s}\n'.format(
+                str(exception)))
+        return 2
+    reflower = BatchReflower(config, scope_providers)
+    if not reflower.has_sections():
+        sys.stderr.write(
+            u'Error: {0:s} does not specify any valid '
+            '"wrap_as_you_type_sections"\n'.format(args.config))
+        return 2
+
+    if args.paths == ['-']:
+        if (args.stdin_filename is None or
+                not reflower.is_supported(args.stdin_filename)):
+            parser.error(
+                '"-" requires --stdin-filename with a supported extension')
+        input_file = io.open(
+            sys.stdin.fileno(), 'r', encoding='utf-8', newline='',
+            closefd=False)
+        output_file = io.open(
+            sys.stdout.fileno(), 'w', encoding='utf-8', newline='',
+            closefd=False)
+        try:
+            reflower.reflow_stream(
+                input_file, output_file, args.stdin_filename)
+        except UnicodeDecodeError as exception:
+            sys.stderr.write(
+                u'Error reading the standard input: {0:s}\n'.format(
+                    str(exception)))
+            return 1
+        return 0
+
+    start_time = time.time()
+    if args.from_diff is None:
+        tasks = [(path, None) for path in _gen_paths(args.paths, reflower)]
+    else:
+        try:
+            if args.from_diff == '-':
+                diff_file = io.open(
+                    sys.stdin.fileno(), 'r', encoding='utf-8',
+                    errors='replace', newline='', closefd=False)
+            else:
+                diff_file = io.open(
+                    args.from_diff, 'r', encoding='utf-8', errors='replace',
+                    newline='')
+            with diff_file:
+                diff_paths = _parse_diff(diff_file, args.strip)
+        except (IOError, OSError) as exception:
+            sys.stderr.write(
+                u'Error reading {0:s}: {1:s}\n'.format(
+                    args.from_diff, str(exception)))
+            return 2
+        dirs = [os.path.abspath(path) for path in args.paths]
+        tasks = []
+        for path, rows in diff_paths:
+            abs_path = os.path.abspath(path)
+            if (rows and reflower.is_supported(path) and
+                    (not dirs or any(
+                        abs_path == dir_ or
+                        abs_path.startswith(os.path.join(dir_, ''))
+                        for dir_ in dirs))):
+                tasks.append((path, rows))
+
+    # Skip the files that the cache indicates are wrapped correctly.  A file
+    # whose changed paragraphs are wrapped correctly might not be wrapped
+    # correctly in its entirety, so we don't use the cache with --from-diff.
+    if args.no_cache or args.from_diff is not None:
+        cache = None
+        uncached_tasks = tasks
+    else:
+        cache = ResultCache(
+            args.cache_dir or _default_cache_dir(), config, args.syntax)
+        uncached_tasks = []
+        digests = {}
+        for task in tasks:
+            path = task[0]
+            try:
+                with open(path, 'rb') as file_:
+                    digest = cache.digest(path, file_)
+            except (IOError, OSError):
+                # Let BatchReflower report the error
+                uncached_tasks.append(task)
+                continue
+            if not cache.contains(digest):
+                uncached_tasks.append(task)
+                digests[path] = digest
+
+    jobs = max(1, min(args.jobs, len(uncached_tasks)))
+    if jobs == 1:
+        pool = None
+        results = (
+            reflower.run_file(path, report, rows)
+            for path, rows in uncached_tasks)
+    else:
+        chunk_size = args.chunk_size
+        if chunk_size is None:
+            chunk_size = max(1, min(64, len(uncached_tasks) // (8 * jobs)))
+        pool = multiprocessing.Pool(
+            jobs, _init_worker, (config, report, args.syntax))
+        results = pool.imap(_run_file, uncached_tasks, chunk_size)
+
+    counts = {'clean': 0, 'error': 0, 'reflowed': 0, 'unwrapped': 0}
+    try:
+        for result in results:
+            counts[result['status']] += 1
+
+            # A "clean" result for an entire file implies that we decoded all
+            # of it, even if we scanned it using mmap
+            if (cache is not None and result['status'] == 'clean' and
+                    result['path'] in digests):
+                cache.add(digests[result['path']])
+            if result['status'] in ('reflowed', 'unwrapped'):
+                if result.get('report'):
+                    sys.stdout.write(result['report'])
+                else:
+                    sys.stdout.write(u'{0:s}\n'.format(result['path']))
+            elif result['status'] == 'error':
+                sys.stderr.write(
+                    u'{0:s}: error: {1:s}\n'.format(
+                        result['path'], result['message']))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if cache is not None:
+            message = cache.save()
+            if message is not None:
+                sys.stderr.write(
+                    u'Error writing the cache: {0:s}\n'.format(message))
+
+    if report is None:
+        summary = u'Reflowed {0:d} of {1:d} files'.format(
+            counts['reflowed'], len(tasks))
+    else:
+        summary = u'{0:d} of {1:d} files are not wrapped correctly'.format(
+            counts['unwrapped'], len(tasks))
+    if len(uncached_tasks) < len(tasks):
+        summary += u' ({0:d} unchanged files skipped using the cache)'.format(
+            len(tasks) - len(uncached_tasks))
+    sys.stderr.write(
+        u'{0:s}; {1:.2f} seconds\n'.format(
+            summary, time.time() - start_time))
+    if counts['error'] > 0 or counts['unwrapped'] > 0:
+        return 1
+    else:
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
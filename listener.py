@@ -1,3 +1,4 @@
+import functools
 import sys
 
 import sublime
@@ -13,18 +14,37 @@ class WrapAsYouTypeListener(sublime_plugin.EventListener):
     """An EventListener for the WrapAsYouType plugin.
 
     WrapAsYouTypeListener listens for changes to views and runs the
-    wrap_as_you_type command as appropriate.
+    wrap_as_you_type command as appropriate.  If the
+    "wrap_as_you_type_async" setting is true, it computes the word
+    wrapping fixup in on_modified_async, and then runs the
+    wrap_as_you_type command on the UI thread, provided the view has
+    not changed in the meantime.
     """
 
     # Private attributes:
     # bool _is_running: Whether on_modified is currently being called.
 
+    # The number of milliseconds the user must stop typing for before we
+    # perform the deferred reflows, as in WrapFixer.has_deferred_edit(), if the
+    # "wrap_as_you_type_defer_reflow" setting is true.  Otherwise, we perform
+    # them (i.e. the work that exceeded the work budget) on the next idle tick.
+    _DEFERRED_REFLOW_DELAY = 500
+
     def __init__(self):
         super(WrapAsYouTypeListener, self).__init__()
         self._is_running = False
 
     def on_modified(self, view):
         wrap_fixer = WrapFixer.instance(view)
+        if wrap_fixer.is_performing_edits():
+            # This is one of our own edits.  WrapFixer.perform_edits() takes
+            # care of the bookkeeping once it has performed all of them.
+            return
+        if not wrap_fixer.handles_modifications():
+            # The user modified the buffer using another view into it.  That
+            # view's WrapFixer performs any word wrapping fixup.
+            wrap_fixer.on_clone_modified()
+            return
         wrap_fixer.on_modified()
 
         if self._is_running:
@@ -40,19 +60,167 @@ class WrapAsYouTypeListener(sublime_plugin.EventListener):
                     not view.command_history(1)[0]):
 
                 last_command = view.command_history(0)[0]
-                if (last_command not in ('swap_line_up', 'swap_line_down') and
-                        # It is important to refrain from running the
-                        # wrap_as_you_type command if there is no word wrap
-                        # fixup to perform.  Otherwise, Sublime creates an undo
-                        # entry for every single keystroke.
-                        wrap_fixer.has_edit()):
+                if last_command in ('swap_line_up', 'swap_line_down'):
+                    pass
+                elif wrap_fixer.is_async():
+                    if wrap_fixer.prepare_analysis():
+                        # on_modified_async computes the fixup, and
+                        # _finish_fixup performs it and calls
+                        # on_post_modification()
+                        return
+                # It is important to refrain from running the wrap_as_you_type
+                # command if there is no word wrap fixup to perform.
+                # Otherwise, Sublime creates an undo entry for every single
+                # keystroke.
+                elif wrap_fixer.has_edit():
                     view.run_command('wrap_as_you_type')
             wrap_fixer.on_post_modification()
+            self._schedule_deferred_reflow(view, wrap_fixer)
+            self._schedule_overflow_scan(view, wrap_fixer)
+        finally:
+            self._is_running = False
+
+    def on_modified_async(self, view):
+        change_count = WrapFixer.instance(view).analyze()
+        if change_count is not None:
+            sublime.set_timeout(
+                functools.partial(self._finish_fixup, view, change_count), 0)
+
+    def _finish_fixup(self, view, change_count):
+        """Perform the word wrapping fixup computed in on_modified_async.
+
+        View view - The view.
+        int change_count - The value of view.change_count() for which we
+            computed the fixup.
+        """
+        if view.change_count() != change_count:
+            # The fixup is stale.  The analysis for the later modification
+            # supersedes it.
+            return
+        wrap_fixer = WrapFixer.instance(view)
+        self._is_running = True
+        try:
+            if wrap_fixer.has_planned_edit():
+                view.run_command('wrap_as_you_type')
+            wrap_fixer.on_post_modification()
+            self._schedule_deferred_reflow(view, wrap_fixer)
+            self._schedule_overflow_scan(view, wrap_fixer)
+        finally:
+            self._is_running = False
+
+    def _schedule_deferred_reflow(self, view, wrap_fixer, delay=None):
+        """Schedule a call to _deferred_reflow, if there is anything to do.
+
+        The call only performs the deferred reflows if the view does not
+        change in the meantime.  Otherwise, the call that we schedule in
+        response to the later change supersedes it.
+
+        View view - The view.
+        WrapFixer wrap_fixer - The WrapFixer for the view.
+        int delay - The number of milliseconds to wait before the call.
+            By default, this is _DEFERRED_REFLOW_DELAY if the
+            "wrap_as_you_type_defer_reflow" setting is true, and 0
+            otherwise.
+        """
+        if wrap_fixer.has_continuations():
+            if delay is None:
+                if view.settings().get('wrap_as_you_type_defer_reflow'):
+                    delay = self._DEFERRED_REFLOW_DELAY
+                else:
+                    delay = 0
+            sublime.set_timeout(
+                functools.partial(
+                    self._deferred_reflow, view, view.change_count()),
+                delay)
+
+    def _deferred_reflow(self, view, change_count):
+        """Perform the deferred reflows, if the user stopped typing.
+
+        View view - The view.
+        int change_count - The value of view.change_count() when we
+            scheduled the call.
+        """
+        wrap_fixer = WrapFixer.existing_instance(view)
+        if wrap_fixer is None or view.change_count() != change_count:
+            return
+        self._is_running = True
+        try:
+            if wrap_fixer.has_deferred_edit():
+                view.run_command('wrap_as_you_type')
+                wrap_fixer.update_overflow()
+
+                # Resume any reflow that exceeded the work budget on the next
+                # idle tick
+                self._schedule_deferred_reflow(view, wrap_fixer, 0)
         finally:
             self._is_running = False
 
+    def _schedule_overflow_scan(self, view, wrap_fixer):
+        """Highlight the overflowing text using a full scan, if necessary.
+
+        This performs the scan off of the UI thread if possible, as in
+        WrapFixer.prepare_overflow_scan().  We copy the view here on the UI
+        thread, so that the copy is consistent with the view's change
+        count.
+
+        View view - The view.
+        WrapFixer wrap_fixer - The WrapFixer for the view.
+        """
+        if not wrap_fixer.prepare_overflow_scan():
+            return
+        scanner = wrap_fixer.reflower()
+        if hasattr(sublime, 'set_timeout_async'):
+            sublime.set_timeout_async(
+                functools.partial(
+                    self._scan_overflow, view, wrap_fixer, scanner),
+                0)
+        else:
+            wrap_fixer.finish_overflow_scan(scanner.scan_overflow())
+
+    def _scan_overflow(self, view, wrap_fixer, scanner):
+        """Compute the scan scheduled by _schedule_overflow_scan.
+
+        View view - The view.
+        WrapFixer wrap_fixer - The WrapFixer for the view.
+        WrapFixer scanner - The return value of wrap_fixer.reflower().
+        """
+        scan = scanner.scan_overflow()
+        sublime.set_timeout(
+            functools.partial(
+                self._finish_overflow_scan, view, wrap_fixer, scan),
+            0)
+
+    def _finish_overflow_scan(self, view, wrap_fixer, scan):
+        """Highlight the overflowing text computed by _scan_overflow.
+
+        If the view changed in the meantime, this schedules another scan.
+
+        View view - The view.
+        WrapFixer wrap_fixer - The WrapFixer for the view.
+        dict<str, object> scan - The result of the scan.
+        """
+        wrap_fixer.finish_overflow_scan(scan)
+        if (view.is_valid() and
+                WrapFixer.existing_instance(view) is wrap_fixer):
+            self._schedule_overflow_scan(view, wrap_fixer)
+
+    def on_activated(self, view):
+        wrap_fixer = WrapFixer.existing_instance(view)
+        if wrap_fixer is None and view.settings().get(
+                'wrap_as_you_type_highlight_overflow'):
+            wrap_fixer = WrapFixer.instance(view)
+        if wrap_fixer is not None:
+            self._schedule_overflow_scan(view, wrap_fixer)
+
     def on_selection_modified(self, view):
-        WrapFixer.instance(view).on_selection_modified()
+        wrap_fixer = WrapFixer.instance(view)
+        wrap_fixer.on_selection_modified()
+        self._schedule_overflow_scan(view, wrap_fixer)
+
+    def on_selection_modified_async(self, view):
+        wrap_fixer = WrapFixer.existing_instance(view)
+        if wrap_fixer is not None:
+            wrap_fixer.precompute_section_to_extend()
 
     def on_close(self, view):
         WrapFixer.clear_instance(view)
@@ -70,3 +238,29 @@ class WrapAsYouTypeListener(sublime_plugin.EventListener):
                 return (
                     operator == sublime.OP_NOT_REGEX_MATCH or
                     operator == sublime.OP_NOT_REGEX_CONTAINS)
+
+
+if hasattr(sublime_plugin, 'TextChangeListener'):
+    class WrapAsYouTypeTextChangeListener(sublime_plugin.TextChangeListener):
+        """A TextChangeListener for the WrapAsYouType plugin.
+
+        WrapAsYouTypeTextChangeListener reports the exact changes to each
+        buffer's text to the WrapFixers for the buffer's views, so that
+        they do not need to infer them from the command history.  It is
+        only available in Sublime Text 4.
+        """
+
+        @classmethod
+        def is_applicable(cls, buffer):
+            # By default, Sublime does not attach TextChangeListeners to any
+            # buffers
+            return True
+
+        def on_text_changed(self, changes):
+            # The WrapFixers for a buffer's views share the record of the
+            # changes, so we only need to notify one of them
+            for view in self.buffer.views():
+                wrap_fixer = WrapFixer.existing_instance(view)
+                if wrap_fixer is not None:
+                    wrap_fixer.on_text_changed(changes)
+                    break
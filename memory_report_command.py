@@ -0,0 +1,43 @@
+import sys
+
+import sublime
+import sublime_plugin
+
+if sys.version_info[0] >= 3:
+    from .util import Util
+    from .wrap_fixer import WrapFixer
+else:
+    from util import Util
+    from wrap_fixer import WrapFixer
+
+
+class WrapAsYouTypeMemoryReportCommand(sublime_plugin.ApplicationCommand):
+    """A command that reports how much memory WrapAsYouType is using.
+
+    A command that prints the approximate memory footprint of each of
+    the caches WrapAsYouType maintains for each view to the console.
+    """
+
+    def run(self):
+        lines = []
+        total_size = 0
+        for wrap_fixer in WrapFixer.instances():
+            view = wrap_fixer.view()
+            cache_sizes = wrap_fixer.cache_sizes()
+            view_size = sum(size for name, size in cache_sizes)
+            total_size += view_size
+            lines.append(
+                u'  View {0:d} ({1:s}): {2:d} bytes'.format(
+                    view.id(), view.file_name() or view.name() or 'untitled',
+                    view_size))
+            for name, size in cache_sizes:
+                lines.append(u'    {0:s}: {1:d} bytes'.format(name, size))
+
+        print(
+            u'WrapAsYouType memory usage: {0:d} views, {1:d} bytes'.format(
+                len(WrapFixer.instances()), total_size))
+        for line in lines:
+            print(line)
+        Util.status_message(
+            sublime.active_window(),
+            'WrapAsYouType memory usage; see console')
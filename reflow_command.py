@@ -0,0 +1,170 @@
+import functools
+import sys
+import time
+
+from sublime import Region
+import sublime
+import sublime_plugin
+
+if sys.version_info[0] >= 3:
+    from .util import Util
+    from .wrap_fixer import WrapFixer
+else:
+    from util import Util
+    from wrap_fixer import WrapFixer
+
+
+class WrapAsYouTypeReflowCommand(sublime_plugin.TextCommand):
+    """A command that reflows all of the wrappable sections in the selection.
+
+    If the selection is empty, this reflows the entire document.  The
+    reflow follows the same rules as word wrapping fixup, as though the
+    user had typed each line.  We reflow the paragraphs the user can see
+    right away.  Where possible, we compute the reflow of the rest of
+    the document off of the UI thread, showing our progress in the
+    status bar, and then perform it in chunks when the editor is idle,
+    starting with the chunks nearest to the visible region.  If the user
+    modifies the document in the meantime, we cancel the rest of the
+    reflow.
+    """
+
+    # The key for the status bar text indicating the progress of the reflow
+    _STATUS_KEY = 'wrap_as_you_type_reflow'
+
+    # The minimum number of seconds between updates to the progress in the
+    # status bar
+    _PROGRESS_INTERVAL = 0.1
+
+    # The number of milliseconds to wait between performing the chunks of
+    # the reflow, so that Sublime can respond to the user in the meantime
+    _CHUNK_DELAY = 10
+
+    def run(self, edit):
+        view = self.view
+        wrap_fixer = WrapFixer.instance(view)
+        wrap_fixer.cancel_reflow()
+
+        # Reflow the visible paragraphs first
+        visible_region = view.visible_region()
+        visible_regions = []
+        for region in self._regions():
+            begin = max(region.begin(), visible_region.begin())
+            end = min(region.end(), visible_region.end())
+            if begin <= end:
+                visible_regions.append(Region(begin, end))
+        if visible_regions:
+            wrap_fixer.plan_reflow(
+                wrap_fixer.reflower().compute_reflow(visible_regions))
+            while wrap_fixer.plan_reflow_chunk():
+                wrap_fixer.perform_edits(edit)
+            wrap_fixer.on_post_modification()
+
+        # The visible paragraphs are already wrapped correctly, so reflowing
+        # them again is a no-op.  We copy the view here on the UI thread, so
+        # that the copy is consistent with the view's change count.
+        regions = self._regions()
+        reflower = wrap_fixer.reflower()
+        if hasattr(sublime, 'set_timeout_async'):
+            view.set_status(
+                WrapAsYouTypeReflowCommand._STATUS_KEY,
+                'WrapAsYouType: reflowing')
+            sublime.set_timeout_async(
+                functools.partial(
+                    self._compute, wrap_fixer, reflower, regions),
+                0)
+        else:
+            wrap_fixer.plan_reflow(reflower.compute_reflow(regions))
+            while wrap_fixer.plan_reflow_chunk():
+                wrap_fixer.perform_edits(edit)
+            wrap_fixer.on_post_modification()
+
+    def _regions(self):
+        """Return the regions to reflow.
+
+        return list<Region> - The non-empty selection regions, or the
+            entire document if there are none.
+        """
+        view = self.view
+        regions = [
+            Region(region.begin(), region.end()) for region in view.sel()
+            if not region.empty()]
+        if regions:
+            return regions
+        else:
+            return [Region(0, view.size())]
+
+    def _set_progress(self, message, fraction):
+        """Show the progress of the reflow in the status bar.
+
+        str message - The description of the current step.
+        float fraction - The fraction of the step we have completed.
+        """
+        self.view.set_status(
+            WrapAsYouTypeReflowCommand._STATUS_KEY,
+            'WrapAsYouType: {0:s} ({1:d}%)'.format(
+                message, int(100 * fraction)))
+
+    def _compute(self, wrap_fixer, reflower, regions):
+        """Compute the reflow, and then perform it on the UI thread.
+
+        WrapFixer wrap_fixer - The WrapFixer for the view.
+        WrapFixer reflower - The return value of wrap_fixer.reflower().
+        list<Region> regions - The regions to reflow.
+        """
+        progress = {'time': time.time()}
+
+        def show_progress(fraction):
+            now = time.time()
+            if (now - progress['time'] >=
+                    WrapAsYouTypeReflowCommand._PROGRESS_INTERVAL):
+                progress['time'] = now
+                self._set_progress('reflowing', fraction)
+
+        reflow = reflower.compute_reflow(regions, show_progress)
+        sublime.set_timeout(
+            functools.partial(self._start, wrap_fixer, reflow), 0)
+
+    def _start(self, wrap_fixer, reflow):
+        """Start performing the reflow computed by _compute.
+
+        WrapFixer wrap_fixer - The WrapFixer for the view.
+        dict<str, object> reflow - The return value of
+            WrapFixer.compute_reflow.
+        """
+        view = self.view
+        if view.change_count() != reflow['change_count']:
+            self._cancel()
+            return
+        wrap_fixer.plan_reflow(reflow, view.visible_region())
+        self._perform_chunk(wrap_fixer, view.change_count())
+
+    def _perform_chunk(self, wrap_fixer, change_count):
+        """Perform the next chunk of the reflow, and schedule the one after.
+
+        WrapFixer wrap_fixer - The WrapFixer for the view.
+        int change_count - The value of view.change_count() after we
+            performed the previous chunk.
+        """
+        view = self.view
+        if view.change_count() != change_count:
+            wrap_fixer.cancel_reflow()
+            self._cancel()
+        elif not wrap_fixer.plan_reflow_chunk():
+            view.erase_status(WrapAsYouTypeReflowCommand._STATUS_KEY)
+        else:
+            if wrap_fixer.has_planned_edit():
+                view.run_command('wrap_as_you_type')
+                wrap_fixer.on_post_modification()
+            self._set_progress('applying reflow', wrap_fixer.reflow_progress())
+            sublime.set_timeout(
+                functools.partial(
+                    self._perform_chunk, wrap_fixer, view.change_count()),
+                WrapAsYouTypeReflowCommand._CHUNK_DELAY)
+
+    def _cancel(self):
+        """Notify the user that we canceled the reflow."""
+        view = self.view
+        view.erase_status(WrapAsYouTypeReflowCommand._STATUS_KEY)
+        Util.status_message(
+            view.window(),
+            'WrapAsYouType: reflow canceled, because the document changed')
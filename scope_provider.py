@@ -0,0 +1,574 @@
+import re
+import sys
+
+if sys.version_info[0] >= 3:
+    from .text_buffer import Region
+else:
+    from text_buffer import Region
+
+
+class ScopeProvider(object):
+    """Supplies the scopes of the characters in text that is not in a View.
+
+    Outside of Sublime Text, there is no syntax definition to determine
+    the scopes that WrapEngine matches against the sections' selectors.
+    A ScopeProvider computes them instead, for use in a TextBuffer.
+
+    A scope provider tokenizes text from beginning to end, so the scopes
+    of a given line may depend on the preceding lines, e.g. if the line
+    is in the middle of a block comment.  The provider summarizes the
+    preceding lines as a "state": a hashable value that is None at the
+    beginning of a file.  Given the state at the beginning of a line,
+    the scopes of the rest of the text do not depend on the text before
+    the line.  This makes it possible to compute the scopes of a range
+    of lines without computing the scopes of the lines before it, by
+    passing the preceding text to end_state.
+    """
+
+    def scope_runs(self, text, state=None):
+        """Return the scopes of the characters in the specified text.
+
+        str text - The text.  Its line breaks must be '\\n' characters.
+        object state - The state at the beginning of the text, as
+            returned by end_state.  The text must begin at the beginning
+            of a line.
+        return list<tuple<Region, str>> - The scopes, formatted like the
+            return value of View.extract_tokens_with_scopes.
+        """
+        raise NotImplementedError('Subclasses must implement')
+
+    def end_state(self, text, state=None, begin=0, end=None):
+        """Return the state at the end of text[begin:end].
+
+        object text - The text, as a str, or as UTF-8 encoded bytes or
+            an mmap.mmap, so that we can skip over text without decoding
+            it.  Its line breaks must be '\\n' or '\\r\\n'.
+        object state - The state at "begin", which must be the beginning
+            of a line.
+        int begin - The index of the beginning of the range.
+        int end - The index of the end of the range, which must be the
+            beginning of a line or the end of the text.  If this is
+            None, the range extends to the end of the text.
+        return object - The state.
+        """
+        raise NotImplementedError('Subclasses must implement')
+
+
+class RegexScopeProvider(ScopeProvider):
+    """A ScopeProvider that recognizes comments using regular expressions.
+
+    RegexScopeProvider supports a fixed set of common languages, which
+    it identifies by file extension.  It only recognizes comments and
+    string literals, the latter so that it can tell whether comment
+    punctuation is in a string: block and line comments in C-family
+    languages, including documentation comments such as "/** ... */"
+    and Rust's "///" and "//!"; "#" comments; and Python docstrings.  It
+    gives them the same scopes as Sublime's syntax definitions, e.g.
+    "source.c comment.block.c punctuation.definition.comment.begin.c",
+    and it gives the other characters the scope of the language, e.g.
+    "source.c".  It does not support nested block comments, raw string
+    literals, or "here documents".
+
+    The state is None, or the index in _blocks of the multi-line comment
+    or string that contains the beginning of the line.  We tokenize one
+    line at a time, and we cache the scope runs of recent lines, keyed
+    by the line and the state at its beginning, so the common lines of
+    a file, such as blank lines and the lines of license headers, are
+    only tokenized once.  Because there are few distinct scopes, the
+    scope strings are shared, so the cache in ScopeSelector.score is
+    effective as well.
+    """
+
+    # Private attributes:
+    #
+    # list<dict<str, object>> _blocks - The multi-line comments and strings,
+    #     i.e. the block tokens, followed by the docstring form of each
+    #     triple-quoted Python string.  Each element has the following
+    #     entries: "begin_scope", the scope of the opening punctuation;
+    #     "close_regexes", regular expressions for text and for bytes that
+    #     match the text up to and including the closing punctuation, which
+    #     is the group named "close"; "close_pattern", the pattern for
+    #     "close_regexes"; "end_scope", the scope of the closing punctuation;
+    #     and "scope", the scope of the contents.
+    # dict<str, int> _block_indices - A map from the name of each group in
+    #     _token_regex that matches the opening punctuation of a block token
+    #     to the index of the block in _blocks.  If the language has
+    #     docstrings, the name followed by "d" maps to the index of the
+    #     docstring form.
+    # tuple<re.Pattern, re.Pattern> _docstring_prefix_regexes - Regular
+    #     expressions for text and for bytes that match the text on a line
+    #     before a triple quote if the triple quote begins a docstring.  This
+    #     is None if the language does not have docstrings.
+    # dict<tuple<object, str>, tuple<tuple<tuple<int, int, str>>, object>>
+    #     _line_cache - A map from pairs of a state and a line, including any
+    #     newline character, to the result of _tokenize on the line.
+    # dict<str, tuple<str, str>> _line_scopes - A map from the name of each
+    #     group in _token_regex that matches the punctuation of a line
+    #     comment to a pair consisting of the scope of the punctuation and
+    #     the scope of the rest of the comment.
+    # tuple<re.Pattern, re.Pattern> _open_regexes - Regular expressions for
+    #     text and for bytes that match the opening punctuation of a block
+    #     token.  The groups have the same names as in _token_regex.
+    # tuple<re.Pattern, re.Pattern> _skip_regexes - Regular expressions for
+    #     text and for bytes that match text in which no block token begins.
+    # str _source_scope - The scope of the characters that are not in a
+    #     token.
+    # dict<str, str> _string_scopes - A map from the name of each group in
+    #     _token_regex that matches a single-line string to its scope.
+    # re.Pattern _token_regex - A regular expression that matches the
+    #     beginning of any token.  Each alternative is a named group.
+
+    # The maximum number of elements in _line_cache
+    _MAX_CACHED_LINES = 4096
+
+    # A map from each file extension we support to the name of its language,
+    # i.e. the key in _LANGUAGES
+    _EXTENSIONS = {
+        'bash': 'shell', 'c': 'c', 'cc': 'c++', 'cjs': 'js', 'cpp': 'c++',
+        'cs': 'cs', 'css': 'css', 'cxx': 'c++', 'go': 'go', 'h': 'c',
+        'hh': 'c++', 'hpp': 'c++', 'hxx': 'c++', 'java': 'java', 'js': 'js',
+        'jsx': 'js', 'kt': 'kotlin', 'm': 'objc', 'mjs': 'js', 'php': 'php',
+        'pl': 'perl', 'pm': 'perl', 'py': 'python', 'pyw': 'python',
+        'r': 'r', 'rb': 'ruby', 'rs': 'rust', 'scala': 'scala',
+        'sh': 'shell', 'swift': 'swift', 'ts': 'ts', 'tsx': 'ts',
+    }
+
+    # The block comments of C-family languages, including documentation
+    # comments.  Each token is a tuple whose first element is its kind.
+    # ('block', open, scope, close, escapes) is a comment or string that may
+    # span multiple lines, where "open" and "close" are regular expressions
+    # for the opening and closing punctuation and "escapes" indicates whether
+    # a backslash escapes the following character.  ('line', open, scope) is
+    # a line comment, which extends from the punctuation "open" to the end of
+    # the line, including the newline.  ('string', regex, scope) is a string
+    # that may not span multiple lines.  The scopes omit the language suffix,
+    # e.g. "comment.block" rather than "comment.block.c".
+    _C_BLOCK_COMMENTS = (
+        ('block', r'/\*\*(?![*/])', 'comment.block.documentation', r'\*/',
+         False),
+        ('block', r'/\*', 'comment.block', r'\*/', False),
+    )
+
+    # The single-line strings of C-family languages and most languages with
+    # "#" comments
+    _STRINGS = (
+        ('string', r'"(?:\\.|[^"\\\n])*"?', 'string.quoted.double'),
+        ('string', r"'(?:\\.|[^'\\\n])*'?", 'string.quoted.single'),
+    )
+
+    # The tokens of C-family languages that lack special string literals
+    _C_TOKENS = (
+        _C_BLOCK_COMMENTS +
+        (('line', r'//', 'comment.line.double-slash'),) + _STRINGS)
+
+    # A map from the name of each language we support to a dictionary
+    # describing it.  Each dictionary has the following entries: "scope",
+    # the scope of the language; "suffix", the suffix of the names of the
+    # language's scopes; "tokens", the tokens, as in _C_BLOCK_COMMENTS, with
+    # the block tokens first, each in order of priority; "special", the
+    # characters with which a token may begin; and optionally "docstrings",
+    # whether a triple-quoted string at the beginning of a line is a
+    # docstring, as in Python.
+    _LANGUAGES = {
+        'c': {
+            'scope': 'source.c', 'special': '"\'/', 'suffix': 'c',
+            'tokens': _C_TOKENS,
+        },
+        'c++': {
+            'scope': 'source.c++', 'special': '"\'/', 'suffix': 'c++',
+            'tokens': _C_TOKENS,
+        },
+        'cs': {
+            'scope': 'source.cs', 'special': '"\'/', 'suffix': 'cs',
+            'tokens': (
+                _C_BLOCK_COMMENTS +
+                (('line', r'///(?!/)', 'comment.line.documentation'),) +
+                _C_TOKENS[len(_C_BLOCK_COMMENTS):]),
+        },
+        'css': {
+            'scope': 'source.css', 'special': '"\'/', 'suffix': 'css',
+            'tokens':
+                (('block', r'/\*', 'comment.block', r'\*/', False),) +
+                _STRINGS,
+        },
+        'go': {
+            'scope': 'source.go', 'special': '"\'/`', 'suffix': 'go',
+            'tokens': (
+                (('block', r'`', 'string.quoted.raw', r'`', False),) +
+                _C_TOKENS),
+        },
+        'java': {
+            'scope': 'source.java', 'special': '"\'/', 'suffix': 'java',
+            'tokens': _C_TOKENS,
+        },
+        'js': {
+            'scope': 'source.js', 'special': '"\'/`', 'suffix': 'js',
+            'tokens': (
+                (('block', r'`', 'string.quoted.other', r'`', True),) +
+                _C_TOKENS),
+        },
+        'kotlin': {
+            'scope': 'source.kotlin', 'special': '"\'/', 'suffix': 'kotlin',
+            'tokens': (
+                (('block', r'"""', 'string.quoted.triple', r'"""', False),) +
+                _C_TOKENS),
+        },
+        'objc': {
+            'scope': 'source.objc', 'special': '"\'/', 'suffix': 'objc',
+            'tokens': _C_TOKENS,
+        },
+        'perl': {
+            'scope': 'source.perl', 'special': '"\'#', 'suffix': 'perl',
+            'tokens': (
+                (('line', r'(?<![$@%\\])#', 'comment.line.number-sign'),) +
+                _STRINGS),
+        },
+        'php': {
+            'scope': 'source.php', 'special': '"\'#/', 'suffix': 'php',
+            'tokens': (
+                _C_BLOCK_COMMENTS +
+                (('line', r'#(?!\[)', 'comment.line.number-sign'),) +
+                _C_TOKENS[len(_C_BLOCK_COMMENTS):]),
+        },
+        'python': {
+            'docstrings': True,
+            'scope': 'source.python', 'special': '"\'#', 'suffix': 'python',
+            'tokens': (
+                ('block', r'"""', 'string.quoted.double.block', r'"""', True),
+                ('block', r"'''", 'string.quoted.single.block', r"'''", True),
+                ('line', r'#', 'comment.line.number-sign'),
+            ) + _STRINGS,
+        },
+        'r': {
+            'scope': 'source.r', 'special': '"\'#', 'suffix': 'r',
+            'tokens':
+                (('line', r'#', 'comment.line.number-sign'),) + _STRINGS,
+        },
+        'ruby': {
+            'scope': 'source.ruby', 'special': '"\'#', 'suffix': 'ruby',
+            'tokens': (
+                (('line', r'(?<![?$])#', 'comment.line.number-sign'),) +
+                _STRINGS),
+        },
+        'rust': {
+            'scope': 'source.rust', 'special': '"\'/', 'suffix': 'rust',
+            'tokens': (
+                ('block', r'/\*[*!](?![*/])', 'comment.block.documentation',
+                 r'\*/', False),
+                ('block', r'/\*', 'comment.block', r'\*/', False),
+                ('block', r'"', 'string.quoted.double', r'"', True),
+                ('line', r'//[/!](?!/)', 'comment.line.documentation'),
+                ('line', r'//', 'comment.line.double-slash'),
+                ('string', r"'(?:\\[^'\n]*|[^'\\\n])'",
+                 'string.quoted.single'),
+            ),
+        },
+        'scala': {
+            'scope': 'source.scala', 'special': '"\'/', 'suffix': 'scala',
+            'tokens': (
+                (('block', r'"""', 'string.quoted.triple', r'"""', False),) +
+                _C_TOKENS),
+        },
+        'shell': {
+            'scope': 'source.shell.bash', 'special': '"\'#',
+            'suffix': 'shell',
+            'tokens': (
+                ('line', r'(?<![^ \t\n;&|()])#', 'comment.line.number-sign'),
+                _STRINGS[0],
+                ('string', r"'[^'\n]*'?", 'string.quoted.single'),
+            ),
+        },
+        'swift': {
+            'scope': 'source.swift', 'special': '"\'/', 'suffix': 'swift',
+            'tokens': (
+                (('block', r'"""', 'string.quoted.double.block', r'"""',
+                  True),) +
+                _C_TOKENS),
+        },
+        'ts': {
+            'scope': 'source.ts', 'special': '"\'/`', 'suffix': 'ts',
+            'tokens': (
+                (('block', r'`', 'string.quoted.other', r'`', True),) +
+                _C_TOKENS),
+        },
+    }
+
+    # A map from the name of each language to its RegexScopeProvider, for
+    # the languages for which we have created one
+    _providers = {}
+
+    def __init__(self, language):
+        """Initialize the provider.
+
+        dict<str, object> language - The description of the language,
+            as in the values of _LANGUAGES.
+        """
+        source_scope = u'{0:s} '.format(language['scope'])
+        suffix = language['suffix']
+
+        def scope(*names):
+            return source_scope + u''.join(
+                u'{0:s}.{1:s} '.format(name, suffix) for name in names)
+
+        self._source_scope = source_scope
+        self._blocks = []
+        self._block_indices = {}
+        self._line_cache = {}
+        self._line_scopes = {}
+        self._string_scopes = {}
+        token_patterns = []
+        open_patterns = []
+        skip_patterns = []
+        for index, token in enumerate(language['tokens']):
+            group = u't{0:d}'.format(index)
+            pattern = u'(?P<{0:s}>{1:s})'.format(group, token[1])
+            token_patterns.append(pattern)
+            if token[0] == 'block':
+                if token[2].startswith('comment'):
+                    punctuation = 'punctuation.definition.comment'
+                else:
+                    punctuation = 'punctuation.definition.string'
+                if token[4]:
+                    close_pattern = u'(?:\\\\.|[^\\\\])*?(?P<close>{0:s})'
+                else:
+                    close_pattern = u'.*?(?P<close>{0:s})'
+                self._block_indices[group] = len(self._blocks)
+                self._blocks.append(
+                    self._block(
+                        scope(token[2]),
+                        scope(token[2], punctuation + '.begin'),
+                        scope(token[2], punctuation + '.end'),
+                        close_pattern.format(token[3])))
+                open_patterns.append(pattern)
+            elif token[0] == 'line':
+                self._line_scopes[group] = (
+                    scope(token[2], 'punctuation.definition.comment'),
+                    scope(token[2]))
+                skip_patterns.append(u'{0:s}[^\\n]*\\n?'.format(token[1]))
+            else:
+                self._string_scopes[group] = scope(token[2])
+                skip_patterns.append(token[1])
+
+        if language.get('docstrings'):
+            for group, index in list(self._block_indices.items()):
+                self._block_indices[group + 'd'] = len(self._blocks)
+                self._blocks.append(
+                    self._block(
+                        scope('comment.block.documentation'),
+                        scope(
+                            'comment.block.documentation',
+                            'punctuation.definition.comment.begin'),
+                        scope(
+                            'comment.block.documentation',
+                            'punctuation.definition.comment.end'),
+                        self._blocks[index]['close_pattern']))
+            self._docstring_prefix_regexes = RegexScopeProvider._compile(
+                r'[ \t]*[rRuU]?\Z', 0)
+        else:
+            self._docstring_prefix_regexes = None
+
+        self._token_regex = re.compile(
+            u'|'.join(token_patterns), re.MULTILINE)
+        if open_patterns:
+            open_pattern = u'|'.join(open_patterns)
+        else:
+            open_pattern = u'(?!)'
+        self._open_regexes = RegexScopeProvider._compile(open_pattern, 0)
+
+        # Match any number of line comments, single-line strings, runs of
+        # characters that can't begin a token, and other characters, as long
+        # as they don't begin a block token.  The alternatives are in the
+        # same order as in _token_regex, so this agrees with _tokenize.
+        skip_patterns.append(
+            u'[^{0:s}]+'.format(re.escape(language['special'])))
+        skip_patterns.append(u'.')
+        self._skip_regexes = RegexScopeProvider._compile(
+            u'(?:(?!{0:s})(?:{1:s}))*'.format(
+                u'|'.join(
+                    u'(?:{0:s})'.format(token[1])
+                    for token in language['tokens'] if token[0] == 'block') or
+                u'(?!)',
+                u'|'.join(skip_patterns)),
+            re.DOTALL)
+
+    def _block(self, scope, begin_scope, end_scope, close_pattern):
+        """Return an element of _blocks.
+
+        str scope - The scope of the contents.
+        str begin_scope - The scope of the opening punctuation.
+        str end_scope - The scope of the closing punctuation.
+        str close_pattern - A regular expression matching the text up to
+            and including the closing punctuation, which is the group
+            named "close".
+        return dict<str, object> - The element.
+        """
+        return {
+            'begin_scope': begin_scope,
+            'close_pattern': close_pattern,
+            'close_regexes': RegexScopeProvider._compile(
+                close_pattern, re.DOTALL),
+            'end_scope': end_scope,
+            'scope': scope,
+        }
+
+    @staticmethod
+    def _compile(pattern, flags):
+        """Return versions of a regular expression for text and for bytes.
+
+        str pattern - The regular expression, which must consist of
+            ASCII characters.
+        int flags - The flags to pass to re.compile.  We add
+            re.MULTILINE.
+        return tuple<re.Pattern, re.Pattern> - The regular expressions.
+        """
+        return (
+            re.compile(pattern, flags | re.MULTILINE),
+            re.compile(pattern.encode('ascii'), flags | re.MULTILINE))
+
+    @staticmethod
+    def for_extension(extension):
+        """Return the RegexScopeProvider for the specified file extension.
+
+        str extension - The extension, e.g. 'py'.  This is
+            case-insensitive.
+        return RegexScopeProvider - The provider, or None if we do not
+            support the extension.
+        """
+        name = RegexScopeProvider._EXTENSIONS.get(extension.lower())
+        if name is None:
+            return None
+        provider = RegexScopeProvider._providers.get(name)
+        if provider is None:
+            provider = RegexScopeProvider(RegexScopeProvider._LANGUAGES[name])
+            RegexScopeProvider._providers[name] = provider
+        return provider
+
+    def _open_block(self, text, match, is_bytes):
+        """Return the state after the opening punctuation of a block token.
+
+        object text - The text, as in end_state.
+        re.Match match - The match of the opening punctuation, for
+            _token_regex or _open_regexes.
+        bool is_bytes - Whether "text" consists of bytes.
+        return int - The index of the block in _blocks.
+        """
+        group = match.lastgroup
+        if self._docstring_prefix_regexes is not None:
+            start = match.start()
+            if is_bytes:
+                line_begin = text.rfind(b'\n', 0, start) + 1
+            else:
+                line_begin = text.rfind(u'\n', 0, start) + 1
+            prefix_regex = self._docstring_prefix_regexes[is_bytes]
+            if prefix_regex.match(text[line_begin:start]) is not None:
+                return self._block_indices[group + 'd']
+        return self._block_indices[group]
+
+    def _tokenize(self, text, state):
+        """Return the scope runs for the specified text.
+
+        str text - The text, which must begin at the beginning of a
+            line.
+        object state - The state at the beginning of the text.
+        return tuple<tuple<tuple<int, int, str>>, object> - A pair
+            consisting of the scope runs, represented as triples of the
+            beginning, end, and scope of each run, and the state at the
+            end of the text.
+        """
+        runs = []
+        pos = 0
+        end = len(text)
+        while pos < end:
+            if state is not None:
+                block = self._blocks[state]
+                match = block['close_regexes'][False].match(text, pos)
+                if match is None:
+                    runs.append((pos, end, block['scope']))
+                    break
+                close_begin = match.start('close')
+                if close_begin > pos:
+                    runs.append((pos, close_begin, block['scope']))
+                runs.append((close_begin, match.end(), block['end_scope']))
+                pos = match.end()
+                state = None
+                continue
+
+            match = self._token_regex.search(text, pos)
+            if match is None:
+                runs.append((pos, end, self._source_scope))
+                break
+            if match.start() > pos:
+                runs.append((pos, match.start(), self._source_scope))
+            group = match.lastgroup
+            if group in self._line_scopes:
+                punctuation_scope, comment_scope = self._line_scopes[group]
+                runs.append((match.start(), match.end(), punctuation_scope))
+                pos = text.find('\n', match.end()) + 1
+                if pos == 0:
+                    pos = end
+                if pos > match.end():
+                    runs.append((match.end(), pos, comment_scope))
+            elif group in self._string_scopes:
+                runs.append(
+                    (match.start(), match.end(), self._string_scopes[group]))
+                pos = match.end()
+            else:
+                state = self._open_block(text, match, False)
+                runs.append(
+                    (match.start(), match.end(),
+                     self._blocks[state]['begin_scope']))
+                pos = match.end()
+        return (tuple(runs), state)
+
+    def scope_runs(self, text, state=None):
+        begins = []
+        ends = []
+        scopes = []
+        line_cache = self._line_cache
+        begin = 0
+        while begin < len(text):
+            end = text.find('\n', begin) + 1
+            if end == 0:
+                end = len(text)
+            key = (state, text[begin:end])
+            result = line_cache.get(key)
+            if result is None:
+                result = self._tokenize(key[1], state)
+                if len(line_cache) >= RegexScopeProvider._MAX_CACHED_LINES:
+                    line_cache.clear()
+                line_cache[key] = result
+            line_runs, state = result
+            for run_begin, run_end, scope in line_runs:
+                if scopes and scopes[-1] is scope:
+                    ends[-1] = begin + run_end
+                else:
+                    begins.append(begin + run_begin)
+                    ends.append(begin + run_end)
+                    scopes.append(scope)
+            begin = end
+        return [
+            (Region(begins[index], ends[index]), scopes[index])
+            for index in range(len(scopes))]
+
+    def end_state(self, text, state=None, begin=0, end=None):
+        if end is None:
+            end = len(text)
+        is_bytes = not isinstance(text, u''.__class__)
+        skip_regex = self._skip_regexes[is_bytes]
+        open_regex = self._open_regexes[is_bytes]
+        pos = begin
+        while pos < end:
+            if state is not None:
+                match = self._blocks[state]['close_regexes'][is_bytes].match(
+                    text, pos, end)
+                if match is None:
+                    return state
+                pos = match.end()
+                state = None
+            else:
+                pos = skip_regex.match(text, pos, end).end()
+                if pos < end:
+                    match = open_regex.match(text, pos, end)
+                    state = self._open_block(text, match, is_bytes)
+                    pos = match.end()
+        return state
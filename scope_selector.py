@@ -0,0 +1,218 @@
+import re
+
+
+class ScopeSelector(object):
+    """Provides a pure-Python equivalent of sublime.score_selector.
+
+    This makes it possible to match scopes against the selectors in the
+    wrap_as_you_type_* settings when Sublime Text is not available.  It
+    supports the same selector syntax as Sublime: scope names, which
+    match any scope that has the name's components as a prefix, e.g.
+    "comment.line" matches "comment.line.double-slash.c"; sequences of
+    scope names separated by whitespace, which match nested scopes in
+    order; the operators "," and "|" (or), "&" (and), and "-" (and not);
+    and parentheses.  A selector matches a scope if score() returns a
+    positive number.  The scores of matching selectors are ordered
+    roughly like Sublime's, so that deeper and more specific matches
+    score higher, but their exact values differ.
+    """
+
+    # A regular expression for splitting a selector into tokens.  A hyphen is
+    # an operator unless it is in the middle of a scope name, as in
+    # "comment.line.double-slash".
+    _TOKEN_REGEX = re.compile(r'\s*([(),|&-]|[^\s(),|&-][^\s(),|&]*)')
+
+    # A map from each selector string we have parsed to the result of
+    # _parse()
+    _parsed = {}
+
+    # The maximum number of elements in _parsed
+    _MAX_PARSED = 256
+
+    # A map from each pair of a scope and a selector we have scored to the
+    # result of score().  Outside of Sublime, the scopes typically come from
+    # a ScopeProvider, which only produces a few distinct scopes.
+    _scores = {}
+
+    # The maximum number of elements in _scores
+    _MAX_SCORES = 4096
+
+    @staticmethod
+    def _tokenize(selector):
+        """Return the tokens in the specified selector string.
+
+        str selector - The selector.
+        return list<str> - The tokens.
+        """
+        tokens = []
+        index = 0
+        while True:
+            match = ScopeSelector._TOKEN_REGEX.match(selector, index)
+            if match is None:
+                return tokens
+            tokens.append(match.group(1))
+            index = match.end()
+
+    @staticmethod
+    def _parse(selector):
+        """Return the parse tree for the specified selector string.
+
+        Each node in the tree is a tuple whose first element indicates
+        its type.  ('or', left, right), ('and', left, right), and
+        ('minus', left, right) represent the corresponding binary
+        operators; ('not', operand) represents a selector that begins
+        with "-"; and ('path', names) represents a sequence of scope
+        names, where "names" is a list of the components of each name,
+        e.g. [['source', 'python'], ['comment']].  An empty selector
+        is an empty path, which matches every scope.
+
+        str selector - The selector.
+        return tuple - The parse tree.
+        """
+        tree = ScopeSelector._parsed.get(selector)
+        if tree is None:
+            tokens = ScopeSelector._tokenize(selector)
+            tree, index = ScopeSelector._parse_or(tokens, 0)
+            if len(ScopeSelector._parsed) >= ScopeSelector._MAX_PARSED:
+                ScopeSelector._parsed = {}
+            ScopeSelector._parsed[selector] = tree
+        return tree
+
+    @staticmethod
+    def _parse_or(tokens, index):
+        """Parse a sequence of selectors separated by "," or "|".
+
+        list<str> tokens - The tokens, as returned by _tokenize.
+        int index - The index of the first token to parse.
+        return tuple<tuple, int> - A pair consisting of the parse tree,
+            as in _parse(), and the index of the first token we did not
+            parse.
+        """
+        tree, index = ScopeSelector._parse_and(tokens, index)
+        while index < len(tokens) and tokens[index] in (',', '|'):
+            right, index = ScopeSelector._parse_and(tokens, index + 1)
+            tree = ('or', tree, right)
+        return (tree, index)
+
+    @staticmethod
+    def _parse_and(tokens, index):
+        """Parse a sequence of selectors separated by "&" or "-".
+
+        The arguments and the return value are as in _parse_or.
+        """
+        if index < len(tokens) and tokens[index] == '-':
+            operand, index = ScopeSelector._parse_primary(tokens, index + 1)
+            tree = ('not', operand)
+        else:
+            tree, index = ScopeSelector._parse_primary(tokens, index)
+        while index < len(tokens) and tokens[index] in ('&', '-'):
+            operator = tokens[index]
+            right, index = ScopeSelector._parse_primary(tokens, index + 1)
+            if operator == '&':
+                tree = ('and', tree, right)
+            else:
+                tree = ('minus', tree, right)
+        return (tree, index)
+
+    @staticmethod
+    def _parse_primary(tokens, index):
+        """Parse a parenthesized selector or a sequence of scope names.
+
+        The arguments and the return value are as in _parse_or.
+        """
+        if index < len(tokens) and tokens[index] == '(':
+            tree, index = ScopeSelector._parse_or(tokens, index + 1)
+            if index < len(tokens) and tokens[index] == ')':
+                index += 1
+            return (tree, index)
+
+        names = []
+        while (index < len(tokens) and
+                tokens[index] not in ('(', ')', ',', '|', '&', '-')):
+            names.append(tokens[index].split('.'))
+            index += 1
+        return (('path', names), index)
+
+    @staticmethod
+    def _score_path(scopes, names):
+        """Return the score of a sequence of scope names.
+
+        list<list<str>> scopes - The components of each of the scopes
+            in the scope string, from outermost to innermost.
+        list<list<str>> names - The components of each scope name in
+            the sequence, as in the "path" nodes returned by _parse().
+        return int - The score.
+        """
+        if not names:
+            return 1
+
+        # Match the names from last to first, matching each one with the
+        # innermost scope we can, so as to find the highest score
+        score = 0
+        scope_index = len(scopes)
+        for name in reversed(names):
+            scope_index -= 1
+            while (scope_index >= 0 and
+                    scopes[scope_index][:len(name)] != name):
+                scope_index -= 1
+            if scope_index < 0:
+                return 0
+            score += len(name) << (3 * scope_index)
+        return score
+
+    @staticmethod
+    def _score_tree(scopes, tree):
+        """Return the score of the specified parse tree.
+
+        list<list<str>> scopes - The components of each of the scopes
+            in the scope string, as in _score_path.
+        tuple tree - The parse tree, as returned by _parse().
+        return int - The score.
+        """
+        node_type = tree[0]
+        if node_type == 'path':
+            return ScopeSelector._score_path(scopes, tree[1])
+        elif node_type == 'not':
+            if ScopeSelector._score_tree(scopes, tree[1]) > 0:
+                return 0
+            else:
+                return 1
+
+        left = ScopeSelector._score_tree(scopes, tree[1])
+        if node_type == 'or':
+            return max(left, ScopeSelector._score_tree(scopes, tree[2]))
+        elif left == 0:
+            return 0
+        right = ScopeSelector._score_tree(scopes, tree[2])
+        if node_type == 'and':
+            if right > 0:
+                return max(left, right)
+            else:
+                return 0
+        elif right > 0:
+            return 0
+        else:
+            return left
+
+    @staticmethod
+    def score(scope, selector):
+        """Return how well the specified scope matches the selector.
+
+        This is equivalent to sublime.score_selector(scope, selector),
+        except that the exact values of positive scores differ.
+
+        str scope - The scope, as returned by View.scope_name, e.g.
+            'source.c++ comment.line.double-slash.c '.
+        str selector - The selector, e.g. 'comment - comment.block'.
+        return int - The score.  This is 0 if the scope does not match.
+        """
+        key = (scope, selector)
+        score = ScopeSelector._scores.get(key)
+        if score is None:
+            scopes = [name.split('.') for name in scope.split()]
+            score = ScopeSelector._score_tree(
+                scopes, ScopeSelector._parse(selector))
+            if len(ScopeSelector._scores) >= ScopeSelector._MAX_SCORES:
+                ScopeSelector._scores = {}
+            ScopeSelector._scores[key] = score
+        return score
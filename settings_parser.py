@@ -56,6 +56,14 @@ class SettingsParser(object):
 
     Public attributes:
 
+    bool defer_reflow - The "wrap_as_you_type_defer_reflow" setting.
+        This is False if the value of "wrap_as_you_type_defer_reflow" is
+        invalid.
+    bool highlight_overflow - The
+        "wrap_as_you_type_highlight_overflow" setting.  This is False if
+        the value of "wrap_as_you_type_highlight_overflow" is invalid.
+    bool is_async - The "wrap_as_you_type_async" setting.  This is False
+        if the value of "wrap_as_you_type_async" is invalid.
     bool is_disabled - The result of coercing the
         "wrap_as_you_type_disabled" setting to a boolean.
     bool is_passive - The "wrap_as_you_type_passive" setting.  This is
@@ -86,6 +94,10 @@ class SettingsParser(object):
         "wrap_as_you_type_word_regex" setting.  This is
         DEFAULT_WORD_REGEX if the value of "wrap_as_you_type_word_regex"
         is invalid.
+    dict<str, int> work_budget - Equivalent to the
+        "wrap_as_you_type_work_budget" setting, but with missing "edits"
+        and "milliseconds" entries replaced with None.  This is None if
+        the value of "wrap_as_you_type_work_budget" is null or invalid.
     """
 
     # Private attributes:
@@ -95,6 +107,11 @@ class SettingsParser(object):
     #     in the map.
     # View _view - The View whose settings we are parsing.
 
+    __slots__ = (
+        '_listeners', '_view', 'defer_reflow', 'highlight_overflow',
+        'is_async', 'is_disabled', 'is_passive', 'paragraphs', 'sections',
+        'space_between_words', 'word_regex', 'work_budget')
+
     # The default value for word_regex
     DEFAULT_WORD_REGEX = re.compile(r'[\S\xa0]+')
 
@@ -341,6 +358,61 @@ class SettingsParser(object):
             self.is_passive = False
             raise UserFacingError('The value must be a boolean')
 
+    @_update_setting_method('wrap_as_you_type_defer_reflow')
+    def _update_defer_reflow(self):
+        """Update the value of self.defer_reflow."""
+        defer_setting = self._view.settings().get(
+            'wrap_as_you_type_defer_reflow')
+        if defer_setting in (None, False, True):
+            self.defer_reflow = bool(defer_setting)
+        else:
+            self.defer_reflow = False
+            raise UserFacingError('The value must be a boolean')
+
+    @_update_setting_method('wrap_as_you_type_work_budget')
+    def _update_work_budget(self):
+        """Update the value of self.work_budget."""
+        budget_setting = self._view.settings().get(
+            'wrap_as_you_type_work_budget')
+        self.work_budget = None
+        if budget_setting is None:
+            return
+
+        if not isinstance(budget_setting, dict):
+            raise UserFacingError(
+                '"wrap_as_you_type_work_budget" must be an object')
+        for key in ('edits', 'milliseconds'):
+            value = budget_setting.get(key)
+            if (key in budget_setting and
+                    (not Util.is_int(value) or value <= 0)):
+                raise UserFacingError(
+                    u'"{0:s}" must be a positive integer'.format(key))
+        self.work_budget = {
+            'edits': budget_setting.get('edits'),
+            'milliseconds': budget_setting.get('milliseconds'),
+        }
+
+    @_update_setting_method('wrap_as_you_type_async')
+    def _update_is_async(self):
+        """Update the value of self.is_async."""
+        async_setting = self._view.settings().get('wrap_as_you_type_async')
+        if async_setting in (None, False, True):
+            self.is_async = bool(async_setting)
+        else:
+            self.is_async = False
+            raise UserFacingError('The value must be a boolean')
+
+    @_update_setting_method('wrap_as_you_type_highlight_overflow')
+    def _update_highlight_overflow(self):
+        """Update the value of self.highlight_overflow."""
+        highlight_setting = self._view.settings().get(
+            'wrap_as_you_type_highlight_overflow')
+        if highlight_setting in (None, False, True):
+            self.highlight_overflow = bool(highlight_setting)
+        else:
+            self.highlight_overflow = False
+            raise UserFacingError('The value must be a boolean')
+
     @_update_setting_method('wrap_as_you_type_disabled')
     def _update_is_disabled(self):
         """Update the value of is_disabled."""
@@ -0,0 +1,842 @@
+import io
+import re
+import sys
+import warnings
+
+if sys.version_info[0] >= 3:
+    from .error import UserFacingError
+    from .scope_provider import ScopeProvider
+    from .text_buffer import Region
+    from .util import Util
+else:
+    from error import UserFacingError
+    from scope_provider import ScopeProvider
+    from text_buffer import Region
+    from util import Util
+
+try:
+    import yaml
+except ImportError:
+    # SyntaxDefinition.load requires PyYAML, but a definition that has
+    # already been parsed may be passed to the constructor
+    yaml = None
+
+
+class SyntaxDefinition(object):
+    """A headless interpreter for a subset of the .sublime-syntax format.
+
+    SyntaxDefinition tokenizes text using the contexts of a syntax
+    definition, as Sublime Text would, in order to compute the scopes of
+    the characters when Sublime is not available.  It supports the
+    following features: "variables"; "contexts", including "prototype",
+    "meta_scope", "meta_content_scope", "meta_include_prototype", and
+    "clear_scopes"; and patterns consisting of "include" or of "match"
+    with any of "scope", "captures", "push", "pop", and "set", where the
+    contexts may be named or anonymous.  It ignores other features, such
+    as "embed", "branch_point", and references to contexts in other
+    syntax definitions.  It translates the Oniguruma regular expressions
+    to Python regular expressions, approximating possessive quantifiers
+    and atomic groups, and it ignores patterns whose regular
+    expressions it can't translate, e.g. those with "\\p{...}".  Python
+    versions before 3.6 do not support inline flags that apply to only
+    part of a regular expression, e.g. "(?i:...)", so there we also
+    ignore patterns with inline flags other than at the beginning.
+
+    As in Sublime, we tokenize one line at a time.  The state at the
+    beginning of a line is the context stack, represented as a tuple of
+    context names, with the main context first.  We cache the scope runs
+    of recent lines, keyed by the line and the context stack at its
+    beginning.
+    """
+
+    # Private attributes:
+    #
+    # dict<str, dict<str, object>> _contexts - A map from each context name to
+    #     a description of the context.  Anonymous contexts have generated
+    #     names that begin with "#".  Each description has the following
+    #     entries: "clear_scopes", the number of scope names to clear, or
+    #     True to clear all of them; "meta_scope" and "meta_content_scope",
+    #     the lists of scope names; "include_prototype", whether to include
+    #     the patterns of the "prototype" context; "raw_patterns", the
+    #     patterns as given in the definition, with the anonymous contexts
+    #     replaced by their names; and "patterns", the result of _patterns,
+    #     once we have computed it.
+    # dict<tuple<tuple<str>, str>, tuple<tuple<tuple<int, int, str>>,
+    #     tuple<str>>> _line_cache - A map from pairs of a context stack and a
+    #     line, including any newline character, to the result of
+    #     _tokenize_line.
+    # list<str> _file_extensions - The "file_extensions" entry.
+    # str _scope - The "scope" entry.
+    # dict<str, str> _scopes - A map from each scope string we have computed
+    #     to itself, so that equal scope strings are the same object.
+    # dict<tuple<tuple<str>, int>, str> _stack_scopes - A map from pairs of a
+    #     context stack and a number of contexts to the result of
+    #     _stack_scope.
+    # dict<str, str> _variables - The "variables" entry, with the variables
+    #     in each value substituted.
+
+    # The maximum number of elements in _line_cache
+    _MAX_CACHED_LINES = 4096
+
+    # The maximum number of consecutive stack operations we perform without
+    # advancing in the line.  After that, we skip a character, to ensure
+    # that tokenizing terminates.
+    _MAX_STACK_OPERATIONS = 64
+
+    # A regular expression matching a reference to a variable in a regular
+    # expression, e.g. "{{identifier}}"
+    _VARIABLE_REGEX = re.compile(r'\{\{(\w+)\}\}')
+
+    # A map from the names of the POSIX bracket expressions Oniguruma
+    # supports, e.g. the "alpha" in "[[:alpha:]]", to equivalent contents of
+    # a Python character class
+    _POSIX_CLASSES = {
+        'alnum': 'a-zA-Z0-9', 'alpha': 'a-zA-Z', 'blank': ' \\t',
+        'cntrl': '\\x00-\\x1f\\x7f', 'digit': '0-9', 'graph': '!-~',
+        'lower': 'a-z', 'print': ' -~', 'punct': '!-/:-@\\[-`{-~',
+        'space': ' \\t\\n\\r\\f\\v', 'upper': 'A-Z', 'word': '\\w',
+        'xdigit': '0-9A-Fa-f',
+    }
+
+    # A regular expression matching a POSIX bracket expression.  The group is
+    # the name of the expression.
+    _POSIX_CLASS_REGEX = re.compile(
+        r'\[:({0:s}):\]'.format('|'.join(sorted(_POSIX_CLASSES))))
+
+    # A regular expression matching inline flags at the beginning of a group,
+    # e.g. "(?i)" or "(?x-i:".  The groups are the flags to turn on, the flags
+    # to turn off, and the character after the flags.
+    _INLINE_FLAGS_REGEX = re.compile(r'\(\?([imx]*)-?([imx]*)([:)])')
+
+    # A map from Oniguruma escape sequences outside of character classes to
+    # equivalent Python regular expressions
+    _ESCAPES = {
+        '\\h': '[0-9A-Fa-f]', '\\H': '[^0-9A-Fa-f]', '\\Z': '(?=\\n?\\Z)',
+        '\\z': '\\Z',
+    }
+
+    def __init__(self, definition):
+        """Initialize the syntax definition.
+
+        dict<str, object> definition - The contents of the
+            .sublime-syntax file, as parsed from YAML.
+        """
+        if not isinstance(definition, dict):
+            raise UserFacingError('A syntax definition must be a mapping')
+        scope = definition.get('scope')
+        if not Util.is_string(scope):
+            raise UserFacingError('Missing "scope" entry')
+        contexts = definition.get('contexts')
+        if not isinstance(contexts, dict) or 'main' not in contexts:
+            raise UserFacingError('Missing "main" context')
+        self._scope = scope
+        self._file_extensions = [
+            extension for extension in definition.get('file_extensions', [])
+            if Util.is_string(extension)]
+        self._variables = {}
+        variables = definition.get('variables') or {}
+        for name in variables:
+            self._variable(name, variables, [])
+        self._contexts = {}
+        for name, patterns in contexts.items():
+            self._add_context(name, patterns)
+        self._line_cache = {}
+        self._scopes = {}
+        self._stack_scopes = {}
+
+    @staticmethod
+    def load(path):
+        """Return the SyntaxDefinition in the specified .sublime-syntax file.
+
+        This requires the PyYAML package.
+        """
+        if yaml is None:
+            raise UserFacingError(
+                'Reading syntax definitions requires the PyYAML package')
+        try:
+            with io.open(path, 'r', encoding='utf-8') as file_:
+                definition = yaml.load(
+                    file_, getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+        except yaml.YAMLError as exception:
+            raise UserFacingError(str(exception))
+        return SyntaxDefinition(definition)
+
+    def file_extensions(self):
+        """Return the extensions of the files that use this syntax."""
+        return list(self._file_extensions)
+
+    def _variable(self, name, variables, names):
+        """Return the value of the specified variable.
+
+        This substitutes the variables in the value, and stores the
+        result in _variables.
+
+        str name - The variable's name.
+        dict<str, str> variables - The "variables" entry.
+        list<str> names - The variables whose values we are currently
+            computing, to detect cycles.
+        return str - The value.
+        """
+        value = self._variables.get(name)
+        if value is not None:
+            return value
+        if name in names or not Util.is_string(variables.get(name)):
+            raise UserFacingError(
+                u'Invalid variable "{0:s}"'.format(name))
+        names.append(name)
+        value = SyntaxDefinition._VARIABLE_REGEX.sub(
+            lambda match: self._variable(match.group(1), variables, names),
+            variables[name])
+        names.pop()
+        self._variables[name] = value
+        return value
+
+    @staticmethod
+    def _scope_names(value):
+        """Return the scope names in a scope entry, e.g. a "scope" entry.
+
+        object value - The value of the entry, which should be a string
+            of scope names separated by whitespace.
+        return list<str> - The scope names.
+        """
+        if Util.is_string(value):
+            return value.split()
+        else:
+            return []
+
+    def _add_context(self, name, patterns):
+        """Add the specified context and its anonymous contexts to _contexts.
+
+        str name - The context's name.
+        list<dict<str, object>> patterns - The context's contents, as
+            given in the definition.
+        """
+        if not isinstance(patterns, list):
+            raise UserFacingError(
+                u'Context "{0:s}" must be a list'.format(name))
+        context = {
+            'clear_scopes': 0,
+            'include_prototype': name != 'prototype',
+            'meta_content_scope': [],
+            'meta_scope': [],
+            'patterns': None,
+            'raw_patterns': [],
+        }
+        self._contexts[name] = context
+        for pattern in patterns:
+            if not isinstance(pattern, dict):
+                continue
+            if 'meta_scope' in pattern:
+                context['meta_scope'] = SyntaxDefinition._scope_names(
+                    pattern['meta_scope'])
+            if 'meta_content_scope' in pattern:
+                context['meta_content_scope'] = (
+                    SyntaxDefinition._scope_names(
+                        pattern['meta_content_scope']))
+            if 'meta_include_prototype' in pattern:
+                context['include_prototype'] = bool(
+                    pattern['meta_include_prototype'])
+            if (pattern.get('clear_scopes') is True or
+                    Util.is_int(pattern.get('clear_scopes'))):
+                context['clear_scopes'] = pattern['clear_scopes']
+            if 'match' in pattern or 'include' in pattern:
+                pattern = dict(pattern)
+                for key in ('push', 'set'):
+                    if key in pattern:
+                        pattern[key] = self._context_names(pattern[key])
+                context['raw_patterns'].append(pattern)
+
+    def _context_names(self, value):
+        """Return the context names for the value of a "push" or "set" entry.
+
+        This adds any anonymous contexts in the value to _contexts.
+
+        object value - The value: a context name, an anonymous context,
+            or a list of context names and anonymous contexts.
+        return list<str> - The names of the contexts, in the order in
+            which we push them.
+        """
+        if Util.is_string(value):
+            return [value]
+        if (isinstance(value, list) and value and
+                all(Util.is_string(item) or isinstance(item, list)
+                    for item in value)):
+            names = []
+            for item in value:
+                names.extend(self._context_names(item))
+            return names
+
+        # An anonymous context
+        name = u'#{0:d}'.format(len(self._contexts))
+        self._add_context(name, value)
+        return [name]
+
+    def _translate_regex(self, pattern):
+        """Return a Python regular expression equivalent to a "match" entry.
+
+        We substitute the variables, and we translate the features of
+        Oniguruma regular expressions that Python does not support, or
+        that it writes differently.  Possessive quantifiers and atomic
+        groups become ordinary quantifiers and groups, and "\\G" is
+        removed.
+
+        str pattern - The value of the "match" entry.
+        return str - The Python regular expression.
+        """
+        pattern = SyntaxDefinition._VARIABLE_REGEX.sub(
+            lambda match: self._variables.get(match.group(1), ''), pattern)
+        components = []
+
+        # The number of additional close parentheses to add at the end of each
+        # enclosing group, for the inline flags in the group
+        group_flag_counts = [0]
+
+        in_class = False
+        is_extended = False
+        index = 0
+        while index < len(pattern):
+            char = pattern[index]
+            if char == '\\':
+                escape = pattern[index:index + 2]
+                index += 2
+                if in_class:
+                    if escape == '\\h':
+                        components.append('0-9A-Fa-f')
+                    else:
+                        components.append(escape)
+                elif escape == '\\G':
+                    pass
+                elif escape == '\\k' and pattern.startswith('<', index):
+                    end = pattern.find('>', index)
+                    components.append(
+                        u'(?P={0:s})'.format(pattern[index + 1:end]))
+                    index = end + 1
+                elif escape == '\\x' and pattern.startswith('{', index):
+                    end = pattern.find('}', index)
+                    components.append(
+                        re.escape(u'%c' % int(pattern[index + 1:end], 16)))
+                    index = end + 1
+                else:
+                    components.append(
+                        SyntaxDefinition._ESCAPES.get(escape, escape))
+            elif in_class:
+                match = SyntaxDefinition._POSIX_CLASS_REGEX.match(
+                    pattern, index)
+                if match is not None:
+                    components.append(
+                        SyntaxDefinition._POSIX_CLASSES[match.group(1)])
+                    index = match.end()
+                    continue
+                if char == ']':
+                    in_class = False
+                    components.append(char)
+                elif char == '[':
+                    # Python does not support nested character classes
+                    components.append('\\[')
+                else:
+                    components.append(char)
+                index += 1
+            elif char == '[':
+                in_class = True
+                components.append(char)
+                index += 1
+                if pattern.startswith('^', index):
+                    components.append('^')
+                    index += 1
+                if pattern.startswith(']', index):
+                    components.append('\\]')
+                    index += 1
+            elif char == '(':
+                match = SyntaxDefinition._INLINE_FLAGS_REGEX.match(
+                    pattern, index)
+                if pattern.startswith('(?<', index) and not (
+                        pattern.startswith('(?<=', index) or
+                        pattern.startswith('(?<!', index)):
+                    components.append('(?P<')
+                    group_flag_counts.append(0)
+                    index += 3
+                elif pattern.startswith('(?>', index):
+                    components.append('(?:')
+                    group_flag_counts.append(0)
+                    index += 3
+                elif pattern.startswith('(?#', index):
+                    index = pattern.find(')', index) + 1 or len(pattern)
+                elif match is not None:
+                    # Inline flags.  We handle the "x" flag ourselves.  Flags
+                    # that are not followed by a colon apply to the rest of
+                    # the enclosing group.
+                    if 'x' in match.group(1):
+                        is_extended = True
+                    elif 'x' in match.group(2):
+                        is_extended = False
+                    on_flags = match.group(1).replace('x', '')
+                    off_flags = match.group(2).replace('x', '')
+                    if index == 0 and match.group(3) == ')':
+                        # Flags at the beginning of the pattern apply to all
+                        # of it, so we make them global flags, which Python
+                        # supports in every version.  The flags are off by
+                        # default, so there is no need to turn any off.
+                        if on_flags:
+                            components.append(u'(?{0:s})'.format(on_flags))
+                    else:
+                        components.append(
+                            u'(?{0:s}{1:s}:'.format(
+                                on_flags,
+                                u'-' + off_flags if off_flags else ''))
+                        if match.group(3) == ')':
+                            group_flag_counts[-1] += 1
+                        else:
+                            group_flag_counts.append(0)
+                    index = match.end()
+                else:
+                    components.append(char)
+                    group_flag_counts.append(0)
+                    index += 1
+            elif char == ')':
+                components.append(')' * (group_flag_counts.pop() + 1))
+                if not group_flag_counts:
+                    group_flag_counts.append(0)
+                index += 1
+            elif char == '#' and is_extended:
+                end = pattern.find('\n', index)
+                if end < 0:
+                    end = len(pattern)
+                index = end
+            elif char in '*+?}' and pattern.startswith('+', index + 1):
+                # A possessive quantifier
+                components.append(char)
+                index += 2
+            elif char.isspace() and is_extended:
+                index += 1
+            else:
+                components.append(char)
+                index += 1
+        components.append(')' * group_flag_counts[0])
+        return ''.join(components)
+
+    def _compile_pattern(self, pattern):
+        """Return the element of a context's "patterns" for a "match" entry.
+
+        dict<str, object> pattern - The entry from the definition.
+        return dict<str, object> - The element, as described in
+            _patterns, or None if we could not compile the regular
+            expression.
+        """
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                regex = re.compile(self._translate_regex(pattern['match']))
+        except (re.error, ValueError, IndexError, OverflowError):
+            return None
+        captures = []
+        for group, scope in sorted((pattern.get('captures') or {}).items()):
+            if Util.is_int(group) and 0 <= group <= regex.groups:
+                captures.append((group, SyntaxDefinition._scope_names(scope)))
+        if 'set' in pattern:
+            pop_count = 1
+            push = pattern['set']
+        else:
+            pop = pattern.get('pop', False)
+            if pop is True:
+                pop_count = 1
+            elif Util.is_int(pop) and pop > 0:
+                pop_count = pop
+            else:
+                pop_count = 0
+            push = pattern.get('push', [])
+        return {
+            'captures': captures,
+            'is_set': 'set' in pattern,
+            'pop_count': pop_count,
+            'push': tuple(name for name in push if name in self._contexts),
+            'regex': regex,
+            'scope': SyntaxDefinition._scope_names(pattern.get('scope')),
+        }
+
+    def _patterns(self, name, visited=None):
+        """Return the patterns of the specified context.
+
+        This includes the patterns in the contexts it includes, and the
+        "prototype" context, if applicable.  We compute the patterns
+        lazily, because most syntax definitions have many contexts that
+        a given file never uses.
+
+        str name - The context's name.
+        set<str> visited - The names of the contexts we are currently
+            including, to detect cycles.
+        return list<dict<str, object>> - The patterns.  Each pattern has
+            the following entries: "regex", the compiled regular
+            expression; "scope", the list of scope names; "captures",
+            pairs consisting of the group numbers and lists of scope
+            names in the "captures" entry, in order; "pop_count", the
+            number of contexts to pop; "push", the names of the contexts
+            to push afterward; and "is_set", whether the entry is a
+            "set" entry.
+        """
+        context = self._contexts[name]
+        if context['patterns'] is not None:
+            return context['patterns']
+        if visited is None:
+            visited = set()
+        if name in visited:
+            return []
+        visited.add(name)
+        patterns = []
+        if context['include_prototype'] and 'prototype' in self._contexts:
+            patterns.extend(self._patterns('prototype', visited))
+        for raw_pattern in context['raw_patterns']:
+            if 'include' in raw_pattern:
+                if raw_pattern['include'] in self._contexts:
+                    patterns.extend(
+                        self._patterns(raw_pattern['include'], visited))
+            else:
+                pattern = self._compile_pattern(raw_pattern)
+                if pattern is not None:
+                    patterns.append(pattern)
+        visited.remove(name)
+        if not visited:
+            context['patterns'] = patterns
+        return patterns
+
+    def _add_context_scope(self, names, context, content):
+        """Add the scope names of a context on the stack to "names".
+
+        list<str> names - The scope names of the contexts below it.
+        dict<str, object> context - The context, as in _contexts.
+        bool content - Whether to add the "meta_content_scope" names.
+        """
+        if context['clear_scopes'] is True:
+            del names[1:]
+        elif context['clear_scopes']:
+            del names[max(1, len(names) - context['clear_scopes']):]
+        names.extend(context['meta_scope'])
+        if content:
+            names.extend(context['meta_content_scope'])
+
+    def _stack_scope(self, stack, content_count):
+        """Return the scope names of the specified context stack.
+
+        tuple<str> stack - The context stack.
+        int content_count - The number of contexts at the bottom of the
+            stack whose "meta_content_scope" names we include.  For the
+            other contexts, we only include the "meta_scope" names.
+        return list<str> - The names, as a new list.
+        """
+        key = (stack, content_count)
+        names = self._stack_scopes.get(key)
+        if names is None:
+            names = [self._scope]
+            for index, name in enumerate(stack):
+                self._add_context_scope(
+                    names, self._contexts[name], index < content_count)
+            if len(self._stack_scopes) >= SyntaxDefinition._MAX_CACHED_LINES:
+                self._stack_scopes = {}
+            self._stack_scopes[key] = names
+        return list(names)
+
+    def _scope_string(self, names):
+        """Return the scope string for the specified scope names.
+
+        We return the same object for equal scope strings, so that the
+        cache in ScopeSelector.score is effective and we don't store
+        many copies of the same string.
+        """
+        scope = u''.join(u'{0:s} '.format(name) for name in names)
+        return self._scopes.setdefault(scope, scope)
+
+    def initial_stack(self):
+        """Return the context stack at the beginning of a file."""
+        return ('main',)
+
+    def _find_match(self, line, pos, stack):
+        """Return the earliest match for the context on top of "stack".
+
+        str line - The line.
+        int pos - The position at which to start searching.
+        tuple<str> stack - The context stack.
+        return tuple<re.Match, dict<str, object>> - The match and the
+            pattern, as in _patterns, or (None, None) if there is no
+            match.  We ignore empty matches that do not alter the stack,
+            since they would not advance the position.
+        """
+        best_match = None
+        best_pattern = None
+        for pattern in self._patterns(stack[-1]):
+            match = pattern['regex'].search(line, pos)
+            if (match is not None and match.start() == match.end() and
+                    not pattern['pop_count'] and not pattern['push']):
+                match = None
+            if (match is not None and
+                    (best_match is None or
+                     match.start() < best_match.start())):
+                best_match = match
+                best_pattern = pattern
+                if match.start() == pos:
+                    break
+        return (best_match, best_pattern)
+
+    def _match_runs(self, match, pattern, stack, runs):
+        """Append the scope runs for a match to "runs".
+
+        Return the context stack after the match.
+
+        re.Match match - The match.
+        dict<str, object> pattern - The pattern, as in _patterns.
+        tuple<str> stack - The context stack before the match.
+        list<tuple<int, int, str>> runs - The runs, as in _tokenize_line.
+        return tuple<str> - The context stack after the match.
+        """
+        pop_count = min(pattern['pop_count'], len(stack) - 1)
+        if pattern['is_set']:
+            names = self._stack_scope(stack[:-1], len(stack) - 1)
+        else:
+            names = self._stack_scope(stack, len(stack) - pop_count)
+        for name in pattern['push']:
+            self._add_context_scope(names, self._contexts[name], False)
+        names.extend(pattern['scope'])
+        if match.start() == match.end():
+            # An empty match that alters the stack
+            pass
+        elif not pattern['captures']:
+            runs.append(
+                (match.start(), match.end(), self._scope_string(names)))
+        else:
+            # Divide the match at the boundaries of the captured groups
+            captures = [
+                (match.start(group), match.end(group), scope_names)
+                for group, scope_names in pattern['captures']
+                if match.start(group) >= 0]
+            points = set([match.start(), match.end()])
+            for begin, end, scope_names in captures:
+                points.add(begin)
+                points.add(end)
+            points = sorted(points)
+            for begin, end in zip(points, points[1:]):
+                run_names = list(names)
+                for capture_begin, capture_end, scope_names in captures:
+                    if capture_begin <= begin and end <= capture_end:
+                        run_names.extend(scope_names)
+                runs.append((begin, end, self._scope_string(run_names)))
+        return stack[:len(stack) - pop_count] + pattern['push']
+
+    def _tokenize_line(self, line, stack):
+        """Return the scope runs for the specified line.
+
+        str line - The line, including any newline character.
+        tuple<str> stack - The context stack at the beginning of the
+            line.
+        return tuple<tuple<tuple<int, int, str>>, tuple<str>> - A pair
+            consisting of the scope runs, represented as triples of the
+            beginning, end, and scope of each run, and the context stack
+            at the end of the line.
+        """
+        runs = []
+        pos = 0
+        operation_count = 0
+        while pos < len(line):
+            match, pattern = self._find_match(line, pos, stack)
+            if match is None:
+                end = len(line)
+            else:
+                end = match.start()
+            if end > pos:
+                runs.append(
+                    (pos, end,
+                     self._scope_string(self._stack_scope(stack, len(stack)))))
+            if match is None:
+                break
+            stack = self._match_runs(match, pattern, stack, runs)
+            if match.end() > pos:
+                pos = match.end()
+                operation_count = 0
+            else:
+                operation_count += 1
+                if operation_count >= SyntaxDefinition._MAX_STACK_OPERATIONS:
+                    runs.append(
+                        (pos, pos + 1,
+                         self._scope_string(
+                             self._stack_scope(stack, len(stack)))))
+                    pos += 1
+                    operation_count = 0
+        return (tuple(runs), stack)
+
+    def tokenize_line(self, line, stack):
+        """Return the scope runs for the specified line.
+
+        This is the same as _tokenize_line, except that we cache the
+        results.
+        """
+        key = (stack, line)
+        result = self._line_cache.get(key)
+        if result is None:
+            result = self._tokenize_line(line, stack)
+            if len(self._line_cache) >= SyntaxDefinition._MAX_CACHED_LINES:
+                self._line_cache.clear()
+            self._line_cache[key] = result
+        return result
+
+
+class SyntaxScopeProvider(ScopeProvider):
+    """A ScopeProvider that uses a SyntaxDefinition.
+
+    The state is the context stack at the beginning of a line, or None
+    for the beginning of a file.
+    """
+
+    # Private attributes:
+    #
+    # SyntaxDefinition _syntax - The syntax definition.
+
+    # A regular expression for splitting text into lines, including the
+    # newline characters
+    _LINE_REGEX = re.compile(r'[^\n]*\n|[^\n]+$')
+
+    def __init__(self, syntax):
+        self._syntax = syntax
+
+    def scope_runs(self, text, state=None):
+        syntax = self._syntax
+        if state is None:
+            state = syntax.initial_stack()
+        runs = []
+        for match in SyntaxScopeProvider._LINE_REGEX.finditer(text):
+            line_runs, state = syntax.tokenize_line(match.group(), state)
+            begin = match.start()
+            for run_begin, run_end, scope in line_runs:
+                if runs and runs[-1][1] is scope:
+                    runs[-1] = (runs[-1][0], scope, begin + run_end)
+                else:
+                    runs.append((begin + run_begin, scope, begin + run_end))
+        return [
+            (Region(run_begin, run_end), scope)
+            for run_begin, scope, run_end in runs]
+
+    def end_state(self, text, state=None, begin=0, end=None):
+        # Tokenize each line, decoding it if necessary.  We don't need to
+        # handle '\r\n' specially, because each line is tokenized separately.
+        syntax = self._syntax
+        if state is None:
+            state = syntax.initial_stack()
+        if end is None:
+            end = len(text)
+        is_bytes = not isinstance(text, u''.__class__)
+        newline = b'\n' if is_bytes else u'\n'
+        pos = begin
+        while pos < end:
+            line_end = text.find(newline, pos, end) + 1
+            if line_end == 0:
+                line_end = end
+            line = text[pos:line_end]
+            if is_bytes:
+                line = line.decode('utf-8', 'replace')
+            if line.endswith('\r\n'):
+                line = line[:-2] + '\n'
+            state = syntax.tokenize_line(line, state)[1]
+            pos = line_end
+        return state
+
+
+class SyntaxDocument(object):
+    """Maintains the scopes of text that changes, using a SyntaxDefinition.
+
+    SyntaxDocument stores the context stack at the beginning of each
+    line and the scope runs of each line.  When a range of lines
+    changes, we tokenize the new lines, followed by the lines after
+    them, starting from the context stack at the beginning of the first
+    changed line.  We stop as soon as the context stack at the end of a
+    line matches the stored context stack at the beginning of the next
+    line, because the scopes of the rest of the lines are the same as
+    before.  So the cost of an edit is usually proportional to the
+    number of lines it changes, rather than the size of the text.
+    """
+
+    # Private attributes:
+    #
+    # list<tuple<tuple<int, int, str>>> _line_runs - The scope runs of each
+    #     line, as returned by SyntaxDefinition.tokenize_line.
+    # list<str> _lines - The lines, including their newline characters.  The
+    #     last line is the text after the last newline character, which may
+    #     be empty.
+    # list<tuple<str>> _stacks - The context stack at the beginning of each
+    #     line.  This is parallel to _lines.
+    # SyntaxDefinition _syntax - The syntax definition.
+
+    def __init__(self, syntax, text=''):
+        """Initialize the document.
+
+        SyntaxDefinition syntax - The syntax definition.
+        str text - The text.  Its line breaks must be '\\n' characters.
+        """
+        self._syntax = syntax
+        self._lines = ['']
+        self._stacks = [syntax.initial_stack()]
+        self._line_runs = [()]
+        self.replace_lines(0, 1, text)
+
+    @staticmethod
+    def _split_lines(text):
+        """Return the lines of the specified text, as in _lines."""
+        lines = text.split('\n')
+        return [line + '\n' for line in lines[:-1]] + [lines[-1]]
+
+    def row_count(self):
+        """Return the number of lines in the document."""
+        return len(self._lines)
+
+    def text(self):
+        """Return the text of the document."""
+        return ''.join(self._lines)
+
+    def replace_lines(self, begin_row, end_row, text):
+        """Replace the specified range of lines with the specified text.
+
+        int begin_row - The first row to replace.
+        int end_row - The row after the last row to replace.  This must
+            be greater than begin_row.
+        str text - The replacement text.  The last line of the text
+            (after its last newline character, if any) is joined with
+            the row at "end_row", if any.
+        return int - The number of lines we tokenized.
+        """
+        lines = SyntaxDocument._split_lines(text)
+        if end_row < len(self._lines):
+            lines[-1] += self._lines[end_row]
+            end_row += 1
+        self._lines[begin_row:end_row] = lines
+        self._stacks[begin_row + 1:end_row] = [None] * (len(lines) - 1)
+        self._line_runs[begin_row:end_row] = [()] * len(lines)
+
+        # Tokenize from begin_row until the context stack converges
+        row = begin_row
+        stack = self._stacks[row]
+        count = 0
+        while True:
+            self._line_runs[row], stack = self._syntax.tokenize_line(
+                self._lines[row], stack)
+            count += 1
+            row += 1
+            if (row == len(self._lines) or
+                    (row >= begin_row + len(lines) and
+                     self._stacks[row] == stack)):
+                break
+            self._stacks[row] = stack
+        return count
+
+    def scope_runs(self):
+        """Return the scopes of the characters in the document.
+
+        return list<tuple<Region, str>> - The scopes, formatted like the
+            return value of View.extract_tokens_with_scopes.
+        """
+        runs = []
+        begin = 0
+        for line, line_runs in zip(self._lines, self._line_runs):
+            for run_begin, run_end, scope in line_runs:
+                if runs and runs[-1][1] is scope:
+                    runs[-1] = (runs[-1][0], scope, begin + run_end)
+                else:
+                    runs.append((begin + run_begin, scope, begin + run_end))
+            begin += len(line)
+        return [
+            (Region(run_begin, run_end), scope)
+            for run_begin, scope, run_end in runs]
@@ -17,13 +17,17 @@ class WrapAsYouTypeCommandTestBase(unittest.TestCase):
         settings.set('tab_size', 4)
         settings.set('translate_tabs_to_spaces', False)
         settings.set('trim_automatic_white_space', True)
+        settings.set('wrap_as_you_type_async', None)
+        settings.set('wrap_as_you_type_defer_reflow', None)
         settings.set('wrap_as_you_type_disabled', False)
         settings.set('wrap_as_you_type_enter_extends_section', False)
+        settings.set('wrap_as_you_type_highlight_overflow', None)
         settings.set('wrap_as_you_type_paragraphs', None)
         settings.set('wrap_as_you_type_passive', None)
         settings.set('wrap_as_you_type_sections', None)
         settings.set('wrap_as_you_type_space_between_words', None)
         settings.set('wrap_as_you_type_word_regex', None)
+        settings.set('wrap_as_you_type_work_budget', None)
         settings.set('wrap_width', None)
 
     def tearDown(self):
@@ -170,3 +174,24 @@ class WrapAsYouTypeCommandTestBase(unittest.TestCase):
             ])
         settings.set(
             'wrap_as_you_type_paragraphs', [{'first_line_regex': r'^""?$'}])
+
+    def _patch(self, target, name, value):
+        """Replace the specified attribute until the test finishes.
+
+        We restore the original value using addCleanup, so that it is
+        restored even if the test fails.
+
+        object target - The object whose attribute to replace, e.g. a
+            class or a module.
+        str name - The name of the attribute.
+        object value - The replacement value.
+        return object - The original value, as returned by getattr.
+        """
+        original = getattr(target, name)
+        attributes = vars(target)
+        if name in attributes:
+            self.addCleanup(setattr, target, name, attributes[name])
+        else:
+            self.addCleanup(delattr, target, name)
+        setattr(target, name, value)
+        return original
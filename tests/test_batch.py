@@ -0,0 +1,388 @@
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from WrapAsYouType.batch import BatchReflower
+from WrapAsYouType.batch import ResultCache
+from WrapAsYouType.batch import _parse_diff
+from WrapAsYouType.batch import main
+
+
+class TestBatchReflower(unittest.TestCase):
+    """Test BatchReflower and the batch reflow command-line tool."""
+
+    # A C file that is not wrapped correctly
+    _UNWRAPPED_TEXT = (
+        'int x;\n'
+        '// Lorem ipsum dolor sit amet, iudicabit interpretaris ius eu.\n'
+        'int y;\n')
+
+    # The result of reflowing _UNWRAPPED_TEXT
+    _WRAPPED_TEXT = (
+        'int x;\n'
+        '// Lorem ipsum dolor sit amet,\n'
+        '// iudicabit interpretaris ius\n'
+        '// eu.\n'
+        'int y;\n')
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._config_path = os.path.join(self._dir, 'config.json')
+        with open(self._config_path, 'w') as file_:
+            json.dump(self._config(), file_)
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def _config(self):
+        """Return the settings for wrapping C "//" comments at width 30."""
+        return {
+            'wrap_as_you_type_sections': [{
+                'line_start': '// ',
+                'selector': 'comment.line',
+            }],
+            'wrap_width': 30,
+        }
+
+    def _write(self, name, text):
+        """Write a file in the temporary directory, and return its path.
+
+        str name - The file's name.
+        str text - The contents of the file.  We do not translate its
+            line breaks.
+        return str - The path.
+        """
+        path = os.path.join(self._dir, name)
+        with io.open(path, 'w', encoding='utf-8', newline='') as file_:
+            file_.write(text)
+        return path
+
+    def _read(self, path):
+        """Return the contents of the specified file, as in _write."""
+        with io.open(path, 'r', encoding='utf-8', newline='') as file_:
+            return file_.read()
+
+    def _main(self, *args):
+        """Run the batch reflow tool with the specified arguments.
+
+        We use a single process and the configuration from _config().
+
+        return tuple<int, str, str> - The exit status, the standard
+            output, and the standard error.
+        """
+        stdout = sys.stdout
+        stderr = sys.stderr
+        sys.stdout = io.StringIO()
+        sys.stderr = io.StringIO()
+        try:
+            status = main(
+                ['--config', self._config_path, '-j', '1'] + list(args))
+            return (status, sys.stdout.getvalue(), sys.stderr.getvalue())
+        finally:
+            sys.stdout = stdout
+            sys.stderr = stderr
+
+    def _write_invalid_large_file(self, name):
+        """Write a large C file that is not valid UTF-8.
+
+        Write a file that is large enough for check_file to scan it using
+        mmap, that is wrapped correctly, and that has an invalid byte in
+        the middle of a line of code.
+
+        str name - The file's name.
+        return str - The path.
+        """
+        code = 'int a = {0:s};\n'.format(' + '.join(['1'] * 500))
+        text = (code + self._WRAPPED_TEXT) * 1000
+        path = self._write(name, text)
+        self.assertGreaterEqual(
+            os.path.getsize(path), BatchReflower._MMAP_THRESHOLD)
+        with open(path, 'r+b') as file_:
+            file_.seek(text.index('1 + 1', len(text) // 2))
+            file_.write(b'\xff')
+        return path
+
+    def test_check(self):
+        """Test the exit status and the output of --check and --diff."""
+        clean_path = self._write('clean.c', self._WRAPPED_TEXT)
+        unwrapped_path = self._write('unwrapped.c', self._UNWRAPPED_TEXT)
+        crlf_path = self._write(
+            'crlf.c', self._UNWRAPPED_TEXT.replace('\n', '\r\n'))
+
+        status, stdout, stderr = self._main(
+            '--check', '--no-cache', clean_path)
+        self.assertEqual(status, 0)
+        self.assertEqual(stdout, '')
+
+        status, stdout, stderr = self._main(
+            '--check', '--no-cache', self._dir)
+        self.assertEqual(status, 1)
+        self.assertEqual(
+            stdout, '{0:s}\n{1:s}\n'.format(crlf_path, unwrapped_path))
+
+        status, stdout, stderr = self._main('--diff', '--no-cache', crlf_path)
+        self.assertEqual(status, 1)
+        self.assertIn(
+            '-// Lorem ipsum dolor sit amet, iudicabit interpretaris ius '
+            'eu.\r\n', stdout)
+        self.assertIn('+// eu.\r\n', stdout)
+
+        status, stdout, stderr = self._main(
+            '--lines', '--no-cache', unwrapped_path)
+        self.assertEqual(status, 1)
+        self.assertEqual(
+            stdout,
+            '{0:s}:2:1: lines 2-2 would be reflowed\n'.format(unwrapped_path))
+
+        # Reflow the files, and check them again.  --check does not alter
+        # them.
+        self.assertEqual(self._read(unwrapped_path), self._UNWRAPPED_TEXT)
+        status, stdout, stderr = self._main('--no-cache', self._dir)
+        self.assertEqual(status, 0)
+        self.assertEqual(self._read(clean_path), self._WRAPPED_TEXT)
+        self.assertEqual(self._read(unwrapped_path), self._WRAPPED_TEXT)
+        self.assertEqual(
+            self._read(crlf_path), self._WRAPPED_TEXT.replace('\n', '\r\n'))
+        status, stdout, stderr = self._main(
+            '--check', '--no-cache', self._dir)
+        self.assertEqual(status, 0)
+
+    def test_result_cache(self):
+        """Test the batch reflow tool's use of ResultCache."""
+        cache_dir = os.path.join(self._dir, 'cache')
+        path = self._write('foo.c', self._WRAPPED_TEXT)
+        status, stdout, stderr = self._main(
+            '--check', '--cache-dir', cache_dir, path)
+        self.assertEqual(status, 0)
+        self.assertNotIn('skipped', stderr)
+        status, stdout, stderr = self._main(
+            '--check', '--cache-dir', cache_dir, path)
+        self.assertEqual(status, 0)
+        self.assertIn('1 unchanged files skipped', stderr)
+
+        # Changing the file invalidates its entry
+        self._write('foo.c', self._UNWRAPPED_TEXT)
+        status, stdout, stderr = self._main(
+            '--check', '--cache-dir', cache_dir, path)
+        self.assertEqual(status, 1)
+        self.assertNotIn('skipped', stderr)
+        self.assertEqual(stdout, '{0:s}\n'.format(path))
+
+        # A large file that is not valid UTF-8 is never cached
+        invalid_path = self._write_invalid_large_file('invalid.c')
+        for _ in range(2):
+            status, stdout, stderr = self._main(
+                '--check', '--cache-dir', cache_dir, invalid_path)
+            self.assertEqual(status, 1)
+            self.assertNotIn('skipped', stderr)
+            self.assertIn('{0:s}: error: '.format(invalid_path), stderr)
+
+        # Changing the configuration changes the digests
+        config = self._config()
+        with open(path, 'rb') as file_:
+            digest = ResultCache(cache_dir, config).digest(path, file_)
+        config['wrap_width'] = 40
+        with open(path, 'rb') as file_:
+            self.assertNotEqual(
+                ResultCache(cache_dir, config).digest(path, file_), digest)
+
+    def test_check_file_mmap(self):
+        """Test that check_file gives the same results for large files.
+
+        Test that BatchReflower.check_file gives the same results whether
+        it reads a file into memory or scans it using mmap.
+        """
+        reflower = BatchReflower(self._config())
+        code = 'int a = {0:s};\n'.format(' + '.join(['1'] * 500))
+        text = ''.join(
+            code + (self._WRAPPED_TEXT if i % 97 else self._UNWRAPPED_TEXT)
+            for i in range(1000))
+        paths = [
+            self._write('lf.c', text),
+            self._write('crlf.c', text.replace('\n', '\r\n'))]
+
+        gen_mapped_changed_rows = BatchReflower._gen_mapped_changed_rows
+        mapped_paths = []
+
+        def mock_gen_mapped_changed_rows(reflower, mapped_file, path):
+            mapped_paths.append(path)
+            return gen_mapped_changed_rows(reflower, mapped_file, path)
+
+        BatchReflower._gen_mapped_changed_rows = mock_gen_mapped_changed_rows
+        try:
+            for path in paths:
+                self.assertGreaterEqual(
+                    os.path.getsize(path), BatchReflower._MMAP_THRESHOLD)
+                for report in ('files', 'lines'):
+                    mapped_result = reflower.check_file(path, report)
+                    self.assertEqual(mapped_paths, [path])
+                    del mapped_paths[:]
+                    self.assertEqual(mapped_result['status'], 'unwrapped')
+
+                    threshold = BatchReflower._MMAP_THRESHOLD
+                    BatchReflower._MMAP_THRESHOLD = 1 << 62
+                    try:
+                        result = reflower.check_file(path, report)
+                    finally:
+                        BatchReflower._MMAP_THRESHOLD = threshold
+                    self.assertEqual(mapped_paths, [])
+                    self.assertEqual(mapped_result, result)
+        finally:
+            BatchReflower._gen_mapped_changed_rows = gen_mapped_changed_rows
+        self.assertEqual(
+            result['report'].count('would be reflowed'),
+            len(range(0, 1000, 97)))
+
+    def test_check_file_mmap_encoding(self):
+        """Test that check_file reports encoding errors in large files.
+
+        Test that when BatchReflower.check_file scans a file using mmap,
+        it reports an invalid byte outside of the paragraphs, as when it
+        reads the file into memory.
+        """
+        reflower = BatchReflower(self._config())
+        path = self._write_invalid_large_file('invalid.c')
+        for report in ('files', 'lines'):
+            mapped_result = reflower.check_file(path, report)
+            self.assertEqual(mapped_result['status'], 'error')
+            self.assertIsNotNone(mapped_result['message'])
+
+            threshold = BatchReflower._MMAP_THRESHOLD
+            BatchReflower._MMAP_THRESHOLD = 1 << 62
+            try:
+                result = reflower.check_file(path, report)
+            finally:
+                BatchReflower._MMAP_THRESHOLD = threshold
+            self.assertEqual(result['status'], 'error')
+
+        status, stdout, stderr = self._main('--check', '--no-cache', path)
+        self.assertEqual(status, 1)
+        self.assertIn('{0:s}: error: '.format(path), stderr)
+
+    def test_parse_diff(self):
+        """Test _parse_diff."""
+        diff = (
+            'diff --git a/foo.c b/foo.c\n'
+            '--- a/foo.c\n'
+            '+++ b/foo.c\n'
+            '@@ -1,3 +1,4 @@\n'
+            ' int x;\n'
+            '-// Lorem ipsum\n'
+            '+// Lorem ipsum dolor\n'
+            '+// sit amet\n'
+            ' int y;\n'
+            '\\ No newline at end of file\n'
+            '@@ -10 +11 @@\n'
+            '-int z;\n'
+            '+int w;\n'
+            '--- a/deleted.c\n'
+            '+++ /dev/null\n'
+            '@@ -1 +0,0 @@\n'
+            '-int x;\n'
+            '--- /dev/null\n'
+            '+++ b/dir/added.c\n'
+            '@@ -0,0 +1,2 @@\n'
+            '+int x;\n'
+            '+int y;\n')
+        self.assertEqual(
+            _parse_diff(io.StringIO(diff), 1),
+            [('foo.c', [1, 2, 10]), ('dir/added.c', [0, 1])])
+        self.assertEqual(
+            _parse_diff(io.StringIO(diff), 0),
+            [('b/foo.c', [1, 2, 10]), ('b/dir/added.c', [0, 1])])
+
+    def test_from_diff(self):
+        """Test that --from-diff only reflows the changed paragraphs."""
+        text = 'int z;\n' + self._UNWRAPPED_TEXT + self._UNWRAPPED_TEXT
+        self._write('foo.c', text)
+        diff_path = self._write(
+            'foo.diff',
+            '--- a/foo.c\n'
+            '+++ b/foo.c\n'
+            '@@ -5,1 +5,2 @@\n'
+            ' int x;\n'
+            '+// Lorem ipsum dolor sit amet, iudicabit interpretaris ius '
+            'eu.\n')
+        cwd = os.getcwd()
+        os.chdir(self._dir)
+        try:
+            status, stdout, stderr = self._main(
+                '--lines', '--from-diff', diff_path)
+            self.assertEqual(status, 1)
+            self.assertEqual(
+                stdout, 'foo.c:6:1: lines 6-6 would be reflowed\n')
+
+            # Limit the files to a directory that does not contain foo.c
+            os.mkdir('dir')
+            status, stdout, stderr = self._main(
+                '--check', '--from-diff', diff_path, 'dir')
+            self.assertEqual(status, 0)
+            self.assertEqual(stdout, '')
+
+            status, stdout, stderr = self._main('--from-diff', diff_path)
+            self.assertEqual(status, 0)
+            self.assertEqual(
+                self._read('foo.c'),
+                'int z;\n' + self._UNWRAPPED_TEXT + self._WRAPPED_TEXT)
+        finally:
+            os.chdir(cwd)
+
+    def test_reflow_stream(self):
+        """Test that BatchReflower.reflow_stream bounds its buffer.
+
+        Test that reflow_stream writes the reflowed text of each
+        paragraph soon after reading it, even if there are no lines
+        between the paragraphs, and that the result is the same as
+        reflowing all of the text at once.
+        """
+        config = self._config()
+        config['wrap_as_you_type_paragraphs'] = [{
+            'first_line_regex': '^- ',
+            'indent': '  ',
+        }]
+        reflower = BatchReflower(config)
+        paragraph = (
+            '// - Lorem ipsum dolor sit amet, iudicabit interpretaris\n'
+            '//   ius eu, et sit iudico aperiri scaevola.\n')
+        text = paragraph * 200
+
+        class InputFile(object):
+            """Text input that records the most paragraphs buffered at once.
+
+            We count the paragraphs using the lines that begin them,
+            which reflowing does not change.
+            """
+
+            def __init__(self, output_file):
+                self.output_file = output_file
+                self.read_count = 0
+                self.max_buffer_count = 0
+
+            def __iter__(self):
+                for line in io.StringIO(text):
+                    write_count = self.output_file.getvalue().count('// - ')
+                    self.max_buffer_count = max(
+                        self.max_buffer_count,
+                        self.read_count - write_count)
+                    if line.startswith('// - '):
+                        self.read_count += 1
+                    yield line
+
+        buffer_size = BatchReflower._STREAM_BUFFER_SIZE
+        BatchReflower._STREAM_BUFFER_SIZE = 200
+        try:
+            output_file = io.StringIO()
+            input_file = InputFile(output_file)
+            reflower.reflow_stream(input_file, output_file, 'foo.c')
+        finally:
+            BatchReflower._STREAM_BUFFER_SIZE = buffer_size
+
+        self.assertEqual(
+            output_file.getvalue(), reflower.reflow_text(text, 'foo.c'))
+        self.assertNotEqual(output_file.getvalue(), text)
+        self.assertLessEqual(
+            input_file.max_buffer_count, 200 // len(paragraph) + 2)
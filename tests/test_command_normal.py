@@ -1,6 +1,7 @@
 from sublime import Region
 
 from WrapAsYouType.tests.command_test_base import WrapAsYouTypeCommandTestBase
+from WrapAsYouType.wrap_fixer import WrapFixer
 
 
 class TestWrapAsYouTypeCommandNormal(WrapAsYouTypeCommandTestBase):
@@ -706,3 +707,90 @@ class TestWrapAsYouTypeCommandNormal(WrapAsYouTypeCommandTestBase):
             Region(
                 comment_start_point, comment_start_point + len(expected_text)))
         self.assertEqual(actual_text, expected_text)
+
+    def _type_fibonacci_comments(self):
+        """Type a series of edits to C++ comments, one character at a time.
+
+        return str - The resulting contents of the document.
+        """
+        view = self._view
+        self._append(
+            '/**\n'
+            ' * The "fibonacci" function returns the nth number in the\n'
+            ' * Fibonacci sequence.\n'
+            ' */\n'
+            'int fibonacci(int n) {\n'
+            '    // Base case\n'
+            '    if (n == 0) {\n'
+            '        return 0;\n'
+            '    }\n'
+            '}\n')
+        point = view.find(r'Fibonacci sequence\.', 0).end()
+        self._insert(
+            point,
+            ' The Fibonacci sequence begins with 0 as the 0th number and 1 as '
+            'the first number. Every subsequent number is equal to the sum '
+            'of the two previous numbers.')
+        point = view.find('Base case', 0).end()
+        self._insert(
+            point,
+            '. This is also the stopping point for recursive '
+            'implementations.')
+        start_point = view.find('as the 0th number', 0).begin()
+        self._backspace(Region(start_point, start_point + 18))
+        point = view.find('the sum of', 0).end()
+        self._insert(point, ' the two numbers before it, i.e.')
+        return view.substr(Region(0, view.size()))
+
+    def test_rule_out_edit(self):
+        """Test ruling out word wrapping fixup without running _gen_edits().
+
+        Test that WrapFixer._try_rule_out_edit() applies to most of the
+        keystrokes when typing in a comment, that it only applies when
+        _gen_edits() would not yield any edits, and that the results are
+        the same as when it never applies.
+        """
+        view = self._view
+        self._set_up_cpp()
+        view.settings().set('rulers', [60])
+        try_rule_out_edit = WrapFixer._try_rule_out_edit
+        counts = {'not_ruled_out': 0, 'ruled_out': 0}
+
+        def checked_try_rule_out_edit(wrap_fixer):
+            if not try_rule_out_edit(wrap_fixer):
+                counts['not_ruled_out'] += 1
+                return False
+            counts['ruled_out'] += 1
+            self.assertIsNone(next(wrap_fixer._gen_edits(), None))
+            return True
+
+        WrapFixer._try_rule_out_edit = checked_try_rule_out_edit
+        try:
+            text = self._type_fibonacci_comments()
+        finally:
+            WrapFixer._try_rule_out_edit = try_rule_out_edit
+        self.assertGreater(counts['ruled_out'], 2 * counts['not_ruled_out'])
+
+        self._set_selection_region(Region(0, view.size()))
+        view.run_command('left_delete')
+        WrapFixer._try_rule_out_edit = lambda wrap_fixer: False
+        try:
+            self.assertEqual(self._type_fibonacci_comments(), text)
+        finally:
+            WrapFixer._try_rule_out_edit = try_rule_out_edit
+        self.assertEqual(
+            text,
+            '/**\n'
+            ' * The "fibonacci" function returns the nth number in the\n'
+            ' * Fibonacci sequence. The Fibonacci sequence begins with 0\n'
+            ' * and 1 as the first number. Every subsequent number is\n'
+            ' * equal to the sum of the two numbers before it, i.e. the\n'
+            ' * two previous numbers.\n'
+            ' */\n'
+            'int fibonacci(int n) {\n'
+            '    // Base case. This is also the stopping point for\n'
+            '    // recursive implementations.\n'
+            '    if (n == 0) {\n'
+            '        return 0;\n'
+            '    }\n'
+            '}\n')
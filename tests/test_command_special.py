@@ -1,6 +1,9 @@
 from sublime import Region
+import sublime
+import sublime_plugin
 
 from WrapAsYouType.tests.command_test_base import WrapAsYouTypeCommandTestBase
+from WrapAsYouType.wrap_fixer import WrapFixer
 
 
 class TestWrapAsYouTypeCommandSpecial(WrapAsYouTypeCommandTestBase):
@@ -1030,6 +1033,43 @@ class TestWrapAsYouTypeCommandSpecial(WrapAsYouTypeCommandTestBase):
                 comment_start_point, comment_start_point + len(expected_text)))
         self.assertEqual(actual_text, expected_text)
 
+    def test_paste(self):
+        """Test pasting multiple lines of text into a comment."""
+        view = self._view
+        self._set_up_cpp()
+        view.settings().set('rulers', [60])
+        self._append(
+            '/**\n'
+            ' * The "fibonacci" function returns the nth number in the\n'
+            ' * Fibonacci sequence.\n'
+            ' */\n'
+            'int fibonacci(int n);\n')
+
+        point = view.find(r'sequence\.', 0).end()
+        self._set_selection_point(point)
+        clipboard = sublime.get_clipboard()
+        sublime.set_clipboard(
+            ' The Fibonacci sequence begins with 0 as the 0th number\n'
+            ' * and 1 as the first number.\n'
+            ' * Every subsequent number is equal to the sum of the two '
+            'previous numbers.')
+        try:
+            view.run_command('paste')
+        finally:
+            sublime.set_clipboard(clipboard)
+        self.assertEqual(
+            view.substr(Region(0, view.size())),
+            '/**\n'
+            ' * The "fibonacci" function returns the nth number in the\n'
+            ' * Fibonacci sequence. The Fibonacci sequence begins with 0\n'
+            ' * as the 0th number and 1 as the first number. Every\n'
+            ' * subsequent number is equal to the sum of the two previous\n'
+            ' * numbers.\n'
+            ' */\n'
+            'int fibonacci(int n);\n')
+        self.assertEqual(
+            view.sel()[0], Region(view.find(r'numbers\.', 0).end()))
+
     def test_wrap_entire_document(self):
         """Test a "wrap_as_you_type_sections" setting that wraps everything.
 
@@ -1078,3 +1118,741 @@ class TestWrapAsYouTypeCommandSpecial(WrapAsYouTypeCommandTestBase):
             'graeci alienum accusamus, diam mandamus expetenda quo ei.\n')
         actual_text = view.substr(Region(0, view.size()))
         self.assertEqual(actual_text, expected_text)
+
+    def test_text_change_deltas(self):
+        """Test updating the cached line data using reported text changes.
+
+        Test that WrapFixer.on_text_changed() updates the line summary
+        and the scope runs in place, rather than discarding them.
+        """
+        if not hasattr(sublime_plugin, 'TextChangeListener'):
+            self.skipTest('TextChangeListener is not available')
+        view = self._view
+        self._set_up_cpp()
+        view.settings().set('rulers', [60])
+        self._append(
+            '/**\n'
+            ' * The "fibonacci" function returns the nth number in the\n'
+            ' * Fibonacci sequence.\n'
+            ' */\n'
+            'int fibonacci(int n);\n')
+
+        deltas = []
+
+        def mock_on_text_changed(wrap_fixer, changes):
+            on_text_changed(wrap_fixer, changes)
+            summary = wrap_fixer._line_summary
+            runs = wrap_fixer._buffer['scope_runs']
+            deltas.append((
+                summary is not None and
+                summary['change_count'] == view.change_count(),
+                runs is not None and
+                runs['change_count'] == view.change_count()))
+
+        on_text_changed = self._patch(
+            WrapFixer, 'on_text_changed', mock_on_text_changed)
+        point = view.find(r'sequence\.', 0).end()
+        self._insert(point, ' It begins with 0 and 1.')
+        wrap_fixer = WrapFixer.existing_instance(view)
+        self.assertTrue(wrap_fixer._buffer['tracks_text_changes'])
+        self.assertTrue(any(summary for summary, runs in deltas))
+
+        # Changes after the paragraph leave the line data intact
+        del deltas[:]
+        wrap_fixer._scopes_at(view.sel()[0].begin())
+        point = view.find(r'\(int n\);', 0).end()
+        view.sel().clear()
+        view.sel().add(Region(point))
+        view.run_command('insert', {'characters': ' '})
+        self.assertEqual(deltas, [(True, True)])
+        self.assertEqual(
+            view.substr(Region(0, view.size())),
+            '/**\n'
+            ' * The "fibonacci" function returns the nth number in the\n'
+            ' * Fibonacci sequence. It begins with 0 and 1.\n'
+            ' */\n'
+            'int fibonacci(int n); \n')
+
+    def _capture_timeouts(self):
+        """Replace sublime.set_timeout with a function that records calls.
+
+        This has the effect of postponing the functions that the plugin
+        schedules until the test calls them.  We restore
+        sublime.set_timeout when the test finishes, as in _patch().
+
+        return list<tuple<function, int>> - The list to which to add the
+            function and the delay for each call.
+        """
+        timeouts = []
+        self._patch(
+            sublime, 'set_timeout',
+            lambda function, delay=0: timeouts.append((function, delay)))
+        return timeouts
+
+    def _capture_async_timeouts(self):
+        """Replace sublime.set_timeout_async with a recording function.
+
+        This is the same as _capture_timeouts(), except that it replaces
+        sublime.set_timeout_async, and it does not record the delays.
+
+        return list<function> - The list to which to add the function for
+            each call.
+        """
+        timeouts = []
+        self._patch(
+            sublime, 'set_timeout_async',
+            lambda function, delay=0: timeouts.append(function))
+        return timeouts
+
+    def _set_visible_region(self, region):
+        """Replace _view.visible_region() until the test finishes.
+
+        Region region - The value for _view.visible_region() to return.
+        """
+        view_id = self._view.id()
+
+        def mock_visible_region(view):
+            if view.id() != view_id:
+                return visible_region(view)
+            return region
+
+        visible_region = self._patch(
+            sublime.View, 'visible_region', mock_visible_region)
+
+    def test_defer_reflow(self):
+        """Test the "wrap_as_you_type_defer_reflow" setting.
+
+        Test that we only fix the current line and the line after it
+        right away, that typing another character cancels the pending
+        reflow, and that the reflow we schedule after the last keystroke
+        reflows the rest of the paragraph.
+        """
+        view = self._view
+        self._set_up_cpp()
+        settings = view.settings()
+        settings.set('rulers', [60])
+        settings.set('wrap_as_you_type_defer_reflow', True)
+        self._append(
+            '/**\n'
+            ' * The "fibonacci" function returns the nth number in the\n'
+            ' * Fibonacci sequence. It begins with 0 and 1, and each\n'
+            ' * subsequent number is the sum of the two numbers before\n'
+            ' * it.\n'
+            ' */\n'
+            'int fibonacci(int n);\n')
+
+        timeouts = self._capture_timeouts()
+        point = view.find('function', 0).begin()
+        self._insert(point, 'recursive ')
+        self.assertEqual(
+            view.substr(Region(0, view.size())),
+            '/**\n'
+            ' * The "fibonacci" recursive function returns the nth number\n'
+            ' * in the Fibonacci sequence. It begins with 0 and 1, and\n'
+            ' * each\n'
+            ' * subsequent number is the sum of the two numbers before\n'
+            ' * it.\n'
+            ' */\n'
+            'int fibonacci(int n);\n')
+        self.assertGreater(len(timeouts), 1)
+        self.assertTrue(all(delay > 0 for function, delay in timeouts))
+
+        # The reflows we scheduled before the last keystroke have no
+        # effect
+        for function, delay in timeouts[:-1]:
+            function()
+        self.assertIn(' * each\n', view.substr(Region(0, view.size())))
+
+        function = timeouts[-1][0]
+        del timeouts[:]
+        function()
+        self.assertEqual(
+            view.substr(Region(0, view.size())),
+            '/**\n'
+            ' * The "fibonacci" recursive function returns the nth '
+            'number\n'
+            ' * in the Fibonacci sequence. It begins with 0 and 1, and\n'
+            ' * each subsequent number is the sum of the two numbers\n'
+            ' * before it.\n'
+            ' */\n'
+            'int fibonacci(int n);\n')
+        self.assertEqual(
+            view.sel()[0], Region(view.find('recursive ', 0).end()))
+
+    def test_work_budget(self):
+        """Test the "wrap_as_you_type_work_budget" setting.
+
+        Test that once we exhaust the work budget, we stop reflowing the
+        paragraph, and that the reflows we schedule resume where we left
+        off, one budget's worth at a time.
+        """
+        view = self._view
+        self._set_up_cpp()
+        settings = view.settings()
+        settings.set('rulers', [60])
+        settings.set('wrap_as_you_type_work_budget', {'edits': 1})
+        self._append(
+            '/**\n'
+            ' * The "fibonacci" function returns the nth number in the\n'
+            ' * Fibonacci sequence. It begins with 0 and 1, and each\n'
+            ' * subsequent number is the sum of the two numbers before\n'
+            ' * it. For example, the sixth number is 5, because the\n'
+            ' * fourth and fifth numbers are 2 and 3.\n'
+            ' */\n'
+            'int fibonacci(int n);\n')
+
+        timeouts = self._capture_timeouts()
+        point = view.find('function', 0).begin()
+        self._insert(point, 'recursive ')
+        text = view.substr(Region(0, view.size()))
+        self.assertTrue(
+            text.startswith(
+                '/**\n'
+                ' * The "fibonacci" recursive function returns the nth '
+                'number\n'
+                ' * in\n'))
+        self.assertIn(' * it.', text)
+
+        # Run the scheduled reflows, including those that they schedule, as
+        # Sublime would if the user stopped typing
+        texts = [text]
+        while timeouts:
+            function = timeouts.pop(0)[0]
+            function()
+            text = view.substr(Region(0, view.size()))
+            if text != texts[-1]:
+                texts.append(text)
+        self.assertGreater(len(texts), 3)
+        self.assertEqual(
+            texts[-1],
+            '/**\n'
+            ' * The "fibonacci" recursive function returns the nth number\n'
+            ' * in the Fibonacci sequence. It begins with 0 and 1, and\n'
+            ' * each subsequent number is the sum of the two numbers\n'
+            ' * before it. For example, the sixth number is 5, because\n'
+            ' * the fourth and fifth numbers are 2 and 3.\n'
+            ' */\n'
+            'int fibonacci(int n);\n')
+        self.assertEqual(
+            view.sel()[0], Region(view.find('recursive ', 0).end()))
+
+    def test_perform_edits_bookkeeping(self):
+        """Test the bookkeeping for the edits that comprise a fixup.
+
+        Test that WrapFixer.on_modified() is not called for each of the
+        edits that WrapFixer.perform_edits() performs, but only once
+        after all of them.
+        """
+        view = self._view
+        self._set_up_cpp()
+        view.settings().set('rulers', [60])
+        self._append(
+            '/**\n'
+            ' * The "fibonacci" function returns the nth number in the\n'
+            ' * Fibonacci sequence. It begins with 0 and 1, and each\n'
+            ' * subsequent number is the sum of the two numbers before\n'
+            ' * it.\n'
+            ' */\n'
+            'int fibonacci(int n);\n')
+
+        calls = []
+
+        def mock_on_modified(wrap_fixer):
+            calls.append(('on_modified', wrap_fixer.is_performing_edits()))
+            on_modified(wrap_fixer)
+
+        def mock_perform_edits(wrap_fixer, edit):
+            change_count = view.change_count()
+            perform_edits(wrap_fixer, edit)
+            calls.append(
+                ('perform_edits', view.change_count() - change_count))
+
+        on_modified = self._patch(WrapFixer, 'on_modified', mock_on_modified)
+        perform_edits = self._patch(
+            WrapFixer, 'perform_edits', mock_perform_edits)
+        point = view.find('function', 0).begin()
+        self._insert(point, 'recursive ')
+        self.assertNotIn(('on_modified', True), calls)
+        edit_counts = [
+            count for name, count in calls
+            if name == 'perform_edits' and count > 0]
+        self.assertGreater(max(edit_counts), 1)
+        self.assertEqual(
+            len([call for call in calls if call[0] == 'on_modified']),
+            len('recursive ') + len(edit_counts))
+        self.assertEqual(
+            view.substr(Region(0, view.size())),
+            '/**\n'
+            ' * The "fibonacci" recursive function returns the nth number\n'
+            ' * in the Fibonacci sequence. It begins with 0 and 1, and\n'
+            ' * each subsequent number is the sum of the two numbers\n'
+            ' * before it.\n'
+            ' */\n'
+            'int fibonacci(int n);\n')
+
+    def test_extend_section_cache(self):
+        """Test caching the section that the extend section command extends.
+
+        Test that the check for the "wrap_as_you_type_extend_section"
+        key in on_query_context and the subsequent
+        wrap_as_you_type_extend_section command only compute the section
+        once, and that modifying the View invalidates the result.
+        """
+        view = self._view
+        self._set_up_cpp()
+        settings = view.settings()
+        settings.set('rulers', [60])
+        settings.set('wrap_as_you_type_enter_extends_section', True)
+        self._append(
+            '/**\n'
+            ' * The "fibonacci" function returns the nth number in the\n'
+            ' * Fibonacci sequence.\n'
+            ' */\n'
+            'int fibonacci(int n);\n')
+
+        points = []
+
+        def mock_compute_section_to_extend(wrap_fixer, point):
+            points.append(point)
+            return compute_section_to_extend(wrap_fixer, point)
+
+        point = view.find(r'sequence\.', 0).end()
+        self._set_selection_point(point)
+        compute_section_to_extend = self._patch(
+            WrapFixer, '_compute_section_to_extend',
+            mock_compute_section_to_extend)
+
+        # The listener may have already computed the section in
+        # on_selection_modified_async
+        wrap_fixer = WrapFixer.instance(view)
+        self.assertTrue(wrap_fixer.should_extend_section())
+        self.assertIn(points, ([], [point]))
+        computed_points = list(points)
+        view.run_command('wrap_as_you_type_extend_section')
+        self.assertEqual(points, computed_points)
+
+        del points[:]
+        view.run_command('insert', {'characters': 'The'})
+        self.assertTrue(wrap_fixer.should_extend_section())
+        self.assertTrue(wrap_fixer.should_extend_section())
+        self.assertEqual(points[-1:], [view.sel()[0].begin()])
+        self.assertNotIn(view.sel()[0].begin(), points[:-1])
+        self.assertEqual(
+            view.substr(Region(0, view.size())),
+            '/**\n'
+            ' * The "fibonacci" function returns the nth number in the\n'
+            ' * Fibonacci sequence.\n'
+            ' * The\n'
+            ' */\n'
+            'int fibonacci(int n);\n')
+
+    def test_section_match_tracking(self):
+        """Test tracking the sections that match the selection cursor.
+
+        Test that moving the selection cursor does not check the
+        sections' selectors, and that we only check them once for each
+        combination of scopes when the user types.
+        """
+        view = self._view
+        self._set_up_cpp()
+        view.settings().set('rulers', [60])
+        self._append(
+            '/**\n'
+            ' * The "fibonacci" function returns the nth number in the\n'
+            ' * Fibonacci sequence.\n'
+            ' */\n'
+            'int fibonacci(int n);\n')
+
+        calls = []
+
+        def mock_matches_selector(
+                wrap_fixer, section, prev_char_scope, next_char_scope):
+            calls.append((prev_char_scope, next_char_scope))
+            return matches_selector(
+                wrap_fixer, section, prev_char_scope, next_char_scope)
+
+        matches_selector = self._patch(
+            WrapFixer, '_matches_selector', mock_matches_selector)
+
+        # Move the cursor across several lines
+        self._set_selection_point(view.find('nth', 0).begin())
+        self._set_selection_point(view.find('int', 0).begin())
+        self._set_selection_point(view.find('sequence', 0).end())
+        self.assertEqual(calls, [])
+
+        view.run_command('insert', {'characters': ' of numbers'})
+        wrap_fixer = WrapFixer.instance(view)
+        scopes = wrap_fixer._section_scopes
+        self.assertIn(scopes, calls)
+        self.assertIn(scopes, wrap_fixer._scope_section_matches)
+
+        # Returning to a position with the same scopes reuses the
+        # matches
+        del calls[:]
+        self._set_selection_point(view.find('nth', 0).end())
+        self.assertEqual(calls, [])
+        view.run_command('insert', {'characters': ' Fibonacci'})
+        self.assertEqual(wrap_fixer._section_scopes, scopes)
+        self.assertEqual(
+            view.substr(Region(0, view.size())),
+            '/**\n'
+            ' * The "fibonacci" function returns the nth Fibonacci number\n'
+            ' * in the Fibonacci sequence of numbers.\n'
+            ' */\n'
+            'int fibonacci(int n);\n')
+
+    def test_clone(self):
+        """Test word wrapping fixup in a view that is a clone of another.
+
+        Test that the WrapFixers for two views into the same buffer
+        share the buffer's state, and that a modification made using
+        either of them results in a single fixup, which both of them
+        see.
+        """
+        view = self._view
+        self._set_up_cpp()
+        view.settings().set('rulers', [60])
+        self._append(
+            '/**\n'
+            ' * The "fibonacci" function returns the nth number in the\n'
+            ' * Fibonacci sequence.\n'
+            ' */\n'
+            'int fibonacci(int n);\n')
+
+        window = view.window()
+        window.focus_view(view)
+        window.run_command('clone_file')
+        clone = window.active_view()
+        try:
+            self.assertIsNot(clone, view)
+            self.assertEqual(clone.buffer_id(), view.buffer_id())
+            wrap_fixer = WrapFixer.instance(view)
+            clone_wrap_fixer = WrapFixer.instance(clone)
+            self.assertIsNot(clone_wrap_fixer, wrap_fixer)
+            self.assertIs(clone_wrap_fixer._buffer, wrap_fixer._buffer)
+
+            # Only the WrapFixer for the view that has input focus responds
+            # to the modifications
+            views = set()
+
+            def mock_on_modified(wrap_fixer):
+                views.add(wrap_fixer.view())
+                on_modified(wrap_fixer)
+
+            on_modified = self._patch(
+                WrapFixer, 'on_modified', mock_on_modified)
+            point = view.find(r'sequence\.', 0).end()
+            clone.sel().clear()
+            clone.sel().add(Region(point))
+            for char in ' It begins with 0 and 1, and each subsequent':
+                clone.run_command('insert', {'characters': char})
+            self.assertEqual(views, set([clone]))
+            expected_text = (
+                '/**\n'
+                ' * The "fibonacci" function returns the nth number in the\n'
+                ' * Fibonacci sequence. It begins with 0 and 1, and each\n'
+                ' * subsequent\n'
+                ' */\n'
+                'int fibonacci(int n);\n')
+            self.assertEqual(
+                clone.substr(Region(0, clone.size())), expected_text)
+            self.assertEqual(
+                view.substr(Region(0, view.size())), expected_text)
+            self.assertEqual(
+                clone.sel()[0], Region(view.find('subsequent', 0).end()))
+
+            # Continue typing using the original view
+            window.focus_view(view)
+            self._insert(
+                view.find('subsequent', 0).end(),
+                ' number is the sum of the two numbers before it.')
+        finally:
+            clone.set_scratch(True)
+            window.focus_view(clone)
+            window.run_command('close_file')
+        self.assertIsNone(WrapFixer.existing_instance(clone))
+        self.assertEqual(
+            view.substr(Region(0, view.size())),
+            '/**\n'
+            ' * The "fibonacci" function returns the nth number in the\n'
+            ' * Fibonacci sequence. It begins with 0 and 1, and each\n'
+            ' * subsequent number is the sum of the two numbers before\n'
+            ' * it.\n'
+            ' */\n'
+            'int fibonacci(int n);\n')
+
+    def test_multiple_cursors(self):
+        """Test word wrapping fixup with multiple selection cursors.
+
+        Test that when the user types using selection cursors on
+        different lines, we perform word wrapping fixup at each of them.
+        """
+        view = self._view
+        self._set_up_cpp()
+        view.settings().set('rulers', [60])
+        self._append(
+            '/**\n'
+            ' * The "fibonacci" function returns the nth number in the\n'
+            ' * Fibonacci sequence.\n'
+            ' */\n'
+            'int fibonacci(int n);\n'
+            '\n'
+            '/**\n'
+            ' * The "factorial" function returns the product of the\n'
+            ' * numbers from 1 to n.\n'
+            ' */\n'
+            'int factorial(int n);\n')
+
+        selection = view.sel()
+        selection.clear()
+        selection.add(Region(view.find(r'sequence\.', 0).end()))
+        selection.add(Region(view.find(r'to n\.', 0).end()))
+        for char in ' It is always positive, at least for the values of n':
+            view.run_command('insert', {'characters': char})
+        self.assertEqual(
+            view.substr(Region(0, view.size())),
+            '/**\n'
+            ' * The "fibonacci" function returns the nth number in the\n'
+            ' * Fibonacci sequence. It is always positive, at least for\n'
+            ' * the values of n\n'
+            ' */\n'
+            'int fibonacci(int n);\n'
+            '\n'
+            '/**\n'
+            ' * The "factorial" function returns the product of the\n'
+            ' * numbers from 1 to n. It is always positive, at least for\n'
+            ' * the values of n\n'
+            ' */\n'
+            'int factorial(int n);\n')
+        self.assertEqual(
+            list(view.sel()),
+            [
+                Region(region.end())
+                for region in view.find_all('the values of n')])
+
+    def test_reflow_selection(self):
+        """Test the wrap_as_you_type_reflow command on a selection.
+
+        Test that the command only reflows the paragraphs in the
+        selection, and that it reflows the entire document if the
+        selection is empty.
+        """
+        view = self._view
+        self._set_up_cpp()
+        view.settings().set('rulers', [60])
+        self._append(
+            '/**\n'
+            ' * The "fibonacci" function returns the nth number in the '
+            'Fibonacci sequence.\n'
+            ' */\n'
+            'int fibonacci(int n);\n'
+            '\n'
+            '/**\n'
+            ' * The "factorial" function returns the product of the\n'
+            ' * numbers\n'
+            ' * from 1 to n.\n'
+            ' */\n'
+            'int factorial(int n);\n')
+
+        self._set_selection_region(
+            Region(
+                view.find('fibonacci', 0).begin(),
+                view.find('int', 0).end()))
+        view.run_command('wrap_as_you_type_reflow')
+        self.assertEqual(
+            view.substr(Region(0, view.size())),
+            '/**\n'
+            ' * The "fibonacci" function returns the nth number in the\n'
+            ' * Fibonacci sequence.\n'
+            ' */\n'
+            'int fibonacci(int n);\n'
+            '\n'
+            '/**\n'
+            ' * The "factorial" function returns the product of the\n'
+            ' * numbers\n'
+            ' * from 1 to n.\n'
+            ' */\n'
+            'int factorial(int n);\n')
+
+        self._set_selection_point(0)
+        view.run_command('wrap_as_you_type_reflow')
+        self.assertEqual(
+            view.substr(Region(0, view.size())),
+            '/**\n'
+            ' * The "fibonacci" function returns the nth number in the\n'
+            ' * Fibonacci sequence.\n'
+            ' */\n'
+            'int fibonacci(int n);\n'
+            '\n'
+            '/**\n'
+            ' * The "factorial" function returns the product of the\n'
+            ' * numbers from 1 to n.\n'
+            ' */\n'
+            'int factorial(int n);\n')
+        self.assertEqual(view.sel()[0], Region(0))
+
+    def test_reflow_visible_region_first(self):
+        """Test the order in which wrap_as_you_type_reflow reflows.
+
+        Test that the command reflows the paragraphs the user can see
+        right away, and then reflows the rest of the document in chunks,
+        starting with the chunks nearest to the visible region.
+        """
+        if not hasattr(sublime, 'set_timeout_async'):
+            self.skipTest('Asynchronous timeouts are not available')
+        view = self._view
+        self._set_up_cpp()
+        view.settings().set('rulers', [60])
+        lines = [
+            ' * Paragraph {0:d} lorem ipsum dolor sit amet, consectetur '
+            'adipiscing elit.\n'.format(index)
+            for index in range(5)]
+        self._append(
+            ''.join(
+                '/**\n{0:s} */\nint f{1:d}(int n);\n\n'.format(line, index)
+                for index, line in enumerate(lines)))
+        expected_text = ''.join(
+            '/**\n'
+            ' * Paragraph {0:d} lorem ipsum dolor sit amet, consectetur\n'
+            ' * adipiscing elit.\n'
+            ' */\n'
+            'int f{0:d}(int n);\n'
+            '\n'.format(index)
+            for index in range(5))
+
+        def unwrapped_indices():
+            text = view.substr(Region(0, view.size()))
+            return [
+                index for index, line in enumerate(lines) if line in text]
+
+        visible_begin = view.find('Paragraph 2', 0).begin()
+        self._set_visible_region(Region(visible_begin, visible_begin + 10))
+        async_timeouts = self._capture_async_timeouts()
+        timeouts = self._capture_timeouts()
+        self._patch(WrapFixer, '_REFLOW_CHUNK_SIZE', 1)
+        view.run_command('wrap_as_you_type_reflow')
+        self.assertEqual(unwrapped_indices(), [0, 1, 3, 4])
+
+        # Compute the rest of the reflow, and then perform the chunks
+        orders = []
+        for function in async_timeouts:
+            function()
+        while timeouts:
+            function = timeouts.pop(0)[0]
+            function()
+            indices = unwrapped_indices()
+            if not orders or indices != orders[-1]:
+                orders.append(indices)
+        self.assertEqual(orders, [[0, 3, 4], [0, 4], [4], []])
+        self.assertEqual(view.substr(Region(0, view.size())), expected_text)
+
+    def test_reflow_modified(self):
+        """Test modifying the document while wrap_as_you_type_reflow runs.
+
+        Test that if the document changes after the command copies it
+        and before the command performs the reflow of the rest of the
+        document, the command does not perform any of the reflow.
+        """
+        if not hasattr(sublime, 'set_timeout_async'):
+            self.skipTest('Asynchronous timeouts are not available')
+        view = self._view
+        self._set_up_cpp()
+        view.settings().set('rulers', [60])
+        self._append(
+            ''.join(
+                '/**\n'
+                ' * Paragraph {0:d} lorem ipsum dolor sit amet, consectetur '
+                'adipiscing elit.\n'
+                ' */\n'
+                'int f{0:d}(int n);\n'
+                '\n'.format(index)
+                for index in range(3)))
+
+        # Only the empty last line is visible
+        self._set_visible_region(Region(view.size(), view.size()))
+        async_timeouts = self._capture_async_timeouts()
+        timeouts = self._capture_timeouts()
+        view.run_command('wrap_as_you_type_reflow')
+        self._insert(0, '// Header\n')
+        expected_text = view.substr(Region(0, view.size()))
+
+        for function in async_timeouts:
+            function()
+        while timeouts:
+            timeouts.pop(0)[0]()
+        self.assertEqual(view.substr(Region(0, view.size())), expected_text)
+        self.assertEqual(
+            expected_text.count('consectetur adipiscing elit.\n'), 3)
+
+    def test_highlight_overflow(self):
+        """Test the "wrap_as_you_type_highlight_overflow" setting.
+
+        Test that after the initial scan, we update the highlights of
+        the text past the wrap width incrementally when the document
+        changes, without scanning it again.
+        """
+        view = self._view
+        self._set_up_cpp()
+        settings = view.settings()
+        settings.set('rulers', [60])
+        settings.set('wrap_as_you_type_highlight_overflow', True)
+
+        async_timeouts = self._capture_async_timeouts()
+        timeouts = self._capture_timeouts()
+
+        def run_timeouts():
+            # Run the scheduled functions, as Sublime would when idle
+            while async_timeouts or timeouts:
+                if async_timeouts:
+                    async_timeouts.pop(0)()
+                else:
+                    timeouts.pop(0)[0]()
+
+        scan_count = [0]
+
+        def mock_scan_overflow(wrap_fixer):
+            scan_count[0] += 1
+            return scan_overflow(wrap_fixer)
+
+        scan_overflow = self._patch(
+            WrapFixer, 'scan_overflow', mock_scan_overflow)
+        self._append(
+            '/**\n'
+            ' * The "fibonacci" function returns the nth number in the '
+            'Fibonacci sequence.\n'
+            ' */\n'
+            'int fibonacci(int n, int unused_parameter_with_a_long_name);'
+            '\n')
+        self._set_selection_point(0)
+        run_timeouts()
+        wrap_fixer = WrapFixer.instance(view)
+        self.assertEqual(scan_count, [1])
+        point = view.find(r'the Fibonacci sequence\.', 0).end()
+        self.assertEqual(
+            wrap_fixer.overflow_regions(), [Region(point - 17, point)])
+
+        # Typing on the line wraps it
+        self._insert(point, ' It is')
+        run_timeouts()
+        self.assertEqual(wrap_fixer.overflow_regions(), [])
+
+        # A word that is too long to fit on a line overflows
+        self._insert(
+            view.find('It is', 0).end(),
+            ' described at https://en.wikipedia.org/wiki/'
+            'Fibonacci_sequence#Relation_to_the_golden_ratio')
+        run_timeouts()
+        line_region = view.line(view.find('https', 0).begin())
+        self.assertEqual(
+            wrap_fixer.overflow_regions(),
+            [Region(line_region.begin() + 60, line_region.end())])
+        self.assertEqual(scan_count, [1])
+        self.assertEqual(
+            view.substr(Region(0, view.size())),
+            '/**\n'
+            ' * The "fibonacci" function returns the nth number in the\n'
+            ' * Fibonacci sequence. It is described at\n'
+            ' * https://en.wikipedia.org/wiki/'
+            'Fibonacci_sequence#Relation_to_the_golden_ratio\n'
+            ' */\n'
+            'int fibonacci(int n, int unused_parameter_with_a_long_name);\n')
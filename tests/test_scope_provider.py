@@ -0,0 +1,72 @@
+import unittest
+
+from WrapAsYouType.scope_provider import RegexScopeProvider
+
+
+class TestScopeProvider(unittest.TestCase):
+    """Test RegexScopeProvider."""
+
+    def _scopes(self, text, extension, state=None):
+        """Return the scopes of the specified text's tokens.
+
+        return list<tuple<str, str>> - Pairs consisting of the text of
+            each scope run and its scope.
+        """
+        provider = RegexScopeProvider.for_extension(extension)
+        return [
+            (text[region.begin():region.end()], scope)
+            for region, scope in provider.scope_runs(text, state)]
+
+    def test_scope_runs(self):
+        """Test RegexScopeProvider.scope_runs()."""
+        self.assertEqual(
+            self._scopes('s = "/*"; /* a\n * b */\n  // c\n', 'c'),
+            [
+                ('s = ', 'source.c '),
+                ('"/*"', 'source.c string.quoted.double.c '),
+                ('; ', 'source.c '),
+                ('/*',
+                 'source.c comment.block.c '
+                 'punctuation.definition.comment.begin.c '),
+                (' a\n * b ', 'source.c comment.block.c '),
+                ('*/',
+                 'source.c comment.block.c '
+                 'punctuation.definition.comment.end.c '),
+                ('\n  ', 'source.c '),
+                ('//',
+                 'source.c comment.line.double-slash.c '
+                 'punctuation.definition.comment.c '),
+                (' c\n', 'source.c comment.line.double-slash.c '),
+            ])
+        self.assertEqual(
+            self._scopes('    """Doc.\n', 'py'),
+            [
+                ('    ', 'source.python '),
+                ('"""',
+                 'source.python comment.block.documentation.python '
+                 'punctuation.definition.comment.begin.python '),
+                ('Doc.\n',
+                 'source.python comment.block.documentation.python '),
+            ])
+        self.assertEqual(
+            self._scopes("x = '''# a'''\n", 'py')[1][1],
+            'source.python string.quoted.single.block.python '
+            'punctuation.definition.string.begin.python ')
+        self.assertEqual(
+            self._scopes('/// a\n', 'rs')[1],
+            (' a\n', 'source.rust comment.line.documentation.rust '))
+
+    def test_end_state(self):
+        """Test RegexScopeProvider.end_state()."""
+        provider = RegexScopeProvider.for_extension('c')
+        text = 'int x; /* a\n * b\n */ int y;\n'
+        self.assertIsNone(provider.end_state(text))
+        state = provider.end_state(text, None, 0, text.index(' * b'))
+        self.assertIsNotNone(state)
+        self.assertEqual(
+            provider.end_state(text.encode('utf-8'), None, 0, 12), state)
+        self.assertEqual(
+            self._scopes(' * b\n', 'c', state),
+            [(' * b\n', 'source.c comment.block.c ')])
+        self.assertIsNone(
+            provider.end_state('char *s = "/*";\n// /*\n'))
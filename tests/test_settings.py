@@ -1,6 +1,8 @@
 from sublime import Region
+import sublime
 
 from WrapAsYouType.tests.command_test_base import WrapAsYouTypeCommandTestBase
+from WrapAsYouType.wrap_fixer import WrapFixer
 
 
 class TestWrapAsYouTypeSettings(WrapAsYouTypeCommandTestBase):
@@ -840,6 +842,87 @@ class TestWrapAsYouTypeSettings(WrapAsYouTypeCommandTestBase):
                 comment_start_point, comment_start_point + len(expected_text)))
         self.assertEqual(actual_text, expected_text)
 
+    def test_async(self):
+        """Test the "wrap_as_you_type_async" setting.
+
+        Test that WrapFixer.analyze() computes the fixup that
+        prepare_analysis() prepares, and that it and
+        WrapFixer.has_planned_edit() discard the fixup if the View
+        changes in the meantime.  We stub out analyze() while typing, so
+        that we control when the analysis takes place.
+        """
+        view = self._view
+        self._set_up_cpp()
+        settings = view.settings()
+        settings.set('rulers', [60])
+        self._append(
+            '/**\n'
+            ' * The "fibonacci" function returns the nth number in the\n'
+            ' * Fibonacci sequence.\n'
+            ' */\n'
+            'int fibonacci(int n);\n')
+        wrap_fixer = WrapFixer.instance(view)
+        self.assertFalse(wrap_fixer.is_async())
+        if not hasattr(sublime, 'set_timeout_async'):
+            self.skipTest('Asynchronous events are not available')
+        settings.set('wrap_as_you_type_async', True)
+        self.assertTrue(wrap_fixer.is_async())
+
+        analyze = WrapFixer.analyze
+        WrapFixer.analyze = lambda wrap_fixer: None
+        try:
+            point = view.find(r'sequence\.', 0).end()
+            self._set_selection_point(point)
+            view.run_command(
+                'insert',
+                {'characters': ' It begins with 0 and 1, and each subsequent'})
+            change_count = analyze(wrap_fixer)
+            self.assertEqual(change_count, view.change_count())
+            self.assertTrue(wrap_fixer.has_planned_edit())
+
+            # Finish the fixup, as in WrapAsYouTypeListener._finish_fixup,
+            # after the user types another character
+            settings.set('wrap_as_you_type_disabled', True)
+            view.run_command('insert', {'characters': ' '})
+            settings.set('wrap_as_you_type_disabled', False)
+            self.assertFalse(wrap_fixer.has_planned_edit())
+            self.assertEqual(
+                view.substr(Region(0, view.size())),
+                '/**\n'
+                ' * The "fibonacci" function returns the nth number in the\n'
+                ' * Fibonacci sequence. It begins with 0 and 1, and each '
+                'subsequent \n'
+                ' */\n'
+                'int fibonacci(int n);\n')
+
+            # Perform the analysis, as in on_modified_async, after the user
+            # types another character
+            view.run_command('insert', {'characters': 'number'})
+            settings.set('wrap_as_you_type_disabled', True)
+            view.run_command('insert', {'characters': ' '})
+            settings.set('wrap_as_you_type_disabled', False)
+            self.assertIsNone(analyze(wrap_fixer))
+            self.assertFalse(wrap_fixer.has_planned_edit())
+
+            view.run_command('insert', {'characters': 'is'})
+            change_count = analyze(wrap_fixer)
+            self.assertEqual(change_count, view.change_count())
+            self.assertTrue(wrap_fixer.has_planned_edit())
+            view.run_command('wrap_as_you_type')
+            wrap_fixer.on_post_modification()
+        finally:
+            WrapFixer.analyze = analyze
+        self.assertEqual(
+            view.substr(Region(0, view.size())),
+            '/**\n'
+            ' * The "fibonacci" function returns the nth number in the\n'
+            ' * Fibonacci sequence. It begins with 0 and 1, and each\n'
+            ' * subsequent number is\n'
+            ' */\n'
+            'int fibonacci(int n);\n')
+        self.assertEqual(
+            view.sel()[0], Region(view.find('number is', 0).end()))
+
     def test_extend_section_cpp(self):
         """Test WrapAsYouTypeExtendSectionCommand on C++ code."""
         view = self._view
@@ -0,0 +1,166 @@
+import unittest
+
+from WrapAsYouType.syntax_definition import SyntaxDefinition
+from WrapAsYouType.syntax_definition import SyntaxDocument
+
+
+class TestSyntaxDefinition(unittest.TestCase):
+    """Test SyntaxDefinition and SyntaxDocument."""
+
+    def _syntax(self):
+        """Return a SyntaxDefinition for a simple C-like language."""
+        return SyntaxDefinition({
+            'file_extensions': ['c'],
+            'scope': 'source.c',
+            'variables': {'ident': '[A-Za-z_]\\w*'},
+            'contexts': {
+                'prototype': [{'include': 'comments'}],
+                'main': [
+                    {
+                        'match': '\\b(int)\\s+({{ident}})',
+                        'captures': {
+                            1: 'storage.type.c',
+                            2: 'variable.c',
+                        },
+                    },
+                    {
+                        'match': '"',
+                        'scope': 'punctuation.definition.string.begin.c',
+                        'push': 'string',
+                    },
+                ],
+                'comments': [
+                    {
+                        'match': '/\\*',
+                        'scope': 'punctuation.definition.comment.c',
+                        'push': [
+                            {'meta_scope': 'comment.block.c'},
+                            {'match': '\\*/', 'pop': True},
+                        ],
+                    },
+                    {
+                        'match': '//',
+                        'push': [
+                            {'meta_scope': 'comment.line.double-slash.c'},
+                            {'match': '$\\n?', 'pop': True},
+                        ],
+                    },
+                ],
+                'string': [
+                    {'meta_include_prototype': False},
+                    {'meta_scope': 'string.quoted.double.c'},
+                    {'match': '"', 'pop': True},
+                ],
+            },
+        })
+
+    def _scopes(self, document):
+        """Return the scopes of the specified SyntaxDocument's tokens.
+
+        return list<tuple<str, str>> - Pairs consisting of the text of
+            each scope run and its scope.
+        """
+        text = document.text()
+        return [
+            (text[region.begin():region.end()], scope)
+            for region, scope in document.scope_runs()]
+
+    def test_tokenize(self):
+        """Test SyntaxDefinition tokenization."""
+        document = SyntaxDocument(
+            self._syntax(), 'int x; "/*" /* a\n b */ // c\n')
+        self.assertEqual(
+            self._scopes(document),
+            [
+                ('int', 'source.c storage.type.c '),
+                (' ', 'source.c '),
+                ('x', 'source.c variable.c '),
+                ('; ', 'source.c '),
+                ('"',
+                 'source.c string.quoted.double.c '
+                 'punctuation.definition.string.begin.c '),
+                ('/*"', 'source.c string.quoted.double.c '),
+                (' ', 'source.c '),
+                ('/*',
+                 'source.c comment.block.c '
+                 'punctuation.definition.comment.c '),
+                (' a\n b */', 'source.c comment.block.c '),
+                (' ', 'source.c '),
+                ('// c\n', 'source.c comment.line.double-slash.c '),
+            ])
+
+    def test_replace_lines(self):
+        """Test SyntaxDocument.replace_lines()."""
+        syntax = self._syntax()
+        text = ''.join('int x{0};\n'.format(i) for i in range(100))
+        document = SyntaxDocument(syntax, text)
+        self.assertEqual(document.replace_lines(10, 11, 'int y;\n'), 2)
+        self.assertEqual(document.replace_lines(20, 21, '/* a\n'), 81)
+        self.assertEqual(document.replace_lines(30, 31, 'b */\n'), 71)
+        self.assertEqual(document.replace_lines(40, 42, 'int z;'), 1)
+        expected = SyntaxDocument(syntax, document.text())
+        self.assertEqual(document.scope_runs(), expected.scope_runs())
+
+    def test_set(self):
+        """Test "set", "meta_content_scope", "clear_scopes", and flags."""
+        syntax = SyntaxDefinition({
+            'scope': 'source.c',
+            'contexts': {
+                'main': [
+                    {'match': '(?i)\\bint\\b', 'scope': 'storage.type.c'},
+                    {
+                        'match': '\\{',
+                        'scope': 'punctuation.section.block.begin.c',
+                        'push': 'block',
+                    },
+                ],
+                'block': [
+                    {'meta_scope': 'meta.block.c'},
+                    {
+                        'match': '\\}',
+                        'scope': 'punctuation.section.block.end.c',
+                        'pop': True,
+                    },
+                    {
+                        'match': '\\bfn\\b',
+                        'scope': 'storage.type.function.c',
+                        'push': 'function-name',
+                    },
+                ],
+                'function-name': [
+                    {'meta_scope': 'meta.function.name.c'},
+                    {
+                        'match': '\\w+',
+                        'scope': 'entity.name.function.c',
+                        'set': 'function-body',
+                    },
+                ],
+                'function-body': [
+                    {'clear_scopes': 1},
+                    {'meta_scope': 'meta.function.c'},
+                    {'meta_content_scope': 'meta.function.body.c'},
+                    {'match': ';', 'pop': True},
+                ],
+            },
+        })
+        document = SyntaxDocument(syntax, 'INT x; { fn foo bar; }\n')
+        self.assertEqual(
+            self._scopes(document),
+            [
+                ('INT', 'source.c storage.type.c '),
+                (' x; ', 'source.c '),
+                ('{',
+                 'source.c meta.block.c punctuation.section.block.begin.c '),
+                (' ', 'source.c meta.block.c '),
+                ('fn',
+                 'source.c meta.block.c meta.function.name.c '
+                 'storage.type.function.c '),
+                (' ', 'source.c meta.block.c meta.function.name.c '),
+                ('foo', 'source.c meta.function.c entity.name.function.c '),
+                (' bar', 'source.c meta.function.c meta.function.body.c '),
+                (';', 'source.c meta.function.c '),
+                (' ', 'source.c meta.block.c '),
+                ('}',
+                 'source.c meta.block.c punctuation.section.block.end.c '),
+                ('\n', 'source.c '),
+            ])
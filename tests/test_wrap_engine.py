@@ -0,0 +1,143 @@
+import re
+import unittest
+
+from WrapAsYouType.scope_selector import ScopeSelector
+from WrapAsYouType.text_buffer import Region
+from WrapAsYouType.text_buffer import Settings
+from WrapAsYouType.text_buffer import TextBuffer
+from WrapAsYouType.wrap_engine import WrapEngine
+
+
+class TestWrapEngine(unittest.TestCase):
+    """Test WrapEngine on TextBuffers, independently of any View."""
+
+    def _text_buffer(self, text):
+        """Return a TextBuffer for the specified C++ code.
+
+        The lines that start with "//" have the scope of a C++ line
+        comment, and the other lines have the scope of C++ source code.
+        The wrap width is 30.
+        """
+        scope_runs = []
+        for match in re.finditer(r'[^\n]*\n', text):
+            if match.group().startswith('//'):
+                scope = 'source.c++ comment.line.double-slash.c '
+            else:
+                scope = 'source.c++ '
+            scope_runs.append((Region(match.start(), match.end()), scope))
+        settings = Settings({
+            'tab_size': 4,
+            'wrap_as_you_type_sections': [{
+                'line_start': '// ',
+                'selector': 'comment.line',
+            }],
+            'wrap_width': 30,
+        })
+        return TextBuffer(text, settings, scope_runs)
+
+    def _reflow(self, text):
+        """Return the result of reflowing all of the specified text."""
+        text_buffer = self._text_buffer(text)
+        edits = WrapEngine(text_buffer).reflow_edits(
+            [Region(0, text_buffer.size())])
+        for replace_region, replacement_str in reversed(edits):
+            text = (
+                text[:replace_region.begin()] + replacement_str +
+                text[replace_region.end():])
+        return text
+
+    def test_reflow(self):
+        """Test WrapEngine.reflow_edits()."""
+        self.assertEqual(
+            self._reflow(
+                'int x;\n'
+                '// alpha beta gamma delta epsilon zeta eta theta\n'
+                '// iota\n'
+                '// kappa\n'
+                'int y;\n'),
+            'int x;\n'
+            '// alpha beta gamma delta\n'
+            '// epsilon zeta eta theta iota\n'
+            '// kappa\n'
+            'int y;\n')
+        self.assertEqual(
+            self._reflow('int x = 1; int y = 2; int z = 3; int w = 4;\n'),
+            'int x = 1; int y = 2; int z = 3; int w = 4;\n')
+
+    def test_audit(self):
+        """Test WrapEngine.gen_audit()."""
+        text_buffer = self._text_buffer(
+            '// alpha beta\n'
+            '// gamma\n'
+            'int x;\n'
+            '// alpha beta gamma delta epsilon\n'
+            'int y;\n'
+            '// alpha beta gamma delta\n'
+            '// epsilon\n')
+        results = list(WrapEngine(text_buffer).gen_audit())
+        self.assertEqual(
+            [(result['row'], result['problem']) for result in results],
+            [(0, 'under_filled'), (3, 'over_width'), (5, None)])
+
+    def test_may_need_reflow(self):
+        """Test WrapEngine.may_need_reflow()."""
+        engine = WrapEngine(self._text_buffer(''))
+        self.assertFalse(
+            engine.may_need_reflow(
+                'int x;\n'
+                '// alpha beta gamma delta\n'
+                '// epsilon zeta eta theta iota\n'
+                '// kappa\n'
+                'int y;\n'))
+        self.assertTrue(
+            engine.may_need_reflow(
+                '// alpha beta gamma delta epsilon zeta\n'))
+        self.assertTrue(engine.may_need_reflow('// alpha\n// beta\n'))
+        self.assertFalse(engine.may_need_reflow('// alpha\n    // beta\n'))
+        self.assertTrue(engine.may_be_in_paragraph('  // alpha'))
+        self.assertFalse(engine.may_be_in_paragraph('//'))
+        self.assertFalse(engine.may_be_in_paragraph('int x;'))
+
+    def test_paragraph_regions(self):
+        """Test WrapEngine.paragraph_regions()."""
+        text = (
+            '// alpha\n'
+            '// beta\n'
+            'int x;\n'
+            '// gamma\n'
+            '// delta\n'
+            '//\n'
+            '// epsilon\n')
+        text_buffer = self._text_buffer(text)
+        engine = WrapEngine(text_buffer)
+        beta_point = text.index('beta')
+        gamma_point = text.index('gamma')
+        self.assertEqual(
+            engine.paragraph_regions([Region(beta_point, beta_point)]),
+            [Region(0, text.index('\nint'))])
+        self.assertEqual(
+            engine.paragraph_regions([Region(gamma_point, gamma_point)]),
+            [Region(text.index('// gamma'), text.index('\n//\n'))])
+
+    def test_scope_selector(self):
+        """Test ScopeSelector.score."""
+        scope = (
+            'source.c++ comment.block.c '
+            'punctuation.definition.comment.begin.c ')
+        self.assertGreater(ScopeSelector.score(scope, 'comment.block'), 0)
+        self.assertGreater(ScopeSelector.score(scope, 'source comment'), 0)
+        self.assertGreater(
+            ScopeSelector.score(scope, 'string, comment.block'), 0)
+        self.assertEqual(ScopeSelector.score(scope, 'comment source'), 0)
+        self.assertEqual(ScopeSelector.score(scope, 'comment.line'), 0)
+        self.assertEqual(
+            ScopeSelector.score(
+                scope,
+                'comment.block - (comment.block.documentation | '
+                'punctuation.definition.comment.begin)'),
+            0)
+        self.assertGreater(
+            ScopeSelector.score(
+                'source.c++ comment.line.double-slash.c ',
+                'comment.line.double-slash'),
+            0)
@@ -0,0 +1,319 @@
+import bisect
+import re
+import sys
+
+if sys.version_info[0] >= 3:
+    from .scope_selector import ScopeSelector
+else:
+    from scope_selector import ScopeSelector
+
+try:
+    import sublime
+except ImportError:
+    # We are running outside of Sublime Text
+    sublime = None
+
+
+class PlainRegion(object):
+    """A pure-Python equivalent of sublime.Region.
+
+    This provides the subset of the Region API that WrapAsYouType uses,
+    for use when Sublime Text is not available.  Use the Region name
+    defined in this module rather than referring to PlainRegion
+    directly, so that we use sublime.Region when it is available.
+    """
+
+    __slots__ = ('a', 'b')
+
+    def __init__(self, a, b=None):
+        self.a = a
+        if b is None:
+            self.b = a
+        else:
+            self.b = b
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, PlainRegion) and
+            self.a == other.a and self.b == other.b)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.a, self.b))
+
+    def __len__(self):
+        return self.size()
+
+    def __repr__(self):
+        return u'({0:d}, {1:d})'.format(self.a, self.b)
+
+    def begin(self):
+        return min(self.a, self.b)
+
+    def end(self):
+        return max(self.a, self.b)
+
+    def size(self):
+        return abs(self.b - self.a)
+
+    def empty(self):
+        return self.a == self.b
+
+    def contains(self, x):
+        if isinstance(x, PlainRegion):
+            return self.begin() <= x.begin() and x.end() <= self.end()
+        else:
+            return self.begin() <= x <= self.end()
+
+    def cover(self, region):
+        if self.a > self.b:
+            return PlainRegion(
+                max(self.a, region.end()), min(self.b, region.begin()))
+        else:
+            return PlainRegion(
+                min(self.a, region.begin()), max(self.b, region.end()))
+
+
+if sublime is not None:
+    Region = sublime.Region
+    score_selector = sublime.score_selector
+else:
+    Region = PlainRegion
+    score_selector = ScopeSelector.score
+
+
+class Settings(object):
+    """A pure-Python equivalent of sublime.Settings.
+
+    Settings stores settings in a dictionary.  Like sublime.Settings,
+    it calls every function passed to add_on_change whenever any of the
+    settings changes.
+    """
+
+    # Private attributes:
+    #
+    # dict<str, list<() -> void>> _listeners - A map from each key passed to
+    #     add_on_change to the functions passed with that key.
+    # dict<str, object> _values - A map from each setting to its value.
+
+    __slots__ = ('_listeners', '_values')
+
+    def __init__(self, values=None):
+        """Initialize the settings to the values in the specified dict."""
+        self._values = dict(values or {})
+        self._listeners = {}
+
+    def get(self, name, default=None):
+        return self._values.get(name, default)
+
+    def has(self, name):
+        return name in self._values
+
+    def set(self, name, value):
+        self._values[name] = value
+        self._notify()
+
+    def erase(self, name):
+        self._values.pop(name, None)
+        self._notify()
+
+    def _notify(self):
+        """Call all of the functions passed to add_on_change."""
+        for listeners in list(self._listeners.values()):
+            for listener in listeners:
+                listener()
+
+    def add_on_change(self, key, func):
+        self._listeners.setdefault(key, []).append(func)
+
+    def clear_on_change(self, key):
+        self._listeners.pop(key, None)
+
+
+class TextBuffer(object):
+    """An in-memory text buffer that WrapEngine can operate on.
+
+    WrapEngine does not depend on Sublime Text.  Instead, it operates on
+    a "text buffer": an object that provides the following subset of
+    the View API: size, substr, line, full_line, rowcol, text_point,
+    scope_name, sel, get_regions, settings, window, and change_count.
+    Of the region keys that the text buffer passes to get_regions,
+    WrapEngine only uses 'wrap_as_you_type_explicit_line_break', whose
+    regions are the line breaks the user entered explicitly.  A Sublime
+    View is one such text buffer, as are ViewSnapshot and ViewCopy.
+
+    TextBuffer implements the text buffer protocol for text that is not
+    open in Sublime, e.g. text read from a file.  The caller supplies
+    the scopes of the characters as "scope runs": ranges of characters
+    that have the same scope, as returned by
+    View.extract_tokens_with_scopes.  Like a ViewCopy, a TextBuffer is
+    read-only, and its sel() method returns a single selection cursor at
+    the beginning of the text.
+    """
+
+    # Private attributes:
+    #
+    # list<Region> _explicit_line_breaks - The regions for the
+    #     'wrap_as_you_type_explicit_line_break' region key.
+    # list<int> _line_begins - The positions of the beginnings of the lines,
+    #     in order.
+    # tuple<int, int, str> _run - The beginning, end, and scope of the scope
+    #     run that contains the point most recently passed to scope_name, if
+    #     any.  We cache this because consecutive calls to scope_name tend to
+    #     be for nearby points.  This is None if there is no such run.
+    # list<int> _scope_begins - The beginnings of the scope runs, in order,
+    #     followed by the end of the last run.
+    # list<str> _scopes - The scopes of the scope runs.  This is parallel to
+    #     _scope_begins, excluding its last element.
+    # Settings _settings - The settings.
+    # str _text - The text.
+    # object _window - The value to return from window().
+
+    def __init__(
+            self, text, settings, scope_runs=None, explicit_line_breaks=None,
+            window=None):
+        """Initialize the buffer.
+
+        str text - The text.
+        Settings settings - The settings, e.g. a Settings or a
+            sublime.Settings object.
+        list<tuple<Region, str>> scope_runs - The scopes of the
+            characters, formatted like the return value of
+            View.extract_tokens_with_scopes.  The runs must be in order
+            and non-overlapping, but they need not cover all of the
+            text.  The scope of a character that is not in any run is
+            ''.  If this is None, all of the characters have the scope
+            ''.
+        list<Region> explicit_line_breaks - The line breaks the user
+            entered explicitly, as described in the class comment.
+        object window - The value to return from window(), e.g. a
+            sublime.Window in which to display error messages.
+        """
+        self._text = text
+        self._settings = settings
+        self._window = window
+        self._explicit_line_breaks = list(explicit_line_breaks or [])
+        self._line_begins = [0]
+        self._line_begins.extend(
+            match.end() for match in re.finditer('\n', text))
+        self._run = None
+        self._scope_begins, self._scopes = self._scope_run_list(
+            scope_runs or [])
+
+    def _scope_run_list(self, scope_runs, begin=0):
+        """Return the values for _scope_begins and _scopes.
+
+        This fills in the gaps between the specified runs with runs
+        whose scope is ''.
+
+        list<tuple<Region, str>> scope_runs - The runs, formatted like
+            the return value of View.extract_tokens_with_scopes.
+        int begin - The position of the beginning of the first gap.
+        return tuple<list<int>, list<str>> - A pair consisting of the
+            beginnings of the runs, followed by the end of the last run,
+            and the scopes of the runs.
+        """
+        begins = []
+        scopes = []
+        end = begin
+        for region, scope in scope_runs:
+            if region.begin() > end:
+                begins.append(end)
+                scopes.append('')
+            begins.append(region.begin())
+            scopes.append(scope)
+            end = region.end()
+        begins.append(end)
+        return (begins, scopes)
+
+    def _run_scope(self, point, begins, scopes):
+        """Return the scope of "point" in the specified scope runs.
+
+        This updates _run to the run containing "point".
+
+        int point - The position.
+        list<int> begins - The beginnings of the runs, followed by the
+            end of the last run, as in _scope_begins.
+        list<str> scopes - The scopes of the runs, as in _scopes.
+        return str - The scope, or None if "point" is not in any of the
+            runs.
+        """
+        run = self._run
+        if run is not None and run[0] <= point < run[1]:
+            return run[2]
+        index = bisect.bisect_right(begins, point) - 1
+        if 0 <= index < len(scopes):
+            self._run = (begins[index], begins[index + 1], scopes[index])
+            return scopes[index]
+        else:
+            return None
+
+    def change_count(self):
+        return 0
+
+    def settings(self):
+        return self._settings
+
+    def window(self):
+        return self._window
+
+    def sel(self):
+        return [Region(0, 0)]
+
+    def size(self):
+        return len(self._text)
+
+    def substr(self, x):
+        if not isinstance(x, Region):
+            return self._text[x:x + 1]
+        return self._text[max(0, x.begin()):max(0, x.end())]
+
+    def _row(self, point):
+        """Return the row containing the specified point."""
+        return bisect.bisect_right(self._line_begins, point) - 1
+
+    def _line_end(self, row):
+        """Return the end of the specified row, excluding any newline."""
+        if row + 1 < len(self._line_begins):
+            return self._line_begins[row + 1] - 1
+        else:
+            return len(self._text)
+
+    def line(self, point):
+        row = self._row(max(0, min(point, len(self._text))))
+        return Region(self._line_begins[row], self._line_end(row))
+
+    def full_line(self, point):
+        line_region = self.line(point)
+        if line_region.end() < len(self._text):
+            return Region(line_region.begin(), line_region.end() + 1)
+        else:
+            return line_region
+
+    def rowcol(self, point):
+        point = max(0, min(point, len(self._text)))
+        row = self._row(point)
+        return (row, point - self._line_begins[row])
+
+    def text_point(self, row, col):
+        row = max(0, min(row, len(self._line_begins) - 1))
+        return self._line_begins[row] + col
+
+    def row_count(self):
+        """Return the number of lines in the buffer."""
+        return len(self._line_begins)
+
+    def scope_name(self, point):
+        scope = self._run_scope(point, self._scope_begins, self._scopes)
+        if scope is None:
+            return ''
+        else:
+            return scope
+
+    def get_regions(self, key):
+        if key == 'wrap_as_you_type_explicit_line_break':
+            return list(self._explicit_line_breaks)
+        else:
+            return []
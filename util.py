@@ -1,7 +1,12 @@
 import numbers
 import re
+import sys
 
-import sublime
+try:
+    import sublime
+except ImportError:
+    # We are running outside of Sublime Text, as in WrapEngine
+    sublime = None
 
 
 class Util(object):
@@ -29,6 +34,31 @@ class Util(object):
         """
         return isinstance(obj, numbers.Integral) and not isinstance(obj, bool)
 
+    @staticmethod
+    def approximate_size(obj):
+        """Return the approximate number of bytes that "obj" occupies.
+
+        This includes the sizes of the elements of any lists, tuples,
+        sets, and dicts (both keys and values), recursively, but not the
+        sizes of the attributes of other objects.  An object that is
+        reachable in multiple ways only counts once.
+        """
+        size = 0
+        visited_ids = set()
+        objs = [obj]
+        while objs:
+            cur_obj = objs.pop()
+            if id(cur_obj) in visited_ids:
+                continue
+            visited_ids.add(id(cur_obj))
+            size += sys.getsizeof(cur_obj)
+            if isinstance(cur_obj, dict):
+                objs.extend(cur_obj.keys())
+                objs.extend(cur_obj.values())
+            elif isinstance(cur_obj, (list, tuple, set, frozenset)):
+                objs.extend(cur_obj)
+        return size
+
     @staticmethod
     def is_all_whitespace(str_):
         """Return whether the specified string consists only of whitespace."""
@@ -47,6 +77,6 @@ class Util(object):
         if hasattr(window, 'status_message'):
             # Sublime 3
             window.status_message(message)
-        else:
+        elif sublime is not None:
             # Sublime 2
             sublime.status_message(message)
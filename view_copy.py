@@ -0,0 +1,151 @@
+import sys
+
+from sublime import Region
+
+if sys.version_info[0] >= 3:
+    from .text_buffer import TextBuffer
+else:
+    from text_buffer import TextBuffer
+
+
+class ViewCopy(TextBuffer):
+    """An in-memory copy of the contents of a View.
+
+    ViewCopy provides the same subset of the View API as ViewSnapshot,
+    but rather than reading from the View on demand, it copies the
+    View's text up front, so that operations such as line, substr, and
+    rowcol do not need to query the View.  Where possible, it fetches
+    the scopes for many lines at a time, using
+    View.extract_tokens_with_scopes.  This makes it suitable for
+    computing the word wrapping for an entire document, e.g. by
+    creating ViewSnapshots of the ViewCopy.  In other words, ViewCopy
+    is a TextBuffer whose text and scopes come from a View.
+
+    A ViewCopy is read-only.  Its sel() method returns a single
+    selection cursor at the beginning of the document, so that
+    computations that use the ViewCopy do not depend on the positions
+    of the View's actual selection cursors.  Like a ViewSnapshot, it
+    only reflects the View's contents as long as the View has not been
+    modified since the copy was created.  If the ViewCopy has to read
+    from the View after the View was modified, e.g. to fetch scopes,
+    change_count() returns None, so that results computed from the copy
+    are never mistaken for results for the View's current contents.
+    """
+
+    # Private attributes:
+    #
+    # int _change_count - The value of _view.change_count() when the copy was
+    #     created, or None if we read from _view after it was modified.
+    # dict<str, list<Region>> _regions - A map from each key we have passed to
+    #     get_regions to the resulting regions.
+    # dict<int, tuple<list<int>, list<str>>> _scope_chunks - A map from each
+    #     index i to the scopes of the characters in lines
+    #     i * _SCOPE_CHUNK_LINES through (i + 1) * _SCOPE_CHUNK_LINES - 1, as
+    #     returned by _view.extract_tokens_with_scopes, if we have fetched
+    #     them.  Each entry is a pair consisting of the beginnings of the runs
+    #     of characters with the same scope, in order, followed by the end of
+    #     the last run, and the scopes of the runs.
+    # View _view - The View.
+
+    # The number of lines for which we fetch the scopes at once
+    _SCOPE_CHUNK_LINES = 1000
+
+    def __init__(self, view, region_keys=()):
+        """Copy the specified View.
+
+        This must be called on the UI thread.
+
+        View view - The View.
+        list<str> region_keys - The keys whose regions to copy up front,
+            so that get_regions does not need to query the View for
+            them.
+        """
+        # Read the change count before the text, so that if the View is
+        # modified in between, the change count is out of date rather than
+        # the text
+        change_count = view.change_count()
+        TextBuffer.__init__(
+            self, view.substr(Region(0, view.size())), view.settings())
+        self._view = view
+        self._change_count = change_count
+        self._regions = dict(
+            (key, view.get_regions(key)) for key in region_keys)
+        self._scope_chunks = {}
+
+    def change_count(self):
+        """Return the View's change count at the time of the copy.
+
+        return int - The change count, or None if we had to read from the
+            View after it was modified, in which case the results of
+            operations on the copy may be inconsistent.
+        """
+        return self._change_count
+
+    def _check_current(self):
+        """Note whether the View was modified since the copy.
+
+        This should be called after reading anything from the View that
+        depends on its contents.  If the View is still unmodified, the
+        value we read is consistent with the copy.  Otherwise, we set
+        _change_count to None.
+        """
+        if self._view.change_count() != self._change_count:
+            self._change_count = None
+
+    def is_current(self):
+        """Return whether the View is unmodified since the copy."""
+        return self._view.change_count() == self._change_count
+
+    def id(self):
+        return self._view.id()
+
+    def command_history(self, index, modifying_only=False):
+        return self._view.command_history(index, modifying_only)
+
+    def window(self):
+        return self._view.window()
+
+    def scope_name(self, point):
+        view = self._view
+        if (not hasattr(view, 'extract_tokens_with_scopes') or
+                not 0 <= point < len(self._text)):
+            return self._view_scope_name(point)
+        run = self._run
+        if run is not None and run[0] <= point < run[1]:
+            return run[2]
+
+        chunk_index = self._row(point) // ViewCopy._SCOPE_CHUNK_LINES
+        chunk = self._scope_chunks.get(chunk_index)
+        if chunk is None:
+            first_row = chunk_index * ViewCopy._SCOPE_CHUNK_LINES
+            last_row = min(
+                first_row + ViewCopy._SCOPE_CHUNK_LINES,
+                len(self._line_begins)) - 1
+            begin = self._line_begins[first_row]
+            chunk = self._scope_run_list(
+                view.extract_tokens_with_scopes(
+                    Region(
+                        begin,
+                        self.full_line(self._line_begins[last_row]).end())),
+                begin)
+            self._check_current()
+            self._scope_chunks[chunk_index] = chunk
+
+        scope = self._run_scope(point, *chunk)
+        if scope is not None:
+            return scope
+        else:
+            return self._view_scope_name(point)
+
+    def _view_scope_name(self, point):
+        """Return _view.scope_name(point), noting whether _view is current.
+        """
+        scope = self._view.scope_name(point)
+        self._check_current()
+        return scope
+
+    def get_regions(self, key):
+        if key not in self._regions:
+            self._regions[key] = self._view.get_regions(key)
+            self._check_current()
+        return list(self._regions[key])
@@ -0,0 +1,217 @@
+import bisect
+import re
+import sys
+
+from sublime import Region
+
+if sys.version_info[0] >= 3:
+    from .text_buffer import Settings
+else:
+    from text_buffer import Settings
+
+
+class ExcerptBoundsError(Exception):
+    """Raised when a ViewExcerpt is asked about text it did not copy."""
+    pass
+
+
+class ViewExcerpt(object):
+    """An immutable in-memory copy of part of a View.
+
+    ViewExcerpt provides the same subset of the View API as
+    ViewSnapshot, but it copies everything up front: the text and the
+    scopes of a range of whole lines, the selection, the recent command
+    history, the regions for specified keys, and the settings that
+    WrapEngine uses.  Afterwards, it never accesses the View, except in
+    is_current().  This makes it safe to use from a worker thread while
+    the user continues to edit the View, e.g. as the View underlying a
+    ViewSnapshot.  Positions are the same as in the View.
+
+    Methods that would need text or scopes outside of the copied lines
+    raise an ExcerptBoundsError.  Clients that catch it should redo
+    their computation using the View itself, on the UI thread.
+    """
+
+    # Private attributes:
+    #
+    # int _begin - The position of the beginning of the copied lines.
+    # int _change_count - The value of _view.change_count() when we created
+    #     the excerpt.
+    # dict<int, tuple<str, dict<str, object>, str>> _command_history - A map
+    #     from each index we copied to the value of _view.command_history for
+    #     that index.
+    # int _end - The position of the end of the copied lines, excluding any
+    #     newline that follows them.
+    # str _end_scope - The value of _view.scope_name(_end).
+    # int _first_row - The row of _begin.
+    # int _id - The value of _view.id().
+    # list<int> _line_begins - The positions of the beginnings of the copied
+    #     lines, in order.
+    # tuple<int, int, str> _run - The beginning, end, and scope of the scope
+    #     run that contains the point most recently passed to scope_name, as
+    #     in TextBuffer._run.
+    # dict<str, list<Region>> _regions - A map from each region key we copied
+    #     to the result of _view.get_regions.
+    # list<int> _scope_begins - The beginnings of the runs of characters with
+    #     the same scope, in order, followed by the end of the last run.
+    # list<str> _scopes - The scopes of the runs.  This is parallel to
+    #     _scope_begins, excluding its last element.
+    # list<Region> _selection - The selection.
+    # Settings _settings - Copies of the settings in _SETTINGS.
+    # int _size - The value of _view.size().
+    # str _text - The copied lines.
+    # View _view - The View.
+    # Window _window - The value of _view.window().
+
+    # The names of the settings we copy, i.e. the settings that WrapEngine
+    # obtains from the View rather than from its SettingsParser
+    _SETTINGS = (
+        'auto_indent', 'rulers', 'syntax', 'tab_size',
+        'translate_tabs_to_spaces', 'wrap_as_you_type_enter_extends_section',
+        'wrap_width')
+
+    def __init__(self, view, region, region_keys=()):
+        """Copy the specified lines and state from the View.
+
+        This must be called on the UI thread.
+
+        View view - The View.
+        Region region - The region whose lines to copy.
+        Iterable<str> region_keys - The keys whose regions to copy.
+        """
+        self._view = view
+        self._id = view.id()
+        self._window = view.window()
+        self._change_count = view.change_count()
+        self._size = view.size()
+        self._selection = [Region(r.a, r.b) for r in view.sel()]
+        self._command_history = dict(
+            (index, view.command_history(index)) for index in (0, 1))
+        self._regions = dict(
+            (key, view.get_regions(key)) for key in region_keys)
+        settings = view.settings()
+        self._settings = Settings(
+            dict((name, settings.get(name)) for name in ViewExcerpt._SETTINGS))
+
+        self._begin = view.line(region.begin()).begin()
+        self._end = view.line(region.end()).end()
+        self._first_row = view.rowcol(self._begin)[0]
+        self._text = view.substr(Region(self._begin, self._end))
+        self._line_begins = [self._begin]
+        self._line_begins.extend(
+            self._begin + match.end()
+            for match in re.finditer('\n', self._text))
+
+        self._run = None
+        self._scope_begins = []
+        self._scopes = []
+        if hasattr(view, 'extract_tokens_with_scopes'):
+            runs = view.extract_tokens_with_scopes(
+                Region(self._begin, self._end))
+            for run_region, scope in runs:
+                self._scope_begins.append(run_region.begin())
+                self._scopes.append(scope)
+        else:
+            # Sublime Text 3
+            for point in range(self._begin, self._end):
+                scope = view.scope_name(point)
+                if not self._scopes or scope != self._scopes[-1]:
+                    self._scope_begins.append(point)
+                    self._scopes.append(scope)
+        self._scope_begins.append(self._end)
+        self._end_scope = view.scope_name(self._end)
+
+    def change_count(self):
+        """Return the View's change count at the time of the excerpt."""
+        return self._change_count
+
+    def is_current(self):
+        """Return whether the View is unmodified since the excerpt."""
+        return self._view.change_count() == self._change_count
+
+    def id(self):
+        return self._id
+
+    def settings(self):
+        return self._settings
+
+    def window(self):
+        return self._window
+
+    def command_history(self, index, modifying_only=False):
+        if modifying_only or index not in self._command_history:
+            raise ExcerptBoundsError(
+                'The command history entry was not copied')
+        return self._command_history[index]
+
+    def sel(self):
+        return list(self._selection)
+
+    def get_regions(self, key):
+        if key not in self._regions:
+            raise ExcerptBoundsError('The regions were not copied')
+        return list(self._regions[key])
+
+    def size(self):
+        return self._size
+
+    def _check_bounds(self, begin, end):
+        """Raise ExcerptBoundsError unless we copied begin through end."""
+        if begin < self._begin or end > self._end:
+            raise ExcerptBoundsError('The text was not copied')
+
+    def substr(self, x):
+        if not isinstance(x, Region):
+            return self.substr(Region(x, x + 1))
+        begin = max(0, x.begin())
+        end = min(x.end(), self._size)
+        if begin >= end:
+            return ''
+        self._check_bounds(begin, end)
+        return self._text[begin - self._begin:end - self._begin]
+
+    def _row_index(self, point):
+        """Return the index in _line_begins of the line with "point"."""
+        point = max(0, min(point, self._size))
+        self._check_bounds(point, point)
+        return bisect.bisect_right(self._line_begins, point) - 1
+
+    def line(self, point):
+        index = self._row_index(point)
+        if index + 1 < len(self._line_begins):
+            end = self._line_begins[index + 1] - 1
+        else:
+            end = self._end
+        return Region(self._line_begins[index], end)
+
+    def full_line(self, point):
+        line_region = self.line(point)
+        if line_region.end() < self._size:
+            return Region(line_region.begin(), line_region.end() + 1)
+        else:
+            return line_region
+
+    def rowcol(self, point):
+        index = self._row_index(point)
+        return (
+            self._first_row + index,
+            max(0, min(point, self._size)) - self._line_begins[index])
+
+    def text_point(self, row, col):
+        index = row - self._first_row
+        if not 0 <= index < len(self._line_begins):
+            raise ExcerptBoundsError('The row was not copied')
+        return self._line_begins[index] + col
+
+    def scope_name(self, point):
+        run = self._run
+        if run is not None and run[0] <= point < run[1]:
+            return run[2]
+        self._check_bounds(point, point)
+        if point == self._end:
+            return self._end_scope
+        index = bisect.bisect_right(self._scope_begins, point) - 1
+        self._run = (
+            self._scope_begins[index], self._scope_begins[index + 1],
+            self._scopes[index])
+        return self._scopes[index]
@@ -0,0 +1,351 @@
+import sys
+
+if sys.version_info[0] >= 3:
+    from .text_buffer import Region
+else:
+    from text_buffer import Region
+
+
+class ViewSnapshot(object):
+    """A copy-on-write snapshot of a View's contents.
+
+    ViewSnapshot provides the subset of the View API that WrapFixer uses
+    to compute word wrapping fixup: size, substr, line, full_line,
+    rowcol, text_point, scope_name, sel, get_regions, command_history,
+    settings, and window.  It reads lazily from the View, so creating a
+    snapshot does not copy the View's contents.  Edits are applied
+    using apply_edit, which alters the snapshot rather than the View.
+    This makes it possible to compute a sequence of edits off of the UI
+    thread, and to perform them later, or to combine many edits into a
+    single edit, as in net_edit().
+
+    A ViewSnapshot only reflects the View's contents as long as the
+    View has not been modified since the snapshot was created, i.e. as
+    long as is_current() returns True.  Otherwise, the results of its
+    methods are unspecified, and clients should discard any results
+    they computed using the snapshot.
+
+    The scope of a character that was added using apply_edit is taken
+    to be the scope of a nearby character in the View: the first
+    character the edit replaced, or the character after the insertion
+    point.
+    """
+
+    # The snapshot keeps the edited text in a "window": a range of whole lines
+    # in the View, stored as a string.  Positions before the window are the
+    # same as in the View, and positions after the window are offset by the
+    # change in the window's length.
+    #
+    # Private attributes:
+    #
+    # int _begin - The beginning of the window, in the View's coordinates.
+    #     This is the beginning of a line.
+    # int _change_count - The value of _view.change_count() when the snapshot
+    #     was created.
+    # int _delta - The length of _text minus the length of the View's window.
+    #     This is the offset of the positions after the window.
+    # int _end - The end of the window, in the View's coordinates.  This is
+    #     the end of a line, excluding the newline character.
+    # int _focus - The index in _selection of the only selection Region that
+    #     sel() returns, as in focus_cursor, or None if sel() returns all of
+    #     them.
+    # list<int> _origins - The positions in the View of the characters whose
+    #     scopes we use for the characters in _text.  This is parallel to
+    #     _text.
+    # dict<str, list<Region>> _regions - A map from each key we have passed
+    #     to get_regions to the resulting regions, adjusted for the edits we
+    #     have applied.
+    # int _row_change - The number of newline characters in _text minus the
+    #     number of newline characters in the View's window.
+    # int _rows_before - The number of rows before the window.
+    # list<Region> _selection - The selection, adjusted for the edits we have
+    #     applied.
+    # int _size - The value of _view.size() when the snapshot was created.
+    # str _text - The contents of the window, after applying the edits.  This
+    #     is None if we have not applied any edits.
+    # View _view - The View.
+
+    def __init__(self, view):
+        self._view = view
+        self._change_count = view.change_count()
+        self._size = view.size()
+        self._selection = [Region(r.a, r.b) for r in view.sel()]
+        self._focus = None
+        self._regions = {}
+        self._text = None
+        self._begin = 0
+        self._end = 0
+        self._delta = 0
+        self._origins = []
+        self._row_change = 0
+        self._rows_before = 0
+
+    def change_count(self):
+        """Return the View's change count at the time of the snapshot."""
+        return self._change_count
+
+    def is_current(self):
+        """Return whether the View is unmodified since the snapshot."""
+        return self._view.change_count() == self._change_count
+
+    def id(self):
+        return self._view.id()
+
+    def settings(self):
+        return self._view.settings()
+
+    def command_history(self, index, modifying_only=False):
+        return self._view.command_history(index, modifying_only)
+
+    def window(self):
+        return self._view.window()
+
+    def sel(self):
+        if self._focus is None:
+            return list(self._selection)
+        else:
+            return [self._selection[self._focus]]
+
+    def focus_cursor(self, index):
+        """Restrict sel() to a single selection Region.
+
+        This makes it possible to use code that assumes there is a
+        single selection cursor to operate on each of several cursors in
+        turn.  apply_edit continues to adjust all of the selection
+        Regions.
+
+        int index - The index of the Region in the full selection, or
+            None to make sel() return all of the Regions.
+        """
+        self._focus = index
+
+    def size(self):
+        return self._size + self._delta
+
+    def _window_end(self):
+        """Return the end of the window, in the snapshot's coordinates."""
+        return self._end + self._delta
+
+    def _in_window(self, point):
+        """Return whether "point" is in the window, or at either end."""
+        return (
+            self._text is not None and
+            self._begin <= point <= self._window_end())
+
+    def _to_view_point(self, point):
+        """Return the position in the View of the specified point.
+
+        Assume that "point" is not strictly inside the window.
+        """
+        if self._text is not None and point >= self._end + self._delta:
+            return point - self._delta
+        else:
+            return point
+
+    def _from_view_region(self, region):
+        """Return the snapshot Region for the specified View Region.
+
+        Return the Region in the snapshot's coordinates that
+        corresponds to the specified Region, which is in the View's
+        coordinates, is not strictly inside the window, and may be
+        after it.
+        """
+        if self._text is not None and region.begin() >= self._end:
+            return Region(region.a + self._delta, region.b + self._delta)
+        else:
+            return region
+
+    def _extend_window(self, begin, end):
+        """Extend the window to include the specified range of points.
+
+        int begin - The beginning of the range, in the snapshot's
+            coordinates.
+        int end - The end of the range, in the snapshot's coordinates.
+        """
+        view = self._view
+        if self._text is None:
+            self._begin = view.line(begin).begin()
+            self._end = view.line(end).end()
+            self._text = view.substr(Region(self._begin, self._end))
+            self._origins = list(range(self._begin, self._end))
+            self._rows_before = view.rowcol(self._begin)[0]
+            return
+
+        if begin < self._begin:
+            new_begin = view.line(begin).begin()
+            self._text = (
+                view.substr(Region(new_begin, self._begin)) + self._text)
+            self._origins = (
+                list(range(new_begin, self._begin)) + self._origins)
+            self._begin = new_begin
+            self._rows_before = view.rowcol(new_begin)[0]
+        if end > self._window_end():
+            new_end = view.line(self._to_view_point(end)).end()
+            self._text += view.substr(Region(self._end, new_end))
+            self._origins += list(range(self._end, new_end))
+            self._end = new_end
+
+    def substr(self, x):
+        if not isinstance(x, Region):
+            return self.substr(Region(x, x + 1))
+        begin = max(0, x.begin())
+        end = min(x.end(), self.size())
+        if begin >= end:
+            return ''
+        if self._text is None:
+            return self._view.substr(Region(begin, end))
+
+        components = []
+        if begin < self._begin:
+            components.append(
+                self._view.substr(Region(begin, min(end, self._begin))))
+        window_end = self._window_end()
+        if begin < window_end and end > self._begin:
+            components.append(
+                self._text[
+                    max(begin, self._begin) - self._begin:
+                    min(end, window_end) - self._begin])
+        if end > window_end:
+            components.append(
+                self._view.substr(
+                    Region(
+                        max(begin, window_end) - self._delta,
+                        end - self._delta)))
+        return ''.join(components)
+
+    def line(self, point):
+        point = max(0, min(point, self.size()))
+        if self._in_window(point):
+            index = point - self._begin
+            start = self._text.rfind('\n', 0, index) + 1
+            end = self._text.find('\n', index)
+            if end < 0:
+                end = len(self._text)
+            return Region(self._begin + start, self._begin + end)
+        else:
+            return self._from_view_region(
+                self._view.line(self._to_view_point(point)))
+
+    def full_line(self, point):
+        line_region = self.line(point)
+        if line_region.end() < self.size():
+            return Region(line_region.begin(), line_region.end() + 1)
+        else:
+            return line_region
+
+    def rowcol(self, point):
+        point = max(0, min(point, self.size()))
+        if self._in_window(point):
+            index = point - self._begin
+            row = self._rows_before + self._text.count('\n', 0, index)
+            col = index - (self._text.rfind('\n', 0, index) + 1)
+            return (row, col)
+        elif self._text is not None and point > self._begin:
+            row, col = self._view.rowcol(self._to_view_point(point))
+            return (row + self._row_change, col)
+        else:
+            return self._view.rowcol(point)
+
+    def text_point(self, row, col):
+        if self._text is None or row < self._rows_before:
+            return self._view.text_point(row, col)
+        last_window_row = self._rows_before + self._text.count('\n')
+        if row > last_window_row:
+            return (
+                self._view.text_point(row - self._row_change, col) +
+                self._delta)
+
+        index = 0
+        for _ in range(row - self._rows_before):
+            index = self._text.index('\n', index) + 1
+        return self._begin + index + col
+
+    def scope_name(self, point):
+        if self._text is None or point < self._begin:
+            return self._view.scope_name(point)
+        elif point < self._end + self._delta:
+            return self._view.scope_name(self._origins[point - self._begin])
+        else:
+            return self._view.scope_name(point - self._delta)
+
+    def get_regions(self, key):
+        if key not in self._regions:
+            self._regions[key] = [
+                self._from_view_region(region)
+                for region in self._view.get_regions(key)]
+        return list(self._regions[key])
+
+    def net_edit(self):
+        """Return a single edit equivalent to the edits we applied.
+
+        return tuple<Region, str> - A pair consisting of the Region in
+            the View to replace and the replacement text.  This is None
+            if the edits did not alter the View's text.
+        """
+        if self._text is None:
+            return None
+        old_text = self._view.substr(Region(self._begin, self._end))
+        new_text = self._text
+        if old_text == new_text:
+            return None
+
+        max_length = min(len(old_text), len(new_text))
+        prefix_length = 0
+        while (prefix_length < max_length and
+                old_text[prefix_length] == new_text[prefix_length]):
+            prefix_length += 1
+        suffix_length = 0
+        while (suffix_length < max_length - prefix_length and
+                old_text[-suffix_length - 1] == new_text[-suffix_length - 1]):
+            suffix_length += 1
+        return (
+            Region(
+                self._begin + prefix_length,
+                self._end - suffix_length),
+            new_text[prefix_length:len(new_text) - suffix_length])
+
+    def _adjust_point(self, point, region, replacement_str):
+        """Return the position of "point" after the specified edit.
+
+        This mimics the way WrapFixer._perform_edit moves the selection
+        cursor.
+        """
+        if point <= region.begin():
+            return point
+        elif point <= region.end():
+            return region.begin() + len(replacement_str)
+        else:
+            return point - region.size() + len(replacement_str)
+
+    def apply_edit(self, region, replacement_str):
+        """Replace the text in "region" with replacement_str.
+
+        This alters the snapshot, but not the View.
+
+        Region region - The region to replace.
+        str replacement_str - The replacement text.
+        """
+        self._extend_window(region.begin(), region.end())
+        begin = region.begin() - self._begin
+        end = region.end() - self._begin
+        if begin < len(self._origins):
+            origin = self._origins[begin]
+        else:
+            origin = self._end
+        self._row_change += (
+            replacement_str.count('\n') - self._text.count('\n', begin, end))
+        self._text = self._text[:begin] + replacement_str + self._text[end:]
+        self._delta += len(replacement_str) - (end - begin)
+        self._origins[begin:end] = [origin] * len(replacement_str)
+
+        self._selection = [
+            Region(
+                self._adjust_point(r.a, region, replacement_str),
+                self._adjust_point(r.b, region, replacement_str))
+            for r in self._selection]
+        for key, regions in self._regions.items():
+            self._regions[key] = [
+                Region(
+                    self._adjust_point(r.a, region, replacement_str),
+                    self._adjust_point(r.b, region, replacement_str))
+                for r in regions]
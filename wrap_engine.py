@@ -0,0 +1,1685 @@
+import copy
+import re
+import sys
+import time
+
+if sys.version_info[0] >= 3:
+    from .settings_parser import SettingsParser
+    from .text_buffer import Region
+    from .text_buffer import score_selector
+    from .util import Util
+    from .view_snapshot import ViewSnapshot
+else:
+    from settings_parser import SettingsParser
+    from text_buffer import Region
+    from text_buffer import score_selector
+    from util import Util
+    from view_snapshot import ViewSnapshot
+
+
+class WrapEngine(object):
+    """The part of word wrapping fixup that does not depend on Sublime Text.
+
+    WrapEngine computes the edits for splitting lines that extend past
+    the wrap width, joining lines that are in the same paragraph, and
+    erasing the line breaks and indentation that the user appears to
+    have deleted.  Rather than operating on a View, it operates on a
+    "text buffer", as described in the comments for TextBuffer, and it
+    does not import the sublime module.  This makes it possible to run
+    it outside of Sublime Text, e.g. on a TextBuffer containing the text
+    of a file.  A View is one kind of text buffer.  WrapFixer extends
+    WrapEngine with the state it needs to perform word wrapping fixup as
+    the user edits a View.
+    """
+
+    # A number of variable names recur in the implementation of WrapEngine.
+    # The "indent" of a line is the whitespace on that line that precedes the
+    # line start under consideration.  The "i_line_start" (indent + line
+    # start) of a line is the result of appending the line start to the
+    # indent.  The "i_line_start_i" (indent + line start + indent) of a line
+    # is the i_line_start, followed by all of the subsequent whitespace on
+    # that line, up to the first non-whitespace character or the end of the
+    # line.
+    #
+    # Private attributes:
+    #
+    # dict<str, object> _continuation - The remaining work from the most
+    #     recent call to _gen_steady_state_edits(), if it stopped before
+    #     reaching a steady state.  This has the following entries: "point",
+    #     the position at which to resume; "section" and "line_start", the
+    #     arguments to pass to _gen_steady_state_edits().  It is None if there
+    #     is no remaining work, or if we already moved the work to
+    #     WrapFixer._continuations.
+    # SettingsParser _settings_parser - The parsed wrap_as_you_type_*
+    #     settings of _view.
+    # object _view - The text buffer we operate on, as described in the
+    #     comments for TextBuffer.  This is usually a View, a ViewSnapshot,
+    #     a ViewCopy, or a TextBuffer.
+
+    # A regular expression for stripping whitespace from the beginning and end
+    # of a string.  The result of the stripping is given by re.Match.group(1).
+    _STRIP_REGEX = re.compile(r'^\s*(\S.*\S|\S?)\s*$', re.DOTALL)
+
+    # A regular expression matching all of the whitespace at the end of the
+    # source string.  It matches the empty string if there is no such
+    # whitespace.
+    _TRAILING_WHITESPACE_REGEX = re.compile(r'\s*$')
+
+    # A regular expression matching the alphanumeric characters at the
+    # beginning of a word.  It matches the empty string if the word starts
+    # with some other character.
+    _WORD_PREFIX_REGEX = re.compile(r'\w*', re.UNICODE)
+
+    # Equivalent value is contractual
+    _WHITESPACE_REGEX = re.compile(r'\s*')
+
+    __slots__ = ('_continuation', '_settings_parser', '_view')
+
+    def __init__(self, view):
+        """Initialize the engine.
+
+        object view - The text buffer to operate on, as described in the
+            comments for TextBuffer.
+        """
+        self._view = view
+        self._continuation = None
+        self._settings_parser = SettingsParser(view)
+
+    def settings_parser(self):
+        """Return the SettingsParser for the settings of _view."""
+        return self._settings_parser
+
+    def for_buffer(self, view):
+        """Return a copy of this engine that operates on "view".
+
+        The copy shares our parsed settings, so this is cheaper than
+        constructing a new WrapEngine, which parses the settings again.
+        The settings of "view" should be the same as those of _view.
+
+        object view - The text buffer to operate on, as described in the
+            comments for TextBuffer.
+        return WrapEngine - The copy.
+        """
+        engine = copy.copy(self)
+        engine._view = view
+        engine._continuation = None
+        return engine
+
+    def _selection_point(self):
+        """Return the point of the selection cursor.
+
+        Return None if there is not a single, empty selection cursor.
+
+        return int - The point.
+        """
+        selection = self._view.sel()
+        if len(selection) == 1 and selection[0].empty():
+            return selection[0].begin()
+        else:
+            return None
+
+    def _add_width(self, width, char, tab_size):
+        """Return the resulting width after adding the specified character.
+
+        Return the width (number of columns) that results from appending
+        the specified character to a line of the specified width.
+        Assume that char is not a newline character.
+
+        Note that this method is conceptually faulty.  See the comments
+        for _width for details.
+
+        int width - The width of the line prior to adding "char".
+        str char - The character.
+        int tab_size - The number of columns per tab.
+        return int - The width after adding "char".
+        """
+        if char != '\t':
+            return width + 1
+        else:
+            return (width // tab_size) * tab_size + tab_size
+
+    def _width(self, line):
+        """Return the width of the specified line of text.
+
+        Return the width (number of columns) of the specified line of
+        text.  Assume that "line" does not contain any newline
+        characters.
+
+        Note that this method is conceptually faulty.  It assumes that
+        there is one character per Unicode code point, but this is not
+        always true, e.g. for Thai characters.  However, at the time of
+        writing, Sublime Text renders each Unicode code point as one
+        character, so the behavior of this method conforms to that of
+        Sublime.  See
+        https://github.com/SublimeTextIssues/Core/issues/663 .
+        """
+        tab_size = self._view.settings().get('tab_size')
+        width = 0
+        for char in line:
+            width = self._add_width(width, char, tab_size)
+        return width
+
+    def _advance_by_width(self, line, width):
+        """Return the character at column "width" of "line".
+
+        Return the index of the first character in the specified line of
+        text that is at or beyond the specified width (number of
+        columns).  For example, _advance_by_width('foo bar', 4) returns
+        4.  Assume that "line" does not contain any newline characters.
+
+        Note that this method is conceptually faulty.  See the comments
+        for _width for details.
+        """
+        tab_size = self._view.settings().get('tab_size')
+        width_traveled = 0
+        for i, char in enumerate(line):
+            if width_traveled >= width:
+                return i
+            width_traveled = self._add_width(width_traveled, char, tab_size)
+        return len(line)
+
+    def _wrap_width(self, section):
+        """Return the wrap width of the specified section.
+
+        If section['wrap_width'] is None, this method uses the
+        appropriate fallback.
+
+        dict<str, object> section - The section, formatted like the
+            elements of _settings_parser.sections.
+        return int - The wrap width.
+        """
+        if section['wrap_width'] is not None:
+            return section['wrap_width']
+        settings = self._view.settings()
+        wrap_width = settings.get('wrap_width')
+        if wrap_width:
+            return wrap_width
+        rulers = settings.get('rulers')
+        if rulers:
+            return rulers[0]
+        else:
+            return 80
+
+    def _prev_line_region(self, point):
+        """Return the Region containing the previous line.
+
+        Return the Region containing the line before the line that
+        contains "point", excluding newline characters, if any.
+
+        int point - The point.
+        return Region - The previous line region.
+        """
+        view = self._view
+        row = view.rowcol(point)[0]
+        if row > 0:
+            return view.line(view.text_point(row - 1, 0))
+        else:
+            return None
+
+    def _next_line_region(self, point):
+        """Return the Region containing the next line.
+
+        Return the Region containing the line after the line that
+        contains "point", excluding newline characters, if any.
+
+        int point - The point.
+        return Region - The next line region.
+        """
+        view = self._view
+        line_region = view.full_line(point)
+        if line_region.end() < view.size():
+            return view.line(line_region.end())
+        else:
+            return None
+
+    def _leading_whitespace(self, str_, start=0):
+        """Return the whitespace at the beginning of the specified string.
+
+        Return all of the whitespace at the beginning of str_[start:].
+        Return '' if there is no such whitespace.
+
+        str str_ - The string.
+        int start - The starting index.
+        return str - The leading whitespace.
+        """
+        return WrapEngine._WHITESPACE_REGEX.match(str_, start).group()
+
+    def _end_point_excluding_whitespace(self, str_, region):
+        """Return the latest point in "region" that is a whitespace character.
+
+        Return the point of (or rather, immediately before) the latest
+        character in "region" that is a whitespace character.  Return
+        region.end() if the last character is not a whitespace
+        character.  Return region.begin() if all of the characters are
+        whitespace characters.
+
+        str str_ - The value of _view.substr(region).
+        Region region - The region.
+        return int - The point.
+        """
+        match = WrapEngine._TRAILING_WHITESPACE_REGEX.search(str_)
+        return region.end() - match.end() + match.start()
+
+    def _section_indent(self, line, line_start):
+        """Return the whitespace at the beginning of "line" before line_start.
+
+        For example, _section_indent('   * Foo', ' * ') returns '  ',
+        because there are two spaces prior to the space-asterisk-space.
+        Assume that "line" does not contain any newline characters.
+        Return None if "line" does not start with whitespace followed by
+        line_start.  If line_start consists exclusively of whitespace,
+        so that there are multiple possible matches, return the shortest
+        possible match.
+
+        str line - The line of text to match.
+        str line_start - The line start.
+        return str - The whitespace before line_start.
+        """
+        line_indent = self._leading_whitespace(line)
+        if Util.is_all_whitespace(line_start):
+            index = line_indent.find(line_start)
+            if index >= 0:
+                return line_indent[:index]
+            else:
+                return None
+        else:
+            line_start_indent = self._leading_whitespace(line_start)
+            section_indent_length = len(line_indent) - len(line_start_indent)
+            if (line_indent.endswith(line_start_indent) and
+                    line[
+                        len(line_indent):
+                        section_indent_length + len(line_start)] ==
+                    line_start[len(line_start_indent):]):
+                return line_indent[:section_indent_length]
+            else:
+                return None
+
+    def _i_line_start_i(self, line, line_start):
+        """Return the i_line_start_i of the specified line.
+
+        str line - The line of text.
+        str line_start - The line start.
+        return str - The i_line_start_i.
+        """
+        indent = self._section_indent(line, line_start)
+        if indent is None:
+            return None
+        post_indent = self._leading_whitespace(
+            line, len(indent) + len(line_start))
+        return line[:len(indent) + len(line_start) + len(post_indent)]
+
+    def _fix_word_spans(self, raw_spans, str_):
+        """Fix errors in the results of applying "wrap_as_you_type_word_regex".
+
+        Return a list of word spans that is like raw_spans, but after
+        applying adjustments needed to make the results permissible for
+        "wrap_as_you_type_word_regex".  Per README.md,
+        "wrap_as_you_type_word_regex" may not produce non-empty words,
+        and it must produce words that cover all non-whitespace
+        characters.  If raw_spans does not meet these conditions,
+        _fix_word_spans attempts to produce similar results that do.
+        _fix_word_spans may warn the user of the error.
+
+        list<tuple<int, int>> raw_spans - The word spans produced by
+            "wrap_as_you_type_word_regex", formatted like the return
+            value of _word_spans.
+        str str_ - The string from which the words are taken.
+        return list<tuple<int, int>> - The adjusted word spans,
+            formatted like the return value of _word_spans.
+        """
+        # Remove zero-character words
+        non_empty_spans = [span for span in raw_spans if span[0] != span[1]]
+        warn = len(non_empty_spans) < len(raw_spans)
+
+        # Check each gap between adjacent words (and at the beginning and end
+        # of the string) for non-whitespace characters
+        spans = []
+        for i in range(0, len(non_empty_spans) + 1):
+            # Identify the gap
+            if i > 0:
+                gap_start_index = non_empty_spans[i - 1][1]
+            else:
+                gap_start_index = 0
+            if i < len(non_empty_spans):
+                gap_end_index = non_empty_spans[i][0]
+            else:
+                gap_end_index = len(str_)
+            gap = str_[gap_start_index:gap_end_index]
+
+            # Check for non-whitespace characters
+            match = WrapEngine._STRIP_REGEX.search(gap)
+            if match.start(1) < match.end(1):
+                # The gap has a non-whitespace character.  Add a word that
+                # covers the non-whitespace characters.
+                warn = True
+                spans.append((
+                    gap_start_index + match.start(1),
+                    gap_start_index + match.end(1)))
+
+            if i < len(non_empty_spans):
+                spans.append(non_empty_spans[i])
+
+        if warn:
+            raw_words = [str_[span[0]:span[1]] for span in raw_spans]
+            print(
+                u'WrapAsYouType error: The "wrap_as_you_type_word_regex" '
+                'setting is faulty, because on the string {0:s}, it yielded '
+                'either an empty word, or a gap between words that had '
+                'non-whitespace characters.  It produced the following words: '
+                '{1:s}.  WrapAsYouType has corrected for this, but you should '
+                'fix the setting.'.format(repr(str_.strip()), str(raw_words)))
+            Util.status_message(
+                self._view.window(),
+                'WrapAsYouType settings error; see console')
+        return spans
+
+    def _word_spans(self, str_):
+        """Return the locations of the words in str_.
+
+        Return the locations of the words in str_, based on the value of
+        _settings_parser.word_regex (and after applying any corrections
+        suggested by _fix_word_spans).
+
+        str str_ - The string to search.
+        return list<tuple<int, int>> - The positions of the words.  Each
+            element is a pair indicating the start and end indices of
+            the span (the index of the first character, and the index of
+            the position right after the last character).  The elements
+            are in order.
+        """
+        # Trim whitespace
+        match = WrapEngine._STRIP_REGEX.search(str_)
+        trimmed_str = match.group(1)
+        if not trimmed_str:
+            return []
+        trimmed_str_start_index = match.start(1)
+
+        # Compute the words
+        spans = []
+        for match in self._settings_parser.word_regex.finditer(trimmed_str):
+            spans.append((
+                trimmed_str_start_index + match.start(),
+                trimmed_str_start_index + match.end()))
+
+        # Fix any problems with the words
+        if (self._settings_parser.word_regex !=
+                SettingsParser.DEFAULT_WORD_REGEX):
+            return self._fix_word_spans(spans, str_)
+        else:
+            # Optimization: DEFAULT_WORD_REGEX is trustworthy, so don't bother
+            # calling _fix_word_spans
+            return spans
+
+    def _space_between(self, first_word, second_word):
+        """Return the space to use between the specified words.
+
+        Return the space to use between the specified words, as
+        suggested by _settings_parser.space_between_words.  The space is
+        a string consisting of whitespace characters.  It may be the
+        empty string ''.
+
+        str first_word - The word before the space.
+        str second_word - The word after the space.
+        return str - The space.
+        """
+        for item in self._settings_parser.space_between_words:
+            if ((item['first_word_regex'] is None or
+                    item['first_word_regex'].search(
+                        first_word) is not None) and
+                    (item['second_word_regex'] is None or
+                        item['second_word_regex'].search(
+                            second_word) is not None)):
+                return item['space']
+        return ' '
+
+    def _combine_extent(self, section, first_point, second_point):
+        """Return the furthest that we can combine a section.
+
+        Return the furthest point that we can combine first_point with
+        in the specified section, based on section['combining_selector']
+        and section['selector'], as we move from first_point to
+        second_point.  So if second_point > first_point, this is the
+        latest point that is no later than second_point that we can
+        combine with first_point, and vice versa if second_point <
+        first_point.  _combine_extent does not check whether first_point
+        matches the section (as in _point_matches_selector).
+
+        dict<str, object> section - The section, formatted like the
+            elements of _settings_parser.sections.
+        int first_point - The starting point.
+        int second_point - The ending point.
+        return int - The furthest point we can combine.
+        """
+        # Determine the range of points on which to check score_selector
+        view = self._view
+        if first_point >= second_point:
+            points = range(first_point - 1, second_point - 1, -1)
+        elif view.rowcol(second_point)[1] > 0:
+            points = range(first_point, second_point)
+        else:
+            # Special-case the first character of a line; see the comment below
+            points = range(first_point, second_point + 1)
+
+        prev_scope = None
+        for point in points:
+            scope = view.scope_name(point)
+            if scope == prev_scope:
+                # Optimization: Avoid relatively expensive calls to
+                # score_selector
+                continue
+
+            if (score_selector(scope, section['selector']) == 0 and
+                    (section['combining_selector'] is None or
+                        score_selector(
+                            scope, section['combining_selector']) == 0)):
+                if first_point >= second_point:
+                    return point + 1
+                elif view.rowcol(point)[1] > 0:
+                    return point
+                else:
+                    # Special-case the first character of a line.  In a typical
+                    # Sublime syntax file, a line-based scope (e.g. a
+                    # comment.line) includes the newline character at the end
+                    # of the line.  This does not seem quite proper to me, but
+                    # in any event it necessitates this special case.
+                    return point - 1
+            prev_scope = scope
+        return second_point
+
+    def _are_combined(self, section, first_point, second_point):
+        """Return whether we can combine the specified points.
+
+        Return whether we can combine second_point with first_point in
+        the specified section, based on section['combining_selector']
+        and section['selector'], by moving from first_point to
+        second_point.  _are_combined does not check whether first_point
+        matches the section (as in _point_matches_selector).
+
+        dict<str, object> section - The section, formatted like the
+            elements of _settings_parser.sections.
+        int first_point - The starting point.
+        int second_point - The ending point.
+        return bool - Whether we can combine second_point with
+            first_point.
+        """
+        return (
+            self._combine_extent(section, first_point, second_point) ==
+            second_point)
+
+    def _prev_char_scope(self, point, line_region):
+        """Return the scope associated with the character before "point".
+
+        Return the scope associated with the character before "point",
+        as in _view.scope_name, but if that is a line break character,
+        return None instead.
+
+        In a typical Sublime syntax file, a line-based scope (e.g. a
+        comment.line) includes the newline character at the end of the
+        line.  This does not seem quite proper to me, but in any event
+        it requires special behavior in _matches_selector and
+        _point_matches_selector concerning the beginning of the line.
+        This is why _prev_char_scope returns None at the beginning of a
+        line.
+
+        int point - The point.
+        Region line_region - The value of _view.line(point).
+        return str - The scope.
+        """
+        if point > line_region.begin():
+            return self._view.scope_name(point - 1)
+        else:
+            return None
+
+    def _matches_selector(self, section, prev_char_scope, next_char_scope):
+        """Return whether a position with the given scopes matches "section".
+
+        Return whether a position with the specified preceding and
+        succeeding scopes matches "section", based on
+        section['selector'].
+
+        We should conceive of a match as being performed not on a
+        character, but on the point between two characters.  See the
+        comments for _point_matches_selector for more information.
+
+        dict<str, object> section - The section, formatted like the
+            elements of _settings_parser.sections.
+        str prev_char_scope - The result of calling _prev_char_scope on
+            the position.
+        str next_char_scope - The scope of the succeeding character, as
+            returned by _view.scope_name.
+        return bool - Whether the position matches.
+        """
+        return (
+            (prev_char_scope is not None and
+                score_selector(
+                    prev_char_scope, section['selector']) > 0) or
+            score_selector(next_char_scope, section['selector']) > 0)
+
+    def _point_matches_selector(self, section, point, line_region):
+        """Return whether the specified point matches "section".
+
+        Return whether the specified point matches "section", based on
+        section['selector'].
+
+        We should conceive of a match as being performed not on a
+        character, but on the point between two characters.  For
+        example, in C++ block comments, a selection cursor that is
+        immediately before the /* is in the block comment, even though
+        the preceding character is not.  Likewise, a selection cursor
+        that is immediately after the */ is in the block comment, even
+        though the succeeding character is not.
+
+        dict<str, object> section - The section, formatted like the
+            elements of _settings_parser.sections.
+        int point - The position.
+        Region line_region - The value of _view.line(point).
+        return bool - Whether the position matches.
+        """
+        return self._matches_selector(
+            section, self._prev_char_scope(point, line_region),
+            self._view.scope_name(point))
+
+    def _first_line_paragraph(self, line_text):
+        """Return the _settings_parser.paragraphs element matching line_text.
+
+        Return the first element in _settings_parser.paragraphs whose
+        "first_line_regex" entry matches the specified line, if any.
+
+        str line_text - The line's text - the contents of the line after
+            removing the line start and any leading and trailing
+            whitespace.
+        return dict<str, object> - The paragraph element.
+        """
+        for paragraph in self._settings_parser.paragraphs:
+            if paragraph['first_line_regex'].search(line_text) is not None:
+                return paragraph
+        return None
+
+    def _paragraph_indent(self, line_text):
+        """Return the relative indentation of the line after "line".
+
+        Return the indentation of the line after the specified line,
+        relative to the indentation of the specified line, if the
+        subsequent line is in the same paragraph.  Return None instead
+        if the line is part of a single-line paragraph, as in the
+        "single_line" entry of elements of the
+        "wrap_as_you_type_paragraphs" setting.
+
+        str line_text - The line's text - the contents of the line after
+            removing the line start and any leading and trailing
+            whitespace.
+        return str - The indentation.  This consists exclusively of
+            whitespace characters.
+        """
+        for paragraph in self._settings_parser.paragraphs:
+            match = paragraph['first_line_regex'].search(line_text)
+            if match is not None:
+                if paragraph['single_line']:
+                    return None
+
+                indent_group = paragraph['indent_group']
+                if indent_group is not None:
+                    group = match.group(indent_group)
+                    if group is not None:
+                        components = []
+                        for char in group:
+                            components.append(' ' if char != '\t' else '\t')
+                        return ''.join(components)
+
+                if paragraph['indent'] is not None:
+                    return paragraph['indent']
+                elif paragraph['indent_levels'] is not None:
+                    tab_size = self._view.settings().get('tab_size')
+                    return ' ' * (tab_size * paragraph['indent_levels'])
+                else:
+                    return ''
+        return ''
+
+    def _same_paragraph_line(
+            self, section, point, first_line, second_line,
+            first_line_region, second_line_region, line_start):
+        """Determine whether the specified lines are in the same paragraph.
+
+        Determine whether the specified consecutive lines are in the
+        same paragraph.  If so, return the text in the second line - the
+        result of taking that line, removing any characters that are not
+        in the same section as "point", removing the line start, and
+        then removing any leading or trailing whitespace.  If not,
+        return None.
+
+        Note that first_line and second_line need not currently be
+        individual lines; they may be portions of the document that we
+        are considering as if they were consecutive lines.
+
+        dict<str, object> section - The current section, formatted like
+            the elements of _settings_parser.sections.
+        int point - The current position.  This must be in
+            first_line_region or second_line_region.
+        str first_line - The text of the first line.
+        str second_line - The text of the second line.
+        Region first_line_region - The region containing first_line.
+        Region second_line_region - The region containing second_line.
+        str line_start - The line start.
+        return str - The second line's text, if it is in the same
+            paragraph.
+        """
+        # Compute the lines' indents
+        indent = self._section_indent(first_line, line_start)
+        if indent is None:
+            return None
+        second_indent = self._section_indent(second_line, line_start)
+        if second_indent != indent:
+            return None
+
+        # Compute the lines' text, before applying _combine_extent
+        i_line_start_len = len(indent) + len(line_start)
+        first_line_text = first_line[i_line_start_len:].strip()
+        second_line_text = second_line[i_line_start_len:].strip()
+        if not first_line_text or not second_line_text:
+            return None
+
+        # Compute the lines' post-line-start indents
+        first_paragraph_indent = self._leading_whitespace(
+            first_line[i_line_start_len:])
+        second_paragraph_indent = self._leading_whitespace(
+            second_line[i_line_start_len:])
+        if not second_paragraph_indent.startswith(first_paragraph_indent):
+            return None
+
+        # Check whether the indentation of the second line is correct for a
+        # same-paragraph match
+        paragraph_indent = self._paragraph_indent(first_line_text)
+        if (paragraph_indent is None or
+                second_paragraph_indent[len(first_paragraph_indent):] !=
+                paragraph_indent):
+            return None
+
+        # If the line break between the two paragraphs was inserted by the user
+        # pressing the enter key, then we preserve it, by treating the second
+        # line as the start of a new paragraph
+        regions = self._view.get_regions(
+            'wrap_as_you_type_explicit_line_break')
+        for region in regions:
+            if (region.begin() == first_line_region.end() and
+                    region.end() == second_line_region.begin()):
+                return None
+
+        # Restrict second_line_text by _combine_extent
+        combine_extent = self._combine_extent(
+            section, point,
+            second_line_region.begin() + i_line_start_len +
+            len(second_paragraph_indent) + len(second_line_text))
+        if (combine_extent <
+                second_line_region.begin() + i_line_start_len +
+                len(second_paragraph_indent) + 1):
+            # "point" does not combine with any text on the second line
+            return None
+        second_line_extent_text = second_line_text[
+            :combine_extent - second_line_region.begin() - i_line_start_len -
+            len(second_paragraph_indent)].strip()
+        if not second_line_extent_text:
+            return None
+
+        if (self._first_line_paragraph(second_line_extent_text) is not None or
+                not self._are_combined(
+                    section, point, first_line_region.begin())):
+            return None
+        return second_line_extent_text
+
+    def _should_erase_preceding_line_break(
+            self, section, point, line_start, line, line_region, prev_line,
+            prev_line_region, prev_end_point_excluding_whitespace,
+            prev_char_scope, next_char_scope):
+        """Return whether we should erase the preceding line break.
+
+        Return whether we should erase all of the text from the most
+        recent line break up to the selection cursor, if we are using
+        the specified section and line start.  We also erase any
+        trailing whitespace on the line before the line break.  Assume
+        that there is a single, non-empty selection cursor.
+
+        We perform such an erasure when it appears that the user is
+        backspacing content from before the earliest text on the current
+        line.  To the user, the effect is like deleting the space
+        between the last word on the preceding line and the first word
+        on the current line.  The purpose of the erasure is to make it
+        feel more like editing non-wrapped text content to the user (or
+        rather, like editing soft-wrapped content that doesn't have any
+        indentation or line start).
+
+        dict<str, object> section - The section we are attempting to
+            use, formatted like the elements of
+            _settings_parser.sections.
+        int point - The position of the selection cursor.
+        str line_start - The line start we are attempting to use.
+        str line - The value of _view.substr(line_region).
+        Region line_region - The value of _view.line(point).
+        str prev_line - The value of _view.substr(prev_line_region).
+            This is None if prev_line_region is None.
+        Region prev_line_region - The value of _prev_line_region(point).
+        int prev_end_point_excluding_whitespace - The value of
+            _end_point_excluding_whitespace(prev_line,
+            prev_line_region).  This is None if prev_line is None.
+        str prev_char_scope - The value of
+            _prev_char_scope(prev_line_region.end(), prev_line_reigon).
+            This is None if prev_line_region is None.
+        str next_char_scope - The value of
+            _view.scope_name(prev_line_region.end()).  This is None if
+            prev_line_region is None.
+        return bool - Whether we should erase the preceding line break.
+        """
+        if (prev_line_region is None or Util.is_all_whitespace(line) or
+                # If line_start consists exclusively of whitespace, then the
+                # setting is too generic to be confident that the user
+                # backspaced past the beginning of a line
+                Util.is_all_whitespace(line_start)):
+            return False
+
+        # Check whether the user appears to have backspaced part of the
+        # indentation
+        indent = self._section_indent(prev_line, line_start)
+        if (indent is None or line.startswith(indent) or
+                line[:point - line_region.begin()] !=
+                indent[:point - line_region.begin()]):
+            return False
+
+        # Check whether prev_line has at least one word
+        if Util.is_all_whitespace(prev_line[len(indent) + len(line_start):]):
+            return False
+
+        # Check whether the first thing after "point" is line_start, in which
+        # case the user only appears to be editing the indentation
+        if (self._section_indent(
+                line[point - line_region.begin():], line_start) is not None):
+            return False
+
+        # Check whether prev_line.begin() and "point" are in a single section
+        if (not self._matches_selector(
+                section, prev_char_scope, next_char_scope) or
+                not self._are_combined(
+                    section, prev_line_region.begin(), point)):
+            return False
+
+        # If the preceding line break was inserted by the user pressing the
+        # enter key, then preserve it
+        regions = self._view.get_regions(
+            'wrap_as_you_type_explicit_line_break')
+        for region in regions:
+            if region.begin() == prev_line_region.end():
+                return False
+        return True
+
+    def _erase_preceding_line_break_edit(self, point):
+        """Return a pair with an edit for erasing the preceding line break.
+
+        Return a pair whose first element is an edit for erasing all of
+        the text from the most recent line break character up to the
+        selection cursor.  This also erases any trailing whitespace on
+        the line before the line break.  The second element of the
+        return value is the recommended new point - the position to
+        which "point" is moved after the erasure.  Clients ought to
+        check that _should_erase_preceding_line_break returns True
+        before calling this method.  See the comments for
+        _should_erase_preceding_line_break for more information
+        concerning the motivation of such an edit.
+
+        int point - The position.
+        return tuple<tuple<Region, str>, int> - A pair consisting of the
+            edit and the new position, respectively.
+        """
+        # Compute the region to erase
+        view = self._view
+        line_region = view.line(point)
+        line = view.substr(line_region)
+        prev_line_region = self._prev_line_region(point)
+        prev_line = view.substr(prev_line_region)
+        erase_start_point = self._end_point_excluding_whitespace(
+            prev_line, prev_line_region)
+        erase_end_point = (
+            line_region.begin() + len(self._leading_whitespace(line)))
+        erase_region = Region(erase_start_point, erase_end_point)
+
+        # Return the edit and the new position
+        edit = (erase_region, '')
+        if point <= erase_region.begin():
+            return (edit, point)
+        elif point <= erase_region.end():
+            return (edit, erase_region.begin())
+        else:
+            return (edit, point - erase_region.size())
+
+    def _try_remove_indent_of_next_line_edit(self, section, point, line_start):
+        r"""Return an edit for removing subsequent indentation, if appropriate.
+
+        Return an edit for removing the text from "point" up to what
+        appears to be the end of the former i_line_start_i of the next
+        line, or None if we should not remove such text.
+
+        The goal here is to help the user when he presses the "delete"
+        key at the end of a line.  For example, if the line start is
+        " * ", the current line of text reads, "   * Foo bar   * baz",
+        and the selection cursor is immediately after the word "bar",
+        then it looks as though the document used to read,
+        "   * Foo bar\n   * baz", and the user just deleted the newline
+        character.  In this case, we erase text so that the line reads,
+        "   * Foo barbaz" instead.  The purpose of the erasure is to
+        make it feel more like editing non-wrapped text content to the
+        user (or rather, like editing soft-wrapped content that doesn't
+        have any indentation or line start).
+
+        dict<str, object> section - The current section, formatted like
+            the elements of _settings_parser.sections.
+        int point - The position.
+        str line_start - The line start.
+        return tuple<Region, str> - The edit, if any.
+        """
+        line_region = self._view.line(point)
+        line = self._view.substr(line_region)
+        first_line = line[:point - line_region.begin()]
+        second_line = line[point - line_region.begin():]
+        i_line_start_i = self._i_line_start_i(second_line, line_start)
+        if (i_line_start_i is None or
+                self._leading_whitespace(i_line_start_i) in ('', ' ', '  ')):
+            # i_line_start_i is too generic for us to confidently guess that
+            # the user deleted a newline character
+            return None
+
+        # Check _point_matches_selector
+        if not self._point_matches_selector(section, point, line_region):
+            return None
+
+        # Check whether the "lines" are in the same paragraph
+        if (self._same_paragraph_line(
+                section, point, first_line, second_line,
+                Region(line_region.begin(), point),
+                Region(point, line_region.end()), line_start) is None):
+            return None
+
+        # Return the edit
+        erase_region = Region(point, point + len(i_line_start_i))
+        return (erase_region, '')
+
+    def _try_split_edit(self, section, point, line_start):
+        """Return a pair containing the edit for splitting the line, if any.
+
+        Return a pair whose first element is the edit for splitting the
+        line containing "point", if we should do so.  If the line is
+        longer than the wrap width, and it contains at least two words,
+        then we split the line after the latest word that is no later
+        than the wrap width (or the first word if there is no such
+        word), assuming the split is contained in a single section.
+        Note that it may take multiple split operations to reduce the
+        line down to lines that are all no longer than the wrap width.
+        The second element of the return value is the recommended new
+        point - the later of the position to which "point" is moved
+        after the split, and the position after the i_line_start_i of
+        the added line.  This method returns (None, None) if we should
+        not perform a split operation.  It assumes that there is a
+        single, empty selection cursor.
+
+        dict<str, object> section - The current section, formatted like
+            the elements of _settings_parser.sections.
+        int point - The current position.
+        str line_start - The line start.
+        return tuple<tuple<Region, str>, int> - A pair consisting of the
+            edit and the new position, respectively.
+        """
+        # Compute the words on the current line
+        view = self._view
+        line_region = view.line(point)
+        line = view.substr(line_region)
+        i_line_start_i = self._i_line_start_i(line, line_start)
+        if i_line_start_i is None:
+            return (None, None)
+        word_spans = self._word_spans(line[len(i_line_start_i):])
+        if len(word_spans) <= 1:
+            return (None, None)
+
+        # Check whether the line is longer than the wrap width
+        wrap_width = self._wrap_width(section)
+        wrap_index = self._advance_by_width(line, wrap_width)
+        if wrap_index >= len(i_line_start_i) + word_spans[-1][1]:
+            return (None, None)
+
+        # Check whether this is a single-line paragraph
+        line_text = line[len(i_line_start_i):].rstrip()
+        paragraph = self._first_line_paragraph(line_text)
+        if paragraph is not None and paragraph['single_line']:
+            return (None, None)
+
+        # Compute the last word on this line and the first word on the next
+        # line, post-split
+        last_word_span = None
+        first_word_span = None
+        if len(i_line_start_i) + word_spans[0][1] > wrap_index:
+            # The first word does not fit on one line
+            last_word_span = word_spans[0]
+            first_word_span = word_spans[1]
+        else:
+            for span in word_spans:
+                if len(i_line_start_i) + span[1] <= wrap_index:
+                    last_word_span = span
+                else:
+                    first_word_span = span
+                    break
+        last_word_region = Region(
+            line_region.begin() + len(i_line_start_i) + last_word_span[0],
+            line_region.begin() + len(i_line_start_i) + last_word_span[1])
+        first_word_region = Region(
+            line_region.begin() + len(i_line_start_i) + first_word_span[0],
+            line_region.begin() + len(i_line_start_i) + first_word_span[1])
+
+        # Check whether "point" is in the same section as
+        # first_word_region.end() and line_region.begin()
+        if (not self._point_matches_selector(section, point, line_region) or
+                not self._are_combined(
+                    section, point, first_word_region.end()) or
+                not self._are_combined(section, point, line_region.begin())):
+            return (None, None)
+
+        # Compute the edit
+        selection_point = self._selection_point()
+        if (last_word_region.end() < selection_point <=
+                first_word_region.begin()):
+            # Keep any spaces (or tabs) that are just before the cursor at the
+            # end of the first line in the split
+            replace_start_point = selection_point
+        else:
+            replace_start_point = last_word_region.end()
+        replace_region = Region(replace_start_point, first_word_region.begin())
+        line_text = line[
+            len(i_line_start_i):last_word_region.end() - line_region.begin()]
+        paragraph_indent = self._paragraph_indent(line_text)
+        if paragraph_indent is None:
+            paragraph_indent = ''
+        replacement_str = u'\n{0:s}{1:s}'.format(
+            i_line_start_i, paragraph_indent)
+        edit = (replace_region, replacement_str)
+
+        # Return the edit and the new position
+        if point <= replace_region.end():
+            return (edit, replace_region.begin() + len(replacement_str))
+        else:
+            return (edit, point - replace_region.size() + len(replacement_str))
+
+    def _try_join_edit(self, section, point, line_start):
+        """Return a pair containing the edit for joining, if any.
+
+        Return a pair whose first element is the edit for joining the
+        line containing "point" with the subsequent line, if we should
+        do so.  If adding the first word on the next line to the current
+        line results in a line that is no longer than the wrap width,
+        then we join the text on the two lines, assuming they are in the
+        same paragraph and section.  This would be followed up with a
+        split operation (as in _try_split_edit) if necessary to ensure
+        that the current line is no longer than the wrap width.  The
+        second element of the return value is the recommended new
+        point - the position of the former end of the line containing
+        "point".  This method returns (None, None) if we should not
+        perform a join operation.
+
+        dict<str, object> section - The current section, formatted like
+            the elements of _settings_parser.sections.
+        int point - The current position.
+        str line_start - The line start.
+        return tuple<tuple<Region, str>, int> - A pair consisting of the
+            edit and the new position, respectively.
+        """
+        # Check _point_matches_selector
+        view = self._view
+        line_region = view.line(point)
+        line = view.substr(line_region)
+        next_line_region = self._next_line_region(point)
+        if next_line_region is None:
+            return (None, None)
+        next_line = view.substr(next_line_region)
+        if not self._point_matches_selector(section, point, line_region):
+            return (None, None)
+
+        # Check whether the lines are in the same paragraph
+        next_line_extent_text = self._same_paragraph_line(
+            section, point, line, next_line, line_region, next_line_region,
+            line_start)
+        if next_line_extent_text is None:
+            return (None, None)
+
+        # Compute the last word on this line and the first word on the next
+        # line
+        i_line_start_i_len = len(self._i_line_start_i(line, line_start))
+        last_word_span = self._word_spans(line[i_line_start_i_len:])[-1]
+        last_word = line[
+            i_line_start_i_len + last_word_span[0]:
+            i_line_start_i_len + last_word_span[1]]
+        next_i_line_start_i_len = len(
+            self._i_line_start_i(next_line, line_start))
+        first_word_span = self._word_spans(next_line_extent_text)[0]
+        first_word = next_line[
+            next_i_line_start_i_len + first_word_span[0]:
+            next_i_line_start_i_len + first_word_span[1]]
+
+        # Compute the post-join spacing between last_word and first_word
+        if not Util.is_all_whitespace(line[-1]):
+            keep_space = False
+            space = self._space_between(last_word, first_word)
+        else:
+            # e.g. the user pressed space a few times at the end of the line,
+            # then pressed backspace a few times.  Preserve the space that the
+            # user entered at the end of the line.
+            keep_space = True
+            space = line[i_line_start_i_len + last_word_span[1]:]
+
+        # Check whether we can fit first_word on this line
+        width = self._width(
+            u'{0:s}{1:s}{2:s}'.format(
+                line[:i_line_start_i_len + last_word_span[1]], space,
+                first_word))
+        if width > self._wrap_width(section):
+            return (None, None)
+
+        # Compute the edit
+        first_word_start_point = (
+            next_line_region.begin() + next_i_line_start_i_len)
+        replace_region = Region(line_region.end(), first_word_start_point)
+        if keep_space:
+            edit = (replace_region, '')
+        else:
+            edit = (replace_region, space)
+        return (edit, line_region.end())
+
+    def _try_backwards_join_edit(self, section, point, line_start):
+        """Return a pair containing the edit for joining backwards, if any.
+
+        Return a pair whose first element is the edit for joining the
+        line containing "point" with the previous line, if we should do
+        so.  If adding the first word on the current line to the
+        previous line results in a line that is no longer than the wrap
+        width, then we join the text on the two lines, assuming they are
+        in the same paragraph and section.  This would be followed up
+        with a split operation (as in _try_split_edit) if necessary to
+        ensure that the current line is no longer than the wrap width.
+        The second element of the return value is the recommended new
+        point - the position of the former end of the previous line.
+        This method returns (None, None) if we should not perform a join
+        operation.
+
+        dict<str, object> section - The current section, formatted like
+            the elements of _settings_parser.sections.
+        int point - The current position.
+        str line_start - The line start.
+        return tuple<tuple<Region, str>, int> - A pair consisting of the
+            edit and the new position, respectively.
+        """
+        prev_line_region = self._prev_line_region(point)
+        if prev_line_region is not None:
+            return self._try_join_edit(
+                section, prev_line_region.end(), line_start)
+        else:
+            return (None, None)
+
+    def _gen_steady_state_edits(
+            self, section, point, line_start, last_row, budget):
+        """Coroutine for returning edits for splitting and joining lines.
+
+        Keep splitting and joining lines, starting with the line
+        containing "point", until we reach a steady state.  If we stop
+        first, because we moved past last_row or exhausted the budget,
+        we set _continuation to the remaining work.  This is a coroutine
+        that requires each edit to be executed before control is returned
+        to it, as in WrapFixer._gen_edits().
+
+        dict<str, object> section - The current section, formatted like
+            the elements of _settings_parser.sections.
+        int point - The position at which to start.
+        str line_start - The line start.
+        int last_row - The last row we may split or join, or None if
+            there is no such limit.  We always perform at least one edit
+            if there are any to perform.
+        dict<str, int> budget - The work budget, formatted like
+            _settings_parser.work_budget, or None if there is no budget.
+        return Generator<tuple<Region, str>> - The edits.
+        """
+        self._continuation = None
+        view = self._view
+        if budget is None:
+            max_edits = None
+            deadline = None
+        else:
+            max_edits = budget['edits']
+            if budget['milliseconds'] is None:
+                deadline = None
+            else:
+                deadline = time.time() + budget['milliseconds'] / 1000.0
+
+        edit_count = 0
+        while True:
+            if edit_count > 0 and (
+                    (last_row is not None and
+                        view.rowcol(point)[0] > last_row) or
+                    (max_edits is not None and edit_count >= max_edits) or
+                    (deadline is not None and time.time() >= deadline)):
+                self._continuation = {
+                    'line_start': line_start,
+                    'point': point,
+                    'section': section,
+                }
+                return
+
+            edit, split_point = self._try_split_edit(
+                section, point, line_start)
+            if edit is not None:
+                yield edit
+                point = split_point
+            else:
+                edit, join_point = self._try_join_edit(
+                    section, point, line_start)
+                if edit is not None:
+                    yield edit
+                    point = join_point
+                else:
+                    break
+            edit_count += 1
+
+    def _line_section(self, line_region):
+        """Return the section and line start of the specified line.
+
+        Return the first section and line start such that the line
+        starts with the line start, as in _section_indent, and the end
+        of the line matches the section, as in _point_matches_selector.
+        This returns (None, None) if there is no such section.
+
+        Region line_region - The line.
+        return tuple<dict<str, object>, str> - A pair consisting of the
+            section, formatted like the elements of
+            _settings_parser.sections, and the line start.
+        """
+        line = self._view.substr(line_region)
+        for section in self._settings_parser.sections:
+            for line_start in section['allowed_line_starts']:
+                if (self._section_indent(line, line_start) is not None and
+                        self._point_matches_selector(
+                            section, line_region.end(), line_region)):
+                    return (section, line_start)
+        return (None, None)
+
+    def _reflow_lines(self, region, is_passive):
+        """Reflow the lines that intersect "region" in our ViewSnapshot.
+
+        Apply the same splits and joins to each such line, along with
+        any lines that we join them with, that typing the text would
+        have produced.  This assumes that _view is a ViewSnapshot, and
+        it applies the edits to the snapshot rather than the underlying
+        View.
+
+        Region region - The region, in the coordinates of the underlying
+            View.
+        bool is_passive - Whether to only split lines, as in passive
+            mode, rather than splitting and joining them.
+        """
+        snapshot = self._view
+        end_distance = snapshot.size() - region.end()
+        line_region = snapshot.line(region.begin())
+        while line_region.begin() <= snapshot.size() - end_distance:
+            section, line_start = self._line_section(line_region)
+            if section is not None:
+                point = line_region.end()
+                if is_passive:
+                    edit, point = self._try_split_edit(
+                        section, point, line_start)
+                    while edit is not None:
+                        snapshot.apply_edit(*edit)
+                        edit, point = self._try_split_edit(
+                            section, point, line_start)
+                else:
+                    for edit in self._gen_steady_state_edits(
+                            section, point, line_start, None, None):
+                        snapshot.apply_edit(*edit)
+
+            line_region = self._next_line_region(line_region.begin())
+            if line_region is None:
+                break
+
+    def _gen_reflow_paragraphs(self, line_regions):
+        """Generator for the paragraphs for compute_reflow() to reflow.
+
+        Return the maximal runs of consecutive lines in "line_regions"
+        that have the same section and line start, as in
+        _line_section(), excluding lines that have nothing after the
+        i_line_start_i.  We compute the paragraphs lazily, one line at a
+        time, so that we do not need to store the sections of all of the
+        lines at once.
+
+        list<Region> line_regions - The regions to reflow.  Each region
+            must span from the beginning of a line to the end of a line.
+            The regions must be in order and non-overlapping.
+        return Generator<Region> - The paragraphs, in order.  Each
+            paragraph spans from the beginning of its first line to the
+            end of its last line.
+        """
+        view = self._view
+        paragraph = None
+        prev_key = None
+        for region in line_regions:
+            line_region = view.line(region.begin())
+            while (line_region is not None and
+                    line_region.end() <= region.end()):
+                section, line_start = self._line_section(line_region)
+                if section is None:
+                    key = None
+                else:
+                    line = view.substr(line_region)
+                    if (len(self._i_line_start_i(line, line_start)) ==
+                            len(line)):
+                        key = None
+                    else:
+                        key = (id(section), line_start)
+
+                if (key is not None and key == prev_key and
+                        paragraph.end() + 1 == line_region.begin()):
+                    paragraph = paragraph.cover(line_region)
+                else:
+                    if paragraph is not None:
+                        yield paragraph
+                    if key is not None:
+                        paragraph = line_region
+                    else:
+                        paragraph = None
+                prev_key = key
+                line_region = self._next_line_region(line_region.begin())
+        if paragraph is not None:
+            yield paragraph
+
+    def _reflow_paragraph(self, paragraph):
+        """Return the edit for reflowing the specified paragraph.
+
+        This assumes that _view supports efficient random access, like a
+        TextBuffer or a ViewCopy.  The edit includes any lines after the
+        paragraph that we join it with.
+
+        Region paragraph - The paragraph, as returned by
+            _gen_reflow_paragraphs().
+        return tuple<Region, str> - The edit, or None if the paragraph
+            is already wrapped correctly.
+        """
+        snapshot = ViewSnapshot(self._view)
+        reflower = copy.copy(self)
+        reflower._view = snapshot
+        reflower._reflow_lines(paragraph, False)
+        return snapshot.net_edit()
+
+    def _gen_paragraph_reflows(self, line_regions):
+        """Generator for the reflows of the paragraphs in "line_regions".
+
+        This assumes that _view supports efficient random access, as in
+        _reflow_paragraph().  If reflowing a paragraph joins it with the
+        next paragraph, as returned by _gen_reflow_paragraphs(), we
+        reflow them together, as a single paragraph.
+
+        list<Region> line_regions - The regions to reflow, as in
+            _gen_reflow_paragraphs().
+        return Generator<tuple<Region, tuple<Region, str>>> - Pairs
+            consisting of each paragraph and the edit for reflowing it,
+            as returned by _reflow_paragraph(), in order.
+        """
+        paragraphs = self._gen_reflow_paragraphs(line_regions)
+        paragraph = next(paragraphs, None)
+        while paragraph is not None:
+            next_paragraph = next(paragraphs, None)
+            edit = self._reflow_paragraph(paragraph)
+            while (edit is not None and next_paragraph is not None and
+                    edit[0].end() > next_paragraph.begin()):
+                # We joined the paragraph with the next one, so we have to
+                # reflow them together
+                paragraph = paragraph.cover(next_paragraph)
+                next_paragraph = next(paragraphs, None)
+                edit = self._reflow_paragraph(paragraph)
+            yield (paragraph, edit)
+            paragraph = next_paragraph
+
+    def _min_wrap_width(self):
+        """Return the minimum of the wrap widths of the sections."""
+        return min(
+            self._wrap_width(section)
+            for section in self._settings_parser.sections)
+
+    def _overflow_region(self, line_region, min_wrap_width):
+        """Return the text on the specified line past the wrap width.
+
+        Return None if the line is not in a section, as in
+        _line_section(), or if it does not extend past the section's
+        wrap width.
+
+        Region line_region - The line.
+        int min_wrap_width - The value of _min_wrap_width().
+        return Region - The text past the wrap width.
+        """
+        line = self._view.substr(line_region)
+        if len(line) <= min_wrap_width and '\t' not in line:
+            # Each character takes up at least one column, so the line can't
+            # extend past the wrap width
+            return None
+
+        section = self._overflow_section(line_region)
+        if section is None:
+            return None
+
+        wrap_width = self._wrap_width(section)
+        if self._width(line) <= wrap_width:
+            return None
+        return Region(
+            line_region.begin() + self._advance_by_width(line, wrap_width),
+            line_region.end())
+
+    def _overflow_section(self, line_region):
+        """Return the section of the specified line, for _overflow_region().
+
+        This is equivalent to _line_section(line_region)[0].  Subclasses
+        may override it to reuse sections they have already computed.
+
+        Region line_region - The line.
+        return dict<str, object> - The section, formatted like the
+            elements of _settings_parser.sections, or None.
+        """
+        return self._line_section(line_region)[0]
+
+    def _reflow_line_regions(self, regions):
+        """Return the lines that intersect the specified regions.
+
+        list<Region> regions - The regions.
+        return list<Region> - The lines, merged into ordered,
+            non-overlapping runs of lines, as in _gen_reflow_paragraphs().
+        """
+        view = self._view
+        line_regions = []
+        for region in sorted(regions, key=lambda region: region.begin()):
+            end = region.end()
+            if end > region.begin() and view.line(end).begin() == end:
+                # Exclude the line that merely starts at the end of the region
+                end -= 1
+            line_region = view.line(region.begin()).cover(view.line(end))
+            if (line_regions and
+                    line_region.begin() <= line_regions[-1].end() + 1):
+                line_regions[-1] = line_regions[-1].cover(line_region)
+            else:
+                line_regions.append(line_region)
+        return line_regions
+
+    def _continues_paragraph(self, line_region, next_line_region):
+        """Return whether the specified lines are in the same paragraph.
+
+        Region line_region - The first line.
+        Region next_line_region - The line after line_region.
+        return bool - Whether next_line_region continues the paragraph
+            that contains line_region, as in _same_paragraph_line().
+        """
+        section, line_start = self._line_section(line_region)
+        if section is None:
+            return False
+        view = self._view
+        return self._same_paragraph_line(
+            section, line_region.end(), view.substr(line_region),
+            view.substr(next_line_region), line_region, next_line_region,
+            line_start) is not None
+
+    def paragraph_regions(self, regions):
+        """Return the paragraphs that intersect the specified regions.
+
+        Each paragraph is a maximal run of lines such that each line is
+        in the same paragraph as the next, as in _same_paragraph_line().
+        A line that is not in a paragraph with any other line is a
+        paragraph by itself.  Passing the result to reflow_edits()
+        reflows the paragraphs in their entirety, without reflowing the
+        neighboring paragraphs, e.g. other items in the same bulleted
+        list.
+
+        list<Region> regions - The regions.
+        return list<Region> - The paragraphs, in order.  Each region
+            spans from the beginning of a line to the end of a line.
+            We merge paragraphs that overlap or are on adjacent lines.
+        """
+        view = self._view
+        paragraphs = []
+        for line_region in self._reflow_line_regions(regions):
+            first_line_region = view.line(line_region.begin())
+            while True:
+                prev_line_region = self._prev_line_region(
+                    first_line_region.begin())
+                if (prev_line_region is None or
+                        not self._continues_paragraph(
+                            prev_line_region, first_line_region)):
+                    break
+                first_line_region = prev_line_region
+
+            last_line_region = view.line(line_region.end())
+            while True:
+                next_line_region = self._next_line_region(
+                    last_line_region.begin())
+                if (next_line_region is None or
+                        not self._continues_paragraph(
+                            last_line_region, next_line_region)):
+                    break
+                last_line_region = next_line_region
+
+            paragraph = first_line_region.cover(last_line_region)
+            if paragraphs and paragraph.begin() <= paragraphs[-1].end() + 1:
+                paragraphs[-1] = paragraphs[-1].cover(paragraph)
+            else:
+                paragraphs.append(paragraph)
+        return paragraphs
+
+    def gen_reflow_edits(self, regions):
+        """Generator for the edits for reflowing the specified regions.
+
+        This is a lazy equivalent of reflow_edits(), so the caller may
+        stop once it has seen as many edits as it needs, e.g. after the
+        first edit if it only needs to know whether the regions are
+        wrapped correctly.
+
+        list<Region> regions - The regions to reflow.
+        return Generator<tuple<Region, str>> - The edits, as in
+            reflow_edits().
+        """
+        for paragraph, edit in self._gen_paragraph_reflows(
+                self._reflow_line_regions(regions)):
+            if edit is not None:
+                yield edit
+
+    def reflow_edits(self, regions, progress_callback=None):
+        """Return the edits for reflowing the specified regions.
+
+        Reflow every wrappable section in the lines that intersect
+        "regions", using the same rules as word wrapping fixup, as
+        though the user had typed each line.  We iterate over the
+        paragraphs lazily, and reflow each one in memory.  This does not
+        alter _view.  It assumes that _view supports efficient random
+        access, as in _reflow_paragraph(); to reflow a View, use a
+        ViewCopy of it.
+
+        list<Region> regions - The regions to reflow.
+        callable progress_callback - A function that we call
+            periodically with the fraction of the work that we have
+            completed, as a float from 0 to 1.  This may be None.
+        return list<tuple<Region, str>> - The edits for reflowing the
+            paragraphs, in order.  The regions of the edits are
+            non-overlapping and are in the coordinates prior to
+            performing any of the edits.
+        """
+        edits = []
+        size = float(max(1, self._view.size()))
+        for paragraph, edit in self._gen_paragraph_reflows(
+                self._reflow_line_regions(regions)):
+            if edit is not None:
+                edits.append(edit)
+            if progress_callback is not None:
+                progress_callback(paragraph.end() / size)
+        return edits
+
+    def _min_first_word_length(self, str_):
+        """Return a lower bound on the length of the first word in str_.
+
+        This is the bound that may_need_reflow() uses for the first word
+        on a line.
+
+        str str_ - The text after the i_line_start_i of the line.
+        return int - The bound, or None if str_ does not have any words.
+        """
+        word_spans = self._word_spans(str_)
+        if not word_spans:
+            return None
+        word = str_[word_spans[0][0]:word_spans[0][1]]
+        return max(1, len(WrapEngine._WORD_PREFIX_REGEX.match(word).group()))
+
+    def may_be_in_paragraph(self, line):
+        """Return whether the specified line might be part of a paragraph.
+
+        This is a fast, conservative check that only looks at the text,
+        not at its scopes.  If it returns False, then reflowing never
+        alters the line or joins it with another line.  The line might
+        be part of a paragraph if it starts with one of the sections'
+        line starts, followed by some text.  Since reflowing only alters
+        the lines in paragraphs, the caller may reflow the text before
+        and after a line for which this returns False independently.
+
+        str line - The line.  This must not contain any newline
+            characters.
+        return bool - Whether the line might be part of a paragraph.
+        """
+        for section in self._settings_parser.sections:
+            for line_start in section['allowed_line_starts']:
+                indent = self._section_indent(line, line_start)
+                if (indent is not None and
+                        line[len(indent) + len(line_start):].strip()):
+                    return True
+        return False
+
+    def may_need_reflow(self, text):
+        """Return whether reflowing the specified text might alter it.
+
+        This is a fast, conservative check that only looks at the text,
+        not at its scopes.  If it returns False, then reflow_edits()
+        would not return any edits for a text buffer containing "text"
+        with our settings.  Reflowing only splits a line that extends
+        past the wrap width, and only joins a line with the next line if
+        the first word on the next line fits at the end of the line.  So
+        we look for lines that start with one of the sections' line
+        starts, and that are either too wide or are followed by a line
+        with the same line start and indent whose first word might fit.
+
+        The scopes may cut the first word on the next line short, e.g.
+        at the "*/" in "word*/".  We assume that they do not cut it in
+        the middle of a run of alphanumeric characters, so we only count
+        the alphanumeric characters at the beginning of the word, or one
+        character if it starts with some other character.
+
+        str text - The text.  Its line breaks must be '\\n' characters.
+        return bool - Whether reflowing might alter the text.
+        """
+        sections = self._settings_parser.sections
+        if not sections:
+            return False
+        min_space_length = min(
+            [1] +
+            [len(item['space'])
+                for item in self._settings_parser.space_between_words])
+        line_starts = []
+        for section in sections:
+            wrap_width = self._wrap_width(section)
+            for line_start in section['allowed_line_starts']:
+                line_starts.append((line_start, wrap_width))
+
+        lines = text.split('\n')
+        for index, line in enumerate(lines):
+            width = None
+            for line_start, wrap_width in line_starts:
+                indent = self._section_indent(line, line_start)
+                if indent is None:
+                    continue
+                i_line_start_len = len(indent) + len(line_start)
+                if not line[i_line_start_len:].strip():
+                    continue
+                if width is None:
+                    width = self._width(line.rstrip())
+                if width > wrap_width:
+                    return True
+                if (index + 1 == len(lines) or
+                        width + min_space_length + 1 > wrap_width):
+                    continue
+                next_line = lines[index + 1]
+                if self._section_indent(next_line, line_start) != indent:
+                    continue
+                word_length = self._min_first_word_length(
+                    next_line[i_line_start_len:])
+                if (word_length is not None and
+                        width + min_space_length + word_length <=
+                        wrap_width):
+                    return True
+        return False
+
+    def gen_audit(self):
+        """Generator that checks the wrapping of each paragraph.
+
+        For each paragraph in the text buffer, as in reflow_edits(),
+        determine whether its wrapping differs from the result of
+        reflowing it.  We check the paragraphs lazily, so the caller may
+        stop at any point.  This does not alter _view.  It assumes that
+        _view supports efficient random access, as in reflow_edits().
+
+        return Generator<dict<str, object>> - The results for the
+            paragraphs, in order.  Each result has the following
+            entries: "row" and "end_row", the first and last rows of
+            the paragraph; and "problem", which is "over_width" if one
+            of the lines extends past the wrap width, "under_filled" if
+            reflowing the paragraph would reduce its number of lines,
+            "rewrapped" if reflowing would alter it in some other way,
+            and None if the paragraph is wrapped correctly.
+        """
+        if not self._settings_parser.sections:
+            return
+        view = self._view
+        min_wrap_width = self._min_wrap_width()
+        line_regions = [Region(0, view.size())]
+        for paragraph, edit in self._gen_paragraph_reflows(line_regions):
+            problem = None
+            if edit is not None:
+                replace_region, replacement_str = edit
+                line_region = view.line(paragraph.begin())
+                while line_region is not None:
+                    if self._overflow_region(
+                            line_region, min_wrap_width) is not None:
+                        problem = 'over_width'
+                        break
+                    if line_region.end() >= paragraph.end():
+                        break
+                    line_region = self._next_line_region(
+                        line_region.begin())
+                if problem is None:
+                    if (replacement_str.count('\n') <
+                            view.substr(replace_region).count('\n')):
+                        problem = 'under_filled'
+                    else:
+                        problem = 'rewrapped'
+            yield {
+                'end_row': view.rowcol(paragraph.end())[0],
+                'problem': problem,
+                'row': view.rowcol(paragraph.begin())[0],
+            }
+
+    def find_overflow_regions(self):
+        """Return the text on every line that extends past the wrap width.
+
+        This assumes that _view supports efficient random access, as in
+        reflow_edits().
+
+        return list<Region> - The text past the wrap width on each line,
+            as in _overflow_region(), in order.
+        """
+        regions = []
+        if self._settings_parser.sections:
+            min_wrap_width = self._min_wrap_width()
+            line_region = self._view.line(0)
+            while line_region is not None:
+                overflow_region = self._overflow_region(
+                    line_region, min_wrap_width)
+                if overflow_region is not None:
+                    regions.append(overflow_region)
+                line_region = self._next_line_region(line_region.begin())
+        return regions
@@ -1,19 +1,29 @@
-import re
+import bisect
+import copy
 import sys
 
 from sublime import Region
 import sublime
-import sublime_plugin
 
 if sys.version_info[0] >= 3:
     from .settings_parser import SettingsParser
     from .util import Util
+    from .view_copy import ViewCopy
+    from .view_excerpt import ExcerptBoundsError
+    from .view_excerpt import ViewExcerpt
+    from .view_snapshot import ViewSnapshot
+    from .wrap_engine import WrapEngine
 else:
     from settings_parser import SettingsParser
     from util import Util
+    from view_copy import ViewCopy
+    from view_excerpt import ExcerptBoundsError
+    from view_excerpt import ViewExcerpt
+    from view_snapshot import ViewSnapshot
+    from wrap_engine import WrapEngine
 
 
-class WrapFixer(sublime_plugin.TextCommand):
+class WrapFixer(WrapEngine):
     """Provides the ability to perform word wrapping fixup.
 
     "Word wrapping fixup" consists of attempting to fix word wrapping in
@@ -21,7 +31,9 @@ class WrapFixer(sublime_plugin.TextCommand):
     brains of the WrapAsYouType plugin.  Each WrapFixer instance manages
     a particular View.  A WrapFixer instance assumes that the
     on_modified(), on_post_modification(), and on_selection_modified()
-    methods are called as appropriate.
+    methods are called as appropriate.  WrapFixer builds on WrapEngine,
+    which computes the individual splits and joins independently of
+    Sublime Text.
     """
 
     # The main body of wrap fixup is the _gen_edits() method.  It is a
@@ -29,18 +41,29 @@ class WrapFixer(sublime_plugin.TextCommand):
     # to fix word wrap, and requires each edit to be executed before control is
     # returned to the generator.  Each edit is represented as a pair consisting
     # of a Region and a string, and indicates that any text that is in the
-    # Region should be replaced with the given string.
-    #
-    # A number of variable names recur in the implementation of WrapFixer.  The
-    # "indent" of a line is the whitespace on that line that precedes the line
-    # start under consideration.  The "i_line_start" (indent + line start) of a
-    # line is the result of appending the line start to the indent.  The
-    # "i_line_start_i" (indent + line start + indent) of a line is the
-    # i_line_start, followed by all of the subsequent whitespace on that line,
-    # up to the first non-whitespace character or the end of the line.
+    # Region should be replaced with the given string.  See the comments for
+    # WrapEngine for the meanings of the variable names that recur in the
+    # implementation, such as "i_line_start_i".  In WrapFixer, the _view
+    # attribute is the View that the WrapFixer manages.
     #
     # Private attributes:
     #
+    # WrapFixer _analyzer - A copy of this WrapFixer whose _view is a
+    #     ViewSnapshot of a ViewExcerpt of our View, which analyze() uses to
+    #     compute the word wrapping fixup for the most recent modification.
+    #     This is None if there is no such fixup to compute.
+    # str _clipboard - The contents of the clipboard to use in place of
+    #     sublime.get_clipboard(), as captured by prepare_analysis(), or None
+    #     to read the clipboard.
+    # int _continuation_count - The number of continuations we have added to
+    #     _continuations.  We use this to generate unique region keys.
+    # list<tuple<str, dict<str, object>, str>> _continuations - The deferred
+    #     reflows, from oldest to newest.  Each reflow is represented as a
+    #     tuple consisting of a region key, the section, formatted like the
+    #     elements of _settings_parser.sections, and the line start.  The
+    #     region for the key is an empty Region at the position at which to
+    #     resume splitting and joining.  We perform these reflows when the
+    #     user stops typing, as in has_deferred_edit().
     # Generator<tuple<Region, str>> _edits_gen - A coroutine that yields the
     #     edits to execute in order to perform word wrapping fixup: an
     #     execution of the _gen_edits() method.  This will normally be at least
@@ -49,8 +72,50 @@ class WrapFixer(sublime_plugin.TextCommand):
     #     called, then all of the edits have been retrieved.  This is None if
     #     the view was altered since the beginning of the most recent call to
     #     has_edit() or perform_edits().
+    # dict<str, object> _section_to_extend_cache - The most recent result of
+    #     _section_to_extend(), if any.  The "result" entry is the result, and
+    #     the "point" entry is the argument.  The "change_count", "sections",
+    #     and "syntax" entries are the values of _view.change_count(),
+    #     _settings_parser.sections, and the "syntax" setting at the time, all
+    #     of which the result depends on.  The "line_end" entry is the end of
+    #     the line containing the point; changes to the text after it do not
+    #     affect the result.
     # tuple<Region, str> _first_edit - The first edit that _edits_gen yielded.
     #     This is None if it did not yield any edits or if _edits_gen is None.
+    # dict<str, object> _line_summary - A summary of the line containing the
+    #     selection cursor, as computed by _compute_line_summary.  This enables
+    #     _try_rule_out_edit() to establish that a keystroke does not require
+    #     any word wrapping fixup, without running _gen_edits().  We update it
+    #     to reflect the changes reported to on_text_changed(), where
+    #     possible, as in _update_line_summary().  This is None if there is no
+    #     summary.
+    # bool _is_scanning_overflow - Whether prepare_overflow_scan() returned
+    #     True, and we have not yet called finish_overflow_scan().
+    # int _overflow_key_count - The number of region keys we have created for
+    #     _overflow_keys.  We use this to generate unique region keys.
+    # list<str> _overflow_keys - The region keys of the highlights of the text
+    #     that extends past the wrap width, in order of position.  Rather than
+    #     using a single key, we divide the highlights into buckets, so that
+    #     when the text changes, we only have to read and rewrite the buckets
+    #     near the change.  The regions for each key are in order, and they
+    #     precede the regions for the next key.
+    # list<Region> _overflow_dirty - The regions of the text that changed
+    #     since we last updated the overflow highlights, as in
+    #     _update_overflow(), in the current coordinates.  This is None if we
+    #     have yet to highlight the overflowing lines using a full scan, as in
+    #     scan_overflow(), or if the "wrap_as_you_type_highlight_overflow"
+    #     setting is false.
+    # dict<str, object> _plan - The word wrapping fixup that analyze()
+    #     computed, or the reflow chunk that plan_reflow_chunk() planned, if
+    #     we have not yet performed or discarded it.  This has
+    #     the following entries: "change_count", the value of
+    #     _view.change_count() when the fixup was computed; "edits", the list
+    #     of edits to perform, as in _gen_edits(), or None if analyze() was
+    #     unable to compute them using its ViewExcerpt; "passively_split", the
+    #     value _passively_split should have after performing the edits;
+    #     "continuation", the value _continuation should have after performing
+    #     the edits; and "selection", the value of _selection_after_edits.
+    #     This is None if there is no such fixup.
     # bool _passively_split - Whether the line after the selection cursor was
     #     added as a result of our splitting a line (as in _try_split_edit),
     #     provided that the split took place since the last time the user set
@@ -60,62 +125,253 @@ class WrapFixer(sublime_plugin.TextCommand):
     # int _prev_selection_point - The most recent value of _selection_point().
     #     We do not update _prev_selection_point if the
     #     "wrap_as_you_type_disabled" setting is true.
+    # dict<str, object> _reflow - The remaining work for the reflow passed to
+    #     plan_reflow(), if any.  This has the following entries: "chunks",
+    #     the chunks that we have yet to plan, in reverse order of priority,
+    #     each represented as a list of edits in the coordinates of the
+    #     reflow; "chunk_count", the total number of chunks; and "deltas", a
+    #     list of pairs consisting of the beginning of each chunk we have
+    #     planned, in the coordinates of the reflow, and the change in the
+    #     document's length as a result of performing the chunk.  This is
+    #     None if there is no such reflow.
     # list<bool> _section_matches - Whether the selection cursor matches each
     #     of the sections, as in _point_matches_selector.  This is parallel to
     #     _settings_parser.sections.  All of the elements of _section_matches
     #     are True if there isn't a single, empty selection cursor.  In the
     #     event of a modification, _section_matches is not updated until
     #     on_post_modification() is called.  The value of _section_matches is
-    #     unspecified if _settings_parser.is_disabled is True.
-    # View _view - The View that this WrapFixer manages.
+    #     unspecified if _settings_parser.is_disabled is True.  This is None
+    #     if we have not yet computed it from _section_scopes.  Use
+    #     _current_section_matches() to access it.
+    # tuple<int, int, tuple<int>, str> _section_matches_key - The values of
+    #     _view.change_count(), _selection_point(), _cursor_points(), and the
+    #     "syntax" setting as of the most recent update to _section_scopes, if
+    #     any.
+    # tuple<str, str> _section_scopes - The values of _prev_char_scope and
+    #     _view.scope_name at the selection cursor, which determine
+    #     _section_matches.  This is None if there isn't a single, empty
+    #     selection cursor.
+    # dict<tuple<str, str>, list<bool>> _scope_section_matches - A cache of the
+    #     values of _section_matches for each value of _section_scopes we have
+    #     encountered, as in _scope_matches.
+    # list<tuple<str, str>> _cursor_scopes - The equivalent of _section_scopes
+    #     for each of the selection cursors, if there are multiple cursors, as
+    #     in _cursor_points().  This is parallel to _view.sel().  It is None if
+    #     _cursor_points() is None.
+    # list<list<bool>> _cursor_section_matches - The equivalent of
+    #     _section_matches for each of the selection cursors.  This is
+    #     parallel to _cursor_scopes.  It is None if _cursor_scopes is None or
+    #     if we have not yet computed it.  Use
+    #     _current_cursor_section_matches() to access it.
+    # list<Region> _selection_after_edits - The selection the View should have
+    #     after performing the edits that _gen_edits() yielded, if it computed
+    #     them for multiple selection cursors.  This is None otherwise.
+    # bool _was_ruled_out - Whether has_edit() used _try_rule_out_edit() to
+    #     determine that the most recent modification did not require any word
+    #     wrapping fixup.
+    #
+    # If a buffer is open in multiple views (e.g. using "File" > "New View into
+    # File"), there is one WrapFixer per view, but they share the state that
+    # pertains to the buffer rather than to the selection cursor.  This is
+    # stored in the _buffer attribute, which is a dictionary with the
+    # following entries:
+    #
+    # int buffer_id - The value of _view.buffer_id().
+    # WrapFixer explicit_line_break_fixer - The WrapFixer whose View has the
+    #     "wrap_as_you_type_explicit_line_break" regions, if any.  The regions
+    #     move to the View that most recently responded to a modification, as
+    #     in handles_modifications().
+    # bool is_performing_edits - Whether one of the WrapFixers is in the middle
+    #     of a call to perform_edits().
+    # int overflow_change_count - The value of _view.change_count() as of the
+    #     most recent modification we marked for updating the overflow
+    #     highlights, as in _mark_overflow_dirty_for_modification(), or None.
+    # int overflow_text_change_count - The number of elements at the
+    #     beginning of "text_changes" that we have marked for updating the
+    #     overflow highlights.
+    # int reported_change_count - The value of _view.change_count() as of the
+    #     most recent call to on_text_changed(), or None if there has not been
+    #     one.  The changes passed to the next call are the changes since
+    #     then, so we may update the caches that reflect this change count to
+    #     reflect the changes.
+    # dict<str, object> scope_runs - The scopes of the line containing the
+    #     selection cursor of one of the Views, as returned by
+    #     _view.extract_tokens_with_scopes.  This is None if we have not
+    #     computed them.  Otherwise, it has the following entries:
+    #
+    #     list<int> begins - The beginnings of the runs of characters with the
+    #         same scope, in order.
+    #     int change_count - The value of _view.change_count() that the runs
+    #         reflect.  We update this when the text after the line changes,
+    #         as in _update_scope_runs().
+    #     list<int> ends - The ends of the runs.  This is parallel to "begins".
+    #     Region line_region - The line.
+    #     list<str> scopes - The scopes of the runs.  This is parallel to
+    #         "begins".
+    #     str syntax - The value of the "syntax" setting when we computed the
+    #         runs.
+    # int size - The value of _view.size() after the most recent modification
+    #     for which we called on_post_modification().
+    # list<tuple<int, int, str>> text_changes - The changes to the buffer's
+    #     text since the most recent call to on_post_modification(), as
+    #     reported to on_text_changed(), in order.  Each change is represented
+    #     as a tuple consisting of the beginning and the end of the replaced
+    #     text and the replacement text.  This is None if we have not been
+    #     tracking the changes since then, e.g. in Sublime Text 2 and 3.
+    # int text_changes_count - The value of _view.change_count() as of the
+    #     most recent update to "text_changes".  If this differs from the
+    #     current change count, then on_text_changed() has not yet been called
+    #     for the most recent modification, so "text_changes" is incomplete.
+    # bool tracks_text_changes - Whether on_text_changed() has ever been
+    #     called.
+    # list<WrapFixer> wrap_fixers - The WrapFixers for the buffer's Views, in
+    #     the order in which we created them.
+
+    __slots__ = (
+        '_analyzer', '_buffer', '_clipboard', '_continuation_count',
+        '_continuations',
+        '_cursor_scopes', '_cursor_section_matches', '_edits_gen',
+        '_first_edit', '_is_scanning_overflow', '_last_use', '_line_summary',
+        '_overflow_dirty', '_overflow_key_count', '_overflow_keys',
+        '_passively_split', '_plan', '_prev_selection_point', '_reflow',
+        '_scope_section_matches', '_section_matches', '_section_matches_key',
+        '_section_scopes', '_section_to_extend_cache',
+        '_selection_after_edits', '_was_ruled_out')
 
-    # A regular expression for stripping whitespace from the beginning and end
-    # of a string.  The result of the stripping is given by re.Match.group(1).
-    _STRIP_REGEX = re.compile(r'^\s*(\S.*\S|\S?)\s*$', re.DOTALL)
+    # A map to each WrapFixer instance from _view.id()
+    _instances = {}
 
-    # A regular expression matching all of the whitespace at the end of the
-    # source string.  It matches the empty string if there is no such
-    # whitespace.
-    _TRAILING_WHITESPACE_REGEX = re.compile(r'\s*$')
+    # A map to the _buffer value for each buffer from its ID
+    _buffers = {}
 
-    # Equivalent value is contractual
-    _WHITESPACE_REGEX = re.compile(r'\s*')
+    # The maximum number of elements in _instances.  When we need to create a
+    # WrapFixer and there are already this many, we first discard the
+    # WrapFixer that was used least recently, as long as its state is empty.
+    # This ensures that the WrapFixers for views that are never closed (or
+    # whose closing we do not observe) do not accumulate indefinitely.
+    _MAX_INSTANCES = 64
 
-    # A map to each WrapFixer instance from _view.id()
-    _instances = {}
+    # The number of calls to instance() so far
+    _use_count = 0
+
+    # The maximum number of elements in _continuations
+    _MAX_CONTINUATIONS = 8
+
+    # The maximum number of elements in _scope_section_matches
+    _MAX_SCOPE_SECTION_MATCHES = 256
+
+    # The maximum number of selection cursors for which we perform word
+    # wrapping fixup
+    _MAX_CURSORS = 64
+
+    # The number of rows before the first selection cursor and after the last
+    # one that prepare_analysis() copies for analyze() to use
+    _ANALYSIS_CONTEXT_ROWS = 50
+
+    # The maximum number of characters spanned by each chunk of a reflow, as
+    # in plan_reflow().  A chunk may exceed this if it consists of a single
+    # long paragraph.
+    _REFLOW_CHUNK_SIZE = 20000
+
+    # The prefix of the region keys for highlighting the text that extends
+    # past the wrap width, if the "wrap_as_you_type_highlight_overflow"
+    # setting is true
+    _OVERFLOW_KEY_PREFIX = 'wrap_as_you_type_overflow_'
+
+    # The number of regions in each bucket of _overflow_keys when we create
+    # the buckets
+    _OVERFLOW_BUCKET_SIZE = 32
+
+    # The maximum number of elements of _overflow_dirty.  If there are more,
+    # we combine them into a single region.
+    _MAX_OVERFLOW_DIRTY = 16
+
+    # The commands whose modifications are confined to the lines containing
+    # the selection cursors and the lines before them.  In Sublime Text 2 and
+    # 3, where we do not know exactly what changed, we perform a full scan of
+    # the overflowing lines after any other command.
+    _TYPING_COMMANDS = (
+        'insert', 'left_delete', 'right_delete', 'wrap_as_you_type',
+        'wrap_as_you_type_extend_section')
 
     def __init__(self, view):
         """Private constructor."""
-        self._view = view
+        WrapEngine.__init__(self, view)
+        self._analyzer = None
+        self._clipboard = None
+        self._continuation_count = 0
+        self._continuations = []
+        self._cursor_scopes = None
+        self._cursor_section_matches = None
         self._edits_gen = None
         self._first_edit = None
+        self._is_scanning_overflow = False
+        self._last_use = 0
+        self._line_summary = None
+        self._overflow_dirty = None
+        self._overflow_key_count = 0
+        self._overflow_keys = []
+        self._section_to_extend_cache = None
         self._prev_selection_point = None
         self._passively_split = False
-        self._section_matches = []
-        self._settings_parser = SettingsParser(view)
+        self._plan = None
+        self._reflow = None
+        self._scope_section_matches = {}
+        self._section_matches = None
+        self._section_matches_key = None
+        self._section_scopes = None
+        self._selection_after_edits = None
+        self._was_ruled_out = False
+
+        buffer_id = view.buffer_id()
+        self._buffer = WrapFixer._buffers.get(buffer_id)
+        if self._buffer is None:
+            self._buffer = {
+                'buffer_id': buffer_id,
+                'explicit_line_break_fixer': None,
+                'is_performing_edits': False,
+                'overflow_change_count': None,
+                'overflow_text_change_count': 0,
+                'reported_change_count': None,
+                'scope_runs': None,
+                'size': view.size(),
+                'text_changes': None,
+                'text_changes_count': None,
+                'tracks_text_changes': False,
+                'wrap_fixers': [],
+            }
+            WrapFixer._buffers[buffer_id] = self._buffer
+        self._buffer['wrap_fixers'].append(self)
 
         self._settings_parser.add_on_change(
-            'wrap_as_you_type_sections', self._update_section_matches)
+            'wrap_as_you_type_sections', self._on_change_sections)
+        for setting in (
+                'wrap_as_you_type_defer_reflow', 'wrap_as_you_type_sections'):
+            self._settings_parser.add_on_change(
+                setting, self.clear_continuations)
+        for setting in (
+                'wrap_as_you_type_paragraphs', 'wrap_as_you_type_sections',
+                'wrap_as_you_type_space_between_words',
+                'wrap_as_you_type_word_regex'):
+            self._settings_parser.add_on_change(
+                setting, self._clear_line_summary)
         self._settings_parser.add_on_change(
             'wrap_as_you_type_passive', self._on_change_passive)
         self._settings_parser.add_on_change(
             'wrap_as_you_type_disabled', self._on_change_disabled)
+        for setting in (
+                'wrap_as_you_type_highlight_overflow',
+                'wrap_as_you_type_sections'):
+            self._settings_parser.add_on_change(setting, self._reset_overflow)
 
-    def _selection_point(self):
-        """Return the point of the selection cursor.
-
-        Return None if there is not a single, empty selection cursor.
+    def _update_section_matches(self):
+        """Update the value of _section_matches.
 
-        return int - The point.
+        This is cheap if the selection cursor has not moved to a
+        position with different scopes since the last update.  It only
+        determines the scopes at the cursor; _current_section_matches()
+        checks them against the sections when it is first called.
         """
-        selection = self._view.sel()
-        if len(selection) == 1 and selection[0].empty():
-            return selection[0].begin()
-        else:
-            return None
-
-    def _update_section_matches(self):
-        """Update the value of _section_matches."""
         if (not self._settings_parser.sections or
                 self._settings_parser.is_disabled):
             return
@@ -123,1017 +379,151 @@ class WrapFixer(sublime_plugin.TextCommand):
         view = self._view
         point = self._selection_point()
         if point is None:
-            self._section_matches = (
-                [True] * len(self._settings_parser.sections))
+            cursor_points = self._cursor_points()
+        else:
+            cursor_points = None
+        key = (
+            view.change_count(), point, cursor_points,
+            view.settings().get('syntax'))
+        if key == self._section_matches_key:
             return
+        self._section_matches_key = key
 
-        line_region = view.line(point)
-        prev_char_scope = self._prev_char_scope(point, line_region)
-        next_char_scope = view.scope_name(point)
-
-        self._section_matches = []
-        for section in self._settings_parser.sections:
-            self._section_matches.append(
-                self._matches_selector(
-                    section, prev_char_scope, next_char_scope))
-
-    def _add_width(self, width, char, tab_size):
-        """Return the resulting width after adding the specified character.
-
-        Return the width (number of columns) that results from appending
-        the specified character to a line of the specified width.
-        Assume that char is not a newline character.
-
-        Note that this method is conceptually faulty.  See the comments
-        for _width for details.
-
-        int width - The width of the line prior to adding "char".
-        str char - The character.
-        int tab_size - The number of columns per tab.
-        return int - The width after adding "char".
-        """
-        if char != '\t':
-            return width + 1
-        else:
-            return (width // tab_size) * tab_size + tab_size
-
-    def _width(self, line):
-        """Return the width of the specified line of text.
-
-        Return the width (number of columns) of the specified line of
-        text.  Assume that "line" does not contain any newline
-        characters.
-
-        Note that this method is conceptually faulty.  It assumes that
-        there is one character per Unicode code point, but this is not
-        always true, e.g. for Thai characters.  However, at the time of
-        writing, Sublime Text renders each Unicode code point as one
-        character, so the behavior of this method conforms to that of
-        Sublime.  See
-        https://github.com/SublimeTextIssues/Core/issues/663 .
-        """
-        tab_size = self._view.settings().get('tab_size')
-        width = 0
-        for char in line:
-            width = self._add_width(width, char, tab_size)
-        return width
-
-    def _advance_by_width(self, line, width):
-        """Return the character at column "width" of "line".
-
-        Return the index of the first character in the specified line of
-        text that is at or beyond the specified width (number of
-        columns).  For example, _advance_by_width('foo bar', 4) returns
-        4.  Assume that "line" does not contain any newline characters.
-
-        Note that this method is conceptually faulty.  See the comments
-        for _width for details.
-        """
-        tab_size = self._view.settings().get('tab_size')
-        width_traveled = 0
-        for i, char in enumerate(line):
-            if width_traveled >= width:
-                return i
-            width_traveled = self._add_width(width_traveled, char, tab_size)
-        return len(line)
-
-    def _wrap_width(self, section):
-        """Return the wrap width of the specified section.
-
-        If section['wrap_width'] is None, this method uses the
-        appropriate fallback.
-
-        dict<str, object> section - The section, formatted like the
-            elements of _settings_parser.sections.
-        return int - The wrap width.
-        """
-        if section['wrap_width'] is not None:
-            return section['wrap_width']
-        settings = self._view.settings()
-        wrap_width = settings.get('wrap_width')
-        if wrap_width:
-            return wrap_width
-        rulers = settings.get('rulers')
-        if rulers:
-            return rulers[0]
+        if point is None:
+            scopes = None
         else:
-            return 80
+            scopes = self._scopes_at(point)
+        if scopes != self._section_scopes or self._section_matches is None:
+            self._section_scopes = scopes
+            self._section_matches = self._scope_section_matches.get(scopes)
 
-    def _prev_line_region(self, point):
-        """Return the Region containing the previous line.
-
-        Return the Region containing the line before the line that
-        contains "point", excluding newline characters, if any.
-
-        int point - The point.
-        return Region - The previous line region.
-        """
-        view = self._view
-        row = view.rowcol(point)[0]
-        if row > 0:
-            return view.line(view.text_point(row - 1, 0))
+        if cursor_points is None:
+            self._cursor_scopes = None
         else:
-            return None
+            self._cursor_scopes = [
+                self._scopes_at(cursor_point)
+                for cursor_point in cursor_points]
+        self._cursor_section_matches = None
 
-    def _next_line_region(self, point):
-        """Return the Region containing the next line.
+    def _cursor_points(self):
+        """Return the positions of the selection cursors.
 
-        Return the Region containing the line after the line that
-        contains "point", excluding newline characters, if any.
+        Return None unless there are multiple selection cursors, all of
+        them are empty, and there are at most _MAX_CURSORS of them.
 
-        int point - The point.
-        return Region - The next line region.
+        return tuple<int> - The positions, in the order in which they
+            appear in _view.sel().
         """
-        view = self._view
-        line_region = view.full_line(point)
-        if line_region.end() < view.size():
-            return view.line(line_region.end())
-        else:
+        selection = self._view.sel()
+        if not 1 < len(selection) <= WrapFixer._MAX_CURSORS:
             return None
-
-    def _leading_whitespace(self, str_, start=0):
-        """Return the whitespace at the beginning of the specified string.
-
-        Return all of the whitespace at the beginning of str_[start:].
-        Return '' if there is no such whitespace.
-
-        str str_ - The string.
-        int start - The starting index.
-        return str - The leading whitespace.
-        """
-        return WrapFixer._WHITESPACE_REGEX.match(str_, start).group()
-
-    def _end_point_excluding_whitespace(self, str_, region):
-        """Return the latest point in "region" that is a whitespace character.
-
-        Return the point of (or rather, immediately before) the latest
-        character in "region" that is a whitespace character.  Return
-        region.end() if the last character is not a whitespace
-        character.  Return region.begin() if all of the characters are
-        whitespace characters.
-
-        str str_ - The value of _view.substr(region).
-        Region region - The region.
-        return int - The point.
-        """
-        match = WrapFixer._TRAILING_WHITESPACE_REGEX.search(str_)
-        return region.end() - match.end() + match.start()
-
-    def _section_indent(self, line, line_start):
-        """Return the whitespace at the beginning of "line" before line_start.
-
-        For example, _section_indent('   * Foo', ' * ') returns '  ',
-        because there are two spaces prior to the space-asterisk-space.
-        Assume that "line" does not contain any newline characters.
-        Return None if "line" does not start with whitespace followed by
-        line_start.  If line_start consists exclusively of whitespace,
-        so that there are multiple possible matches, return the shortest
-        possible match.
-
-        str line - The line of text to match.
-        str line_start - The line start.
-        return str - The whitespace before line_start.
-        """
-        line_indent = self._leading_whitespace(line)
-        if Util.is_all_whitespace(line_start):
-            index = line_indent.find(line_start)
-            if index >= 0:
-                return line_indent[:index]
-            else:
-                return None
-        else:
-            line_start_indent = self._leading_whitespace(line_start)
-            section_indent_length = len(line_indent) - len(line_start_indent)
-            if (line_indent.endswith(line_start_indent) and
-                    line[
-                        len(line_indent):
-                        section_indent_length + len(line_start)] ==
-                    line_start[len(line_start_indent):]):
-                return line_indent[:section_indent_length]
-            else:
+        points = []
+        for region in selection:
+            if not region.empty():
                 return None
+            points.append(region.begin())
+        return tuple(points)
 
-    def _i_line_start_i(self, line, line_start):
-        """Return the i_line_start_i of the specified line.
+    def _scopes_at(self, point):
+        """Return the scopes before and after the specified position.
 
-        str line - The line of text.
-        str line_start - The line start.
-        return str - The i_line_start_i.
-        """
-        indent = self._section_indent(line, line_start)
-        if indent is None:
-            return None
-        post_indent = self._leading_whitespace(
-            line, len(indent) + len(line_start))
-        return line[:len(indent) + len(line_start) + len(post_indent)]
-
-    def _fix_word_spans(self, raw_spans, str_):
-        """Fix errors in the results of applying "wrap_as_you_type_word_regex".
-
-        Return a list of word spans that is like raw_spans, but after
-        applying adjustments needed to make the results permissible for
-        "wrap_as_you_type_word_regex".  Per README.md,
-        "wrap_as_you_type_word_regex" may not produce non-empty words,
-        and it must produce words that cover all non-whitespace
-        characters.  If raw_spans does not meet these conditions,
-        _fix_word_spans attempts to produce similar results that do.
-        _fix_word_spans may warn the user of the error.
-
-        list<tuple<int, int>> raw_spans - The word spans produced by
-            "wrap_as_you_type_word_regex", formatted like the return
-            value of _word_spans.
-        str str_ - The string from which the words are taken.
-        return list<tuple<int, int>> - The adjusted word spans,
-            formatted like the return value of _word_spans.
-        """
-        # Remove zero-character words
-        non_empty_spans = [span for span in raw_spans if span[0] != span[1]]
-        warn = len(non_empty_spans) < len(raw_spans)
-
-        # Check each gap between adjacent words (and at the beginning and end
-        # of the string) for non-whitespace characters
-        spans = []
-        for i in range(0, len(non_empty_spans) + 1):
-            # Identify the gap
-            if i > 0:
-                gap_start_index = non_empty_spans[i - 1][1]
-            else:
-                gap_start_index = 0
-            if i < len(non_empty_spans):
-                gap_end_index = non_empty_spans[i][0]
-            else:
-                gap_end_index = len(str_)
-            gap = str_[gap_start_index:gap_end_index]
-
-            # Check for non-whitespace characters
-            match = WrapFixer._STRIP_REGEX.search(gap)
-            if match.start(1) < match.end(1):
-                # The gap has a non-whitespace character.  Add a word that
-                # covers the non-whitespace characters.
-                warn = True
-                spans.append((
-                    gap_start_index + match.start(1),
-                    gap_start_index + match.end(1)))
-
-            if i < len(non_empty_spans):
-                spans.append(non_empty_spans[i])
-
-        if warn:
-            raw_words = [str_[span[0]:span[1]] for span in raw_spans]
-            print(
-                u'WrapAsYouType error: The "wrap_as_you_type_word_regex" '
-                'setting is faulty, because on the string {0:s}, it yielded '
-                'either an empty word, or a gap between words that had '
-                'non-whitespace characters.  It produced the following words: '
-                '{1:s}.  WrapAsYouType has corrected for this, but you should '
-                'fix the setting.'.format(repr(str_.strip()), str(raw_words)))
-            Util.status_message(
-                self._view.window(),
-                'WrapAsYouType settings error; see console')
-        return spans
-
-    def _word_spans(self, str_):
-        """Return the locations of the words in str_.
-
-        Return the locations of the words in str_, based on the value of
-        _settings_parser.word_regex (and after applying any corrections
-        suggested by _fix_word_spans).
-
-        str str_ - The string to search.
-        return list<tuple<int, int>> - The positions of the words.  Each
-            element is a pair indicating the start and end indices of
-            the span (the index of the first character, and the index of
-            the position right after the last character).  The elements
-            are in order.
-        """
-        # Trim whitespace
-        match = WrapFixer._STRIP_REGEX.search(str_)
-        trimmed_str = match.group(1)
-        if not trimmed_str:
-            return []
-        trimmed_str_start_index = match.start(1)
-
-        # Compute the words
-        spans = []
-        for match in self._settings_parser.word_regex.finditer(trimmed_str):
-            spans.append((
-                trimmed_str_start_index + match.start(),
-                trimmed_str_start_index + match.end()))
-
-        # Fix any problems with the words
-        if (self._settings_parser.word_regex !=
-                SettingsParser.DEFAULT_WORD_REGEX):
-            return self._fix_word_spans(spans, str_)
-        else:
-            # Optimization: DEFAULT_WORD_REGEX is trustworthy, so don't bother
-            # calling _fix_word_spans
-            return spans
-
-    def _space_between(self, first_word, second_word):
-        """Return the space to use between the specified words.
-
-        Return the space to use between the specified words, as
-        suggested by _settings_parser.space_between_words.  The space is
-        a string consisting of whitespace characters.  It may be the
-        empty string ''.
-
-        str first_word - The word before the space.
-        str second_word - The word after the space.
-        return str - The space.
-        """
-        for item in self._settings_parser.space_between_words:
-            if ((item['first_word_regex'] is None or
-                    item['first_word_regex'].search(
-                        first_word) is not None) and
-                    (item['second_word_regex'] is None or
-                        item['second_word_regex'].search(
-                            second_word) is not None)):
-                return item['space']
-        return ' '
-
-    def _combine_extent(self, section, first_point, second_point):
-        """Return the furthest that we can combine a section.
-
-        Return the furthest point that we can combine first_point with
-        in the specified section, based on section['combining_selector']
-        and section['selector'], as we move from first_point to
-        second_point.  So if second_point > first_point, this is the
-        latest point that is no later than second_point that we can
-        combine with first_point, and vice versa if second_point <
-        first_point.  _combine_extent does not check whether first_point
-        matches the section (as in _point_matches_selector).
-
-        dict<str, object> section - The section, formatted like the
-            elements of _settings_parser.sections.
-        int first_point - The starting point.
-        int second_point - The ending point.
-        return int - The furthest point we can combine.
-        """
-        # Determine the range of points on which to check score_selector
-        view = self._view
-        if first_point >= second_point:
-            points = range(first_point - 1, second_point - 1, -1)
-        elif view.rowcol(second_point)[1] > 0:
-            points = range(first_point, second_point)
-        else:
-            # Special-case the first character of a line; see the comment below
-            points = range(first_point, second_point + 1)
-
-        prev_scope = None
-        for point in points:
-            scope = view.scope_name(point)
-            if scope == prev_scope:
-                # Optimization: Avoid relatively expensive calls to
-                # score_selector
-                continue
+        Return the values of _prev_char_scope and _view.scope_name at
+        "point".  Where possible, this looks the scopes up in the
+        scope runs for the point's line rather than calling
+        _view.scope_name, so that moving the selection cursor within a
+        line does not require querying the View.
 
-            if (sublime.score_selector(scope, section['selector']) == 0 and
-                    (section['combining_selector'] is None or
-                        sublime.score_selector(
-                            scope, section['combining_selector']) == 0)):
-                if first_point >= second_point:
-                    return point + 1
-                elif view.rowcol(point)[1] > 0:
-                    return point
-                else:
-                    # Special-case the first character of a line.  In a typical
-                    # Sublime syntax file, a line-based scope (e.g. a
-                    # comment.line) includes the newline character at the end
-                    # of the line.  This does not seem quite proper to me, but
-                    # in any event it necessitates this special case.
-                    return point - 1
-            prev_scope = scope
-        return second_point
-
-    def _are_combined(self, section, first_point, second_point):
-        """Return whether we can combine the specified points.
-
-        Return whether we can combine second_point with first_point in
-        the specified section, based on section['combining_selector']
-        and section['selector'], by moving from first_point to
-        second_point.  _are_combined does not check whether first_point
-        matches the section (as in _point_matches_selector).
-
-        dict<str, object> section - The section, formatted like the
-            elements of _settings_parser.sections.
-        int first_point - The starting point.
-        int second_point - The ending point.
-        return bool - Whether we can combine second_point with
-            first_point.
+        int point - The position.
+        return tuple<str, str> - The scopes.
         """
-        return (
-            self._combine_extent(section, first_point, second_point) ==
-            second_point)
-
-    def _prev_char_scope(self, point, line_region):
-        """Return the scope associated with the character before "point".
-
-        Return the scope associated with the character before "point",
-        as in _view.scope_name, but if that is a line break character,
-        return None instead.
-
-        In a typical Sublime syntax file, a line-based scope (e.g. a
-        comment.line) includes the newline character at the end of the
-        line.  This does not seem quite proper to me, but in any event
-        it requires special behavior in _matches_selector and
-        _point_matches_selector concerning the beginning of the line.
-        This is why _prev_char_scope returns None at the beginning of a
-        line.
+        view = self._view
+        line_region = view.line(point)
+        if not hasattr(view, 'extract_tokens_with_scopes'):
+            # Sublime Text 2 and 3
+            return (
+                self._prev_char_scope(point, line_region),
+                view.scope_name(point))
+
+        change_count = view.change_count()
+        syntax = view.settings().get('syntax')
+        runs = self._buffer['scope_runs']
+        if (runs is None or runs['change_count'] != change_count or
+                runs['line_region'] != line_region or
+                runs['syntax'] != syntax):
+            tokens = view.extract_tokens_with_scopes(view.full_line(point))
+            runs = {
+                'begins': [region.begin() for region, scope in tokens],
+                'change_count': change_count,
+                'ends': [region.end() for region, scope in tokens],
+                'line_region': line_region,
+                'scopes': [scope for region, scope in tokens],
+                'syntax': syntax,
+            }
+            self._buffer['scope_runs'] = runs
 
-        int point - The point.
-        Region line_region - The value of _view.line(point).
-        return str - The scope.
-        """
         if point > line_region.begin():
-            return self._view.scope_name(point - 1)
+            index = bisect.bisect_right(runs['begins'], point - 1) - 1
+            if index >= 0 and point - 1 < runs['ends'][index]:
+                prev_char_scope = runs['scopes'][index]
+            else:
+                prev_char_scope = view.scope_name(point - 1)
         else:
-            return None
-
-    def _matches_selector(self, section, prev_char_scope, next_char_scope):
-        """Return whether a position with the given scopes matches "section".
-
-        Return whether a position with the specified preceding and
-        succeeding scopes matches "section", based on
-        section['selector'].
+            prev_char_scope = None
+        index = bisect.bisect_right(runs['begins'], point) - 1
+        if index >= 0 and point < runs['ends'][index]:
+            next_char_scope = runs['scopes'][index]
+        else:
+            next_char_scope = view.scope_name(point)
+        return (prev_char_scope, next_char_scope)
 
-        We should conceive of a match as being performed not on a
-        character, but on the point between two characters.  See the
-        comments for _point_matches_selector for more information.
+    def _current_section_matches(self):
+        """Return the value of _section_matches, computing it if necessary.
 
-        dict<str, object> section - The section, formatted like the
-            elements of _settings_parser.sections.
-        str prev_char_scope - The result of calling _prev_char_scope on
-            the position.
-        str next_char_scope - The scope of the succeeding character, as
-            returned by _view.scope_name.
-        return bool - Whether the position matches.
+        return list<bool> - The value of _section_matches.
         """
-        return (
-            (prev_char_scope is not None and
-                sublime.score_selector(
-                    prev_char_scope, section['selector']) > 0) or
-            sublime.score_selector(next_char_scope, section['selector']) > 0)
-
-    def _point_matches_selector(self, section, point, line_region):
-        """Return whether the specified point matches "section".
-
-        Return whether the specified point matches "section", based on
-        section['selector'].
-
-        We should conceive of a match as being performed not on a
-        character, but on the point between two characters.  For
-        example, in C++ block comments, a selection cursor that is
-        immediately before the /* is in the block comment, even though
-        the preceding character is not.  Likewise, a selection cursor
-        that is immediately after the */ is in the block comment, even
-        though the succeeding character is not.
-
-        dict<str, object> section - The section, formatted like the
-            elements of _settings_parser.sections.
-        int point - The position.
-        Region line_region - The value of _view.line(point).
-        return bool - Whether the position matches.
-        """
-        return self._matches_selector(
-            section, self._prev_char_scope(point, line_region),
-            self._view.scope_name(point))
-
-    def _first_line_paragraph(self, line_text):
-        """Return the _settings_parser.paragraphs element matching line_text.
-
-        Return the first element in _settings_parser.paragraphs whose
-        "first_line_regex" entry matches the specified line, if any.
-
-        str line_text - The line's text - the contents of the line after
-            removing the line start and any leading and trailing
-            whitespace.
-        return dict<str, object> - The paragraph element.
-        """
-        for paragraph in self._settings_parser.paragraphs:
-            if paragraph['first_line_regex'].search(line_text) is not None:
-                return paragraph
-        return None
-
-    def _paragraph_indent(self, line_text):
-        """Return the relative indentation of the line after "line".
-
-        Return the indentation of the line after the specified line,
-        relative to the indentation of the specified line, if the
-        subsequent line is in the same paragraph.  Return None instead
-        if the line is part of a single-line paragraph, as in the
-        "single_line" entry of elements of the
-        "wrap_as_you_type_paragraphs" setting.
-
-        str line_text - The line's text - the contents of the line after
-            removing the line start and any leading and trailing
-            whitespace.
-        return str - The indentation.  This consists exclusively of
-            whitespace characters.
-        """
-        for paragraph in self._settings_parser.paragraphs:
-            match = paragraph['first_line_regex'].search(line_text)
-            if match is not None:
-                if paragraph['single_line']:
-                    return None
-
-                indent_group = paragraph['indent_group']
-                if indent_group is not None:
-                    group = match.group(indent_group)
-                    if group is not None:
-                        components = []
-                        for char in group:
-                            components.append(' ' if char != '\t' else '\t')
-                        return ''.join(components)
-
-                if paragraph['indent'] is not None:
-                    return paragraph['indent']
-                elif paragraph['indent_levels'] is not None:
-                    tab_size = self._view.settings().get('tab_size')
-                    return ' ' * (tab_size * paragraph['indent_levels'])
-                else:
-                    return ''
-        return ''
-
-    def _same_paragraph_line(
-            self, section, point, first_line, second_line,
-            first_line_region, second_line_region, line_start):
-        """Determine whether the specified lines are in the same paragraph.
+        if self._section_matches is None:
+            if self._section_scopes is None:
+                self._section_matches = (
+                    [True] * len(self._settings_parser.sections))
+            else:
+                self._section_matches = self._scope_matches(
+                    self._section_scopes)
+        return self._section_matches
 
-        Determine whether the specified consecutive lines are in the
-        same paragraph.  If so, return the text in the second line - the
-        result of taking that line, removing any characters that are not
-        in the same section as "point", removing the line start, and
-        then removing any leading or trailing whitespace.  If not,
-        return None.
+    def _current_cursor_section_matches(self):
+        """Return the value of _cursor_section_matches.
 
-        Note that first_line and second_line need not currently be
-        individual lines; they may be portions of the document that we
-        are considering as if they were consecutive lines.
+        This computes _cursor_section_matches if necessary.
 
-        dict<str, object> section - The current section, formatted like
-            the elements of _settings_parser.sections.
-        int point - The current position.  This must be in
-            first_line_region or second_line_region.
-        str first_line - The text of the first line.
-        str second_line - The text of the second line.
-        Region first_line_region - The region containing first_line.
-        Region second_line_region - The region containing second_line.
-        str line_start - The line start.
-        return str - The second line's text, if it is in the same
-            paragraph.
+        return list<list<bool>> - The value of _cursor_section_matches.
         """
-        # Compute the lines' indents
-        indent = self._section_indent(first_line, line_start)
-        if indent is None:
-            return None
-        second_indent = self._section_indent(second_line, line_start)
-        if second_indent != indent:
-            return None
-
-        # Compute the lines' text, before applying _combine_extent
-        i_line_start_len = len(indent) + len(line_start)
-        first_line_text = first_line[i_line_start_len:].strip()
-        second_line_text = second_line[i_line_start_len:].strip()
-        if not first_line_text or not second_line_text:
-            return None
-
-        # Compute the lines' post-line-start indents
-        first_paragraph_indent = self._leading_whitespace(
-            first_line[i_line_start_len:])
-        second_paragraph_indent = self._leading_whitespace(
-            second_line[i_line_start_len:])
-        if not second_paragraph_indent.startswith(first_paragraph_indent):
-            return None
-
-        # Check whether the indentation of the second line is correct for a
-        # same-paragraph match
-        paragraph_indent = self._paragraph_indent(first_line_text)
-        if (paragraph_indent is None or
-                second_paragraph_indent[len(first_paragraph_indent):] !=
-                paragraph_indent):
-            return None
-
-        # If the line break between the two paragraphs was inserted by the user
-        # pressing the enter key, then we preserve it, by treating the second
-        # line as the start of a new paragraph
-        regions = self._view.get_regions(
-            'wrap_as_you_type_explicit_line_break')
-        for region in regions:
-            if (region.begin() == first_line_region.end() and
-                    region.end() == second_line_region.begin()):
-                return None
-
-        # Restrict second_line_text by _combine_extent
-        combine_extent = self._combine_extent(
-            section, point,
-            second_line_region.begin() + i_line_start_len +
-            len(second_paragraph_indent) + len(second_line_text))
-        if (combine_extent <
-                second_line_region.begin() + i_line_start_len +
-                len(second_paragraph_indent) + 1):
-            # "point" does not combine with any text on the second line
-            return None
-        second_line_extent_text = second_line_text[
-            :combine_extent - second_line_region.begin() - i_line_start_len -
-            len(second_paragraph_indent)].strip()
-        if not second_line_extent_text:
-            return None
-
-        if (self._first_line_paragraph(second_line_extent_text) is not None or
-                not self._are_combined(
-                    section, point, first_line_region.begin())):
-            return None
-        return second_line_extent_text
-
-    def _should_erase_preceding_line_break(
-            self, section, point, line_start, line, line_region, prev_line,
-            prev_line_region, prev_end_point_excluding_whitespace,
-            prev_char_scope, next_char_scope):
-        """Return whether we should erase the preceding line break.
-
-        Return whether we should erase all of the text from the most
-        recent line break up to the selection cursor, if we are using
-        the specified section and line start.  We also erase any
-        trailing whitespace on the line before the line break.  Assume
-        that there is a single, non-empty selection cursor.
-
-        We perform such an erasure when it appears that the user is
-        backspacing content from before the earliest text on the current
-        line.  To the user, the effect is like deleting the space
-        between the last word on the preceding line and the first word
-        on the current line.  The purpose of the erasure is to make it
-        feel more like editing non-wrapped text content to the user (or
-        rather, like editing soft-wrapped content that doesn't have any
-        indentation or line start).
-
-        dict<str, object> section - The section we are attempting to
-            use, formatted like the elements of
+        if (self._cursor_section_matches is None and
+                self._cursor_scopes is not None):
+            self._cursor_section_matches = [
+                self._scope_matches(scopes) for scopes in self._cursor_scopes]
+        return self._cursor_section_matches
+
+    def _scope_matches(self, scopes):
+        """Return whether a position with the given scopes matches sections.
+
+        tuple<str, str> scopes - The values of _prev_char_scope and
+            _view.scope_name at the position.
+        return list<bool> - Whether the position matches each of the
+            sections, as in _matches_selector.  This is parallel to
             _settings_parser.sections.
-        int point - The position of the selection cursor.
-        str line_start - The line start we are attempting to use.
-        str line - The value of _view.substr(line_region).
-        Region line_region - The value of _view.line(point).
-        str prev_line - The value of _view.substr(prev_line_region).
-            This is None if prev_line_region is None.
-        Region prev_line_region - The value of _prev_line_region(point).
-        int prev_end_point_excluding_whitespace - The value of
-            _end_point_excluding_whitespace(prev_line,
-            prev_line_region).  This is None if prev_line is None.
-        str prev_char_scope - The value of
-            _prev_char_scope(prev_line_region.end(), prev_line_reigon).
-            This is None if prev_line_region is None.
-        str next_char_scope - The value of
-            _view.scope_name(prev_line_region.end()).  This is None if
-            prev_line_region is None.
-        return bool - Whether we should erase the preceding line break.
-        """
-        if (prev_line_region is None or Util.is_all_whitespace(line) or
-                # If line_start consists exclusively of whitespace, then the
-                # setting is too generic to be confident that the user
-                # backspaced past the beginning of a line
-                Util.is_all_whitespace(line_start)):
-            return False
-
-        # Check whether the user appears to have backspaced part of the
-        # indentation
-        indent = self._section_indent(prev_line, line_start)
-        if (indent is None or line.startswith(indent) or
-                line[:point - line_region.begin()] !=
-                indent[:point - line_region.begin()]):
-            return False
-
-        # Check whether prev_line has at least one word
-        if Util.is_all_whitespace(prev_line[len(indent) + len(line_start):]):
-            return False
-
-        # Check whether the first thing after "point" is line_start, in which
-        # case the user only appears to be editing the indentation
-        if (self._section_indent(
-                line[point - line_region.begin():], line_start) is not None):
-            return False
-
-        # Check whether prev_line.begin() and "point" are in a single section
-        if (not self._matches_selector(
-                section, prev_char_scope, next_char_scope) or
-                not self._are_combined(
-                    section, prev_line_region.begin(), point)):
-            return False
-
-        # If the preceding line break was inserted by the user pressing the
-        # enter key, then preserve it
-        regions = self._view.get_regions(
-            'wrap_as_you_type_explicit_line_break')
-        for region in regions:
-            if region.begin() == prev_line_region.end():
-                return False
-        return True
-
-    def _erase_preceding_line_break_edit(self, point):
-        """Return a pair with an edit for erasing the preceding line break.
-
-        Return a pair whose first element is an edit for erasing all of
-        the text from the most recent line break character up to the
-        selection cursor.  This also erases any trailing whitespace on
-        the line before the line break.  The second element of the
-        return value is the recommended new point - the position to
-        which "point" is moved after the erasure.  Clients ought to
-        check that _should_erase_preceding_line_break returns True
-        before calling this method.  See the comments for
-        _should_erase_preceding_line_break for more information
-        concerning the motivation of such an edit.
-
-        int point - The position.
-        return tuple<tuple<Region, str>, int> - A pair consisting of the
-            edit and the new position, respectively.
         """
-        # Compute the region to erase
-        view = self._view
-        line_region = view.line(point)
-        line = view.substr(line_region)
-        prev_line_region = self._prev_line_region(point)
-        prev_line = view.substr(prev_line_region)
-        erase_start_point = self._end_point_excluding_whitespace(
-            prev_line, prev_line_region)
-        erase_end_point = (
-            line_region.begin() + len(self._leading_whitespace(line)))
-        erase_region = Region(erase_start_point, erase_end_point)
-
-        # Return the edit and the new position
-        edit = (erase_region, '')
-        if point <= erase_region.begin():
-            return (edit, point)
-        elif point <= erase_region.end():
-            return (edit, erase_region.begin())
-        else:
-            return (edit, point - erase_region.size())
-
-    def _try_remove_indent_of_next_line_edit(self, section, point, line_start):
-        r"""Return an edit for removing subsequent indentation, if appropriate.
-
-        Return an edit for removing the text from "point" up to what
-        appears to be the end of the former i_line_start_i of the next
-        line, or None if we should not remove such text.
-
-        The goal here is to help the user when he presses the "delete"
-        key at the end of a line.  For example, if the line start is
-        " * ", the current line of text reads, "   * Foo bar   * baz",
-        and the selection cursor is immediately after the word "bar",
-        then it looks as though the document used to read,
-        "   * Foo bar\n   * baz", and the user just deleted the newline
-        character.  In this case, we erase text so that the line reads,
-        "   * Foo barbaz" instead.  The purpose of the erasure is to
-        make it feel more like editing non-wrapped text content to the
-        user (or rather, like editing soft-wrapped content that doesn't
-        have any indentation or line start).
-
-        dict<str, object> section - The current section, formatted like
-            the elements of _settings_parser.sections.
-        int point - The position.
-        str line_start - The line start.
-        return tuple<Region, str> - The edit, if any.
-        """
-        line_region = self._view.line(point)
-        line = self._view.substr(line_region)
-        first_line = line[:point - line_region.begin()]
-        second_line = line[point - line_region.begin():]
-        i_line_start_i = self._i_line_start_i(second_line, line_start)
-        if (i_line_start_i is None or
-                self._leading_whitespace(i_line_start_i) in ('', ' ', '  ')):
-            # i_line_start_i is too generic for us to confidently guess that
-            # the user deleted a newline character
-            return None
-
-        # Check _point_matches_selector
-        if not self._point_matches_selector(section, point, line_region):
-            return None
-
-        # Check whether the "lines" are in the same paragraph
-        if (self._same_paragraph_line(
-                section, point, first_line, second_line,
-                Region(line_region.begin(), point),
-                Region(point, line_region.end()), line_start) is None):
-            return None
-
-        # Return the edit
-        erase_region = Region(point, point + len(i_line_start_i))
-        return (erase_region, '')
-
-    def _try_split_edit(self, section, point, line_start):
-        """Return a pair containing the edit for splitting the line, if any.
-
-        Return a pair whose first element is the edit for splitting the
-        line containing "point", if we should do so.  If the line is
-        longer than the wrap width, and it contains at least two words,
-        then we split the line after the latest word that is no later
-        than the wrap width (or the first word if there is no such
-        word), assuming the split is contained in a single section.
-        Note that it may take multiple split operations to reduce the
-        line down to lines that are all no longer than the wrap width.
-        The second element of the return value is the recommended new
-        point - the later of the position to which "point" is moved
-        after the split, and the position after the i_line_start_i of
-        the added line.  This method returns (None, None) if we should
-        not perform a split operation.  It assumes that there is a
-        single, empty selection cursor.
-
-        dict<str, object> section - The current section, formatted like
-            the elements of _settings_parser.sections.
-        int point - The current position.
-        str line_start - The line start.
-        return tuple<tuple<Region, str>, int> - A pair consisting of the
-            edit and the new position, respectively.
-        """
-        # Compute the words on the current line
-        view = self._view
-        line_region = view.line(point)
-        line = view.substr(line_region)
-        i_line_start_i = self._i_line_start_i(line, line_start)
-        if i_line_start_i is None:
-            return (None, None)
-        word_spans = self._word_spans(line[len(i_line_start_i):])
-        if len(word_spans) <= 1:
-            return (None, None)
-
-        # Check whether the line is longer than the wrap width
-        wrap_width = self._wrap_width(section)
-        wrap_index = self._advance_by_width(line, wrap_width)
-        if wrap_index >= len(i_line_start_i) + word_spans[-1][1]:
-            return (None, None)
-
-        # Check whether this is a single-line paragraph
-        line_text = line[len(i_line_start_i):].rstrip()
-        paragraph = self._first_line_paragraph(line_text)
-        if paragraph is not None and paragraph['single_line']:
-            return (None, None)
-
-        # Compute the last word on this line and the first word on the next
-        # line, post-split
-        last_word_span = None
-        first_word_span = None
-        if len(i_line_start_i) + word_spans[0][1] > wrap_index:
-            # The first word does not fit on one line
-            last_word_span = word_spans[0]
-            first_word_span = word_spans[1]
-        else:
-            for span in word_spans:
-                if len(i_line_start_i) + span[1] <= wrap_index:
-                    last_word_span = span
-                else:
-                    first_word_span = span
-                    break
-        last_word_region = Region(
-            line_region.begin() + len(i_line_start_i) + last_word_span[0],
-            line_region.begin() + len(i_line_start_i) + last_word_span[1])
-        first_word_region = Region(
-            line_region.begin() + len(i_line_start_i) + first_word_span[0],
-            line_region.begin() + len(i_line_start_i) + first_word_span[1])
-
-        # Check whether "point" is in the same section as
-        # first_word_region.end() and line_region.begin()
-        if (not self._point_matches_selector(section, point, line_region) or
-                not self._are_combined(
-                    section, point, first_word_region.end()) or
-                not self._are_combined(section, point, line_region.begin())):
-            return (None, None)
-
-        # Compute the edit
-        selection_point = self._selection_point()
-        if (last_word_region.end() < selection_point <=
-                first_word_region.begin()):
-            # Keep any spaces (or tabs) that are just before the cursor at the
-            # end of the first line in the split
-            replace_start_point = selection_point
-        else:
-            replace_start_point = last_word_region.end()
-        replace_region = Region(replace_start_point, first_word_region.begin())
-        line_text = line[
-            len(i_line_start_i):last_word_region.end() - line_region.begin()]
-        paragraph_indent = self._paragraph_indent(line_text)
-        if paragraph_indent is None:
-            paragraph_indent = ''
-        replacement_str = u'\n{0:s}{1:s}'.format(
-            i_line_start_i, paragraph_indent)
-        edit = (replace_region, replacement_str)
-
-        # Return the edit and the new position
-        if point <= replace_region.end():
-            return (edit, replace_region.begin() + len(replacement_str))
-        else:
-            return (edit, point - replace_region.size() + len(replacement_str))
-
-    def _try_join_edit(self, section, point, line_start):
-        """Return a pair containing the edit for joining, if any.
-
-        Return a pair whose first element is the edit for joining the
-        line containing "point" with the subsequent line, if we should
-        do so.  If adding the first word on the next line to the current
-        line results in a line that is no longer than the wrap width,
-        then we join the text on the two lines, assuming they are in the
-        same paragraph and section.  This would be followed up with a
-        split operation (as in _try_split_edit) if necessary to ensure
-        that the current line is no longer than the wrap width.  The
-        second element of the return value is the recommended new
-        point - the position of the former end of the line containing
-        "point".  This method returns (None, None) if we should not
-        perform a join operation.
-
-        dict<str, object> section - The current section, formatted like
-            the elements of _settings_parser.sections.
-        int point - The current position.
-        str line_start - The line start.
-        return tuple<tuple<Region, str>, int> - A pair consisting of the
-            edit and the new position, respectively.
-        """
-        # Check _point_matches_selector
-        view = self._view
-        line_region = view.line(point)
-        line = view.substr(line_region)
-        next_line_region = self._next_line_region(point)
-        if next_line_region is None:
-            return (None, None)
-        next_line = view.substr(next_line_region)
-        if not self._point_matches_selector(section, point, line_region):
-            return (None, None)
-
-        # Check whether the lines are in the same paragraph
-        next_line_extent_text = self._same_paragraph_line(
-            section, point, line, next_line, line_region, next_line_region,
-            line_start)
-        if next_line_extent_text is None:
-            return (None, None)
-
-        # Compute the last word on this line and the first word on the next
-        # line
-        i_line_start_i_len = len(self._i_line_start_i(line, line_start))
-        last_word_span = self._word_spans(line[i_line_start_i_len:])[-1]
-        last_word = line[
-            i_line_start_i_len + last_word_span[0]:
-            i_line_start_i_len + last_word_span[1]]
-        next_i_line_start_i_len = len(
-            self._i_line_start_i(next_line, line_start))
-        first_word_span = self._word_spans(next_line_extent_text)[0]
-        first_word = next_line[
-            next_i_line_start_i_len + first_word_span[0]:
-            next_i_line_start_i_len + first_word_span[1]]
-
-        # Compute the post-join spacing between last_word and first_word
-        if not Util.is_all_whitespace(line[-1]):
-            keep_space = False
-            space = self._space_between(last_word, first_word)
-        else:
-            # e.g. the user pressed space a few times at the end of the line,
-            # then pressed backspace a few times.  Preserve the space that the
-            # user entered at the end of the line.
-            keep_space = True
-            space = line[i_line_start_i_len + last_word_span[1]:]
-
-        # Check whether we can fit first_word on this line
-        width = self._width(
-            u'{0:s}{1:s}{2:s}'.format(
-                line[:i_line_start_i_len + last_word_span[1]], space,
-                first_word))
-        if width > self._wrap_width(section):
-            return (None, None)
-
-        # Compute the edit
-        first_word_start_point = (
-            next_line_region.begin() + next_i_line_start_i_len)
-        replace_region = Region(line_region.end(), first_word_start_point)
-        if keep_space:
-            edit = (replace_region, '')
-        else:
-            edit = (replace_region, space)
-        return (edit, line_region.end())
-
-    def _try_backwards_join_edit(self, section, point, line_start):
-        """Return a pair containing the edit for joining backwards, if any.
-
-        Return a pair whose first element is the edit for joining the
-        line containing "point" with the previous line, if we should do
-        so.  If adding the first word on the current line to the
-        previous line results in a line that is no longer than the wrap
-        width, then we join the text on the two lines, assuming they are
-        in the same paragraph and section.  This would be followed up
-        with a split operation (as in _try_split_edit) if necessary to
-        ensure that the current line is no longer than the wrap width.
-        The second element of the return value is the recommended new
-        point - the position of the former end of the previous line.
-        This method returns (None, None) if we should not perform a join
-        operation.
-
-        dict<str, object> section - The current section, formatted like
-            the elements of _settings_parser.sections.
-        int point - The current position.
-        str line_start - The line start.
-        return tuple<tuple<Region, str>, int> - A pair consisting of the
-            edit and the new position, respectively.
-        """
-        prev_line_region = self._prev_line_region(point)
-        if prev_line_region is not None:
-            return self._try_join_edit(
-                section, prev_line_region.end(), line_start)
-        else:
-            return (None, None)
+        matches = self._scope_section_matches.get(scopes)
+        if matches is None:
+            prev_char_scope, next_char_scope = scopes
+            matches = [
+                self._matches_selector(
+                    section, prev_char_scope, next_char_scope)
+                for section in self._settings_parser.sections]
+            if (len(self._scope_section_matches) >=
+                    WrapFixer._MAX_SCOPE_SECTION_MATCHES):
+                self._scope_section_matches = {}
+            self._scope_section_matches[scopes] = matches
+        return matches
 
     def _find_section(self, point):
         """Compute the section to use for word wrap fixup, if any.
@@ -1175,7 +565,8 @@ class WrapFixer(sublime_plugin.TextCommand):
 
         # Find the first matching section
         sections = self._settings_parser.sections
-        for section, was_match in zip(sections, self._section_matches):
+        for section, was_match in zip(
+                sections, self._current_section_matches()):
             for line_start in section['allowed_line_starts']:
                 # We check _should_erase_preceding_line_break separately,
                 # because it checks for the line start on the previous line
@@ -1197,6 +588,82 @@ class WrapFixer(sublime_plugin.TextCommand):
                     return (section, line_start, False)
         return (None, None, False)
 
+    def _pasted_region(self, point):
+        """Return the Region containing the text the user just pasted.
+
+        Return None if the most recent modification was not the pasting
+        of multiple lines of text into a section, ending at "point".
+
+        int point - The position of the selection cursor.
+        return Region - The pasted text.
+        """
+        view = self._view
+        if (view.command_history(0)[0] not in ('paste', 'paste_and_indent') or
+                not any(self._current_section_matches())):
+            return None
+
+        text_change = self._single_text_change()
+        clipboard = self._clipboard
+        if clipboard is None:
+            clipboard = sublime.get_clipboard()
+        size_change = view.size() - self._buffer['size']
+        if (text_change is not None and
+                text_change[0] + len(text_change[2]) == point):
+            pasted_region = Region(text_change[0], point)
+        elif (0 < len(clipboard) <= point and
+                view.substr(Region(point - len(clipboard), point)) ==
+                clipboard):
+            pasted_region = Region(point - len(clipboard), point)
+        elif 0 < size_change <= point:
+            # e.g. paste_and_indent altered the indentation
+            pasted_region = Region(point - size_change, point)
+        else:
+            return None
+        if '\n' in view.substr(pasted_region):
+            return pasted_region
+        else:
+            return None
+
+    def _gen_bulk_edits(self, region):
+        """Coroutine for returning edits for reflowing inserted text.
+
+        Reflow all of the lines that intersect "region", along with any
+        lines that we join them with.  We compute the reflow in memory
+        using a ViewSnapshot, applying the same splits and joins that
+        typing the text would have produced, and then return it as at
+        most two edits: one before the selection cursor and one after
+        it, so that the cursor stays with the text next to it.  Like
+        _gen_edits(), this is a coroutine that requires each edit to be
+        executed before control is returned to it.
+
+        Region region - The inserted text.
+        return Generator<tuple<Region, str>> - The edits.
+        """
+        snapshot = ViewSnapshot(self._view)
+        reflower = copy.copy(self)
+        reflower._view = snapshot
+        reflower._reflow_lines(region, self._settings_parser.is_passive)
+
+        edit = snapshot.net_edit()
+        if edit is None:
+            return
+        replace_region, replacement_str = edit
+        point = self._selection_point()
+        if not replace_region.begin() < point < replace_region.end():
+            yield edit
+        else:
+            # Split the edit at the selection cursor
+            index = snapshot.sel()[0].begin() - replace_region.begin()
+            yield (
+                Region(replace_region.begin(), point),
+                replacement_str[:index])
+            start_point = replace_region.begin() + index
+            yield (
+                Region(
+                    start_point,
+                    start_point + replace_region.end() - point),
+                replacement_str[index:])
+
     def _gen_edits(self):
         """Coroutine for returning edits for word wrap fixup.
 
@@ -1209,17 +676,41 @@ class WrapFixer(sublime_plugin.TextCommand):
             and indicates that any text that is in the Region should be
             replaced with the given string.
         """
+        self._continuation = None
+        self._selection_after_edits = None
         if not self._settings_parser.sections:
             return
 
-        # Only perform word wrap fixup if there is a single, empty selection
-        # cursor.  The main reason for this is to simplify the implementation.
-        # A secondary reason is to reduce the performance overhead of
-        # WrapAsYouType.
         point = self._selection_point()
         if point is None:
+            for edit in self._gen_multi_cursor_edits():
+                yield edit
+            return
+
+        pasted_region = self._pasted_region(point)
+        if pasted_region is not None:
+            for edit in self._gen_bulk_edits(pasted_region):
+                yield edit
             return
 
+        for edit in self._gen_point_edits(point, True):
+            yield edit
+
+    def _gen_point_edits(self, point, may_defer):
+        """Coroutine for returning edits for word wrap fixup at "point".
+
+        Return the edits for fixing word wrap around the selection
+        cursor, assuming that there is a single, empty selection cursor
+        at "point".  Like _gen_edits(), this is a coroutine that
+        requires each edit to be executed before control is returned to
+        it.
+
+        int point - The position of the selection cursor.
+        bool may_defer - Whether we may leave some of the work for
+            later, as indicated by the "wrap_as_you_type_defer_reflow"
+            and "wrap_as_you_type_work_budget" settings.
+        return Generator<tuple<Region, str>> - The edits.
+        """
         section, line_start, should_erase_preceding_line_break = (
             self._find_section(point))
         if section is None:
@@ -1246,91 +737,703 @@ class WrapFixer(sublime_plugin.TextCommand):
                     yield edit
                     point = join_point
 
-        if not self._settings_parser.is_passive:
-            # Keep splitting and joining until we reach a steady state
-            while True:
-                edit, split_point = self._try_split_edit(
-                    section, point, line_start)
-                if edit is not None:
-                    yield edit
-                    point = split_point
-                else:
-                    edit, join_point = self._try_join_edit(
-                        section, point, line_start)
-                    if edit is not None:
-                        yield edit
-                        point = join_point
-                    else:
-                        break
-        else:
-            # Split as much as possible
-            view = self._view
-            row = view.rowcol(self._selection_point())[0]
-            split_count = 0
-            if self._passively_split:
-                split_count += 1
-            split = True
-            while split:
-                edit, split_point = self._try_split_edit(
-                    section, point, line_start)
-                split = edit is not None
-                if split:
-                    yield edit
-                    point = split_point
-                    new_row = view.rowcol(self._selection_point())[0]
-                    if new_row == row:
-                        split_count += 1
-                    else:
-                        row = new_row
+        if not self._settings_parser.is_passive:
+            if may_defer and self._settings_parser.defer_reflow:
+                # Only fix the current line and the next line for now
+                last_row = self._view.rowcol(self._selection_point())[0] + 1
+            else:
+                last_row = None
+            if may_defer:
+                budget = self._settings_parser.work_budget
+            else:
+                budget = None
+            for edit in self._gen_steady_state_edits(
+                    section, point, line_start, last_row, budget):
+                yield edit
+        else:
+            # Split as much as possible
+            view = self._view
+            row = view.rowcol(self._selection_point())[0]
+            split_count = 0
+            if self._passively_split:
+                split_count += 1
+            split = True
+            while split:
+                edit, split_point = self._try_split_edit(
+                    section, point, line_start)
+                split = edit is not None
+                if split:
+                    yield edit
+                    point = split_point
+                    new_row = view.rowcol(self._selection_point())[0]
+                    if new_row == row:
+                        split_count += 1
+                    else:
+                        row = new_row
+
+            if self._passively_split:
+                # Attempt to rejoin the previously split line
+                edit, join_point = self._try_join_edit(
+                    section, point, line_start)
+                if edit is not None:
+                    yield edit
+                    split_count -= 1
+
+                    # Split as much as possible
+                    split = True
+                    while split:
+                        edit, split_point = self._try_split_edit(
+                            section, point, line_start)
+                        split = edit is not None
+                        if split:
+                            yield edit
+                            point = split_point
+                            new_row = view.rowcol(self._selection_point())[0]
+                            if new_row == row:
+                                split_count += 1
+                            else:
+                                row = new_row
+
+            self._passively_split = split_count > 0
+
+    def _gen_multi_cursor_edits(self):
+        """Coroutine for returning edits for word wrap fixup at many cursors.
+
+        Return the edits for fixing word wrap around each of the
+        selection cursors, assuming there are multiple selection
+        cursors, as in _cursor_points().  We process the cursors from
+        back to front, skipping all but the last cursor on each line,
+        and compute the fixup for all of them in memory using a single
+        ViewSnapshot.  We then return all of the resulting edits, and
+        set _selection_after_edits to the resulting selection.  Unlike
+        with _gen_edits(), there is no need to execute each edit before
+        control is returned to the generator, but the edits must be
+        executed in order.
+
+        return Generator<tuple<Region, str>> - The edits.
+        """
+        view = self._view
+        cursor_section_matches = self._current_cursor_section_matches()
+        selection = view.sel()
+        if (cursor_section_matches is None or
+                len(cursor_section_matches) != len(selection)):
+            return
+
+        # Find the last cursor on each line.  The fixup for a given line does
+        # not depend on the position of the cursor within the line, except
+        # that it affects whether we split the line just before the cursor.
+        indices_by_row = {}
+        for index, region in enumerate(selection):
+            if not region.empty():
+                return
+            row = view.rowcol(region.begin())[0]
+            prev_index = indices_by_row.get(row)
+            if (prev_index is None or
+                    region.begin() > selection[prev_index].begin()):
+                indices_by_row[row] = index
+
+        # By processing the cursors from back to front, we ensure that the
+        # fixup for one cursor does not move the lines containing the cursors
+        # we have yet to process, except in the case of backwards joins
+        snapshot = ViewSnapshot(view)
+        cursor_fixer = copy.copy(self)
+        cursor_fixer._view = snapshot
+        cursor_fixer._passively_split = False
+        edits = []
+        for row in sorted(indices_by_row.keys(), reverse=True):
+            index = indices_by_row[row]
+            snapshot.focus_cursor(index)
+            cursor_fixer._section_matches = cursor_section_matches[index]
+            point = snapshot.sel()[0].begin()
+            for edit in cursor_fixer._gen_point_edits(point, False):
+                snapshot.apply_edit(*edit)
+                edits.append(edit)
+        snapshot.focus_cursor(None)
+
+        if edits:
+            self._selection_after_edits = snapshot.sel()
+        for edit in edits:
+            yield edit
+
+    @staticmethod
+    def instance(view):
+        """Return a WrapFixer for fixing word wrap in the specified View."""
+        view_id = view.id()
+        fixer = WrapFixer._instances.get(view_id)
+        if fixer is None:
+            WrapFixer._prune_instances()
+            fixer = WrapFixer(view)
+            WrapFixer._instances[view_id] = fixer
+        WrapFixer._use_count += 1
+        fixer._last_use = WrapFixer._use_count
+        return fixer
+
+    @staticmethod
+    def instances():
+        """Return all of the WrapFixers we have not erased.
+
+        return list<WrapFixer> - The WrapFixers.
+        """
+        return list(WrapFixer._instances.values())
+
+    @staticmethod
+    def _prune_instances():
+        """Make room in _instances for a new WrapFixer.
+
+        Erase the WrapFixers for any Views that are no longer valid.
+        Then, if _instances has _MAX_INSTANCES elements, erase the
+        WrapFixers whose state is empty, as in _has_empty_state(),
+        starting with the ones that were used least recently, until it
+        has fewer elements or there are no such WrapFixers.  This never
+        discards the state of a View that is still open: if we need a
+        WrapFixer for it later, instance() creates an equivalent one.
+        """
+        for view_id, fixer in list(WrapFixer._instances.items()):
+            view = fixer._view
+            if hasattr(view, 'is_valid') and not view.is_valid():
+                fixer._remove_instance(view_id)
+
+        if len(WrapFixer._instances) < WrapFixer._MAX_INSTANCES:
+            return
+        empty_instances = sorted(
+            [
+                (fixer._last_use, view_id)
+                for view_id, fixer in WrapFixer._instances.items()
+                if fixer._has_empty_state()],
+            reverse=True)
+        while (empty_instances and
+                len(WrapFixer._instances) >= WrapFixer._MAX_INSTANCES):
+            view_id = empty_instances.pop()[1]
+            WrapFixer._instances[view_id]._remove_instance(view_id)
+
+    def _remove_instance(self, view_id):
+        """Erase this WrapFixer from _instances, and stop its listeners.
+
+        int view_id - The key of this WrapFixer in _instances.
+        """
+        del WrapFixer._instances[view_id]
+        self._settings_parser.clear_on_change()
+        self._detach_from_buffer()
+
+    def _has_empty_state(self):
+        """Return whether we may discard this WrapFixer without losing state.
+
+        Return False if we are in the middle of computing or performing
+        word wrapping fixup or a reflow, if we have deferred reflows to
+        perform, if we are maintaining overflow highlights, if we own
+        the buffer's explicit line break, or if we passively split the
+        line after the selection cursor.  A WrapFixer for which this
+        returns True behaves the same as a new WrapFixer for the View.
+        """
+        return (
+            self._analyzer is None and self._plan is None and
+            self._reflow is None and not self._continuations and
+            not self._is_scanning_overflow and not self._overflow_keys and
+            not self._passively_split and
+            self._buffer['explicit_line_break_fixer'] is not self and
+            not self._buffer['is_performing_edits'])
+
+    def cache_sizes(self):
+        """Return the approximate memory footprint of each of our caches.
+
+        return list<tuple<str, int>> - A list of pairs consisting of the
+            name of each cache and the approximate number of bytes it
+            occupies, as in Util.approximate_size.
+        """
+        settings_parser = self._settings_parser
+        caches = [
+            ('continuations', self._continuations),
+            ('line summary', self._line_summary),
+            ('overflow changes', self._overflow_dirty),
+            ('overflow highlight keys', self._overflow_keys),
+            (
+                'parsed settings', [
+                    settings_parser.paragraphs, settings_parser.sections,
+                    settings_parser.space_between_words]),
+            ('planned edits', self._plan),
+            ('reflow', self._reflow),
+            ('section matches', self._scope_section_matches),
+            ('section to extend', self._section_to_extend_cache),
+        ]
+        if self._buffer['wrap_fixers'][0] is self:
+            # Only report the state we share with the other Views into the
+            # buffer once
+            caches += [
+                ('scope runs', self._buffer['scope_runs']),
+                ('text changes', self._buffer['text_changes']),
+            ]
+        return [(name, Util.approximate_size(obj)) for name, obj in caches]
+
+    def view(self):
+        """Return the View that this WrapFixer manages."""
+        return self._view
+
+    @staticmethod
+    def existing_instance(view):
+        """Return the WrapFixer for the specified View, if there is one.
+
+        Return None if we have not created a WrapFixer for the View, or
+        if we erased it using clear_instance.
+        """
+        return WrapFixer._instances.get(view.id())
+
+    @staticmethod
+    def clear_instance(view):
+        """Erase any WrapFixer associated with the specified View.
+
+        This allows the WrapFixer to be garbage collected.
+        """
+        wrap_fixer = WrapFixer._instances.get(view.id())
+        if wrap_fixer is not None:
+            wrap_fixer._remove_instance(view.id())
+
+    def _detach_from_buffer(self):
+        """Stop sharing _buffer with the other Views into the buffer.
+
+        This discards _buffer if this is the last WrapFixer sharing it.
+        """
+        buffer_ = self._buffer
+        buffer_['wrap_fixers'].remove(self)
+        if buffer_['explicit_line_break_fixer'] is self:
+            buffer_['explicit_line_break_fixer'] = None
+        if not buffer_['wrap_fixers']:
+            del WrapFixer._buffers[buffer_['buffer_id']]
+
+    def handles_modifications(self):
+        """Return whether we should respond to modifications of the View.
+
+        If the buffer is open in multiple Views, Sublime notifies each
+        of them of every modification, but only one of them should
+        perform word wrapping fixup: the one that has input focus, if
+        any, or else the first one.  The others should call
+        on_clone_modified() instead of on_modified().
+        """
+        wrap_fixers = self._buffer['wrap_fixers']
+        if len(wrap_fixers) == 1:
+            return True
+        window = sublime.active_window()
+        if window is not None:
+            active_view = window.active_view()
+            if (active_view is not None and
+                    active_view.buffer_id() == self._buffer['buffer_id']):
+                return active_view.id() == self._view.id()
+        return wrap_fixers[0] is self
+
+    def on_clone_modified(self):
+        """Respond to a modification made using another View.
+
+        Respond to a modification to the buffer made using another View
+        into the same buffer, i.e. one for which handles_modifications()
+        returned True.  This discards any state that pertains to the
+        text around our own selection cursor.
+        """
+        self._edits_gen = None
+        self._first_edit = None
+        self._plan = None
+        self._was_ruled_out = False
+        summary = self._line_summary
+        if (summary is not None and
+                summary['change_count'] != self._view.change_count()):
+            # on_text_changed() did not bring the summary up to date
+            self._line_summary = None
+
+    def _clear_line_summary(self):
+        """Discard the value of _line_summary."""
+        self._line_summary = None
+
+    def _min_space_length(self):
+        """Return the minimum length of a space between two words.
+
+        Return a lower bound on the number of characters in the value
+        that _space_between returns, and on the number of characters in
+        any whitespace that _try_join_edit preserves at the end of a
+        line.
+        """
+        lengths = [
+            len(item['space'])
+            for item in self._settings_parser.space_between_words]
+        return min([1] + lengths)
+
+    def _min_joined_word_length(
+            self, section, prev_line_end, line, line_region, line_start):
+        """Return the minimum length of a word that a join would move.
+
+        Return a lower bound on the number of characters in the word
+        that _try_join_edit would move from the specified line to the
+        end of the previous line, assuming that the join starts at or
+        before prev_line_end.  Return None if _try_join_edit would not
+        move any text from the line, regardless of the contents of the
+        previous line.
+
+        dict<str, object> section - The current section, formatted like
+            the elements of _settings_parser.sections.
+        int prev_line_end - The end of the previous line.
+        str line - The value of _view.substr(line_region).
+        Region line_region - The region of the line.
+        str line_start - The line start.
+        return int - The lower bound.
+        """
+        i_line_start_i = self._i_line_start_i(line, line_start)
+        if i_line_start_i is None:
+            return None
+        word_spans = self._word_spans(line[len(i_line_start_i):])
+        if not word_spans:
+            return None
+        if (self._settings_parser.word_regex !=
+                SettingsParser.DEFAULT_WORD_REGEX):
+            # A custom word_regex might split the text that combines with
+            # prev_line_end into arbitrarily short words
+            return 1
+
+        # _try_join_edit only moves the part of the first word that combines
+        # with the previous line.  If the combining stops earlier on, then it
+        # stops at the same point if we start from an earlier point.
+        first_word_start_point = (
+            line_region.begin() + len(i_line_start_i) + word_spans[0][0])
+        first_word_end_point = (
+            line_region.begin() + len(i_line_start_i) + word_spans[0][1])
+        combine_extent = self._combine_extent(
+            section, prev_line_end, first_word_end_point)
+        if combine_extent <= first_word_start_point:
+            return None
+        return (
+            min(combine_extent, first_word_end_point) -
+            first_word_start_point)
+
+    def _compute_line_summary(self):
+        """Return a summary of the line containing the selection cursor.
+
+        The summary captures the facts about the current line and its
+        neighbors that _try_rule_out_edit() needs in order to establish
+        that inserting text at the selection cursor calls for no word
+        wrapping fixup, without calling _find_section or any of the
+        _try_*_edit methods.  Return None if there is not a single,
+        empty selection cursor, or if the cursor is not in a section.
+
+        return dict<str, object> - The summary.  It has the following
+            entries:
+
+            int backward_join_width - A lower bound on the width that
+                the previous line would have after a backwards join, as
+                in _try_backwards_join_edit.  This is None if a
+                backwards join is impossible.
+            int begin - The beginning of the line.
+            int change_count - The value of _view.change_count() that
+                the summary reflects.
+            int first_word_end - The point after the first word on the
+                line.  The summary only applies to insertions at or
+                after this point.
+            str line - The text of the line.
+            str line_start - The line start, as returned by
+                _find_section.
+            list<bool> line_start_matches - For each section and line
+                start that _find_section checks, up to and including the
+                matching one, whether the line has that line start, as
+                in _section_indent.
+            int line_size - The number of characters in the line.
+            int next_first_word_length - A lower bound on the number of
+                characters that _try_join_edit would move from the next
+                line, as in _min_joined_word_length.  This is None if a
+                join with the next line is impossible.
+            str next_line - The text of the next line, or None if this
+                is the last line.
+            int point - The position of the selection cursor.
+            str prev_line - The text of the previous line, or None if
+                this is the first line.
+            dict<str, object> section - The section, as returned by
+                _find_section.
+            list<bool> section_matches - The value of _section_matches.
+            tuple<str, str> scopes - The values of _prev_char_scope and
+                _view.scope_name at the selection cursor.
+            int size - The value of _view.size().
+            int tab_size - The "tab_size" setting.
+        """
+        if (not self._settings_parser.sections or
+                self._settings_parser.is_disabled or
+                not any(self._current_section_matches())):
+            return None
+        point = self._selection_point()
+        if point is None:
+            return None
+        section, line_start, should_erase_preceding_line_break = (
+            self._find_section(point))
+        if section is None or should_erase_preceding_line_break:
+            return None
+
+        view = self._view
+        line_region = view.line(point)
+        line = view.substr(line_region)
+        i_line_start_i = self._i_line_start_i(line, line_start)
+        word_spans = self._word_spans(line[len(i_line_start_i):])
+        if not word_spans:
+            return None
+        indent = self._section_indent(line, line_start)
+
+        line_start_matches = []
+        for cur_section in self._settings_parser.sections:
+            for cur_line_start in cur_section['allowed_line_starts']:
+                line_start_matches.append(
+                    self._section_indent(line, cur_line_start) is not None)
+                if cur_section is section and cur_line_start == line_start:
+                    break
+            else:
+                continue
+            break
+
+        # Compute a lower bound on the width of the previous line after a
+        # backwards join
+        backward_join_width = None
+        prev_line = None
+        prev_line_region = self._prev_line_region(point)
+        if prev_line_region is not None:
+            prev_line = view.substr(prev_line_region)
+            prev_i_line_start_i = self._i_line_start_i(prev_line, line_start)
+            if (prev_i_line_start_i is not None and
+                    self._section_indent(prev_line, line_start) == indent):
+                prev_word_spans = self._word_spans(
+                    prev_line[len(prev_i_line_start_i):])
+                min_word_length = self._min_joined_word_length(
+                    section, prev_line_region.end(), line, line_region,
+                    line_start)
+                if prev_word_spans and min_word_length is not None:
+                    backward_join_width = (
+                        self._width(
+                            prev_line[
+                                :len(prev_i_line_start_i) +
+                                prev_word_spans[-1][1]]) +
+                        self._min_space_length() + min_word_length)
+
+        # Compute a lower bound on the length of the text that a join would
+        # move from the next line
+        next_first_word_length = None
+        next_line = None
+        next_line_region = self._next_line_region(point)
+        if next_line_region is not None:
+            next_line = view.substr(next_line_region)
+            if self._section_indent(next_line, line_start) == indent:
+                next_first_word_length = self._min_joined_word_length(
+                    section, line_region.end(), next_line, next_line_region,
+                    line_start)
+
+        return {
+            'backward_join_width': backward_join_width,
+            'begin': line_region.begin(),
+            'change_count': view.change_count(),
+            'first_word_end':
+                line_region.begin() + len(i_line_start_i) + word_spans[0][1],
+            'line': line,
+            'line_size': line_region.size(),
+            'line_start': line_start,
+            'line_start_matches': line_start_matches,
+            'next_first_word_length': next_first_word_length,
+            'next_line': next_line,
+            'point': point,
+            'prev_line': prev_line,
+            'scopes': (
+                self._prev_char_scope(point, line_region),
+                view.scope_name(point)),
+            'section': section,
+            'section_matches': list(self._current_section_matches()),
+            'size': view.size(),
+            'tab_size': view.settings().get('tab_size'),
+        }
+
+    def _try_rule_out_edit(self):
+        """Attempt to establish that there is no word wrap fixup to perform.
+
+        Return True if we can quickly establish that the most recent
+        modification calls for no word wrapping fixup, without running
+        _gen_edits().  This only examines the line containing the
+        selection cursor, its neighbors, and the scopes around the
+        cursor.  A return value of False does not imply that there is an
+        edit to perform.
+        If this returns True based on _line_summary, it sets
+        _was_ruled_out to True.
+
+        return bool - Whether there is definitely no edit to perform.
+        """
+        view = self._view
+        point = self._selection_point()
+        if point is None:
+            return False
+
+        if view.command_history(0)[0] in ('paste', 'paste_and_indent'):
+            # _gen_edits() may reflow the pasted text
+            return False
+
+        # If the selection cursor was not in any section, then only
+        # _should_erase_preceding_line_break could produce an edit, and that
+        # requires the text before the cursor to be whitespace
+        if (not any(self._current_section_matches()) and point > 0 and
+                not view.substr(point - 1).isspace()):
+            return True
+
+        # Check whether the modification was the insertion of text on the
+        # line described by _line_summary, after its first word
+        summary = self._line_summary
+        if summary is None:
+            return False
+        line_region = view.line(point)
+        line = view.substr(line_region)
+        if (summary['change_count'] != view.change_count() and
+                not self._infer_insertion(line_region, line, point)):
+            return False
+        if (point != summary['point'] or
+                view.settings().get('tab_size') != summary['tab_size'] or
+                self._current_section_matches() !=
+                summary['section_matches'] or
+                (self._prev_char_scope(point, line_region),
+                    view.scope_name(point)) != summary['scopes']):
+            return False
+
+        # Check whether _find_section would still select the same section and
+        # line start.  Because the scopes around the cursor are unchanged and
+        # there is text before the cursor, this only depends on the line
+        # starts.
+        index = 0
+        for section in self._settings_parser.sections:
+            for line_start in section['allowed_line_starts']:
+                if index >= len(summary['line_start_matches']):
+                    break
+                if ((self._section_indent(line, line_start) is not None) !=
+                        summary['line_start_matches'][index]):
+                    return False
+                index += 1
+
+        # Rule out _try_remove_indent_of_next_line_edit
+        section = summary['section']
+        line_start = summary['line_start']
+        wrap_width = self._wrap_width(section)
+        i_line_start_i = self._i_line_start_i(
+            line[point - line_region.begin():], line_start)
+        if (i_line_start_i is not None and
+                self._leading_whitespace(i_line_start_i) not in
+                ('', ' ', '  ')):
+            return False
+
+        # Rule out backwards joins
+        if (not self._settings_parser.is_passive and
+                summary['backward_join_width'] is not None and
+                summary['backward_join_width'] <= wrap_width):
+            return False
+
+        # Rule out splits
+        i_line_start_i = self._i_line_start_i(line, line_start)
+        word_spans = self._word_spans(line[len(i_line_start_i):])
+        if (len(word_spans) > 1 and
+                self._advance_by_width(line, wrap_width) <
+                len(i_line_start_i) + word_spans[-1][1]):
+            return False
+
+        # Rule out joins
+        if ((not self._settings_parser.is_passive or self._passively_split)
+                and summary['next_first_word_length'] is not None and
+                self._width(line[:len(i_line_start_i) + word_spans[-1][1]]) +
+                self._min_space_length() + summary['next_first_word_length'] <=
+                wrap_width):
+            return False
+
+        self._was_ruled_out = True
+        return True
+
+    def _infer_insertion(self, line_region, line, point):
+        """Establish that the modification was an insertion at the cursor.
 
-            if self._passively_split:
-                # Attempt to rejoin the previously split line
-                edit, join_point = self._try_join_edit(
-                    section, point, line_start)
-                if edit is not None:
-                    yield edit
-                    split_count -= 1
+        Return whether the only change since we computed _line_summary
+        was the insertion of text without any newlines at the position of
+        the selection cursor at the time, after the first word of the
+        line, with the cursor ending up after the inserted text.  We
+        establish this by comparing the line and its neighbors to the
+        summary, rather than by examining the command history, because
+        Sublime merges consecutive keystrokes into a single entry in the
+        command history.  If this returns True, it updates _line_summary
+        to reflect the insertion.
 
-                    # Split as much as possible
-                    split = True
-                    while split:
-                        edit, split_point = self._try_split_edit(
-                            section, point, line_start)
-                        split = edit is not None
-                        if split:
-                            yield edit
-                            point = split_point
-                            new_row = view.rowcol(self._selection_point())[0]
-                            if new_row == row:
-                                split_count += 1
-                            else:
-                                row = new_row
+        Region line_region - The line containing the selection cursor.
+        str line - The value of _view.substr(line_region).
+        int point - The position of the selection cursor.
+        return bool - Whether the modification was such an insertion.
+        """
+        view = self._view
+        summary = self._line_summary
+        size = view.size()
+        length = size - summary['size']
+        offset = summary['point'] - summary['begin']
+        old_line = summary['line']
+        if (length <= 0 or point - length != summary['point'] or
+                line_region.begin() != summary['begin'] or
+                len(line) != len(old_line) + length or
+                line[:offset] != old_line[:offset] or
+                line[offset + length:] != old_line[offset:]):
+            return False
 
-            self._passively_split = split_count > 0
+        # Rule out changes to the neighboring lines that preserve the size
+        # of the document
+        if line_region.begin() > 0:
+            prev_line = view.substr(view.line(line_region.begin() - 1))
+        else:
+            prev_line = None
+        if line_region.end() < size:
+            next_line = view.substr(view.line(line_region.end() + 1))
+        else:
+            next_line = None
+        if (prev_line != summary['prev_line'] or
+                next_line != summary['next_line']):
+            return False
 
-    @staticmethod
-    def instance(view):
-        """Return a WrapFixer for fixing word wrap in the specified View."""
-        view_id = view.id()
-        fixer = WrapFixer._instances.get(view_id)
-        if fixer is None:
-            fixer = WrapFixer(view)
-            WrapFixer._instances[view_id] = fixer
-        return fixer
+        self._update_line_summary(
+            summary['point'], summary['point'],
+            line[offset:offset + length])
+        summary = self._line_summary
+        if summary is None:
+            return False
+        summary['change_count'] = view.change_count()
+        return True
 
-    @staticmethod
-    def clear_instance(view):
-        """Erase any WrapFixer associated with the specified View.
+    def _update_line_summary(self, begin, end, str_):
+        """Update _line_summary to reflect the specified change to the text.
 
-        This allows the WrapFixer to be garbage collected.
+        If the change is after the next line, or if it is the insertion of
+        text without any newlines after the first word of the line, we
+        update the summary in place.  Otherwise, we discard it.  (A change
+        before the line might alter its scopes.)  This does not update the
+        "change_count" entry.
+
+        int begin - The beginning of the replaced text.
+        int end - The end of the replaced text.
+        str str_ - The replacement text.
         """
-        wrap_fixer = WrapFixer._instances.pop(view.id(), None)
-        if wrap_fixer is not None:
-            wrap_fixer._settings_parser.clear_on_change()
+        summary = self._line_summary
+        if summary is None:
+            return
+        line_end = summary['begin'] + summary['line_size']
+        if summary['next_line'] is None:
+            next_line_end = line_end
+        else:
+            next_line_end = line_end + 1 + len(summary['next_line'])
+        if begin > next_line_end:
+            summary['size'] += len(str_) - (end - begin)
+            return
+
+        if (begin != end or '\n' in str_ or
+                not summary['first_word_end'] <= begin <= line_end):
+            self._line_summary = None
+            return
+        offset = begin - summary['begin']
+        summary['line'] = (
+            summary['line'][:offset] + str_ + summary['line'][offset:])
+        summary['line_size'] += len(str_)
+        summary['size'] += len(str_)
+        if summary['point'] >= begin:
+            summary['point'] += len(str_)
 
     def has_edit(self):
         """Return whether there is any word wrapping fixup to perform."""
         if self._edits_gen is None:
+            if self._try_rule_out_edit():
+                self._edits_gen = iter(())
+                self._first_edit = None
+                return False
             self._edits_gen = self._gen_edits()
             try:
                 self._first_edit = next(self._edits_gen)
@@ -1338,6 +1441,360 @@ class WrapFixer(sublime_plugin.TextCommand):
                 self._first_edit = None
         return self._first_edit is not None
 
+    def is_async(self):
+        """Return whether to compute word wrapping fixup asynchronously.
+
+        If this returns True, then rather than calling has_edit(), we
+        should call prepare_analysis() in on_modified, analyze() in
+        on_modified_async, and has_planned_edit() back on the UI thread.
+        """
+        return (
+            self._settings_parser.is_async and
+            hasattr(sublime, 'set_timeout_async'))
+
+    def prepare_analysis(self):
+        """Prepare to compute word wrapping fixup off of the UI thread.
+
+        Capture the state that analyze() needs in order to compute the
+        word wrapping fixup for the most recent modification: an
+        immutable ViewExcerpt of the lines around the selection cursors,
+        a copy of the shared state in _buffer, and the contents of the
+        clipboard after a paste.  analyze() does not access the View or
+        _buffer itself.  This discards any fixup that
+        analyze() computed previously.  It must be called on the UI
+        thread, before on_selection_modified().
+
+        return bool - False if we were able to determine that there is
+            no word wrapping fixup to perform, in which case there is no
+            need to call analyze().
+        """
+        self._plan = None
+        if self._try_rule_out_edit():
+            self._analyzer = None
+            return False
+
+        # The cursor will have moved by the time the analysis finishes, so
+        # _line_summary is no longer reliable
+        self._line_summary = None
+
+        # The analyzer shares _section_matches and _cursor_section_matches,
+        # which reflect the scopes from before the modification.
+        # _update_section_matches() replaces the lists rather than mutating
+        # them, so this is safe.  We compute them here so that the analyzer
+        # does not need to access _scope_section_matches.
+        self._current_section_matches()
+        self._current_cursor_section_matches()
+        view = self._view
+        selection = view.sel()
+        first_row = max(
+            0,
+            view.rowcol(selection[0].begin())[0] -
+            WrapFixer._ANALYSIS_CONTEXT_ROWS)
+        last_row = (
+            view.rowcol(selection[-1].end())[0] +
+            WrapFixer._ANALYSIS_CONTEXT_ROWS)
+        region = Region(
+            view.text_point(first_row, 0),
+            min(view.size(), view.text_point(last_row, 0)))
+        region_keys = ['wrap_as_you_type_explicit_line_break']
+        region_keys.extend(key for key, _, _ in self._continuations)
+
+        # The UI thread continues to update _buffer while the analysis runs,
+        # so the analyzer gets its own copy of the entries it reads.  We
+        # copy the mutable "scope_runs" and "text_changes" values, as
+        # _update_scope_runs() and on_text_changed() modify them in place.
+        buffer_ = dict(self._buffer)
+        if buffer_['scope_runs'] is not None:
+            buffer_['scope_runs'] = dict(buffer_['scope_runs'])
+        if buffer_['text_changes'] is not None:
+            buffer_['text_changes'] = list(buffer_['text_changes'])
+        buffer_['wrap_fixers'] = list(buffer_['wrap_fixers'])
+
+        analyzer = copy.copy(self)
+        analyzer._view = ViewSnapshot(
+            ViewExcerpt(view, region, region_keys))
+        analyzer._analyzer = None
+        analyzer._buffer = buffer_
+        if view.command_history(0)[0] in ('paste', 'paste_and_indent'):
+            analyzer._clipboard = sublime.get_clipboard()
+        self._analyzer = analyzer
+        return True
+
+    def analyze(self):
+        """Compute the word wrapping fixup prepared by prepare_analysis().
+
+        This does not access the View, apart from its change count, so
+        it may be called off of the UI thread.  If the View was modified
+        since the call to prepare_analysis(), this does nothing.  If the
+        fixup requires any text outside of the ViewExcerpt, we leave it
+        to has_planned_edit() to compute the fixup on the UI thread.
+
+        return int - The value of view.change_count() for which we
+            computed the fixup, or None if we did not compute it.  In
+            the former case, has_planned_edit() and
+            on_post_modification() should be called on the UI thread.
+        """
+        analyzer = self._analyzer
+        self._analyzer = None
+        if analyzer is None:
+            return None
+        snapshot = analyzer._view
+        change_count = snapshot.change_count()
+        edits = []
+        try:
+            for e in analyzer._gen_edits():
+                if self._view.change_count() != change_count:
+                    return None
+                edits.append(e)
+                snapshot.apply_edit(*e)
+        except ExcerptBoundsError:
+            self._plan = {
+                'change_count': change_count,
+                'continuation': None,
+                'edits': None,
+                'passively_split': False,
+                'selection': None,
+            }
+            return change_count
+        if self._view.change_count() != change_count:
+            return None
+
+        self._plan = {
+            'change_count': snapshot.change_count(),
+            'continuation': analyzer._continuation,
+            'edits': edits,
+            'passively_split': analyzer._passively_split,
+            'selection': analyzer._selection_after_edits,
+        }
+        return snapshot.change_count()
+
+    def has_planned_edit(self):
+        """Return whether analyze() computed any edits we should perform.
+
+        If the View was modified since analyze() took its snapshot, this
+        discards the fixup and returns False; the analysis for the later
+        modification supersedes it.  If analyze() was unable to compute
+        the fixup using the ViewExcerpt, we compute it here, as in
+        has_edit().  If this returns True, then running the
+        wrap_as_you_type command performs the edits.
+        """
+        plan = self._plan
+        if plan is None:
+            return False
+        elif plan['change_count'] != self._view.change_count():
+            self._plan = None
+            return False
+        elif plan['edits'] is None:
+            self._plan = None
+            return self.has_edit()
+        elif not plan['edits']:
+            self._passively_split = plan['passively_split']
+            self._plan = None
+            return False
+        else:
+            return True
+
+    def reflower(self):
+        """Return a copy of this WrapFixer that operates on a ViewCopy.
+
+        The copy operates on a ViewCopy of _view rather than _view itself,
+        so that its WrapEngine methods that require efficient random
+        access, such as reflow_edits(), may be called off of the UI
+        thread.  This must be called on the UI thread, so that the copy
+        reflects a consistent state of the View.
+
+        return WrapFixer - The copy.
+        """
+        reflower = copy.copy(self)
+        reflower._view = ViewCopy(
+            self._view, ['wrap_as_you_type_explicit_line_break'])
+        reflower._line_summary = None
+        return reflower
+
+    def compute_reflow(self, regions, progress_callback=None):
+        """Compute the edit for reflowing the specified regions.
+
+        Reflow every wrappable section in the lines that intersect
+        "regions", as in reflow_edits().  This must be called on the
+        return value of reflower(), which reflows each paragraph in
+        memory.  This does not alter the View, so it may be called off
+        of the UI thread.  To perform the reflow, pass the result to
+        plan_reflow() on the UI thread.
+
+        list<Region> regions - The regions to reflow.
+        callable progress_callback - A function that we call
+            periodically with the fraction of the work that we have
+            completed, as a float from 0 to 1.  This may be None.
+        return dict<str, object> - The reflow.  This has the following
+            entries: "change_count", the value of _view.change_count()
+            for which we computed the reflow, as in
+            ViewCopy.change_count(); and "edits", the return value of
+            reflow_edits().
+        """
+        edits = self.reflow_edits(regions, progress_callback)
+        return {'change_count': self._view.change_count(), 'edits': edits}
+
+    def gen_audit(self):
+        """Generator that checks the wrapping of each paragraph.
+
+        This is the same as WrapEngine.gen_audit(), except that we copy
+        the View's text into memory first, as in ViewCopy.  We make the
+        copy when gen_audit() is called, which must be on the UI thread.
+        Iterating over the results does not alter the View, so it may
+        take place off of the UI thread.
+
+        return Generator<dict<str, object>> - The results, as in
+            WrapEngine.gen_audit().
+        """
+        return WrapEngine.gen_audit(self.reflower())
+
+    def _reflowed_point(self, point, edits):
+        """Return the position of "point" after the specified edits.
+
+        If "point" is inside one of the replaced regions, we keep it the
+        same distance from the beginning of the region, as far as
+        possible, so that it stays in roughly the same place in the
+        reflowed paragraph.
+
+        int point - The position.
+        list<tuple<Region, str>> edits - The edits, in order.  The
+            regions must be non-overlapping and in the coordinates prior
+            to performing any of the edits.
+        return int - The position after the edits.
+        """
+        offset = 0
+        for replace_region, replacement_str in edits:
+            if point <= replace_region.begin():
+                break
+            elif point < replace_region.end():
+                return (
+                    replace_region.begin() + offset +
+                    min(point - replace_region.begin(), len(replacement_str)))
+            offset += len(replacement_str) - replace_region.size()
+        return point + offset
+
+    def plan_reflow(self, reflow, visible_region=None):
+        """Prepare to perform the reflow computed by compute_reflow().
+
+        We divide the reflow into chunks of nearby paragraphs, which
+        plan_reflow_chunk() performs one at a time, starting with the
+        chunks nearest to visible_region.  This discards any reflow we
+        were previously in the middle of performing.  If the View was
+        modified since reflower() copied it, this does nothing.
+
+        dict<str, object> reflow - The return value of compute_reflow().
+        Region visible_region - The region the user can see, or None to
+            perform the chunks in order of position.
+        """
+        self._reflow = None
+        if (reflow['change_count'] != self._view.change_count() or
+                not reflow['edits']):
+            return
+
+        chunks = []
+        for edit in reflow['edits']:
+            if (chunks and
+                    edit[0].end() - chunks[-1][0][0].begin() <=
+                    WrapFixer._REFLOW_CHUNK_SIZE):
+                chunks[-1].append(edit)
+            else:
+                chunks.append([edit])
+        if visible_region is not None:
+            # The sort is stable, so chunks at the same distance remain in
+            # order of position
+            chunks.sort(
+                key=lambda chunk: max(
+                    0, chunk[0][0].begin() - visible_region.end(),
+                    visible_region.begin() - chunk[-1][0].end()))
+        chunks.reverse()
+        self._reflow = {
+            'chunks': chunks,
+            'chunk_count': len(chunks),
+            'deltas': [],
+        }
+
+    def plan_reflow_chunk(self):
+        """Arrange for the wrap_as_you_type command to perform a reflow chunk.
+
+        Plan the next chunk of the reflow passed to plan_reflow().  If
+        this returns True, then running the wrap_as_you_type command
+        performs the chunk as a single edit.  The View must not be
+        modified between the call to plan_reflow() and the last call to
+        plan_reflow_chunk(), except by performing the chunks; call
+        cancel_reflow() if it is.
+
+        return bool - Whether there was a chunk to plan.  This is False
+            if we have performed all of the chunks.
+        """
+        reflow = self._reflow
+        if reflow is None:
+            return False
+        elif not reflow['chunks']:
+            self._reflow = None
+            return False
+
+        # Translate the edits to the current coordinates
+        chunk = reflow['chunks'].pop()
+        begin = chunk[0][0].begin()
+        offset = 0
+        for chunk_begin, delta in reflow['deltas']:
+            if chunk_begin < begin:
+                offset += delta
+        edits = [
+            (
+                Region(
+                    replace_region.begin() + offset,
+                    replace_region.end() + offset),
+                replacement_str)
+            for replace_region, replacement_str in chunk]
+        reflow['deltas'].append((
+            begin,
+            sum(
+                len(replacement_str) - replace_region.size()
+                for replace_region, replacement_str in chunk)))
+
+        # Combine the edits
+        view = self._view
+        chunk_region = Region(edits[0][0].begin(), edits[-1][0].end())
+        chunk_text = view.substr(chunk_region)
+        strs = []
+        point = chunk_region.begin()
+        for replace_region, replacement_str in edits:
+            strs.append(
+                chunk_text[
+                    point - chunk_region.begin():
+                    replace_region.begin() - chunk_region.begin()])
+            strs.append(replacement_str)
+            point = replace_region.end()
+
+        self._plan = {
+            'change_count': view.change_count(),
+            'continuation': None,
+            'edits': [(chunk_region, ''.join(strs))],
+            'passively_split': False,
+            'selection': [
+                Region(
+                    self._reflowed_point(region.a, edits),
+                    self._reflowed_point(region.b, edits))
+                for region in view.sel()],
+        }
+        return True
+
+    def reflow_progress(self):
+        """Return the fraction of the chunks plan_reflow_chunk() planned.
+
+        return float - The fraction, from 0 to 1.  This is 1 if we are
+            not in the middle of a reflow.
+        """
+        reflow = self._reflow
+        if reflow is None:
+            return 1.0
+        return 1 - len(reflow['chunks']) / float(reflow['chunk_count'])
+
+    def cancel_reflow(self):
+        """Discard the rest of the reflow passed to plan_reflow()."""
+        self._reflow = None
+
     def _perform_edit(self, edit, e):
         """Perform the specified edit.
 
@@ -1349,6 +1806,9 @@ class WrapFixer(sublime_plugin.TextCommand):
         # Perform the edit
         view = self._view
         replace_region, replacement_str = e
+        self._mark_overflow_dirty(
+            replace_region.begin(), replace_region.end(),
+            len(replacement_str))
         if not replacement_str:
             view.erase(edit, replace_region)
         elif replace_region.empty():
@@ -1367,15 +1827,218 @@ class WrapFixer(sublime_plugin.TextCommand):
     def perform_edits(self, edit):
         """Perform word wrapping fixup.
 
+        The edits are performed as a transaction: while it is in
+        progress, is_performing_edits() returns True, on_modified()
+        should not be called, and on_text_changed() ignores the
+        individual edits.  Once the transaction finishes, we update our
+        state once for all of them.
+
+        sublime.Edit edit - The Edit object to use for the operation.
+        """
+        view = self._view
+        change_count = view.change_count()
+        buffer_ = self._buffer
+        buffer_['is_performing_edits'] = True
+        try:
+            self._perform_edits(edit)
+        finally:
+            buffer_['is_performing_edits'] = False
+
+        if view.change_count() != change_count:
+            # _perform_edit() marked the edits for updating the overflow
+            # highlights
+            buffer_['overflow_change_count'] = view.change_count()
+            self.on_modified()
+            if buffer_['tracks_text_changes']:
+                # We know what the edits were, so there is no need to track
+                # them
+                buffer_['text_changes'] = []
+                buffer_['text_changes_count'] = view.change_count()
+                buffer_['overflow_text_change_count'] = 0
+
+    def is_performing_edits(self):
+        """Return whether we are in the middle of perform_edits().
+
+        This is also True if the WrapFixer for another View into the
+        same buffer is in the middle of perform_edits().
+        """
+        return self._buffer['is_performing_edits']
+
+    def _perform_edits(self, edit):
+        """Perform word wrapping fixup, as in perform_edits().
+
         sublime.Edit edit - The Edit object to use for the operation.
         """
+        if self._plan is not None:
+            plan = self._plan
+            self._plan = None
+            if plan['change_count'] == self._view.change_count():
+                for e in plan['edits']:
+                    self._perform_edit(edit, e)
+                self._passively_split = plan['passively_split']
+                self._continuation = plan['continuation']
+                self._save_continuation()
+                self._set_selection(plan['selection'])
+                return
+
         if self.has_edit():
             edits_gen = self._edits_gen
             self._perform_edit(edit, self._first_edit)
             for e in edits_gen:
                 self._perform_edit(edit, e)
+            self._save_continuation()
+            self._set_selection(self._selection_after_edits)
+
+    def _set_selection(self, regions):
+        """Set the selection to the specified Regions, if any.
+
+        list<Region> regions - The Regions, or None to leave the
+            selection alone.
+        """
+        if regions is not None:
+            selection = self._view.sel()
+            selection.clear()
+            for region in regions:
+                selection.add(region)
+
+    def _save_continuation(self):
+        """Add _continuation, if any, to the deferred reflows."""
+        continuation = self._continuation
+        if continuation is None:
+            return
+        self._continuation = None
+
+        # Supersede any deferred reflow that starts on the same line.  This
+        # coalesces the reflows from consecutive keystrokes.
+        view = self._view
+        point = continuation['point']
+        row = view.rowcol(point)[0]
+        continuations = []
+        for key, section, line_start in self._continuations:
+            regions = view.get_regions(key)
+            if regions and view.rowcol(regions[0].begin())[0] != row:
+                continuations.append((key, section, line_start))
+            else:
+                view.erase_regions(key)
+        if len(continuations) >= WrapFixer._MAX_CONTINUATIONS:
+            view.erase_regions(continuations.pop(0)[0])
+
+        self._continuation_count += 1
+        key = 'wrap_as_you_type_continuation_{0:d}'.format(
+            self._continuation_count)
+        view.add_regions(key, [Region(point, point)], '')
+        continuations.append(
+            (key, continuation['section'], continuation['line_start']))
+        self._continuations = continuations
+
+    def has_continuations(self):
+        """Return whether there are any deferred reflows to perform."""
+        return bool(self._continuations)
+
+    def clear_continuations(self):
+        """Discard all of the deferred reflows."""
+        for key, _, _ in self._continuations:
+            self._view.erase_regions(key)
+        self._continuations = []
+        self._continuation = None
+
+    def _gen_deferred_edits(self):
+        """Coroutine for returning edits for the deferred reflows.
+
+        This is like _gen_edits(), but for the reflows in
+        _continuations, which were deferred because the
+        "wrap_as_you_type_defer_reflow" setting is true or because we
+        exhausted the work budget.  If there is a work budget, we only
+        perform one deferred reflow that alters the View per call, and
+        we stop once we exhaust the budget, setting _continuation to the
+        remaining work.
+        """
+        self._continuation = None
+        if self._selection_point() is None:
+            # _try_split_edit assumes a single, empty selection cursor
+            return
+        view = self._view
+        while self._continuations:
+            key, section, line_start = self._continuations.pop(0)
+            regions = view.get_regions(key)
+            view.erase_regions(key)
+            if regions:
+                edited = False
+                for edit in self._gen_steady_state_edits(
+                        section, regions[0].begin(), line_start, None,
+                        self._settings_parser.work_budget):
+                    yield edit
+                    edited = True
+                if edited and self._settings_parser.work_budget is not None:
+                    return
+
+    def has_deferred_edit(self):
+        """Return whether there is a deferred reflow that alters the View.
+
+        This should be called when the user stops typing.  If it returns
+        True, then running the wrap_as_you_type command performs the
+        deferred reflows.  Otherwise, this discards them.
+        """
+        self._edits_gen = self._gen_deferred_edits()
+        try:
+            self._first_edit = next(self._edits_gen)
+        except StopIteration:
+            self._first_edit = None
+        return self._first_edit is not None
 
     def _section_to_extend(self, point):
+        """Return the section we should extend, if any.
+
+        This is equivalent to _compute_section_to_extend(point), but it
+        caches the result, so that the on_query_context check for the
+        "wrap_as_you_type_extend_section" key and the subsequent
+        wrap_as_you_type_extend_section command only compute it once.
+
+        int point - The point.
+        return tuple<dict<str, object>, str> - The result.
+        """
+        view = self._view
+        change_count = view.change_count()
+        sections = self._settings_parser.sections
+        syntax = view.settings().get('syntax')
+        cache = self._section_to_extend_cache
+        if (cache is not None and
+                cache['change_count'] == change_count and
+                cache['point'] == point and
+                cache['sections'] is sections and
+                cache['syntax'] == syntax):
+            return cache['result']
+
+        result = self._compute_section_to_extend(point)
+        self._section_to_extend_cache = {
+            'change_count': change_count,
+            'line_end': view.line(point).end(),
+            'point': point,
+            'result': result,
+            'sections': sections,
+            'syntax': syntax,
+        }
+        return result
+
+    def precompute_section_to_extend(self):
+        """Compute _section_to_extend() ahead of time, if appropriate.
+
+        If the "wrap_as_you_type_enter_extends_section" setting is
+        enabled and the selection cursor is at the end of a line, where
+        the user is likely to press enter next, this caches the result
+        of _section_to_extend() for the cursor.  This does not alter the
+        View, so it may be called off of the UI thread.
+        """
+        view = self._view
+        if (self._settings_parser.is_disabled or
+                not view.settings().get(
+                    'wrap_as_you_type_enter_extends_section')):
+            return
+        point = self._selection_point()
+        if point is not None and point == view.line(point).end():
+            self._section_to_extend(point)
+
+    def _compute_section_to_extend(self, point):
         """Compute the section we should extend, if any.
 
         Compute the section that contains "point", if it is appropriate
@@ -1472,8 +2135,16 @@ class WrapFixer(sublime_plugin.TextCommand):
                 view.erase(
                     edit, Region(line_region.begin() + match.start(), point))
 
+    def _on_change_sections(self):
+        """Respond to a change in the "wrap_as_you_type_sections" setting."""
+        self._scope_section_matches = {}
+        self._section_matches = None
+        self._section_matches_key = None
+        self._update_section_matches()
+
     def _on_change_passive(self):
         """Respond to a change in the "wrap_as_you_type_passive" setting."""
+        self.clear_continuations()
         if self._settings_parser.is_passive:
             self._view.erase_regions('wrap_as_you_type_explicit_line_break')
         else:
@@ -1481,6 +2152,7 @@ class WrapFixer(sublime_plugin.TextCommand):
 
     def _on_change_disabled(self):
         """Respond to a change in the "wrap_as_you_type_disabled" setting."""
+        self.clear_continuations()
         if self._settings_parser.is_disabled:
             self._passively_split = False
         else:
@@ -1527,11 +2199,18 @@ class WrapFixer(sublime_plugin.TextCommand):
         """Respond to a modification to the WrapFixer's View's content.
 
         This method is called before performing any resulting word wrap
-        fixup.  It is also called for the modifications that comprise
-        the actual word wrap fixup.
+        fixup.  Rather than being called for each of the modifications
+        that comprise the actual word wrap fixup, it is called once
+        after all of them.
         """
         self._edits_gen = None
         self._first_edit = None
+        self._was_ruled_out = False
+        if self._continuations and self._view.command_history(1)[0]:
+            # Don't redo a reflow the user undid
+            self.clear_continuations()
+        self._take_explicit_line_break()
+        self._mark_overflow_dirty_for_modification()
 
         # If the user pressed the enter key (or performed an analogous
         # operation), mark the last line break as an explicit line break.  We
@@ -1555,6 +2234,27 @@ class WrapFixer(sublime_plugin.TextCommand):
                         'wrap_as_you_type_explicit_line_break',
                         [line_break_region], '')
 
+    def _take_explicit_line_break(self):
+        """Move the explicit line break to our View, if it is in another View.
+
+        The explicit line break pertains to the buffer, but we store it
+        using regions, which belong to a particular View.  So when the
+        user starts editing the buffer using a different View, we move
+        the regions to that View.
+        """
+        buffer_ = self._buffer
+        fixer = buffer_['explicit_line_break_fixer']
+        if fixer is not self:
+            if fixer is not None:
+                regions = fixer._view.get_regions(
+                    'wrap_as_you_type_explicit_line_break')
+                fixer._view.erase_regions(
+                    'wrap_as_you_type_explicit_line_break')
+                if regions:
+                    self._view.add_regions(
+                        'wrap_as_you_type_explicit_line_break', regions, '')
+            buffer_['explicit_line_break_fixer'] = self
+
     def on_post_modification(self):
         """Respond to a modification, after performing any word wrap fixup.
 
@@ -1565,7 +2265,130 @@ class WrapFixer(sublime_plugin.TextCommand):
         the fixup.  This method is called if even if there was no word
         wrap fixup to perform.
         """
-        self._update_section_matches()
+        buffer_ = self._buffer
+        buffer_['size'] = self._view.size()
+        if buffer_['tracks_text_changes']:
+            buffer_['text_changes'] = []
+            buffer_['text_changes_count'] = self._view.change_count()
+            buffer_['overflow_text_change_count'] = 0
+        if self._was_ruled_out:
+            # The scopes around the selection cursor did not change, so
+            # _section_matches is still correct.  _try_rule_out_edit()
+            # already updated _line_summary to reflect the insertion.
+            summary = self._line_summary
+            self._section_matches_key = (
+                self._view.change_count(), summary['point'], None,
+                self._view.settings().get('syntax'))
+            self._section_scopes = summary['scopes']
+        else:
+            self._update_section_matches()
+            self._line_summary = self._compute_line_summary()
+        self.update_overflow()
+
+    def on_text_changed(self, changes):
+        """Respond to changes to the text of the WrapFixer's View.
+
+        This is called in Sublime Text 4, using a TextChangeListener.
+        Unlike on_modified(), it tells us exactly what changed, so that
+        we do not need to infer it from the command history.  The
+        changes are shared with the WrapFixers for the other Views into
+        the same buffer, so it is only necessary to call this for one of
+        them.
+
+        We also use the changes to update the caches that describe
+        particular lines, namely the "scope_runs" entry of _buffer and
+        each WrapFixer's _line_summary and _section_to_extend_cache,
+        rather than discarding them.
+
+        list<sublime.TextChange> changes - The changes.
+        """
+        buffer_ = self._buffer
+        change_count = self._view.change_count()
+        prev_change_count = buffer_['reported_change_count']
+        buffer_['reported_change_count'] = change_count
+        buffer_['tracks_text_changes'] = True
+        text_changes = [
+            (change.a.pt, change.b.pt, change.str) for change in changes]
+        if (buffer_['text_changes'] is not None and
+                not buffer_['is_performing_edits']):
+            buffer_['text_changes'].extend(text_changes)
+            buffer_['text_changes_count'] = change_count
+
+        if prev_change_count is not None:
+            self._update_scope_runs(text_changes, prev_change_count)
+            for fixer in buffer_['wrap_fixers']:
+                fixer._update_line_caches(text_changes, prev_change_count)
+
+    def _update_scope_runs(self, text_changes, prev_change_count):
+        """Update the "scope_runs" entry of _buffer to reflect text changes.
+
+        The scopes of a line only depend on the text up to the end of the
+        line, so if all of the changes are after the line, the runs
+        remain valid.  Otherwise, we discard them.
+
+        list<tuple<int, int, str>> text_changes - The changes, formatted
+            like the elements of the "text_changes" entry of _buffer.
+        int prev_change_count - The value of _view.change_count() before
+            the changes.
+        """
+        runs = self._buffer['scope_runs']
+        if runs is None or runs['change_count'] != prev_change_count:
+            return
+        line_end = runs['line_region'].end()
+        if all(begin > line_end for begin, _, _ in text_changes):
+            runs['change_count'] = self._view.change_count()
+        else:
+            self._buffer['scope_runs'] = None
+
+    def _update_line_caches(self, text_changes, prev_change_count):
+        """Update the caches that describe particular lines for text changes.
+
+        Update _line_summary and _section_to_extend_cache to reflect the
+        specified changes, where possible, rather than discarding them.
+
+        list<tuple<int, int, str>> text_changes - The changes, formatted
+            like the elements of the "text_changes" entry of _buffer.
+        int prev_change_count - The value of _view.change_count() before
+            the changes.
+        """
+        view = self._view
+        summary = self._line_summary
+        if (summary is not None and
+                summary['change_count'] == prev_change_count):
+            for begin, end, str_ in text_changes:
+                self._update_line_summary(begin, end, str_)
+            summary = self._line_summary
+            if summary is not None:
+                if summary['size'] == view.size():
+                    summary['change_count'] = view.change_count()
+                else:
+                    self._line_summary = None
+
+        cache = self._section_to_extend_cache
+        if (cache is not None and
+                cache['change_count'] == prev_change_count):
+            if all(begin > cache['line_end'] for begin, _, _ in text_changes):
+                cache['change_count'] = view.change_count()
+            else:
+                self._section_to_extend_cache = None
+
+    def _single_text_change(self):
+        """Return the change to the text since on_post_modification().
+
+        Return the change to the View's text since the most recent call
+        to on_post_modification(), formatted like the elements of the
+        "text_changes" entry of _buffer.  Return None if there were
+        multiple changes, or if we do not know what changed.
+
+        return tuple<int, int, str> - The change.
+        """
+        text_changes = self._buffer['text_changes']
+        if (text_changes is not None and len(text_changes) == 1 and
+                self._buffer['text_changes_count'] ==
+                self._view.change_count()):
+            return text_changes[0]
+        else:
+            return None
 
     def on_selection_modified(self):
         """Respond to a change in the position(s) of the selection cursor(s).
@@ -1584,3 +2407,286 @@ class WrapFixer(sublime_plugin.TextCommand):
                 self._view.erase_regions(
                     'wrap_as_you_type_explicit_line_break')
         self._prev_selection_point = selection_point
+
+    def _overflow_section(self, line_region):
+        # Reuse the classification of the line containing the selection
+        # cursor, if we have it
+        summary = self._line_summary
+        if (summary is not None and
+                summary['begin'] == line_region.begin() and
+                summary['line_size'] == line_region.size()):
+            return summary['section']
+        else:
+            return self._line_section(line_region)[0]
+
+    def _replace_overflow_buckets(self, start, end, regions):
+        """Replace the buckets _overflow_keys[start:end] with "regions".
+
+        We reuse the existing keys where possible, and divide the regions
+        into buckets of _OVERFLOW_BUCKET_SIZE regions.
+
+        int start - The index of the first bucket to replace.
+        int end - The index after the last bucket to replace.
+        list<Region> regions - The highlights to put in place of the
+            buckets, in order.  They must lie between the highlights in
+            the buckets before and after the replaced buckets.
+        """
+        if hasattr(sublime, 'DRAW_SQUIGGLY_UNDERLINE'):
+            flags = (
+                sublime.DRAW_NO_FILL | sublime.DRAW_NO_OUTLINE |
+                sublime.DRAW_SQUIGGLY_UNDERLINE)
+        else:
+            # Sublime 2
+            flags = sublime.DRAW_OUTLINED
+
+        view = self._view
+        old_keys = self._overflow_keys[start:end]
+        new_keys = []
+        for index in range(
+                0, len(regions), WrapFixer._OVERFLOW_BUCKET_SIZE):
+            if len(new_keys) < len(old_keys):
+                key = old_keys[len(new_keys)]
+            else:
+                key = u'{0:s}{1:d}'.format(
+                    WrapFixer._OVERFLOW_KEY_PREFIX, self._overflow_key_count)
+                self._overflow_key_count += 1
+            view.add_regions(
+                key,
+                regions[index:index + WrapFixer._OVERFLOW_BUCKET_SIZE],
+                'invalid', '', flags)
+            new_keys.append(key)
+        for key in old_keys[len(new_keys):]:
+            view.erase_regions(key)
+        self._overflow_keys[start:end] = new_keys
+
+    def overflow_regions(self):
+        """Return the highlights of the text past the wrap width.
+
+        return list<Region> - The highlighted text, in order.
+        """
+        regions = []
+        for key in self._overflow_keys:
+            regions.extend(self._view.get_regions(key))
+        return regions
+
+    def _reset_overflow(self):
+        """Discard the overflow highlights, pending a full scan."""
+        self._overflow_dirty = None
+        self._replace_overflow_buckets(0, len(self._overflow_keys), [])
+
+    def _mark_overflow_dirty(self, begin, end, length):
+        """Record a change to the text, for updating the overflow highlights.
+
+        Record the change for the WrapFixers for all of the Views into
+        our buffer, so that _update_overflow() rechecks the lines it
+        touched.
+
+        int begin - The beginning of the replaced text.
+        int end - The end of the replaced text.
+        int length - The length of the replacement text.
+        """
+        delta = length - (end - begin)
+        for fixer in self._buffer['wrap_fixers']:
+            dirty = fixer._overflow_dirty
+            if dirty is None:
+                continue
+
+            # Move the existing regions to the coordinates after the change
+            points = []
+            for region in dirty:
+                for point in (region.begin(), region.end()):
+                    if point <= begin:
+                        points.append(point)
+                    elif point >= end:
+                        points.append(point + delta)
+                    else:
+                        points.append(begin + length)
+            dirty = [
+                Region(points[i], points[i + 1])
+                for i in range(0, len(points), 2)]
+
+            dirty.append(Region(begin, begin + length))
+            if len(dirty) > WrapFixer._MAX_OVERFLOW_DIRTY:
+                dirty = [
+                    Region(
+                        min(region.begin() for region in dirty),
+                        max(region.end() for region in dirty))]
+            fixer._overflow_dirty = dirty
+
+    def _mark_overflow_dirty_for_modification(self):
+        """Record the most recent modification, for the overflow highlights.
+
+        If the "text_changes" entry of _buffer is up to date, we mark the
+        changes it records that we have not already marked.  Otherwise,
+        we fall back to _mark_overflow_dirty_at_cursors().
+        """
+        buffer_ = self._buffer
+        change_count = self._view.change_count()
+        if buffer_['overflow_change_count'] == change_count:
+            return
+        text_changes = buffer_['text_changes']
+        if (text_changes is not None and
+                buffer_['text_changes_count'] == change_count):
+            for begin, end, str_ in text_changes[
+                    buffer_['overflow_text_change_count']:]:
+                self._mark_overflow_dirty(begin, end, len(str_))
+            buffer_['overflow_text_change_count'] = len(text_changes)
+        else:
+            self._mark_overflow_dirty_at_cursors()
+        buffer_['overflow_change_count'] = change_count
+
+    def _mark_overflow_dirty_at_cursors(self):
+        """Record the most recent modification, without knowing what it was.
+
+        This is for Sublime Text 2 and 3, which do not tell us exactly
+        what changed, and for when we have not yet received the
+        TextChanges for the modification.  If it was a typing command, we
+        mark the lines containing the selection cursors and the lines
+        before them as changed.  Otherwise, we arrange to perform a full
+        scan of the overflowing lines.
+        """
+        if self._view.command_history(0)[0] in WrapFixer._TYPING_COMMANDS:
+            view = self._view
+            for region in view.sel():
+                begin = view.line(region.begin()).begin()
+                begin = view.line(max(0, begin - 1)).begin()
+                end = view.line(region.end()).end()
+                self._mark_overflow_dirty(begin, end, end - begin)
+        else:
+            for fixer in self._buffer['wrap_fixers']:
+                fixer._overflow_dirty = None
+
+    def _update_overflow(self):
+        """Update the overflow highlights for the lines that changed.
+
+        We only recheck the lines that intersect _overflow_dirty, and
+        only read and rewrite the buckets of highlights near them, so
+        this takes time proportional to the number of changed lines,
+        rather than to the size of the document or the number of
+        highlights.
+        """
+        dirty = self._overflow_dirty
+        if not dirty:
+            return
+        self._overflow_dirty = []
+        if not self._settings_parser.sections:
+            return
+
+        # Compute the changed lines
+        view = self._view
+        size = view.size()
+        line_regions = []
+        for region in sorted(dirty, key=lambda region: region.begin()):
+            line_region = view.line(min(region.begin(), size)).cover(
+                view.line(min(region.end(), size)))
+            if (line_regions and
+                    line_region.begin() <= line_regions[-1].end() + 1):
+                line_regions[-1] = line_regions[-1].cover(line_region)
+            else:
+                line_regions.append(line_region)
+
+        # Update the changed lines in reverse order, so that updating the
+        # buckets for one group of lines does not alter the indices of the
+        # buckets for the groups before it
+        min_wrap_width = self._min_wrap_width()
+        keys = self._overflow_keys
+        for changed_region in reversed(line_regions):
+            # Find the buckets that might contain highlights on the lines
+            low = 0
+            high = len(keys)
+            while low < high:
+                mid = (low + high) // 2
+                regions = view.get_regions(keys[mid])
+                if regions and regions[-1].end() < changed_region.begin():
+                    low = mid + 1
+                else:
+                    high = mid
+            start = low
+            end = start
+            prev_regions = []
+            while end < len(keys):
+                regions = view.get_regions(keys[end])
+                if regions and regions[0].begin() > changed_region.end():
+                    break
+                prev_regions.extend(regions)
+                end += 1
+
+            regions = [
+                region for region in prev_regions
+                if region.end() < changed_region.begin() or
+                region.begin() > changed_region.end()]
+            line_region = view.line(changed_region.begin())
+            while line_region is not None:
+                overflow_region = self._overflow_region(
+                    line_region, min_wrap_width)
+                if overflow_region is not None:
+                    regions.append(overflow_region)
+                if line_region.end() >= changed_region.end():
+                    break
+                line_region = self._next_line_region(line_region.begin())
+
+            if regions != prev_regions:
+                regions.sort(key=lambda region: region.begin())
+                self._replace_overflow_buckets(start, end, regions)
+
+    def update_overflow(self):
+        """Update the overflow highlights after a modification.
+
+        This updates the highlights for all of the Views into our
+        buffer.  on_post_modification() calls this, so it is only
+        necessary to call it after modifications that are not followed
+        by a call to on_post_modification(), such as deferred reflows.
+        """
+        for fixer in self._buffer['wrap_fixers']:
+            fixer._update_overflow()
+
+    def prepare_overflow_scan(self):
+        """Prepare to highlight the overflowing lines using a full scan.
+
+        If the "wrap_as_you_type_highlight_overflow" setting is true and
+        we have not yet highlighted the text that extends past the wrap
+        width, this returns True, in which case the caller should call
+        scan_overflow() on the return value of reflower(), and then pass
+        the result to finish_overflow_scan() on the UI thread.
+
+        return bool - Whether to perform a full scan.
+        """
+        if (not self._settings_parser.highlight_overflow or
+                self._overflow_dirty is not None or
+                self._is_scanning_overflow):
+            return False
+        self._is_scanning_overflow = True
+        return True
+
+    def scan_overflow(self):
+        """Compute the text that extends past the wrap width.
+
+        This must be called on the return value of reflower(), which
+        checks every line in memory.  This does not alter the View, so
+        it may be called off of the UI thread.
+
+        return dict<str, object> - The result of the scan.  This has the
+            following entries: "change_count", the value of
+            _view.change_count() for which we computed the result, as in
+            ViewCopy.change_count(); and "regions", the text past the
+            wrap width, as in _overflow_region().
+        """
+        regions = self.find_overflow_regions()
+        return {'change_count': self._view.change_count(), 'regions': regions}
+
+    def finish_overflow_scan(self, scan):
+        """Highlight the overflowing text computed by scan_overflow().
+
+        If the View was modified since reflower() copied it, this
+        discards the scan, and prepare_overflow_scan() will return True
+        again.
+
+        dict<str, object> scan - The return value of scan_overflow().
+        """
+        self._is_scanning_overflow = False
+        if (self._settings_parser.highlight_overflow and
+                self._overflow_dirty is None and
+                scan['change_count'] == self._view.change_count()):
+            self._replace_overflow_buckets(
+                0, len(self._overflow_keys), scan['regions'])
+            self._overflow_dirty = []